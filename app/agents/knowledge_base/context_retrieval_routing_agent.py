@@ -5,6 +5,14 @@ from langchain_openai import ChatOpenAI
 from langchain.agents import create_agent
 from langchain.agents.structured_output import ToolStrategy
 from app.agents.config import DEFAULT_MODEL_NANO
+from app.services.knowledge_base.query_fast_path import (
+    KB_QUERY_FAST_PATH,
+    cache_key,
+    cached_llm_call,
+    fast_path_stats,
+    preclassify,
+    routing_decision_cache,
+)
 from app.services.token_usage_service import TokenUsageService
 
 
@@ -27,18 +35,44 @@ class ContextRetrievalRoutingAgent:
         self.token_usage_service = TokenUsageService()
 
     def decide_retrieval_and_mode(
-        self, question: str, history: list[dict] | None = None
+        self, question: str, history: list[dict] | None = None, law_firm_id: int | None = None
     ) -> ContextRetrievalDecisionSchema:
         """
         Decide se deve buscar contexto e qual modo de busca é mais apropriado.
+
+        Sem LLM para cumprimentos (não busca) e perguntas curtas com
+        identificador — CNJ, CNPJ, CPF, NB (full_text); o resto passa pelo
+        cache (ver query_fast_path).
         
         Args:
             question: Pergunta do usuário
             history: Histórico de conversa (opcional)
+            law_firm_id: Escritório (entra na chave do cache)
             
         Returns:
             ContextRetrievalDecisionSchema com should_retrieve_context e search_mode
         """
+        if KB_QUERY_FAST_PATH:
+            preclassified = preclassify(question)
+            if preclassified.small_talk:
+                fast_path_stats.record("decide_retrieval_and_mode", "rule")
+                return ContextRetrievalDecisionSchema(should_retrieve_context=False, search_mode="semantic")
+            if preclassified.identifier_lookup:
+                fast_path_stats.record("decide_retrieval_and_mode", "rule")
+                return ContextRetrievalDecisionSchema(should_retrieve_context=True, search_mode="full_text")
+
+        try:
+            return cached_llm_call(
+                "decide_retrieval_and_mode",
+                routing_decision_cache,
+                cache_key(law_firm_id, question, history),
+                lambda: self._decide_with_llm(question, history),
+            )
+        except Exception as e:
+            print(f"Erro ao decidir retrieval e modo: {str(e)}")
+            return ContextRetrievalDecisionSchema(should_retrieve_context=True, search_mode="semantic")
+
+    def _decide_with_llm(self, question: str, history: list[dict] | None) -> ContextRetrievalDecisionSchema:
         history_preview = ""
         if history:
             limited_history = history[-6:] if len(history) > 6 else history
@@ -70,37 +104,33 @@ class ContextRetrievalRoutingAgent:
             },
         ]
 
-        try:
-            agent = create_agent(
-                model=self.llm,
-                response_format=ToolStrategy(ContextRetrievalDecisionSchema),
-            )
-            
-            call_started_at = time.time()
-            response_payload = agent.invoke({"messages": messages})
-            latency_ms = int((time.time() - call_started_at) * 1000)
-            
-            # Capturar tokens
-            self.token_usage_service.capture_and_store(
-                response_payload,
-                agent_name="ContextRetrievalRoutingAgent",
-                action_name="decide_retrieval_and_mode",
-                print_prefix="[ContextRetrievalRoutingAgent][tokens]",
-                model_name=self.model_name,
-                model_provider="openai",
-                latency_ms=latency_ms,
-                status="success",
-                metadata_payload={
-                    "question_length": len(question),
-                    "has_history": bool(history_preview),
-                },
-            )
-            
-            result = response_payload.get("structured_response")
-            if not result:
-                raise RuntimeError("Resposta estruturada não retornada pelo create_agent")
-            
-            return result
-        except Exception as e:
-            print(f"Erro ao decidir retrieval e modo: {str(e)}")
-            return ContextRetrievalDecisionSchema(should_retrieve_context=True, search_mode="semantic")
+        agent = create_agent(
+            model=self.llm,
+            response_format=ToolStrategy(ContextRetrievalDecisionSchema),
+        )
+        
+        call_started_at = time.time()
+        response_payload = agent.invoke({"messages": messages})
+        latency_ms = int((time.time() - call_started_at) * 1000)
+        
+        # Capturar tokens
+        self.token_usage_service.capture_and_store(
+            response_payload,
+            agent_name="ContextRetrievalRoutingAgent",
+            action_name="decide_retrieval_and_mode",
+            print_prefix="[ContextRetrievalRoutingAgent][tokens]",
+            model_name=self.model_name,
+            model_provider="openai",
+            latency_ms=latency_ms,
+            status="success",
+            metadata_payload={
+                "question_length": len(question),
+                "has_history": bool(history_preview),
+            },
+        )
+        
+        result = response_payload.get("structured_response")
+        if not result:
+            raise RuntimeError("Resposta estruturada não retornada pelo create_agent")
+        
+        return result
@@ -6,6 +6,14 @@ from langchain_openai import ChatOpenAI
 from langchain.agents import create_agent
 from langchain.agents.structured_output import ToolStrategy
 from app.agents.config import DEFAULT_MODEL_NANO
+from app.services.knowledge_base.query_fast_path import (
+    KB_QUERY_FAST_PATH,
+    cache_key,
+    cached_llm_call,
+    fast_path_stats,
+    keywords_cache,
+    preclassify,
+)
 from app.services.token_usage_service import TokenUsageService
 
 
@@ -30,20 +38,46 @@ class KeywordExtractionAgent:
         self.llm = ChatOpenAI(model=self.model_name, temperature=0)
         self.token_usage_service = TokenUsageService()
 
-    def extract_keywords(self, question: str) -> list[str]:
+    def extract_keywords(self, question: str, law_firm_id: int | None = None) -> list[str]:
         """
         Extrai termos-chave da pergunta para busca full_text.
         
         Retorna ambos os formatos (original e normalizado) para CPF/CNPJ:
         - Exemplo: '88.611.835/0008-03' → ['88.611.835/0008-03', '88611835000803']
         - Exemplo: '098.545.439.-35' → ['098.545.439.-35', '09854543935']
+
+        Perguntas curtas com identificador saem por regex e perguntas de até
+        3 palavras viram a própria busca (lista vazia), sem LLM; o resto passa
+        pelo cache (ver query_fast_path).
         
         Args:
             question: Pergunta do usuário
+            law_firm_id: Escritório (entra na chave do cache)
             
         Returns:
             Lista de termos-chave extraídos, ou lista vazia se nenhum termo específico encontrado
         """
+        if KB_QUERY_FAST_PATH:
+            preclassified = preclassify(question)
+            if preclassified.identifier_lookup:
+                fast_path_stats.record("extract_keywords", "rule")
+                return list(preclassified.keywords)
+            if preclassified.short or preclassified.small_talk:
+                fast_path_stats.record("extract_keywords", "rule")
+                return []
+
+        try:
+            return list(cached_llm_call(
+                "extract_keywords",
+                keywords_cache,
+                cache_key(law_firm_id, question),
+                lambda: self._extract_with_llm(question),
+            ))
+        except Exception as e:
+            logger.error("Erro ao extrair termos-chave: %s", str(e))
+            return []
+
+    def _extract_with_llm(self, question: str) -> list[str]:
         messages = [
             {
                 "role": "system",
@@ -69,41 +103,37 @@ class KeywordExtractionAgent:
             },
         ]
 
-        try:
-            agent = create_agent(
-                model=self.llm,
-                response_format=ToolStrategy(KeywordExtractionSchema),
-            )
-            
-            call_started_at = time.time()
-            response_payload = agent.invoke({"messages": messages})
-            latency_ms = int((time.time() - call_started_at) * 1000)
-            
-            # Capturar tokens
-            self.token_usage_service.capture_and_store(
-                response_payload,
-                agent_name="KeywordExtractionAgent",
-                action_name="extract_keywords",
-                print_prefix="[KeywordExtractionAgent][tokens]",
-                model_name=self.model_name,
-                model_provider="openai",
-                latency_ms=latency_ms,
-                status="success",
-                metadata_payload={"question_length": len(question)},
-            )
-            
-            result = response_payload.get("structured_response")
-            if not result:
-                raise RuntimeError("Resposta estruturada não retornada pelo create_agent")
-            
-            logger.debug(
-                "Extração de termos-chave concluída | "
-                "extracted_type=%s | keywords_count=%d | keywords=%s",
-                result.extracted_type,
-                len(result.search_keywords),
-                result.search_keywords,
-            )
-            return result.search_keywords
-        except Exception as e:
-            logger.error("Erro ao extrair termos-chave: %s", str(e))
-            return []
+        agent = create_agent(
+            model=self.llm,
+            response_format=ToolStrategy(KeywordExtractionSchema),
+        )
+        
+        call_started_at = time.time()
+        response_payload = agent.invoke({"messages": messages})
+        latency_ms = int((time.time() - call_started_at) * 1000)
+        
+        # Capturar tokens
+        self.token_usage_service.capture_and_store(
+            response_payload,
+            agent_name="KeywordExtractionAgent",
+            action_name="extract_keywords",
+            print_prefix="[KeywordExtractionAgent][tokens]",
+            model_name=self.model_name,
+            model_provider="openai",
+            latency_ms=latency_ms,
+            status="success",
+            metadata_payload={"question_length": len(question)},
+        )
+        
+        result = response_payload.get("structured_response")
+        if not result:
+            raise RuntimeError("Resposta estruturada não retornada pelo create_agent")
+        
+        logger.debug(
+            "Extração de termos-chave concluída | "
+            "extracted_type=%s | keywords_count=%d | keywords=%s",
+            result.extracted_type,
+            len(result.search_keywords),
+            result.search_keywords,
+        )
+        return result.search_keywords
@@ -28,6 +28,52 @@ MAX_CHARS_PER_CHUNK = int(os.getenv("MAX_CHARS_PER_CHUNK", "3000"))
 QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "64"))
 MEILISEARCH_ADD_BATCH_SIZE = int(os.getenv("MEILISEARCH_ADD_BATCH_SIZE", "500"))
 
+# Campos de payload indexados no Qdrant: a busca filtra por tenant
+# (law_firm_id) dentro do HNSW em vez de varrer os vetores de todos os
+# escritórios e pós-filtrar; file_id serve à exclusão/atualização por arquivo.
+PAYLOAD_INDEXES = {
+    "law_firm_id": rest.PayloadSchemaType.INTEGER,
+    "file_id": rest.PayloadSchemaType.INTEGER,
+    "category": rest.PayloadSchemaType.KEYWORD,
+}
+# Depois do backfill (database/backfill_knowledge_base_tenant_payload.py), ligar
+# para que pontos sem law_firm_id deixem de aparecer em qualquer busca.
+KB_TENANT_FILTER_STRICT = os.getenv("KB_TENANT_FILTER_STRICT", "false").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def tenant_filter(law_firm_id: int | None) -> rest.Filter | None:
+    """Filtro Qdrant do escritório para query_points (None sem escritório).
+
+    Fora do modo estrito, pontos ainda sem law_firm_id (ingeridos antes do
+    campo existir) continuam elegíveis; quem lista trechos ao usuário já
+    confere o arquivo contra KnowledgeBase.law_firm_id.
+    """
+    if not law_firm_id:
+        return None
+    tenant = rest.FieldCondition(key="law_firm_id", match=rest.MatchValue(value=int(law_firm_id)))
+    if KB_TENANT_FILTER_STRICT:
+        return rest.Filter(must=[tenant])
+    return rest.Filter(
+        should=[tenant, rest.IsEmptyCondition(is_empty=rest.PayloadField(key="law_firm_id"))]
+    )
+
+
+def tenant_matches(payload: dict | None, law_firm_id: int | None) -> bool:
+    """Mesma regra de tenant_filter aplicada a um payload já devolvido.
+
+    Para backends sem o filtro no próprio índice (o Meilisearch só filtra por
+    file_id): o trecho é do escritório ou, fora do modo estrito, ainda não
+    tem law_firm_id."""
+    if not law_firm_id:
+        return True
+    value = (payload or {}).get("law_firm_id")
+    if value is None or value == "":
+        return not KB_TENANT_FILTER_STRICT
+    try:
+        return int(value) == int(law_firm_id)
+    except (TypeError, ValueError):
+        return False
+
 
 class KnowledgeIngestionAgent:
     """Recebe e processa arquivos para ingestão na base vetorial."""
@@ -54,11 +100,37 @@ class KnowledgeIngestionAgent:
             self._ensure_meilisearch_index()
 
     def _ensure_collection(self) -> None:
-        if self.qdrant.collection_exists(self.collection):
+        if not self.qdrant.collection_exists(self.collection):
+            self.qdrant.create_collection(
+                collection_name=self.collection,
+                vectors_config=rest.VectorParams(size=VECTOR_SIZE, distance=rest.Distance.COSINE),
+            )
+        self._ensure_payload_indexes()
+
+    def _ensure_payload_indexes(self) -> None:
+        """Cria os índices de PAYLOAD_INDEXES que ainda não existem (idempotente)."""
+        existing = set((self.qdrant.get_collection(self.collection).payload_schema or {}).keys())
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            if field_name in existing:
+                continue
+            self.qdrant.create_payload_index(
+                collection_name=self.collection,
+                field_name=field_name,
+                field_schema=field_schema,
+                wait=True,
+            )
+
+    def set_tenant_payload_by_file_id(self, file_id: int, law_firm_id: int, category: str | None = None) -> None:
+        """Grava law_firm_id/category nos pontos já existentes de um arquivo (backfill)."""
+        if file_id is None or law_firm_id is None:
             return
-        self.qdrant.create_collection(
+        self.qdrant.set_payload(
             collection_name=self.collection,
-            vectors_config=rest.VectorParams(size=VECTOR_SIZE, distance=rest.Distance.COSINE),
+            payload={"law_firm_id": int(law_firm_id), "category": category or ""},
+            points=rest.Filter(
+                must=[rest.FieldCondition(key="file_id", match=rest.MatchValue(value=file_id))]
+            ),
+            wait=True,
         )
 
     def _embed(self, text: str) -> list[float]:
@@ -230,8 +302,12 @@ class KnowledgeIngestionAgent:
         lawsuit_number: str = None,
         chunks_with_pages: list[dict] = None,
         file_id: int = None,
+        law_firm_id: int = None,
     ) -> Optional[list[str]]:
-        """Ingere documento na base vetorial."""
+        """Ingere documento na base vetorial.
+
+        `law_firm_id` vai no payload (campo indexado) para que a busca do
+        escritório filtre no próprio Qdrant."""
         if chunks_with_pages:
             chunks = chunks_with_pages
         else:
@@ -277,6 +353,9 @@ class KnowledgeIngestionAgent:
             if file_id is not None:
                 payload["file_id"] = file_id
 
+            if law_firm_id is not None:
+                payload["law_firm_id"] = int(law_firm_id)
+
             if chunk_page is not None:
                 payload["page"] = chunk_page
 
@@ -328,6 +407,7 @@ class KnowledgeIngestionAgent:
         tags: str = None,
         lawsuit_number: str = None,
         file_id: int = None,
+        law_firm_id: int = None,
     ):
         """Ingere conteúdo já processado e preserva metadados de paginação quando disponíveis."""
         if processed_document is None:
@@ -366,6 +446,7 @@ class KnowledgeIngestionAgent:
                     lawsuit_number=lawsuit_number,
                     chunks_with_pages=chunks_with_pages,
                     file_id=file_id,
+                    law_firm_id=law_firm_id,
                 )
             else:
                 full_text = str(processed_document.full_text or "")
@@ -379,6 +460,7 @@ class KnowledgeIngestionAgent:
                         tags=tags,
                         lawsuit_number=lawsuit_number,
                         file_id=file_id,
+                        law_firm_id=law_firm_id,
                     )
                 else:
                     print("⚠ Documento processado sem conteúdo textual para ingestão")
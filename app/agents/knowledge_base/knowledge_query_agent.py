@@ -5,11 +5,13 @@ import logging
 import os
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from types import SimpleNamespace
 from rich import print
 
 from dotenv import load_dotenv
+from flask import current_app, has_app_context
 from meilisearch_python_sdk import Client as MeilisearchClient
 from openai import OpenAI
 from langchain.agents import create_agent
@@ -25,8 +27,10 @@ from app.agents.knowledge_base.context_retrieval_routing_agent import (
     ContextRetrievalRoutingAgent,
 )
 from app.agents.knowledge_base.keyword_extraction_agent import KeywordExtractionAgent
+from app.agents.knowledge_base.knowledge_ingestion_agent import tenant_filter, tenant_matches
 from app.agents.knowledge_base.tools import KnowledgeQueryTools
 from app.services.token_usage_service import TokenUsageService
+from app.services.knowledge_base.search_helpers import passes_score_cutoff
 from app.agents.config import DEFAULT_MODEL_MINI, DEFAULT_MODEL_NANO
 
 
@@ -47,11 +51,83 @@ KB_MAX_HISTORY_CHARS = int(os.getenv("KB_MAX_HISTORY_CHARS", "12000"))
 KB_MAX_CONTEXT_RESULTS = int(os.getenv("KB_MAX_CONTEXT_RESULTS", "10"))
 KB_MAX_CONTEXT_CHARS_PER_SOURCE = int(os.getenv("KB_MAX_CONTEXT_CHARS_PER_SOURCE", "3000"))
 KB_AGENT_RECURSION_LIMIT = int(os.getenv("KB_AGENT_RECURSION_LIMIT", "10"))
+# "auto": o roteador LLM decide se busca e em qual modo. Qualquer modo fixo
+# ("hybrid", "semantic", "full_text") pula o roteador — uma chamada LLM a menos.
+KB_CHAT_SEARCH_MODE = os.getenv("KB_CHAT_SEARCH_MODE", "auto").strip().lower()
+KB_HYBRID_RRF_K = int(os.getenv("KB_HYBRID_RRF_K", "60"))
+KB_HYBRID_CANDIDATES = int(os.getenv("KB_HYBRID_CANDIDATES", "30"))
+
+_SEARCH_MODE_ALIASES = {
+    "semantic": "semantic",
+    "semantica": "semantic",
+    "full_text": "full_text",
+    "full-text": "full_text",
+    "literal": "full_text",
+    "textual": "full_text",
+    "hybrid": "hybrid",
+    "hibrida": "hybrid",
+    "híbrida": "hybrid",
+}
+_SEARCH_MODE_LABELS = {"semantic": "semântica", "full_text": "full-text", "hybrid": "híbrida"}
 
 
 logger = logging.getLogger(__name__)
 
 
+def normalize_search_mode(value, default: str | None = "semantic") -> str | None:
+    """Normaliza o modo de busca; devolve None para valores desconhecidos."""
+    raw = str(value or "").strip().lower()
+    if not raw:
+        return default
+    return _SEARCH_MODE_ALIASES.get(raw)
+
+
+def configured_chat_search_mode() -> str | None:
+    """Modo fixo de KB_CHAT_SEARCH_MODE, ou None quando o roteador LLM decide."""
+    if KB_CHAT_SEARCH_MODE == "auto":
+        return None
+    return normalize_search_mode(KB_CHAT_SEARCH_MODE, default=None)
+
+
+def _point_key(point) -> str:
+    """Chave de fusão: o id do chunk é o mesmo no Qdrant e no Meilisearch."""
+    point_id = getattr(point, "id", None)
+    if point_id is not None:
+        return str(point_id)
+    payload = point.payload or {}
+    if payload.get("id") is not None:
+        return str(payload["id"])
+    return f"{payload.get('file_id')}|{payload.get('page')}|{payload.get('chunk_index')}"
+
+
+def reciprocal_rank_fusion(ranked_lists, k: int = 60) -> list:
+    """Funde listas ranqueadas por RRF: score = Σ 1 / (k + posição).
+
+    `ranked_lists` é uma sequência de (rótulo, pontos). Cada ponto fundido
+    leva o payload do primeiro backend em que apareceu, `score` = maior
+    score bruto entre os backends (só para exibição: cosseno do Qdrant e
+    _rankingScore do Meilisearch não são comparáveis, o corte de relevância
+    vale por ramo antes da fusão), `rrf_score` e `origins` (backends que o
+    encontraram)."""
+    fused: dict[str, SimpleNamespace] = {}
+    for label, points in ranked_lists:
+        for rank, point in enumerate(points or [], start=1):
+            key = _point_key(point)
+            raw_score = getattr(point, "score", None)
+            entry = fused.get(key)
+            if entry is None:
+                entry = SimpleNamespace(
+                    id=key, payload=dict(point.payload or {}), score=raw_score, rrf_score=0.0, origins=[],
+                )
+                fused[key] = entry
+            elif raw_score is not None and (entry.score is None or raw_score > entry.score):
+                entry.score = raw_score
+            entry.rrf_score += 1.0 / (k + rank)
+            if label not in entry.origins:
+                entry.origins.append(label)
+    return sorted(fused.values(), key=lambda item: item.rrf_score, reverse=True)
+
+
 class ResponseSchema(BaseModel):
     answer: str = Field(description="Resposta gerada para a pergunta")
     sources: list[str] = Field(description="Índices das fontes utilizadas (ex: ['0', '2'])")
@@ -90,6 +166,7 @@ class KnowledgeQueryAgent:
         self._last_context_text = ""
         self._context_search_calls = 0
         self._cached_should_use_context = None
+        self._law_firm_id = None
         self.tools_registry = KnowledgeQueryTools()
         self.token_usage_service = TokenUsageService()
         self.router_llm = ChatOpenAI(model=ROUTER_MODEL, temperature=0).with_structured_output(RetrievalDecisionSchema)
@@ -151,49 +228,120 @@ class KnowledgeQueryAgent:
         embedding_request = self.openai.embeddings.create(input=text, model=EMBEDDING_MODEL)
         return embedding_request.data[0].embedding
 
+    def _semantic_search(self, question: str, history, limit: int, law_firm_id: int | None):
+        improved_question = self.query_enhancer.enhance_question(question, history=history, law_firm_id=law_firm_id)
+        print("pergunta original:", question)
+        print("pergunta melhorada:", improved_question)
+        vector = self.create_embedding_vector(improved_question)
+        results = self.qdrant.query_points(
+            collection_name=self.collection,
+            query=vector,
+            query_filter=tenant_filter(law_firm_id),
+            limit=limit,
+        )
+        return improved_question, results
+
+    def _full_text_search(self, question: str, limit: int, law_firm_id: int | None = None):
+        """Busca no Meilisearch. O índice só filtra por file_id: os hits de
+        outro escritório saem aqui, pelo law_firm_id do payload, antes de
+        chegar à fusão ou ao contexto do chat."""
+        # Extrair termos-chave para melhorar a busca full_text
+        keywords = self.keyword_extraction.extract_keywords(question, law_firm_id=law_firm_id)
+        search_query = " ".join(keywords) if keywords else question
+
+        print(f"termos-chave extraídos: {keywords}")
+        print(f"query para busca: {search_query}")
+
+        search_results = self.meilisearch.index(self.collection).search(
+            search_query,
+            limit=limit,
+            show_ranking_score=True,
+        )
+        points = [
+            SimpleNamespace(id=hit.get("id"), payload=hit, score=hit.get("_rankingScore"))
+            for hit in (search_results.hits or [])
+            if tenant_matches(hit, law_firm_id)
+        ]
+        return search_query, SimpleNamespace(points=points)
+
+    def _hybrid_search(self, question: str, history, limit: int, law_firm_id: int | None):
+        """Semântica e full-text em paralelo, fundidas por RRF.
+
+        Cada ramo tem sua chamada LLM (melhoria da pergunta / termos-chave),
+        então em paralelo a latência é a do ramo mais lento. Se um ramo
+        falhar, segue só com o outro. O corte mínimo de score é o de cada
+        ramo (passes_score_cutoff com o modo do ramo), aplicado antes da
+        fusão, porque os scores dos dois backends não têm a mesma escala."""
+        app = current_app._get_current_object() if has_app_context() else None
+
+        def _in_app_context(fn, *args):
+            # O rastreio de tokens dos agentes grava no banco: precisa de contexto
+            if app is None:
+                return fn(*args)
+            with app.app_context():
+                return fn(*args)
+
+        candidates = max(limit, KB_HYBRID_CANDIDATES)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            semantic_future = executor.submit(
+                _in_app_context, self._semantic_search, question, history, candidates, law_firm_id
+            )
+            full_text_future = executor.submit(
+                _in_app_context, self._full_text_search, question, candidates, law_firm_id
+            )
+
+        improved_question = question
+        ranked_lists = []
+        errors = []
+        for label, future in (("semantic", semantic_future), ("full_text", full_text_future)):
+            try:
+                query_text, branch_results = future.result()
+            except Exception as exc:
+                errors.append(exc)
+                print(f"busca híbrida: ramo {label} falhou: {exc}")
+                continue
+            if label == "semantic":
+                improved_question = query_text
+            ranked_lists.append((label, [
+                point for point in branch_results.points
+                if passes_score_cutoff(float(getattr(point, "score", None) or 0), label)
+            ]))
+
+        if not ranked_lists:
+            raise errors[0]
+
+        fused = reciprocal_rank_fusion(ranked_lists, k=KB_HYBRID_RRF_K)[:limit]
+        return improved_question, SimpleNamespace(points=fused)
+
     def ask_knowledge_base(
         self,
         question: str,
         history=None,
         limit: int | None = None,
         search_mode: str = "semantic",
+        law_firm_id: int | None = None,
     ) -> dict:
+        """Busca trechos na base. Com `law_firm_id`, a busca semântica filtra
+        pelo escritório no próprio Qdrant (payload indexado) e a full-text
+        descarta os hits de outro escritório pelo payload.
+
+        Modos: "semantic" (Qdrant), "full_text" (Meilisearch) e "hybrid" (os
+        dois em paralelo, fundidos por reciprocal rank fusion)."""
         query_limit = limit if limit is not None else KB_MAX_CONTEXT_RESULTS
-        normalized_mode = str(search_mode or "semantic").strip().lower()
-        if normalized_mode in {"full-text", "literal"}:
-            normalized_mode = "full_text"
-        
+        normalized_mode = normalize_search_mode(search_mode)
+        if normalized_mode is None:
+            raise ValueError("search_mode inválido. Use 'semantic', 'full_text' ou 'hybrid'.")
+
         if normalized_mode == "semantic":
-            improved_question = self.query_enhancer.enhance_question(question, history=history)
-            print("pergunta original:", question)
-            print("pergunta melhorada:", improved_question)
-            vector = self.create_embedding_vector(improved_question)
-            results = self.qdrant.query_points(collection_name=self.collection, query=vector, limit=query_limit)
-            points = results.points
+            improved_question, results = self._semantic_search(question, history, query_limit, law_firm_id)
         elif normalized_mode == "full_text":
             improved_question = question
             print("pergunta original:", question)
-            
-            # Extrair termos-chave para melhorar a busca full_text
-            keywords = self.keyword_extraction.extract_keywords(question)
-            search_query = " ".join(keywords) if keywords else question
-            
-            print(f"termos-chave extraídos: {keywords}")
-            print(f"query para busca: {search_query}")
-            
-            search_results = self.meilisearch.index(self.collection).search(
-                search_query,
-                limit=query_limit,
-                show_ranking_score=True,
-            )
-            points = [
-                SimpleNamespace(payload=hit, score=hit.get("_rankingScore"))
-                for hit in (search_results.hits or [])
-            ]
-            results = SimpleNamespace(points=points)
+            _, results = self._full_text_search(question, query_limit, law_firm_id)
         else:
-            raise ValueError("search_mode inválido. Use 'semantic' ou 'full_text'.")
+            improved_question, results = self._hybrid_search(question, history, query_limit, law_firm_id)
 
+        points = results.points
         context = "\n".join([(item.payload.get("text") or "") for item in points])
         return {
             "original_question": question,
@@ -208,8 +356,15 @@ class KnowledgeQueryAgent:
             self._debug_log("Decisão de contexto em cache", should_use_context=self._cached_should_use_context.get('should_retrieve'))
             return self._cached_should_use_context.get('should_retrieve', False), self._cached_should_use_context.get('search_mode', 'semantic')
 
+        fixed_mode = configured_chat_search_mode()
+        if fixed_mode:
+            self._cached_should_use_context = {'should_retrieve': True, 'search_mode': fixed_mode}
+            return True, fixed_mode
+
         history = [{"role": "user", "content": history_preview}] if history_preview else None
-        decision = self.context_retrieval_routing.decide_retrieval_and_mode(question, history=history)
+        decision = self.context_retrieval_routing.decide_retrieval_and_mode(
+            question, history=history, law_firm_id=self._law_firm_id
+        )
         self._cached_should_use_context = {
             'should_retrieve': bool(decision.should_retrieve_context),
             'search_mode': decision.search_mode
@@ -223,7 +378,7 @@ class KnowledgeQueryAgent:
 
     def _resolve_context_search(self, question: str, search_mode: str = "semantic", history_preview: str = "") -> str:
         self._context_search_calls += 1
-        mode_label = "semântica" if search_mode == "semantic" else "full-text"
+        mode_label = _SEARCH_MODE_LABELS.get(search_mode, search_mode)
         self._debug_log("Busca de contexto iniciada", call_count=self._context_search_calls, search_mode=mode_label)
 
         if self._context_search_calls > 1:
@@ -232,7 +387,9 @@ class KnowledgeQueryAgent:
         if self._last_context_text:
             return self._last_context_text
 
-        context_data = self.ask_knowledge_base(question, history=None, search_mode=search_mode)
+        context_data = self.ask_knowledge_base(
+            question, history=None, search_mode=search_mode, law_firm_id=self._law_firm_id
+        )
         self._last_context_data = context_data
 
         points = context_data.get("results").points if context_data and context_data.get("results") else []
@@ -305,6 +462,7 @@ class KnowledgeQueryAgent:
         self._last_context_text = ""
         self._context_search_calls = 0
         self._cached_should_use_context = None
+        self._law_firm_id = law_firm_id
         sources_map = {}
 
         start_time = time.time()
@@ -321,8 +479,14 @@ class KnowledgeQueryAgent:
             should_use_context = False
             search_mode = "semantic"
             context_text = ""
+        elif configured_chat_search_mode():
+            # Modo fixo por configuração: sem a chamada ao roteador LLM
+            should_use_context = True
+            search_mode = configured_chat_search_mode()
         else:
-            retrieval_decision = self.context_retrieval_routing.decide_retrieval_and_mode(question, history=normalized_history)
+            retrieval_decision = self.context_retrieval_routing.decide_retrieval_and_mode(
+                question, history=normalized_history, law_firm_id=law_firm_id
+            )
             should_use_context = bool(retrieval_decision.should_retrieve_context)
             search_mode = retrieval_decision.search_mode
 
@@ -332,7 +496,7 @@ class KnowledgeQueryAgent:
                 context_text = self._last_context_text
 
         if should_use_context:
-            search_mode_label = "semântica" if search_mode == "semantic" else "full-text"
+            search_mode_label = _SEARCH_MODE_LABELS.get(search_mode, search_mode)
             context_block = context_text if str(context_text or "").strip() else f"contexto foi buscado ({search_mode_label}), mas retornou vazio"
         else:
             context_block = "sem contexto (roteador decidiu não consultar base)"
@@ -4,6 +4,14 @@ import time
 from langchain.agents import create_agent
 from langchain_openai import ChatOpenAI
 from app.agents.config import DEFAULT_MODEL_MINI
+from app.services.knowledge_base.query_fast_path import (
+    KB_QUERY_FAST_PATH,
+    cache_key,
+    cached_llm_call,
+    enhanced_question_cache,
+    fast_path_stats,
+    preclassify,
+)
 from app.services.token_usage_service import TokenUsageService
 
 
@@ -15,11 +23,39 @@ class QueryEnhancerAgent:
         self.llm = ChatOpenAI(model=self.model_name, temperature=0)
         self.token_usage_service = TokenUsageService()
 
-    def enhance_question(self, question: str, history: list[dict] | None = None) -> str:
+    def enhance_question(
+        self, question: str, history: list[dict] | None = None, law_firm_id: int | None = None
+    ) -> str:
+        """Pergunta reformulada para a busca semântica.
+
+        Sem LLM quando a pergunta é um identificador (CNJ, CNPJ, NB…), um
+        cumprimento ou curta e sem histórico — a reformulação não acrescenta
+        nada; o resto passa pelo cache (ver query_fast_path)."""
         cleaned_question = (question or "").strip()
         if not cleaned_question:
             return ""
 
+        preclassified = preclassify(cleaned_question)
+        if KB_QUERY_FAST_PATH and (
+            preclassified.small_talk
+            or preclassified.identifier_lookup
+            or (preclassified.short and not history)
+        ):
+            fast_path_stats.record("enhance_question", "rule")
+            return cleaned_question
+
+        try:
+            return cached_llm_call(
+                "enhance_question",
+                enhanced_question_cache,
+                cache_key(law_firm_id, cleaned_question, history),
+                lambda: self._enhance_with_llm(cleaned_question, history, law_firm_id),
+            )
+        except Exception as e:
+            print(f"Erro ao melhorar pergunta para busca: {str(e)}")
+            return cleaned_question
+
+    def _enhance_with_llm(self, cleaned_question: str, history: list[dict] | None, law_firm_id: int | None) -> str:
         history = history or []
         limited_history = history[-10:] if len(history) > 10 else history
         history_lines: list[str] = []
@@ -47,51 +83,47 @@ class QueryEnhancerAgent:
             f"Pergunta atual:\n{cleaned_question}"
         )
 
-        try:
-            agent = create_agent(
-                model=self.llm,
-                system_prompt=system_prompt,
-            )
-            
-            messages = [{"role": "user", "content": user_prompt}]
-            
-            call_started_at = time.time()
-            response_payload = agent.invoke({"messages": messages})
-            latency_ms = int((time.time() - call_started_at) * 1000)
-            
-            # Capturar e salvar uso de tokens
-            self.token_usage_service.capture_and_store(
-                response_payload,
-                agent_name="QueryEnhancerAgent",
-                action_name="enhance_question",
-                print_prefix="[QueryEnhancerAgent][tokens]",
-                model_name=self.model_name,
-                model_provider="openai",
-                user_id=None,
-                law_firm_id=None,
-                chat_session_id=None,
-                latency_ms=latency_ms,
-                status="success",
-                metadata_payload={
-                    "original_question": cleaned_question[:200],
-                    "has_history": len(history_lines) > 0,
-                },
-            )
-            
-            # Extrair resposta das mensagens
-            messages_result = response_payload.get("messages", [])
-            if messages_result:
-                last_message = messages_result[-1]
-                if hasattr(last_message, "content"):
-                    improved_question = (last_message.content or "").strip()
-                elif isinstance(last_message, dict):
-                    improved_question = (last_message.get("content", "") or "").strip()
-                else:
-                    improved_question = str(last_message).strip()
+        agent = create_agent(
+            model=self.llm,
+            system_prompt=system_prompt,
+        )
+        
+        messages = [{"role": "user", "content": user_prompt}]
+        
+        call_started_at = time.time()
+        response_payload = agent.invoke({"messages": messages})
+        latency_ms = int((time.time() - call_started_at) * 1000)
+        
+        # Capturar e salvar uso de tokens
+        self.token_usage_service.capture_and_store(
+            response_payload,
+            agent_name="QueryEnhancerAgent",
+            action_name="enhance_question",
+            print_prefix="[QueryEnhancerAgent][tokens]",
+            model_name=self.model_name,
+            model_provider="openai",
+            user_id=None,
+            law_firm_id=law_firm_id,
+            chat_session_id=None,
+            latency_ms=latency_ms,
+            status="success",
+            metadata_payload={
+                "original_question": cleaned_question[:200],
+                "has_history": len(history_lines) > 0,
+            },
+        )
+        
+        # Extrair resposta das mensagens
+        messages_result = response_payload.get("messages", [])
+        if messages_result:
+            last_message = messages_result[-1]
+            if hasattr(last_message, "content"):
+                improved_question = (last_message.content or "").strip()
+            elif isinstance(last_message, dict):
+                improved_question = (last_message.get("content", "") or "").strip()
             else:
-                improved_question = cleaned_question
-            
-            return improved_question or cleaned_question
-        except Exception as e:
-            print(f"Erro ao melhorar pergunta para busca: {str(e)}")
-            return cleaned_question
\ No newline at end of file
+                improved_question = str(last_message).strip()
+        else:
+            improved_question = cleaned_question
+        
+        return improved_question or cleaned_question
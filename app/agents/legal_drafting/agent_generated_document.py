@@ -1430,8 +1430,9 @@ class AgentGeneratedDocument:
                 build_reference_search_context,
             )
             from app.agents.legal_drafting.impugnacao_thesis_coverage import (
+                build_thesis_coverage,
+                build_thesis_search_request,
                 compute_reference_budgets,
-                search_thesis_references,
             )
             search_context = build_reference_search_context(process)
             trf_region = search_context.get('trf_region')
@@ -1505,11 +1506,10 @@ class AgentGeneratedDocument:
                 max_chars=1600,
             )
 
-            # 1) Blocos por TESE primeiro — TODOS, sem `break`. A cota por
-            # tese (per_thesis) já reserva espaço para todas antes de gastar
-            # o orçamento global; descartar uma tese aqui voltaria a ser o
-            # bug de cobertura silenciosa que este módulo corrige.
-            thesis_blocks: list[str] = []
+            # Todas as buscas (uma por tese e uma por seção) são montadas
+            # antes e vão ao retriever num único lote: um embedding em lote e
+            # uma rodada de Qdrant, em vez de uma ida por tese/seção/camada.
+            thesis_searches: list[tuple[str, Optional[str], dict]] = []
             for thesis_label, thesis_rows in grouped.items():
                 thesis_catalog_tag = thesis_key_by_label.get(thesis_label)
                 query_parts = [
@@ -1549,20 +1549,64 @@ class AgentGeneratedDocument:
 
                 query_text = " | ".join(query_parts) or f"Tese: {thesis_label}"
 
-                chunks, coverage = search_thesis_references(
-                    retriever,
-                    law_firm_id=law_firm_id,
-                    thesis_label=thesis_label,
-                    thesis_key=thesis_catalog_tag,
-                    query_text=query_text,
-                    context=search_context,
-                    kind_plan=thesis_kind_plan,
-                    max_chunks=8,
-                    max_chars=per_thesis,
-                    allowed_reference_ids=allowed_reference_ids,
-                    min_distinct=2,
+                thesis_searches.append((
+                    thesis_label,
+                    thesis_catalog_tag,
+                    build_thesis_search_request(
+                        law_firm_id=law_firm_id,
+                        thesis_key=thesis_catalog_tag,
+                        query_text=query_text,
+                        context=search_context,
+                        kind_plan=thesis_kind_plan,
+                        max_chunks=8,
+                        max_chars=per_thesis,
+                        allowed_reference_ids=allowed_reference_ids,
+                        min_distinct=2,
+                    ),
+                ))
+
+            # Blocos por SEÇÃO usam o que sobrar do orçamento total
+            # (per_section) — puladas quando o resto é irrisório.
+            section_searches: list[tuple[str, dict]] = []
+            if per_section >= 300:
+                for section_label, kind_plan, section_focus in section_plans:
+                    section_query = (
+                        f"Seção da peça: {section_label} | "
+                        f"Objetivo: {section_focus} | "
+                        f"Contexto do processo: {process_summary} | "
+                        f"Seleções do caso: {selections_summary}"
+                    )
+                    section_searches.append((section_label, {
+                        "law_firm_id": law_firm_id,
+                        "query_text": section_query,
+                        "trf_region": trf_region,
+                        "context": search_context,
+                        "kind_plan": kind_plan,
+                        "max_chunks": 5,
+                        "max_chars": per_section,
+                        "allowed_reference_ids": allowed_reference_ids,
+                    }))
+
+            try:
+                search_results = retriever.fetch_style_references_batch(
+                    [request for _, _, request in thesis_searches]
+                    + [request for _, request in section_searches]
+                )
+            except Exception as error:
+                print(f"[AgentGeneratedDocument] Falha na busca de referências em lote: {error}")
+                search_results = [[] for _ in range(len(thesis_searches) + len(section_searches))]
+            thesis_results = search_results[:len(thesis_searches)]
+            section_results = search_results[len(thesis_searches):]
+
+            # 1) Blocos por TESE primeiro — TODOS, sem `break`. A cota por
+            # tese (per_thesis) já reserva espaço para todas antes de gastar
+            # o orçamento global; descartar uma tese aqui voltaria a ser o
+            # bug de cobertura silenciosa que este módulo corrige.
+            thesis_blocks: list[str] = []
+            for (thesis_label, thesis_catalog_tag, _), chunks in zip(thesis_searches, thesis_results):
+                coverage_list.append(
+                    build_thesis_coverage(thesis_label, thesis_catalog_tag, chunks, search_context)
                 )
-                coverage_list.append(coverage)
 
                 if not chunks:
                     continue
@@ -1578,34 +1622,16 @@ class AgentGeneratedDocument:
 
             self.last_reference_coverage = coverage_list
 
-            # 2) Blocos por SEÇÃO depois, com o que sobrou do orçamento total
-            # (per_section) — puladas quando o resto é irrisório.
+            # 2) Blocos por SEÇÃO depois, com o que sobrou do orçamento total.
             section_blocks: list[str] = []
-            if per_section >= 300:
-                for section_label, kind_plan, section_focus in section_plans:
-                    section_query = (
-                        f"Seção da peça: {section_label} | "
-                        f"Objetivo: {section_focus} | "
-                        f"Contexto do processo: {process_summary} | "
-                        f"Seleções do caso: {selections_summary}"
-                    )
-                    section_chunks = retriever.fetch_style_references(
-                        law_firm_id=law_firm_id,
-                        query_text=section_query,
-                        trf_region=trf_region,
-                        context=search_context,
-                        kind_plan=kind_plan,
-                        max_chunks=5,
-                        max_chars=per_section,
-                        allowed_reference_ids=allowed_reference_ids,
-                    )
-                    section_block = self._build_section_style_reference_block(
-                        section_label=section_label,
-                        chunks=section_chunks,
-                        max_chars=per_section,
-                    )
-                    if section_block:
-                        section_blocks.append(section_block)
+            for (section_label, _), section_chunks in zip(section_searches, section_results):
+                section_block = self._build_section_style_reference_block(
+                    section_label=section_label,
+                    chunks=section_chunks,
+                    max_chars=per_section,
+                )
+                if section_block:
+                    section_blocks.append(section_block)
 
             # Ordem final no prompt: header -> seções -> teses. Teses são
             # conteúdo protegido: se o agregado estourar max_total_chars, a
@@ -48,8 +48,15 @@ class ImpugnacaoReferenceRetriever:
         self.openai = OpenAI()
 
     def _embed(self, text: str) -> list[float]:
-        response = self.openai.embeddings.create(input=text, model=EMBEDDING_MODEL)
-        return response.data[0].embedding
+        return self._embed_many([text])[0]
+
+    def _embed_many(self, texts: list[str]) -> list[list[float]]:
+        """Embeddings de vários textos numa única chamada, na ordem de entrada."""
+        if not texts:
+            return []
+        response = self.openai.embeddings.create(input=list(texts), model=EMBEDDING_MODEL)
+        ordered = sorted(response.data, key=lambda item: item.index)
+        return [item.embedding for item in ordered]
 
     def _collection_exists(self) -> bool:
         try:
@@ -185,30 +192,224 @@ class ImpugnacaoReferenceRetriever:
         `top_k + min_distinct_references` trechos por kind. Sem o parâmetro,
         o comportamento é idêntico ao anterior (compat).
 
+        Todas as camadas de todos os kinds vão ao Qdrant numa única rodada
+        (`query_batch_points`); a seleção por cota/peças distintas/orçamento
+        roda depois, em memória. Para várias buscas de uma vez (teses e
+        seções de um documento), use `fetch_style_references_batch`.
+
         Cada item: {section_kind, heading, reference_title, trf_region,
         quality_score, text}.
         """
         if not IMPUGNACAO_REFERENCES_ENABLED:
             return []
-        if not law_firm_id:
-            return []
-        if allowed_reference_ids is not None and not allowed_reference_ids:
+        prepared = self._prepare_style_request(
+            law_firm_id=law_firm_id,
+            query_text=query_text,
+            generation_mode=generation_mode,
+            trf_region=trf_region,
+            context=context,
+            thesis_catalog_id=thesis_catalog_id,
+            kind_plan=kind_plan,
+            max_chunks=max_chunks,
+            max_chars=max_chars,
+            allowed_reference_ids=allowed_reference_ids,
+            min_distinct_references=min_distinct_references,
+        )
+        if prepared is None:
             return []
         if not self._collection_exists():
             return []
 
-        plan = kind_plan or DEFAULT_KIND_PLAN
-        cap_chunks = max_chunks or IMPUGNACAO_REFERENCES_MAX_CHUNKS
-        cap_chars = max_chars or IMPUGNACAO_REFERENCES_MAX_CHARS
+        try:
+            vector = self._embed(prepared["query_text"])
+        except Exception as error:
+            print(f"[ImpugnacaoReferenceRetriever] Falha no embedding: {error}")
+            return []
+
+        return self._run_style_requests([prepared], {0: vector})[0]
+
+    def fetch_style_references_batch(self, requests: list[dict]) -> list[list[dict]]:
+        """Executa várias buscas de `fetch_style_references` com poucas idas à rede.
+
+        Cada pedido é um dict com os kwargs de `fetch_style_references`; o
+        resultado sai na mesma ordem, com a mesma seleção que chamadas
+        individuais produziriam. Um único embedding em lote cobre todas as
+        consultas e todas as camadas vão ao Qdrant numa única rodada — uma
+        segunda rodada só acontece para o fallback amplo de pedidos que
+        voltaram vazios.
+        """
+        results: list[list[dict]] = [[] for _ in requests]
+        if not IMPUGNACAO_REFERENCES_ENABLED or not requests:
+            return results
+
+        prepared = [self._prepare_style_request(**request) for request in requests]
+        active = [idx for idx, item in enumerate(prepared) if item is not None]
+        if not active or not self._collection_exists():
+            return results
+
+        try:
+            vectors = self._embed_many([prepared[idx]["query_text"] for idx in active])
+        except Exception as error:
+            print(f"[ImpugnacaoReferenceRetriever] Falha no embedding em lote: {error}")
+            return results
+
+        return self._run_style_requests(prepared, dict(zip(active, vectors)))
+
+    @staticmethod
+    def _prepare_style_request(
+        *,
+        law_firm_id: int,
+        query_text: str,
+        generation_mode: Optional[str] = None,
+        trf_region: Optional[str] = None,
+        context: Optional[dict] = None,
+        thesis_catalog_id: Optional[str] = None,
+        kind_plan: Optional[list[tuple[str, int]]] = None,
+        max_chunks: Optional[int] = None,
+        max_chars: Optional[int] = None,
+        allowed_reference_ids: Optional[list[int]] = None,
+        min_distinct_references: Optional[int] = None,
+    ) -> Optional[dict]:
+        """Normaliza os kwargs de uma busca; None quando ela não deve consultar nada."""
+        if not law_firm_id:
+            return None
+        if allowed_reference_ids is not None and not allowed_reference_ids:
+            return None
 
         if context is None and trf_region:
             context = {"trf_region": trf_region}
 
+        return {
+            "law_firm_id": law_firm_id,
+            "query_text": query_text or "impugnacao a contestacao FAP",
+            "generation_mode": generation_mode,
+            "context": context,
+            "thesis_catalog_id": thesis_catalog_id,
+            "plan": kind_plan or DEFAULT_KIND_PLAN,
+            "cap_chunks": max_chunks or IMPUGNACAO_REFERENCES_MAX_CHUNKS,
+            "cap_chars": max_chars or IMPUGNACAO_REFERENCES_MAX_CHARS,
+            "allowed_reference_ids": allowed_reference_ids,
+            "min_distinct_references": min_distinct_references,
+        }
+
+    def _layer_queries(
+        self,
+        prepared: dict,
+        vector: list[float],
+        kind: Optional[str],
+        limit: int,
+    ) -> list[tuple]:
+        """Uma consulta por camada de contexto (juiz > vara > TRF > geral) do kind."""
+        return [
+            (
+                vector,
+                self._build_filter(
+                    law_firm_id=prepared["law_firm_id"],
+                    section_kind=kind,
+                    generation_mode=prepared["generation_mode"],
+                    thesis_catalog_id=prepared["thesis_catalog_id"],
+                    extra_match=layer,
+                    allowed_reference_ids=prepared["allowed_reference_ids"],
+                ),
+                limit,
+                f"kind={kind} camada={layer}",
+            )
+            for layer in self._context_layers(prepared["context"], kind)
+        ]
+
+    def _run_query_batch(self, queries: list[tuple]) -> list[list]:
+        """Executa as consultas numa única ida ao Qdrant, na ordem recebida.
+
+        Se o lote falhar, repete uma a uma: uma camada com erro vira lista
+        vazia sem derrubar as demais, como na busca sequencial.
+        """
+        if not queries:
+            return []
         try:
-            vector = self._embed(query_text or "impugnacao a contestacao FAP")
+            responses = self.qdrant.query_batch_points(
+                collection_name=self.collection,
+                requests=[
+                    rest.QueryRequest(
+                        query=vector,
+                        filter=query_filter,
+                        limit=limit,
+                        with_payload=True,
+                    )
+                    for vector, query_filter, limit, _ in queries
+                ],
+            )
+            return [response.points for response in responses]
         except Exception as error:
-            print(f"[ImpugnacaoReferenceRetriever] Falha no embedding: {error}")
-            return []
+            print(
+                f"[ImpugnacaoReferenceRetriever] Busca em lote indisponível "
+                f"({len(queries)} consultas), consultando uma a uma: {error}"
+            )
+
+        results: list[list] = []
+        for vector, query_filter, limit, label in queries:
+            try:
+                results.append(self.qdrant.query_points(
+                    collection_name=self.collection,
+                    query=vector,
+                    query_filter=query_filter,
+                    limit=limit,
+                    with_payload=True,
+                ).points)
+            except Exception as error:
+                print(f"[ImpugnacaoReferenceRetriever] Falha {label}: {error}")
+                results.append([])
+        return results
+
+    def _run_style_requests(self, prepared: list[Optional[dict]], vectors: dict[int, list[float]]) -> list[list[dict]]:
+        """Compila as camadas de todos os pedidos num lote e aplica a seleção de cada um."""
+        results: list[list[dict]] = [[] for _ in prepared]
+
+        def _plan_round(entries_by_request: dict[int, list[tuple[Optional[str], int]]]) -> dict[int, list]:
+            queries: list[tuple] = []
+            slots: list[tuple[int, Optional[str], int, int]] = []
+            for idx, entries in entries_by_request.items():
+                item = prepared[idx]
+                for kind, top_k in entries:
+                    # Janela de busca amplia por min_distinct_references: com
+                    # limit=top_k a camada tende a repetir a mesma peça no topo e
+                    # a 2ª peça distinta nunca fica alcançável. Sem o parâmetro
+                    # (min_distinct_references=None), soma 0 e o limit não muda.
+                    limit = top_k + (item["min_distinct_references"] or 0)
+                    layer_queries = self._layer_queries(item, vectors[idx], kind, limit)
+                    slots.append((idx, kind, top_k, len(layer_queries)))
+                    queries.extend(layer_queries)
+
+            hits = self._run_query_batch(queries)
+            planned: dict[int, list] = {idx: [] for idx in entries_by_request}
+            position = 0
+            for idx, kind, top_k, n_layers in slots:
+                planned[idx].append((kind, top_k, hits[position:position + n_layers]))
+                position += n_layers
+            return planned
+
+        for idx, planned in _plan_round({idx: prepared[idx]["plan"] for idx in vectors}).items():
+            results[idx] = self._select_style_references(prepared[idx], planned)
+
+        # Fallback amplo apenas quando nada foi encontrado no plano principal.
+        fallback = {
+            idx: [(None, prepared[idx]["cap_chunks"])]
+            for idx in vectors
+            if not results[idx] and prepared[idx]["cap_chunks"] > 0
+        }
+        if fallback:
+            for idx, planned in _plan_round(fallback).items():
+                results[idx] = self._select_style_references(prepared[idx], planned)
+
+        return results
+
+    def _select_style_references(self, prepared: dict, planned: list) -> list[dict]:
+        """Aplica cota por kind, peças distintas e orçamento sobre hits já buscados.
+
+        `planned` traz, na ordem do plano, `(kind, top_k, hits_por_camada)`.
+        """
+        cap_chunks = prepared["cap_chunks"]
+        cap_chars = prepared["cap_chars"]
+        min_distinct_references = prepared["min_distinct_references"]
 
         collected: list[dict] = []
         total_chars = 0
@@ -223,40 +424,15 @@ class ImpugnacaoReferenceRetriever:
                 and len(distinct_refs) < min_distinct_references
             )
 
-        def _query(kind: Optional[str], extra_match: dict, limit: int):
-            try:
-                return self.qdrant.query_points(
-                    collection_name=self.collection,
-                    query=vector,
-                    query_filter=self._build_filter(
-                        law_firm_id=law_firm_id,
-                        section_kind=kind,
-                        generation_mode=generation_mode,
-                        thesis_catalog_id=thesis_catalog_id,
-                        extra_match=extra_match,
-                        allowed_reference_ids=allowed_reference_ids,
-                    ),
-                    limit=limit,
-                    with_payload=True,
-                ).points
-            except Exception as error:
-                print(f"[ImpugnacaoReferenceRetriever] Falha kind={kind} camada={extra_match}: {error}")
-                return []
-
-        def _collect(kind: Optional[str], top_k: int) -> None:
+        def _collect(kind: Optional[str], top_k: int, layer_hits: list[list]) -> None:
             nonlocal total_chars
             taken_for_kind = 0
             hard_ceiling = top_k + (min_distinct_references or 0)
-            for layer in self._context_layers(context, kind):
+            for hits in layer_hits:
                 if len(collected) >= cap_chunks or total_chars >= cap_chars:
                     return
                 if taken_for_kind >= top_k and not _needs_more_distinct():
                     return
-                # Janela de busca amplia por min_distinct_references: com
-                # limit=top_k a camada tende a repetir a mesma peça no topo e
-                # a 2ª peça distinta nunca fica alcançável. Sem o parâmetro
-                # (min_distinct_references=None), soma 0 e o limit não muda.
-                hits = _query(kind, layer, hard_ceiling)
                 # Dentro da camada, mantém a ordem de score do Qdrant;
                 # quality_score desempata.
                 hits = sorted(
@@ -296,14 +472,10 @@ class ImpugnacaoReferenceRetriever:
                     if ref_id is not None:
                         distinct_refs.add(ref_id)
 
-        for kind, top_k in plan:
+        for kind, top_k, layer_hits in planned:
             if len(collected) >= cap_chunks or total_chars >= cap_chars:
                 break
-            _collect(kind, top_k)
-
-        # Fallback amplo apenas quando nada foi encontrado no plano principal.
-        if not collected and cap_chunks > 0:
-            _collect(None, cap_chunks)
+            _collect(kind, top_k, layer_hits)
 
         return collected
 
@@ -13,6 +13,9 @@ fonte única de:
   vara > TRF > geral) e parada por peças distintas, retornando também a
   cobertura agregada (`coverage`) consumida pelo gerador, pelo worker, pelo
   preview e pela tela.
+- `build_thesis_search_request` / `build_thesis_coverage`: as duas metades
+  de `search_thesis_references`, para quem agrupa as buscas de várias teses
+  num único `fetch_style_references_batch`.
 
 Falha na busca de uma tese NUNCA deve interromper a geração — ver
 `search_thesis_references`.
@@ -111,28 +114,54 @@ def search_thesis_references(
     Retorna (chunks, coverage). Falha do retriever -> ([], coverage sem_modelo).
     """
     try:
-        chunks = retriever.fetch_style_references(
+        chunks = retriever.fetch_style_references(**build_thesis_search_request(
             law_firm_id=law_firm_id,
+            thesis_key=thesis_key,
             query_text=query_text,
             context=context,
-            thesis_catalog_id=(thesis_key or None),
             kind_plan=kind_plan,
             max_chunks=max_chunks,
             max_chars=max_chars,
             allowed_reference_ids=allowed_reference_ids,
-            min_distinct_references=min_distinct,
-        )
+            min_distinct=min_distinct,
+        ))
     except Exception as error:
         print(
             f"[impugnacao_thesis_coverage] Falha na busca da tese "
             f"'{thesis_label}': {error}"
         )
-        return [], _build_coverage(thesis_label, thesis_key, [], context)
+        return [], build_thesis_coverage(thesis_label, thesis_key, [], context)
+
+    return chunks, build_thesis_coverage(thesis_label, thesis_key, chunks, context)
 
-    return chunks, _build_coverage(thesis_label, thesis_key, chunks, context)
+
+def build_thesis_search_request(
+    *,
+    law_firm_id: int,
+    thesis_key: Optional[str],
+    query_text: str,
+    context: Optional[dict],
+    kind_plan: list[tuple[str, int]],
+    max_chunks: int,
+    max_chars: int,
+    allowed_reference_ids: Optional[list[int]] = None,
+    min_distinct: int = 2,
+) -> dict:
+    """Kwargs de `fetch_style_references` para a busca de uma tese."""
+    return {
+        "law_firm_id": law_firm_id,
+        "query_text": query_text,
+        "context": context,
+        "thesis_catalog_id": (thesis_key or None),
+        "kind_plan": kind_plan,
+        "max_chunks": max_chunks,
+        "max_chars": max_chars,
+        "allowed_reference_ids": allowed_reference_ids,
+        "min_distinct_references": min_distinct,
+    }
 
 
-def _build_coverage(
+def build_thesis_coverage(
     thesis_label: str,
     thesis_key: Optional[str],
     chunks: list[dict],
@@ -8,7 +8,8 @@ from functools import wraps
 from datetime import datetime
 
 from app.models import User
-from app.services import access_audit_service
+from app.services import access_audit_service, layout_context_cache
+from app.services.knowledge_base import query_fast_path
 
 access_audit_bp = Blueprint('access_audit', __name__, url_prefix='/admin/access-audit')
 
@@ -87,3 +88,20 @@ def user_screens(user_id):
             "last_seen_at": _fmt_local(s['last_seen_at']),
         } for s in screens],
     })
+
+
+@access_audit_bp.route('/layout-cache', methods=['GET'])
+@require_law_firm
+@require_admin
+def layout_cache_stats():
+    """Contadores de acerto/falta do cache de contexto do layout (deste worker)."""
+    return jsonify(layout_context_cache.stats())
+
+
+@access_audit_bp.route('/kb-query-fast-path', methods=['GET'])
+@require_law_firm
+@require_admin
+def kb_query_fast_path_stats():
+    """Pré-processamento das perguntas da base: quantas saíram por regra, cache
+    ou LLM, e a latência de LLM economizada (deste worker)."""
+    return jsonify(query_fast_path.stats())
@@ -3,6 +3,7 @@ from app.models import db, Case, CaseComment, CaseActivity, User
 from datetime import datetime
 from functools import wraps
 from sqlalchemy.orm import joinedload
+from app.services.layout_context_cache import invalidate_recent_case_comments
 
 case_comments_bp = Blueprint('case_comments', __name__, url_prefix='/cases/<int:case_id>/comments')
 
@@ -119,6 +120,7 @@ def add_comment(case_id):
     )
     db.session.add(activity)
     db.session.commit()
+    invalidate_recent_case_comments(session.get('law_firm_id'))
     
     return jsonify({
         'id': comment.id,
@@ -159,6 +161,7 @@ def reply_comment(case_id, comment_id):
     )
     db.session.add(activity)
     db.session.commit()
+    invalidate_recent_case_comments(session.get('law_firm_id'))
     
     return jsonify({
         'id': reply.id,
@@ -189,6 +192,7 @@ def update_comment(case_id, comment_id):
     
     comment.updated_at = datetime.now()
     db.session.commit()
+    invalidate_recent_case_comments(session.get('law_firm_id'))
     
     return jsonify({'updated': True})
 
@@ -209,6 +213,7 @@ def delete_comment(case_id, comment_id):
     CaseComment.query.filter_by(parent_comment_id=comment_id).delete()
     db.session.delete(comment)
     db.session.commit()
+    invalidate_recent_case_comments(session.get('law_firm_id'))
     
     return jsonify({'deleted': True})
 
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for, flash, send_file
 from app.models import db, Case, Client, CaseBenefit, Document, Petition, CaseLawyer, Lawyer, CaseCompetence, CasesKnowledgeBase, CaseTemplate, CaseStatus
 from app.agents.knowledge_base.case_knowledge_ingestor import CaseKnowledgeIngestor
+from app.services.layout_context_cache import invalidate_recent_case_comments
 from datetime import datetime
 from decimal import Decimal
 from functools import wraps
@@ -549,6 +550,7 @@ def case_edit(case_id):
         
         try:
             db.session.commit()
+            invalidate_recent_case_comments(law_firm_id)
             from flask import flash
             flash('Caso atualizado com sucesso!', 'success')
             return redirect(url_for('cases.cases_list'))
@@ -566,6 +568,7 @@ def case_delete(case_id):
     try:
         db.session.delete(case)
         db.session.commit()
+        invalidate_recent_case_comments(case.law_firm_id)
         from flask import flash
         flash('Caso excluído com sucesso!', 'success')
     except Exception as e:
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify
 from app.models import db, Client
+from app.services import benefit_search_service
 from app.services.open_cnpj_service import OpenCNPJService
 from datetime import datetime
 from functools import wraps
@@ -110,6 +111,7 @@ def client_edit(client_id):
     form = ClientForm(obj=client)
     
     if form.validate_on_submit():
+        name_changed = client.name != form.name.data
         client.name = form.name.data
         client.cnpj = form.cnpj.data
         client.street = form.street.data
@@ -124,6 +126,9 @@ def client_edit(client_id):
         
         try:
             db.session.commit()
+            if name_changed:
+                # O nome do cliente vai no documento de cada benefício do índice de busca
+                benefit_search_service.index_client_benefits(client.id)
             flash('Cliente atualizado com sucesso!', 'success')
             return redirect(url_for('clients.clients_list'))
         except Exception as e:
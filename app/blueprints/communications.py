@@ -109,7 +109,7 @@ def process_communications(numero):
     """Todas as comunicações de um processo específico (número CNJ, com ou sem máscara)."""
     from app.models import JudicialProcess
     from app.services.comunica_pje_client import only_digits
-    from sqlalchemy import or_
+    from sqlalchemy import and_, or_
 
     law_firm_id = get_current_law_firm_id()
     digits = only_digits(numero)
@@ -129,11 +129,13 @@ def process_communications(numero):
                       if communications and communications[0].numero_processo_mascara
                       else numero)
 
+    # Dígitos contra dígitos: acha o processo cadastrado com ou sem máscara;
+    # linhas ainda sem process_number_digits (antes do backfill) pelos formatos
     process = (JudicialProcess.query
                .filter_by(law_firm_id=law_firm_id)
-               .filter(or_(JudicialProcess.process_number == digits,
-                           JudicialProcess.process_number == numero_display,
-                           JudicialProcess.process_number == numero))
+               .filter(or_(JudicialProcess.process_number_digits == digits,
+                           and_(JudicialProcess.process_number_digits.is_(None),
+                                JudicialProcess.process_number.in_([digits, numero_display, numero]))))
                .first())
 
     return render_template(
@@ -11,6 +11,7 @@ from app.services.fap_web_service import (
     FapWebAuthPayload, FapWebService, build_fap_service, resolve_fap_auth,
 )
 from app.services.fap_contestation_judgment_report_service import FapContestationJudgmentReportService
+from app.services import benefit_search_service, fap_data_version
 from app.services import fap_group_service
 from app.services import fap_vigencia_service
 from app.services.openrouter_models_service import fetch_openrouter_text_models_for_info
@@ -1784,23 +1785,31 @@ def _apply_benefits_filters(
     quick_vigencia='',
 ):
     search_text = (search_value or '').strip().lower()
-    if search_text:
+    # Texto livre → ids pelo índice `benefits` do Meilisearch; sem ele
+    # (indisponível, termo amplo demais…), o LIKE em todas as colunas. Termo
+    # com dígito soma os dois: o índice casa só começo de palavra e o trecho
+    # do meio de um NB/CPF/CNPJ só o LIKE acha.
+    search_ids = benefit_search_service.search_ids(law_firm_id, search_text) if search_text else None
+    if search_ids is not None and not benefit_search_service.identificador(search_text):
+        query = query.filter(Benefit.id.in_(search_ids))
+    elif search_text:
         like_term = f'%{search_text}%'
-        query = query.filter(
-            or_(
-                func.lower(cast(Benefit.id, String)).like(like_term),
-                func.lower(cast(Benefit.benefit_number, String)).like(like_term),
-                func.lower(cast(Client.name, String)).like(like_term),
-                func.lower(cast(Benefit.insured_name, String)).like(like_term),
-                func.lower(cast(Benefit.benefit_type, String)).like(like_term),
-                func.lower(cast(Benefit.insured_cpf, String)).like(like_term),
-                func.lower(cast(Benefit.insured_nit, String)).like(like_term),
-                func.lower(cast(Benefit.employer_cnpj, String)).like(like_term),
-                func.lower(cast(Benefit.employer_name, String)).like(like_term),
-                func.lower(cast(Benefit.status, String)).like(like_term),
-                func.lower(cast(Benefit.fap_vigencia_years, String)).like(like_term),
-            )
+        like_filter = or_(
+            func.lower(cast(Benefit.id, String)).like(like_term),
+            func.lower(cast(Benefit.benefit_number, String)).like(like_term),
+            func.lower(cast(Client.name, String)).like(like_term),
+            func.lower(cast(Benefit.insured_name, String)).like(like_term),
+            func.lower(cast(Benefit.benefit_type, String)).like(like_term),
+            func.lower(cast(Benefit.insured_cpf, String)).like(like_term),
+            func.lower(cast(Benefit.insured_nit, String)).like(like_term),
+            func.lower(cast(Benefit.employer_cnpj, String)).like(like_term),
+            func.lower(cast(Benefit.employer_name, String)).like(like_term),
+            func.lower(cast(Benefit.status, String)).like(like_term),
+            func.lower(cast(Benefit.fap_vigencia_years, String)).like(like_term),
         )
+        if search_ids:
+            like_filter = or_(Benefit.id.in_(search_ids), like_filter)
+        query = query.filter(like_filter)
 
     if quick_root:
         root = ''.join(ch for ch in quick_root if ch.isdigit())[:8]
@@ -3327,6 +3336,7 @@ def mark_vigencia_first_instance_deferred(vigencia_id):
 
     try:
         db.session.commit()
+        fap_data_version.bump(law_firm_id)
         flash(
             f'{result["updated_count"]} benefício(s) da vigência {vigencia.vigencia_year or "-"} marcado(s) como deferido na 1ª instância.',
             'success',
@@ -3402,6 +3412,7 @@ def mark_vigencias_first_instance_deferred_batch():
                 skipped_no_eligible += 1
 
         db.session.commit()
+        fap_data_version.bump(law_firm_id)
     except Exception as exc:
         db.session.rollback()
         flash(f'Erro ao aplicar atualização em massa: {str(exc)}', 'danger')
@@ -3590,6 +3601,7 @@ def classify_single_benefit_topic_api(benefit_id):
             force_reclassify=force_reclassify,
         )
         db.session.commit()
+        fap_data_version.bump(law_firm_id)
     except Exception as exc:
         db.session.rollback()
         current_app.logger.exception('Erro ao classificar tópico FAP do benefício %s', benefit_id)
@@ -3856,6 +3868,9 @@ def fap_contestation_reports():
                     else:
                         flash(f'Erro ao enviar {filename}: {str(e)}', 'danger')
 
+            if success_count:
+                fap_data_version.bump(law_firm_id)
+
             if wants_json:
                 messages = []
                 if success_count:
@@ -3950,6 +3965,7 @@ def delete_fap_contestation_report(report_id):
             os.remove(report.file_path)
         db.session.delete(report)
         db.session.commit()
+        fap_data_version.bump(law_firm_id)
         flash('Relatório excluído com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -4194,6 +4210,7 @@ def fap_auto_import_import_contestacao():
             fap_rec_for_flag.report_id = report.id
 
         db.session.commit()
+        fap_data_version.bump(law_firm_id)
 
         if force_process:
             service = FapContestationJudgmentReportService(current_app._get_current_object())
@@ -4317,6 +4334,7 @@ def fap_auto_import_fetch_companies():
                 FapCompany.cnpj.notin_(seen_cnpjs),
             ).delete(synchronize_session='fetch')
         db.session.commit()
+        fap_data_version.bump(law_firm_id)
     except Exception as e:
         db.session.rollback()
         current_app.logger.exception('Erro ao salvar empresas FAP no banco')
@@ -4383,6 +4401,8 @@ def new_dispute():
         db.session.add(benefit)
         try:
             db.session.commit()
+            benefit_search_service.index_benefits([benefit.id])
+            fap_data_version.bump(law_firm_id)
             flash('Registro de disputa cadastrado com sucesso!', 'success')
             return redirect(url_for('disputes_center.list_disputes_center'))
         except Exception as e:
@@ -4475,6 +4495,8 @@ def edit_dispute(benefit_id):
 
         try:
             db.session.commit()
+            benefit_search_service.index_benefits([benefit.id])
+            fap_data_version.bump(law_firm_id)
             flash('Registro de disputa atualizado com sucesso!', 'success')
             return redirect(url_for('disputes_center.list_disputes_center'))
         except Exception as e:
@@ -4502,6 +4524,8 @@ def delete_dispute(benefit_id):
     try:
         db.session.delete(benefit)
         db.session.commit()
+        benefit_search_service.remove_benefits([benefit_id])
+        fap_data_version.bump(law_firm_id)
         flash('Registro de disputa excluído com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -4906,6 +4930,7 @@ def edit_cat(cat_id):
 
         try:
             db.session.commit()
+            fap_data_version.bump(law_firm_id)
             flash('CAT atualizada com sucesso!', 'success')
             return redirect(url_for('disputes_center.list_cats'))
         except Exception as exc:
@@ -5396,6 +5421,7 @@ def edit_payroll_mass(payroll_mass_id):
 
         try:
             db.session.commit()
+            fap_data_version.bump(law_firm_id)
             flash('Massa Salarial atualizada com sucesso!', 'success')
             return redirect(url_for('disputes_center.list_payroll_masses'))
         except Exception as exc:
@@ -5872,6 +5898,7 @@ def edit_employment_link(employment_link_id):
 
         try:
             db.session.commit()
+            fap_data_version.bump(law_firm_id)
             flash('Vínculo atualizado com sucesso!', 'success')
             return redirect(url_for('disputes_center.list_employment_links'))
         except Exception as exc:
@@ -6375,6 +6402,7 @@ def edit_turnover_rate(turnover_rate_id):
 
         try:
             db.session.commit()
+            fap_data_version.bump(law_firm_id)
             flash('Taxa de Rotatividade atualizada com sucesso!', 'success')
             return redirect(url_for('disputes_center.list_turnover_rates'))
         except Exception as exc:
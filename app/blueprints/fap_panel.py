@@ -47,10 +47,14 @@ from app.models import (
     FapCompany,
     FapWebContestacao,
     FapWebContestacaoChangeHistory,
+    FapWebContestacaoGroupSummary,
     FapWebProcuracao,
     db,
 )
 from app.services import fap_group_service
+from app.services import fap_contestacao_summary_service
+from app.services import fap_panel_filter_cache
+from app.services import fap_data_version
 from app.services import fap_group_import_service
 from app.services import fap_procuracoes_service
 from app.services.fap_web_service import (
@@ -410,6 +414,8 @@ def sync_fetch_companies():
             ).delete(synchronize_session='fetch')
 
         db.session.commit()
+        fap_panel_filter_cache.invalidate(law_firm_id)
+        fap_data_version.bump(law_firm_id)
     except Exception as e:
         db.session.rollback()
         current_app.logger.exception('Erro ao salvar empresas FAP no banco')
@@ -485,6 +491,7 @@ def sync_run_year():
         'data_transmissao',
         'data_dou_date',
     )
+    grupos_alterados = set()   # (ano_vigencia, cnpj) com resumo a recalcular
 
     try:
         for item in items:
@@ -565,6 +572,8 @@ def sync_run_year():
                         changed_new[field_name] = next_value
 
                 if changed_new:
+                    grupos_alterados.add((existing.ano_vigencia, existing.cnpj))
+                    grupos_alterados.add((year_int, cnpj_full_14))
                     history_row = FapWebContestacaoChangeHistory(
                         law_firm_id=law_firm_id,
                         contestacao_db_id=existing.id,
@@ -653,9 +662,15 @@ def sync_run_year():
                     synced_at=now,
                 )
                 db.session.add(history_row)
+                grupos_alterados.add((year_int, cnpj_full_14))
                 created += 1
 
+        # Resumo por grupo da tela de contestações, no mesmo commit
+        db.session.flush()
+        fap_contestacao_summary_service.refresh_groups(law_firm_id, grupos_alterados)
         db.session.commit()
+        fap_panel_filter_cache.invalidate(law_firm_id)
+        fap_data_version.bump(law_firm_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({'ok': False, 'message': f'Erro ao salvar no banco: {str(e)}'}), 500
@@ -726,21 +741,19 @@ def sync_download_batch():
     def _download_one(rec):
         svc = FapWebService(auth)
         try:
-            dl = svc.download_contestacao(
+            save_dir = os.path.join(upload_root, str(rec.ano_vigencia), rec.cnpj)
+            # Streaming para disco: o PDF não passa inteiro pela memória
+            dl = svc.download_contestacao_to(
                 year=rec.ano_vigencia,
                 cnpj=rec.cnpj,
                 contestacao_id=rec.contestacao_id,
+                directory=save_dir,
             )
             if not dl.ok:
                 return {'rec_id': rec.id, 'ok': False, 'error': dl.message}
 
-            pdf_bytes = dl.data['pdf_bytes']
-            filename  = f"{rec.contestacao_id}_{dl.data['filename']}"
-            save_dir  = os.path.join(upload_root, str(rec.ano_vigencia), rec.cnpj)
-            os.makedirs(save_dir, exist_ok=True)
-
-            with open(os.path.join(save_dir, filename), 'wb') as f:
-                f.write(pdf_bytes)
+            filename = f"{rec.contestacao_id}_{dl.data['filename']}"
+            dl.data['file'].publish(os.path.join(save_dir, filename))
 
             rel_path = '/'.join([
                 'uploads', 'fap_web_contestacoes',
@@ -769,6 +782,8 @@ def sync_download_batch():
             results.append(fut.result())
 
     remaining = pending_q.count()
+    if any(r['ok'] for r in results):
+        fap_data_version.bump(law_firm_id)
 
     return jsonify({
         'ok': True,
@@ -1203,6 +1218,28 @@ def _baldes_vazios():
     return {f'c_{coluna}{inst}': [] for coluna in COLUNAS_SITUACAO for inst in ('1', '2')}
 
 
+def _contadores_sql():
+    """SUM(CASE …) por balde, rotulados count_and1, count_pub2, …
+
+    Espelho em SQL de ``_chave_celula``: mesmo UPPER/TRIM do código da
+    situação, código fora do mapa (ou nulo) em "Outras", e "SEGUNDA" em
+    qualquer posição do código da instância para a coluna 2. Os cards contam
+    o conjunto filtrado inteiro numa agregação só, sem trazer as linhas.
+    """
+    from sqlalchemy import case, not_
+
+    situacao = func.upper(func.trim(func.coalesce(FapWebContestacao.situacao_codigo, '')))
+    segunda = func.upper(func.coalesce(FapWebContestacao.instancia_codigo, '')).like('%SEGUNDA%')
+    por_coluna = {coluna: situacao == codigo for codigo, coluna in _SITUACAO_PARA_COLUNA.items()}
+    por_coluna[COL_OUTRAS] = situacao.notin_(list(_SITUACAO_PARA_COLUNA))
+    return [
+        func.sum(case((por_coluna[coluna] & (segunda if inst == '2' else not_(segunda)), 1), else_=0))
+        .label(f'count_{coluna}{inst}')
+        for coluna in COLUNAS_SITUACAO
+        for inst in ('1', '2')
+    ]
+
+
 def _build_contestacoes_filters(law_firm_id):
     """Monta a lista de condições SQLAlchemy a partir dos filtros da query string.
 
@@ -1243,6 +1280,40 @@ def _build_contestacoes_filters(law_firm_id):
     return conds
 
 
+def _build_group_summary_filters(law_firm_id):
+    """Os filtros de _build_contestacoes_filters sobre o resumo por grupo.
+
+    Só vale quando todos os filtros são do grupo (vigência, raiz, CNPJ,
+    grupo empresarial): com instância, situação ou protocolo as datas de
+    cada grupo dependem das linhas filtradas, e a tela agrega as linhas.
+    Nesse caso retorna None.
+    """
+    if any(request.args.get(nome, '').strip() for nome in ('instancia', 'situacao', 'protocolo')):
+        return None
+    f_year      = request.args.get('ano_vigencia', '').strip()
+    f_cnpj_raiz = request.args.get('cnpj_raiz', '').strip()
+    f_cnpj      = request.args.get('cnpj', '').strip()
+    f_grupo     = request.args.get('grupo', '').strip()
+
+    Summary = FapWebContestacaoGroupSummary
+    conds = [Summary.law_firm_id == law_firm_id]
+    grupo_cond = fap_group_service.group_condition(
+        law_firm_id, f_grupo, Summary.cnpj_raiz, coluna_e_raiz=True,
+    )
+    if grupo_cond is not None:
+        conds.append(grupo_cond)
+    if f_year and f_year != '__all__':
+        try:
+            conds.append(Summary.ano_vigencia == int(f_year))
+        except ValueError:
+            pass
+    if f_cnpj_raiz:
+        conds.append(Summary.cnpj_raiz == f_cnpj_raiz)
+    if f_cnpj:
+        conds.append(Summary.cnpj == f_cnpj)
+    return conds
+
+
 @fap_panel_bp.route('/contestacoes/pending-list', methods=['GET'])
 @require_law_firm
 def contestacoes_pending_list():
@@ -1296,12 +1367,9 @@ def contestacoes_page():
 
     law_firm_id = get_current_law_firm_id()
 
-    companies = (
-        FapCompany.query
-        .filter_by(law_firm_id=law_firm_id)
-        .order_by(FapCompany.nome)
-        .all()
-    )
+    # Empresas, mapa raiz → CNPJs e valores de instância/situação dos filtros:
+    # cache por escritório, invalidado pela sincronização.
+    filter_options = fap_panel_filter_cache.get_contestacoes_filter_options(law_firm_id)
 
     # ── Filtros ──────────────────────────────────────────────────────────
     # Vigência: padrão "Todas" (__all__) na carga inicial (sem parâmetro na URL).
@@ -1333,26 +1401,14 @@ def contestacoes_page():
 
     filter_conds = _build_contestacoes_filters(law_firm_id)
     query = FapWebContestacao.query.filter(*filter_conds)
-
-    # ── Mapa de CNPJs (14 dígitos) por raiz para o filtro de estabelecimento ──
-    cnpj_rows = (
-        FapWebContestacao.query
-        .filter_by(law_firm_id=law_firm_id)
-        .with_entities(FapWebContestacao.cnpj_raiz, FapWebContestacao.cnpj)
-        .distinct()
-        .all()
-    )
-    cnpjs_by_raiz: dict[str, list[str]] = {}
-    for raiz, cnpj_full in cnpj_rows:
-        if raiz and cnpj_full:
-            cnpjs_by_raiz.setdefault(raiz, [])
-            if cnpj_full not in cnpjs_by_raiz[raiz]:
-                cnpjs_by_raiz[raiz].append(cnpj_full)
-    for raiz in cnpjs_by_raiz:
-        cnpjs_by_raiz[raiz].sort()
+    # Só filtros de grupo: pagina pelo resumo (fap_web_contestacao_group_summaries)
+    summary_conds = _build_group_summary_filters(law_firm_id)
 
     # ── Paginação por grupo (vigência × CNPJ) ────────────────────────────
-    from sqlalchemy import and_, or_, exists, func
+    from sqlalchemy import and_, case, exists, func, literal, select, tuple_
+
+    summaries = fap_contestacao_summary_service
+    Summary = FapWebContestacaoGroupSummary
 
     try:
         page = max(1, int(request.args.get('page', 1)))
@@ -1364,9 +1420,16 @@ def contestacoes_page():
         page_size = 50
     if page_size not in (25, 50, 100):
         page_size = 50
+    # Cursores das setas "próxima"/"anterior": posição do último/primeiro
+    # grupo da página vista (ver fap_contestacao_summary_service).
+    after_cursor = summaries.decode_cursor(request.args.get('after', '').strip(), f_sort)
+    before_cursor = summaries.decode_cursor(request.args.get('before', '').strip(), f_sort)
 
     all_rows = []
+    imported_map = {}
     group_keys = []
+    next_cursor = None
+    prev_cursor = None
     total_groups = 0
     total_pages = 1
     total_contestacoes = 0
@@ -1379,36 +1442,45 @@ def contestacoes_page():
     contadores = {chave.replace('c_', 'count_'): 0 for chave in _baldes_vazios()}
 
     if has_active_filters:
-        # Estatísticas sobre TODO o conjunto filtrado (não só a página)
-        total_contestacoes = query.count()
+        # Estatísticas sobre TODO o conjunto filtrado (não só a página), numa
+        # agregação só: total, importadas, com arquivo local, os contadores
+        # por instância/situação (mesma classificação da tabela, ver
+        # _contadores_sql) e o nº de grupos (vigência, cnpj) — a unidade de
+        # paginação — como subconsulta escalar.
         imported_exists = exists().where(and_(
             FapAutoImportedContestacao.law_firm_id == law_firm_id,
             FapAutoImportedContestacao.contestacao_id == FapWebContestacao.contestacao_id,
         ))
-        imported_count = query.filter(imported_exists).count()
+        if summary_conds is not None:
+            groups_count = select(func.count(Summary.id)).where(*summary_conds)
+        else:
+            groups_sq = (
+                select(FapWebContestacao.ano_vigencia, FapWebContestacao.cnpj)
+                .where(*filter_conds)
+                .group_by(FapWebContestacao.ano_vigencia, FapWebContestacao.cnpj)
+                .subquery()
+            )
+            groups_count = select(func.count()).select_from(groups_sq)
+        stats = (
+            db.session.query(
+                func.count(FapWebContestacao.id).label('total'),
+                func.sum(case((imported_exists, 1), else_=0)).label('imported'),
+                func.sum(case((FapWebContestacao.file_path.isnot(None), 1), else_=0)).label('with_file'),
+                *_contadores_sql(),
+                groups_count.scalar_subquery().label('groups'),
+            )
+            .filter(*filter_conds)
+            .one()
+        )._mapping
+        total_contestacoes = int(stats['total'] or 0)
+        imported_count = int(stats['imported'] or 0)
         pending_count = total_contestacoes - imported_count
-
-        # Arquivos locais sobre TODO o conjunto filtrado (não só a página exibida)
-        with_file_count = query.filter(FapWebContestacao.file_path.isnot(None)).count()
+        with_file_count = int(stats['with_file'] or 0)
         without_file_count = total_contestacoes - with_file_count
+        for chave in contadores:
+            contadores[chave] = int(stats[chave] or 0)
 
-        # Contadores por instância/situação sobre TODO o conjunto filtrado
-        # (reusa a mesma classificação da tabela para não divergir).
-        for inst_cod, sit_cod, sit_desc in query.with_entities(
-            FapWebContestacao.instancia_codigo,
-            FapWebContestacao.situacao_codigo,
-            FapWebContestacao.situacao_descricao,
-        ).all():
-            chave = _chave_celula(sit_cod, inst_cod).replace('c_', 'count_')
-            contadores[chave] += 1
-
-        # Grupos (vigência, cnpj) distintos — unidade de paginação
-        groups_q = (
-            db.session.query(FapWebContestacao.ano_vigencia, FapWebContestacao.cnpj)
-            .filter(*filter_conds)
-            .group_by(FapWebContestacao.ano_vigencia, FapWebContestacao.cnpj)
-        )
-        total_groups = groups_q.count()
+        total_groups = int(stats['groups'] or 0)
         total_pages = max(1, (total_groups + page_size - 1) // page_size)
         if page > total_pages:
             page = total_pages
@@ -1416,77 +1488,84 @@ def contestacoes_page():
         # Ordenação dos grupos (linhas = empresa × vigência). Padrão = vigência
         # desc, CNPJ asc. Nas ordenações por data, reordena os grupos pela data
         # MAIS RECENTE de cada um (grupos sem essa data caem para o fim).
-        tiebreak = [FapWebContestacao.ano_vigencia.desc(), FapWebContestacao.cnpj.asc()]
-        ordered_q = (
-            db.session.query(FapWebContestacao.ano_vigencia, FapWebContestacao.cnpj)
-            .filter(*filter_conds)
-        )
-        if f_sort == 'dou':
-            order_by = [func.max(FapWebContestacao.data_dou_date).desc(), *tiebreak]
-        elif f_sort == 'transmissao':
-            order_by = [func.max(FapWebContestacao.data_transmissao).desc(), *tiebreak]
-        elif f_sort == 'cadastro':
-            order_by = [func.max(FapWebContestacao.created_at).desc(), *tiebreak]
-        elif f_sort == 'atualizacao':
-            # Data da última mudança real (histórico), agregada por grupo.
-            ordered_q = ordered_q.outerjoin(
-                FapWebContestacaoChangeHistory,
-                and_(
-                    FapWebContestacaoChangeHistory.contestacao_db_id == FapWebContestacao.id,
-                    FapWebContestacaoChangeHistory.change_type == 'updated',
-                ),
+        if summary_conds is not None:
+            sort_expr = summaries.summary_sort_column(f_sort)
+            ano_expr, cnpj_expr = Summary.ano_vigencia, Summary.cnpj
+            ordered_q = (
+                db.session.query(ano_expr, cnpj_expr, sort_expr if sort_expr is not None else literal(None))
+                .filter(*summary_conds)
             )
-            order_by = [func.max(FapWebContestacaoChangeHistory.synced_at).desc(), *tiebreak]
+            keyset = ordered_q.filter
         else:
-            order_by = tiebreak
-
-        group_keys = (
-            ordered_q
-            .group_by(FapWebContestacao.ano_vigencia, FapWebContestacao.cnpj)
-            .order_by(*order_by)
-            .limit(page_size)
-            .offset((page - 1) * page_size)
-            .all()
-        )
+            # Instância/situação/protocolo: as datas do grupo são as das
+            # linhas filtradas — agrega as linhas (com o histórico na
+            # ordenação "atualização") e aplica o cursor no HAVING.
+            sort_expr = summaries.rows_sort_expression(f_sort)
+            ano_expr, cnpj_expr = FapWebContestacao.ano_vigencia, FapWebContestacao.cnpj
+            ordered_q = (
+                db.session.query(ano_expr, cnpj_expr, sort_expr if sort_expr is not None else literal(None))
+                .filter(*filter_conds)
+            )
+            if f_sort == 'atualizacao':
+                ordered_q = ordered_q.outerjoin(
+                    FapWebContestacaoChangeHistory, summaries.history_join_condition(),
+                )
+            ordered_q = ordered_q.group_by(ano_expr, cnpj_expr)
+            keyset = ordered_q.having
+
+        def _pagina(cursor=None, reverse=False, limit=page_size, offset=0):
+            """Grupos da página; `reverse` busca de trás para frente (antes do
+            cursor, ou a partir do fim) e devolve na ordem da tela."""
+            q = ordered_q
+            if cursor:
+                q = keyset(summaries.keyset_condition(sort_expr, ano_expr, cnpj_expr, cursor, reverse))
+            q = q.order_by(*summaries.order_by(sort_expr, ano_expr, cnpj_expr, reverse=reverse))
+            q = q.limit(limit)
+            if offset:
+                q = q.offset(offset)
+            linhas = q.all()
+            return linhas[::-1] if reverse else linhas
+
+        page_groups = []
+        if total_groups:
+            if after_cursor and page > 1:
+                page_groups = _pagina(after_cursor)
+            elif before_cursor and page < total_pages:
+                page_groups = _pagina(before_cursor, reverse=True)
+            elif page == total_pages and page > 1:
+                # Última página: ordem inversa, sem OFFSET
+                page_groups = _pagina(reverse=True, limit=total_groups - (page - 1) * page_size)
+            if not page_groups:
+                # Primeira carga, salto direto de página ou cursor vencido
+                page_groups = _pagina(offset=(page - 1) * page_size)
+
+        group_keys = [(ano, cnpj) for ano, cnpj, _ in page_groups]
+        if page_groups:
+            (ano, cnpj, chave), (ano_fim, cnpj_fim, chave_fim) = page_groups[0], page_groups[-1]
+            prev_cursor = summaries.encode_cursor(f_sort, chave, ano, cnpj)
+            next_cursor = summaries.encode_cursor(f_sort, chave_fim, ano_fim, cnpj_fim)
 
         if group_keys:
-            key_conds = [
-                and_(FapWebContestacao.ano_vigencia == a, FapWebContestacao.cnpj == c)
-                for (a, c) in group_keys
-            ]
-            all_rows = (
-                query.filter(or_(*key_conds))
+            # Linhas da página + relatório de importação (contestacao_id →
+            # report_id) na mesma consulta, por subconsulta correlacionada.
+            # IN por tupla: usa ix_fap_web_contestacoes_firm_ano_cnpj.
+            report_id_sq = (
+                select(func.max(FapAutoImportedContestacao.report_id))
+                .where(
+                    FapAutoImportedContestacao.law_firm_id == law_firm_id,
+                    FapAutoImportedContestacao.contestacao_id == FapWebContestacao.contestacao_id,
+                )
+                .scalar_subquery()
+            )
+            for rec, report_id in (
+                query.filter(tuple_(FapWebContestacao.ano_vigencia, FapWebContestacao.cnpj).in_(group_keys))
+                .add_columns(report_id_sq)
                 .order_by(FapWebContestacao.ano_vigencia.desc(), FapWebContestacao.cnpj.asc())
                 .all()
-            )
-
-    # ── Mapa de contestações já importadas (contestacao_id → report_id) ──
-    contestacao_ids = [r.contestacao_id for r in all_rows]
-    imported_map = {}
-    if contestacao_ids:
-        imported_rows = (
-            FapAutoImportedContestacao.query
-            .filter(
-                FapAutoImportedContestacao.law_firm_id == law_firm_id,
-                FapAutoImportedContestacao.contestacao_id.in_(contestacao_ids),
-            )
-            .all()
-        )
-        for imp in imported_rows:
-            imported_map[imp.contestacao_id] = imp.report_id
-
-    # ── Valores únicos para os filtros de instância e situação ───────────
-    distinct = FapWebContestacao.query.filter_by(law_firm_id=law_firm_id)
-    instancias = {(r.instancia_codigo, r.instancia_descricao)
-                  for r in distinct.with_entities(
-                      FapWebContestacao.instancia_codigo,
-                      FapWebContestacao.instancia_descricao).distinct()
-                  if r.instancia_codigo}
-    situacoes = {(r.situacao_codigo, r.situacao_descricao)
-                 for r in distinct.with_entities(
-                     FapWebContestacao.situacao_codigo,
-                     FapWebContestacao.situacao_descricao).distinct()
-                 if r.situacao_codigo}
+            ):
+                all_rows.append(rec)
+                if report_id is not None:
+                    imported_map[rec.contestacao_id] = report_id
 
     # ── Agrupamento por (ano_vigencia, cnpj) para montar a tabela ────────
     # Cada célula contém a lista de contestações naquela categoria.
@@ -1528,23 +1607,25 @@ def contestacoes_page():
     return render_template(
         'fap_panel/contestacoes.html',
         mostrar_outras=mostrar_outras,
-        companies=companies,
+        companies=filter_options['companies'],
         years=FAP_AVAILABLE_YEARS,
         table_rows=table_rows,
         total=total_contestacoes,
         with_file_count=with_file_count,
         without_file_count=without_file_count,
         **contadores,
-        instancias=sorted(instancias),
-        situacoes=sorted(situacoes),
+        instancias=filter_options['instancias'],
+        situacoes=filter_options['situacoes'],
         imported_map=imported_map,
-        cnpjs_by_raiz=cnpjs_by_raiz,
+        cnpjs_by_raiz=filter_options['cnpjs_by_raiz'],
         has_active_filters=has_active_filters,
         # paginação (por grupo vigência × CNPJ)
         page=page,
         page_size=page_size,
         total_pages=total_pages,
         total_groups=total_groups,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
         imported_count=imported_count,
         pending_count=pending_count,
         # filtros ativos (para repreencher o form)
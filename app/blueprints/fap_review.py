@@ -886,6 +886,7 @@ def _execute_reviewer_agent(execution_id: int, law_firm_id: int, petition_file_p
                 execution.cost_usd = (execution.cost_usd or Decimal('0')) + aux_cost
 
             _sync_petition_after_revision(execution)
+            _svc.record_execution_statistics(execution)
             
             db.session.commit()
             
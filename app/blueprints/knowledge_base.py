@@ -20,6 +20,19 @@ from werkzeug.utils import secure_filename
 from app.agents.document_processing.agent_document_summary import AgentDocumentSummary
 from app.agents.knowledge_base.knowledge_ingestion_agent import KnowledgeIngestionAgent
 from app.services.knowledge_base.chat_context import build_attachments_context
+from app.services.knowledge_base.page_image_cache import (
+    PAGE_IMAGE_MAX_AGE_SECONDS,
+    file_cache_key,
+    page_etag,
+    page_image_cache,
+    render_highlighted_png,
+)
+from app.services.knowledge_base.result_hydration import (
+    collect_file_ids,
+    file_info_for,
+    filter_sources_detail,
+    load_result_files,
+)
 from app.services.knowledge_base.search_helpers import (
     adjust_search_score,
     highlight_search_terms,
@@ -36,6 +49,7 @@ from app.services.knowledge_base.session_helpers import (
 import os
 import json as json_lib
 import hashlib
+import io
 
 knowledge_base_bp = Blueprint('knowledge_base', __name__, url_prefix='/knowledge-base')
 
@@ -1052,10 +1066,10 @@ def view(file_id):
 
 @knowledge_base_bp.route('/<int:file_id>/page-image/<int:page_no>')
 def page_image(file_id, page_no):
-    """Renderiza uma página específica do PDF como imagem PNG (para o modal de trechos)."""
-    import io
-    import fitz
+    """Renderiza uma página específica do PDF como imagem PNG (para o modal de trechos).
 
+    A página limpa e o índice de palavras vêm do cache em disco
+    (page_image_cache); por pedido só o destaque dos termos é desenhado."""
     law_firm_id = get_current_law_firm_id()
     if not law_firm_id:
         return '', 401
@@ -1072,70 +1086,32 @@ def page_image(file_id, page_no):
     if not resolved_path:
         return '', 404
 
+    search_terms = [t.strip() for t in request.args.getlist('q') if t.strip()]
+    scale = 2.0
     try:
-        import PIL.Image
-        import PIL.ImageDraw
-
-        doc = fitz.open(resolved_path)
-        page_index = max(0, page_no - 1)  # 1-based → 0-based
-        if page_index >= len(doc):
-            page_index = len(doc) - 1
-        page = doc[page_index]
-
-        scale = 2.0
-        mat = fitz.Matrix(scale, scale)
-
-        # Coleta os retângulos de match ANTES de renderizar
-        search_terms = [t.strip() for t in request.args.getlist('q') if t.strip()]
-        match_rects: list[fitz.Rect] = []
-        words = page.get_text("words")  # (x0,y0,x1,y1,word,block,line,word_idx)
-        for term in search_terms:
-            found = page.search_for(term, quads=False)
-            if not found:
-                # Fallback: percorre palavras e busca substring (ex: número dividido em partes)
-                for w in words:
-                    if term in w[4]:
-                        found.append(fitz.Rect(w[:4]))
-            if not found:
-                # Fallback 2: concatena palavras da mesma linha e verifica substring
-                # Agrupa por (block, line)
-                lines: dict = {}
-                for w in words:
-                    key = (w[5], w[6])  # (block_no, line_no)
-                    lines.setdefault(key, []).append(w)
-                for key, line_words in lines.items():
-                    line_text = ''.join(w[4] for w in line_words)
-                    if term in line_text:
-                        # Destaca todas as palavras da linha que contêm dígitos do termo
-                        for w in line_words:
-                            found.append(fitz.Rect(w[:4]))
-                        break
-            print(f"[page_image] term={term!r} found={len(found)} rects via search_for+fallback")
-            match_rects.extend(found)
-        print(f"[page_image] file_id={file_id} page_no={page_no} terms={search_terms} total_rects={len(match_rects)}")
-
-        # Renderiza a página limpa (sem anotações de desenho no PDF)
-        pix = page.get_pixmap(matrix=mat, colorspace=fitz.csRGB)
-        doc.close()
-
-        # Desenha os destaques via PIL por cima da imagem renderizada
-        img = PIL.Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
-        if match_rects:
-            overlay = PIL.Image.new("RGBA", img.size, (0, 0, 0, 0))
-            draw = PIL.ImageDraw.Draw(overlay)
-            for rect in match_rects:
-                # Escala as coordenadas PDF para as coordenadas da imagem
-                x0, y0, x1, y1 = int(rect.x0 * scale), int(rect.y0 * scale), int(rect.x1 * scale), int(rect.y1 * scale)
-                # Área levemente maior para ficar visível
-                draw.rectangle([x0 - 2, y0 - 2, x1 + 2, y1 + 2], fill=(255, 230, 0, 140))
-            img = PIL.Image.alpha_composite(img.convert("RGBA"), overlay).convert("RGB")
-
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        buf.seek(0)
-        return send_file(buf, mimetype='image/png')
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        cache_key = file_cache_key(file.file_hash, resolved_path)
+    except OSError:
+        return '', 404
+
+    # ETag sai do hash do arquivo + página + termos: revalidação sem abrir o PDF
+    etag = page_etag(cache_key, page_no, scale, search_terms)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        try:
+            cached = page_image_cache.get_page(cache_key, resolved_path, page_no, scale)
+            if search_terms:
+                buf, total_rects = render_highlighted_png(cached, search_terms)
+                print(f"[page_image] file_id={file_id} page_no={page_no} terms={search_terms} total_rects={total_rects}")
+                response = send_file(buf, mimetype='image/png')
+            else:
+                response = send_file(io.BytesIO(cached.png_bytes), mimetype='image/png')
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'private, max-age={PAGE_IMAGE_MAX_AGE_SECONDS}'
+    return response
 
 
 @knowledge_base_bp.route('/<int:file_id>/view-docx')
@@ -1346,7 +1322,7 @@ def api_ask():
             'success': True,
             'answer': result['answer'],
             'sources': result['sources'],
-            'sources_detail': result.get('sources_detail', []),
+            'sources_detail': filter_sources_detail(result.get('sources_detail', []), law_firm_id),
             'suggested_questions': result.get('suggested_questions', []),
             'history_id': result.get('history_id'),
             'chat_id': chat_session.id,
@@ -1646,7 +1622,7 @@ def intelligent_search():
     if request.method == 'POST':
         search_query = request.form.get('query', '').strip()
         search_mode = request.form.get('search_mode', 'semantic').strip().lower()
-        if search_mode not in {'semantic', 'full_text'}:
+        if search_mode not in {'semantic', 'full_text', 'hybrid'}:
             search_mode = 'semantic'
         
         if search_query:
@@ -1660,32 +1636,34 @@ def intelligent_search():
                     history=None,
                     limit=50,
                     search_mode=search_mode,
+                    law_firm_id=law_firm_id,
                 )
                 
                 # Processar os resultados
                 if search_data and search_data.get('results') and search_data['results'].points:
+                    result_files = load_result_files(
+                        collect_file_ids(search_data['results'].points), law_firm_id
+                    )
                     for idx, point in enumerate(search_data['results'].points):
                         payload = point.payload
                         point_score = getattr(point, 'score', None)
                         if point_score is None:
                             point_score = payload.get('_rankingScore') if isinstance(payload, dict) else None
 
-                        if point_score is None and search_mode == 'full_text':
+                        if point_score is None and search_mode in ('full_text', 'hybrid'):
                             point_score = max(0.35, 1.0 - (idx * 0.02))
 
                         base_score = float(point_score or 0)
                         
-                        # Buscar informações do arquivo no banco
+                        # Arquivo do trecho (carregado em lote acima); fora do escritório → descarta
                         file_info = None
-                        if 'file_id' in payload and payload['file_id']:
-                            file_info = KnowledgeBase.query.filter_by(
-                                id=payload['file_id'],
-                                law_firm_id=law_firm_id
-                            ).first()
-                        
-                        # Obter o texto e aplicar highlight
+                        if payload.get('file_id'):
+                            result_file = result_files.get(payload['file_id'])
+                            if result_file is None:
+                                continue
+                            file_info = file_info_for(payload, result_file)
+
                         original_text = payload.get('text', '')
-                        highlighted_text = highlight_search_terms(original_text, search_query)
 
                         source_name = payload.get('source', '') or ''
                         description_text = payload.get('description', '') or ''
@@ -1700,7 +1678,7 @@ def intelligent_search():
                         result_item = {
                             'rank': idx + 1,
                             'text': original_text,  # Texto original sem HTML
-                            'highlighted_text': highlighted_text,  # Texto com highlight HTML
+                            'highlighted_text': highlight_search_terms(original_text, search_query),
                             'source': payload.get('source', 'Documento sem nome'),
                             'page': payload.get('page'),
                             'lawsuit_number': payload.get('lawsuit_number'),
@@ -1710,17 +1688,18 @@ def intelligent_search():
                             'score_percent': round(adjusted_score * 100, 2),
                             'base_score': base_score,
                             'literal_match': has_literal_match,
+                            'rrf_score': getattr(point, 'rrf_score', None),
                             'file_id': payload.get('file_id'),
-                            'file_info': {
-                                'original_filename': file_info.original_filename if file_info else None,
-                                'description': file_info.description if file_info else None,
-                                'file_type': file_info.file_type if file_info else None,
-                            } if file_info else None
+                            'file_info': file_info,
                         }
                         
                         results.append(result_item)
 
-                    results.sort(key=lambda item: item['score'], reverse=True)
+                    if search_mode == 'hybrid':
+                        # Ordem da fusão (RRF); o score ajustado só faz o corte
+                        results.sort(key=lambda item: item['rrf_score'] or 0, reverse=True)
+                    else:
+                        results.sort(key=lambda item: item['score'], reverse=True)
                     for position, item in enumerate(results, start=1):
                         item['rank'] = position
 
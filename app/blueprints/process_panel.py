@@ -29,7 +29,7 @@ from app.services import ai_model_settings_service
 from datetime import datetime, date, timedelta, time as dt_time
 from functools import wraps
 from sqlalchemy import or_, and_
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import load_only, selectinload
 from werkzeug.utils import secure_filename
 from types import SimpleNamespace
 from collections import defaultdict
@@ -1012,148 +1012,228 @@ def toggle_legal_thesis_status(thesis_id):
     return redirect(url_for('process_panel.manage_legal_theses'))
 
 
-@process_panel_bp.route('/')
-@require_law_firm
-def list_processes():
-    """Lista todos os processos judiciais cadastrados"""
-    law_firm_id = get_current_law_firm_id()
-    
-    # Filtros
-    search_query = request.args.get('q', '').strip()
-    status_filter = request.args.get('status', '')
-    client_filter = request.args.get('client_id', type=int)
-    legal_thesis_filter = request.args.get('legal_thesis_id', type=int)
-    view_mode = request.args.get('view', 'table').strip().lower()
-    if view_mode not in {'table', 'kanban'}:
-        view_mode = 'table'
+KANBAN_COLUMN_LIMIT = 30
+
+# Relações que os cartões da listagem e do Kanban exibem (polo ativo, passivo e
+# o órgão julgador de tribunal_name): carregadas em lote, não uma por processo.
+_PROCESS_CARD_LOADS = (
+    selectinload(JudicialProcess.plaintiff_client),
+    selectinload(JudicialProcess.defendant),
+    selectinload(JudicialProcess.court),
+)
+
+
+def _process_list_filters():
+    """Filtros da listagem de processos (tabela e Kanban) lidos da query string."""
     discovery_view = request.args.get('discovery', '').strip().lower()
     if discovery_view not in {'descobertos', 'ignorados'}:
         discovery_view = ''
-    page = request.args.get('page', 1, type=int)
+    return SimpleNamespace(
+        search_query=request.args.get('q', '').strip(),
+        status=request.args.get('status', ''),
+        client_id=request.args.get('client_id', type=int),
+        legal_thesis_id=request.args.get('legal_thesis_id', type=int),
+        discovery_view=discovery_view,
+    )
+
+
+# Termo só com dígitos e pontuação: busca pelo número do processo
+_PROCESS_NUMBER_TERM = re.compile(r'^[\d\s.\-/]+$')
+
+
+def _apply_process_search(query, search_query):
+    """Filtro da caixa de busca da listagem.
+
+    Número CNJ completo (os 20 dígitos, com ou sem pontuação) vira igualdade na
+    coluna de dígitos indexada por escritório. O resto cai nos ILIKE de
+    processo e vara; a partir de 4 dígitos, os dígitos do termo casam em
+    qualquer posição do número: começo e fim pelas colunas de dígitos e
+    dígitos invertidos, pedaço do meio ("2023.4.03") por LIKE '%dígitos%'.
+    """
+    search_digits = re.sub(r'\D', '', search_query)
+
+    if _PROCESS_NUMBER_TERM.match(search_query) and len(search_digits) == 20:
+        return query.filter(JudicialProcess.process_number_digits == search_digits)
 
+    digit_conditions = []
+    if len(search_digits) >= 4:
+        digit_conditions = [
+            JudicialProcess.process_number_digits.like(f'{search_digits}%'),
+            JudicialProcess.process_number_digits_reversed.like(f'{search_digits[::-1]}%'),
+            JudicialProcess.process_number_digits.like(f'%{search_digits}%'),
+        ]
+    query = query.outerjoin(Court, JudicialProcess.court_id == Court.id)
+    return query.filter(or_(
+        JudicialProcess.process_number.ilike(f'%{search_query}%'),
+        JudicialProcess.title.ilike(f'%{search_query}%'),
+        JudicialProcess.tribunal.ilike(f'%{search_query}%'),
+        Court.orgao_julgador.ilike(f'%{search_query}%'),
+        Court.tribunal.ilike(f'%{search_query}%'),
+        Court.secao_judiciaria.ilike(f'%{search_query}%'),
+        Court.subsecao_judiciaria.ilike(f'%{search_query}%'),
+        *digit_conditions,
+    ))
+
+
+def _filtered_processes_query(law_firm_id, filters):
+    """Processos do escritório com os filtros da listagem, mais recentes primeiro."""
     query = JudicialProcess.query.filter_by(law_firm_id=law_firm_id)
 
     # Aba "Descobertos": processos criados automaticamente pelo Monitoramento de
     # Comunicações (DJEN) aguardando triagem. A lista principal só mostra os
     # confirmados para não poluir o painel curado manualmente.
-    if discovery_view == 'descobertos':
+    if filters.discovery_view == 'descobertos':
         query = query.filter(JudicialProcess.discovery_status == 'pending_review')
-    elif discovery_view == 'ignorados':
+    elif filters.discovery_view == 'ignorados':
         query = query.filter(JudicialProcess.discovery_status == 'ignored')
     else:
         query = query.filter(JudicialProcess.discovery_status == 'confirmed')
 
     # Filtro por busca
+    search_query = filters.search_query
     if search_query:
-        query = query.outerjoin(Court, JudicialProcess.court_id == Court.id)
-        search_conditions = [
-            JudicialProcess.process_number.ilike(f'%{search_query}%'),
-            JudicialProcess.title.ilike(f'%{search_query}%'),
-            JudicialProcess.tribunal.ilike(f'%{search_query}%'),
-            Court.orgao_julgador.ilike(f'%{search_query}%'),
-            Court.tribunal.ilike(f'%{search_query}%'),
-            Court.secao_judiciaria.ilike(f'%{search_query}%'),
-            Court.subsecao_judiciaria.ilike(f'%{search_query}%'),
-        ]
-        # Número de processo acha com ou sem pontuação: compara dígitos com dígitos
-        search_digits = re.sub(r'\D', '', search_query)
-        if len(search_digits) >= 4:
-            normalized_number = db.func.replace(db.func.replace(db.func.replace(
-                JudicialProcess.process_number, '-', ''), '.', ''), ' ', '')
-            search_conditions.append(normalized_number.like(f'%{search_digits}%'))
-        query = query.filter(or_(*search_conditions))
-    
+        query = _apply_process_search(query, search_query)
+
     # Filtro por status
-    if status_filter:
-        query = query.filter(JudicialProcess.status == status_filter)
+    if filters.status:
+        query = query.filter(JudicialProcess.status == filters.status)
 
     # Filtro por cliente (polo ativo)
-    if client_filter:
-        query = query.filter(JudicialProcess.plaintiff_client_id == client_filter)
+    if filters.client_id:
+        query = query.filter(JudicialProcess.plaintiff_client_id == filters.client_id)
 
     # Filtro por tese jurídica vinculada a benefícios do processo
-    if legal_thesis_filter:
+    if filters.legal_thesis_id:
         query = query.filter(
             JudicialProcess.benefits.any(
                 JudicialProcessBenefit.legal_theses.any(
-                    JudicialLegalThesis.id == legal_thesis_filter
+                    JudicialLegalThesis.id == filters.legal_thesis_id
                 )
             )
         )
-    
-    ordered_query = query.order_by(JudicialProcess.created_at.desc())
 
-    if view_mode == 'kanban':
-        processes_list = ordered_query.all()
-    else:
-        # error_out=False: página fora do alcance mostra lista vazia em vez de 404
-        processes = ordered_query.paginate(page=page, per_page=15, error_out=False)
-        processes_list = processes.items
-    
-    # Estatísticas (a lista principal e os cards contam só os confirmados)
-    confirmed_base = JudicialProcess.query.filter_by(law_firm_id=law_firm_id, discovery_status='confirmed')
-    stats = {
-        'total': confirmed_base.count(),
-        'ativo': confirmed_base.filter_by(status='ativo').count(),
-        'suspenso': confirmed_base.filter_by(status='suspenso').count(),
-        'encerrado': confirmed_base.filter_by(status='encerrado').count(),
-        'descobertos': JudicialProcess.query.filter_by(
-            law_firm_id=law_firm_id, discovery_status='pending_review').count(),
-    }
+    # id desempata created_at: o "Carregar mais" do Kanban pagina por offset
+    return query.order_by(JudicialProcess.created_at.desc(), JudicialProcess.id.desc())
 
-    # ── Mesa de trabalho: prazos do escritório + radar agregado ──────────────
-    firm_deadline_rows, firm_deadlines_total = process_deadline_service.list_pending_for_firm(
-        law_firm_id, limit=8)
-    firm_deadlines = [
-        {'obj': d, **process_deadline_service.classify_deadline(d)}
-        for d in firm_deadline_rows
-    ]
 
-    radar_items, radar_total = process_radar_service.build_radar(law_firm_id, limit=8)
+def _process_stats(law_firm_id):
+    """Cards da listagem numa consulta só: GROUP BY status, discovery_status.
 
-    # Últimas publicações do Monitoramento (globais — com ou sem processo vinculado)
-    latest_pubs = (ProcessCommunication.query
-                   .filter_by(law_firm_id=law_firm_id)
-                   .order_by(ProcessCommunication.data_disponibilizacao.desc(),
-                             ProcessCommunication.id.desc())
-                   .limit(10).all())
+    Total e contagem por status consideram só os confirmados; "descobertos"
+    são os aguardando triagem.
+    """
+    stats = {'total': 0, 'ativo': 0, 'suspenso': 0, 'encerrado': 0, 'descobertos': 0}
+    rows = (db.session.query(JudicialProcess.status, JudicialProcess.discovery_status,
+                             db.func.count())
+            .filter(JudicialProcess.law_firm_id == law_firm_id)
+            .group_by(JudicialProcess.status, JudicialProcess.discovery_status))
+    for status, discovery_status, total in rows:
+        if discovery_status == 'confirmed':
+            stats['total'] += total
+            if status in ('ativo', 'suspenso', 'encerrado'):
+                stats[status] += total
+        elif discovery_status == 'pending_review':
+            stats['descobertos'] += total
+    return stats
+
+
+def _latest_phase_subquery(process_ids):
+    """Subconsulta (process_id, phase) só com o evento mais recente de cada processo.
+
+    ROW_NUMBER por processo (data do evento, depois id, decrescentes): o banco
+    devolve uma linha por processo em vez de todos os eventos.
+    """
+    row_number = db.func.row_number().over(
+        partition_by=JudicialEvent.process_id,
+        order_by=(JudicialEvent.event_date.desc(), JudicialEvent.id.desc()),
+    )
+    ranked = (db.session.query(JudicialEvent.process_id, JudicialEvent.phase,
+                               row_number.label('event_rank'))
+              .filter(JudicialEvent.process_id.in_(process_ids))
+              .subquery())
+    return (db.session.query(ranked.c.process_id, ranked.c.phase)
+            .filter(ranked.c.event_rank == 1)
+            .subquery())
 
-    process_phases = {}
-    process_legal_theses = {}
-    process_ids = [process.id for process in processes_list]
-    if process_ids:
-        latest_events = JudicialEvent.query.filter(
-            JudicialEvent.process_id.in_(process_ids)
-        ).order_by(
-            JudicialEvent.process_id.asc(),
-            JudicialEvent.event_date.desc(),
-            JudicialEvent.id.desc()
-        ).all()
 
-        for event in latest_events:
-            if event.process_id not in process_phases:
-                process_phases[event.process_id] = event.phase
+def _latest_phases(process_ids):
+    """{process_id: fase do evento mais recente}; aceita lista ou subconsulta de ids."""
+    latest = _latest_phase_subquery(process_ids)
+    return dict(db.session.query(latest.c.process_id, latest.c.phase))
 
-        benefits_with_theses = JudicialProcessBenefit.query.options(
-            selectinload(JudicialProcessBenefit.legal_theses)
-        ).filter(
-            JudicialProcessBenefit.process_id.in_(process_ids)
-        ).all()
 
-        thesis_names_by_process = {process_id: set() for process_id in process_ids}
-        for benefit in benefits_with_theses:
-            if not benefit.legal_theses:
-                continue
-            for thesis in benefit.legal_theses:
-                thesis_names_by_process.setdefault(benefit.process_id, set()).add(thesis.name)
+def _with_latest_phase(ordered_query):
+    """Consulta da listagem → (id, fase atual) na mesma ordem, uma linha por processo."""
+    ids_subquery = ordered_query.with_entities(JudicialProcess.id).order_by(None).subquery()
+    latest = _latest_phase_subquery(db.select(ids_subquery.c.id))
+    return (ordered_query
+            .outerjoin(latest, latest.c.process_id == JudicialProcess.id)
+            .with_entities(JudicialProcess.id, latest.c.phase)), latest
 
-        process_legal_theses = {
-            process_id: sorted(thesis_names)
-            for process_id, thesis_names in thesis_names_by_process.items()
-            if thesis_names
-        }
+
+def _kanban_ids_by_column(ordered_query, phase_keys):
+    """{chave da coluna: ids na ordem da listagem}, sem carregar os processos.
+
+    Fase fora das configuradas (ou processo sem evento) vai para '__unassigned__'.
+    """
+    rows, _latest = _with_latest_phase(ordered_query)
+    ids_by_column = defaultdict(list)
+    for process_id, phase_key in rows:
+        ids_by_column[phase_key if phase_key in phase_keys else '__unassigned__'].append(process_id)
+    return ids_by_column
+
+
+def _kanban_column_page(ordered_query, phase_key, phase_keys, offset, limit):
+    """Ids de uma coluna só, de ``offset`` em diante, com a fase filtrada no SQL.
+
+    Traz ``limit + 1`` ids para saber se ainda há próxima página.
+    """
+    rows, latest = _with_latest_phase(ordered_query)
+    if phase_key in phase_keys:
+        rows = rows.filter(latest.c.phase == phase_key)
+    else:
+        rows = rows.filter(or_(latest.c.phase.is_(None), latest.c.phase.notin_(list(phase_keys))))
+    return [process_id for process_id, _phase in rows.offset(offset).limit(limit + 1)]
+
+
+def _kanban_processes(process_ids):
+    """{id: processo} dos cartões visíveis, com as relações do cartão em lote."""
+    if not process_ids:
+        return {}
+    return {process.id: process for process in JudicialProcess.query.options(
+        *_PROCESS_CARD_LOADS).filter(JudicialProcess.id.in_(process_ids))}
+
+
+def _kanban_filter_args(filters):
+    """Filtros atuais como argumentos de url_for (para o "Carregar mais")."""
+    args = {
+        'q': filters.search_query,
+        'status': filters.status,
+        'client_id': filters.client_id,
+        'legal_thesis_id': filters.legal_thesis_id,
+        'discovery': filters.discovery_view,
+    }
+    return {key: value for key, value in args.items() if value}
+
+
+@process_panel_bp.route('/')
+@require_law_firm
+def list_processes():
+    """Lista todos os processos judiciais cadastrados"""
+    law_firm_id = get_current_law_firm_id()
+
+    filters = _process_list_filters()
+    view_mode = request.args.get('view', 'table').strip().lower()
+    if view_mode not in {'table', 'kanban'}:
+        view_mode = 'table'
+    page = request.args.get('page', 1, type=int)
+
+    ordered_query = _filtered_processes_query(law_firm_id, filters)
+    stats = _process_stats(law_firm_id)
 
     if view_mode == 'kanban':
+        # Kanban: cada coluna mostra os primeiros KANBAN_COLUMN_LIMIT cartões; a
+        # distribuição por fase lê só ids e o resto vem por kanban_column_cards.
         clients = Client.query.filter_by(law_firm_id=law_firm_id).order_by(Client.name.asc()).all()
         legal_theses = JudicialLegalThesis.query.filter_by(
             law_firm_id=law_firm_id,
@@ -1164,50 +1244,96 @@ def list_processes():
             law_firm_id=law_firm_id
         ).order_by(JudicialPhase.display_order.asc(), JudicialPhase.name.asc()).all()
 
-        kanban_columns = []
-        columns_by_key = {}
+        ids_by_column = _kanban_ids_by_column(ordered_query, {phase.key for phase in configured_phases})
+        column_defs = [(phase.key, phase.name) for phase in configured_phases]
+        if ids_by_column.get('__unassigned__'):
+            column_defs.append(('__unassigned__', 'Sem fase'))
 
-        for phase in configured_phases:
-            column = {
-                'key': phase.key,
-                'label': phase.name,
-                'processes': []
-            }
-            kanban_columns.append(column)
-            columns_by_key[phase.key] = column
-
-        unassigned_processes = []
-        for process in processes_list:
-            phase_key = process_phases.get(process.id)
-            phase_column = columns_by_key.get(phase_key)
-            if phase_column:
-                phase_column['processes'].append(process)
-            else:
-                unassigned_processes.append(process)
+        limit = KANBAN_COLUMN_LIMIT
+        processes_by_id = _kanban_processes(
+            [pid for key, _label in column_defs for pid in ids_by_column.get(key, [])[:limit]])
 
-        if unassigned_processes:
+        kanban_columns = []
+        for key, label in column_defs:
+            column_ids = ids_by_column.get(key, [])
             kanban_columns.append({
-                'key': '__unassigned__',
-                'label': 'Sem fase',
-                'processes': unassigned_processes,
+                'key': key,
+                'label': label,
+                'processes': [processes_by_id[pid] for pid in column_ids[:limit] if pid in processes_by_id],
+                'total': len(column_ids),
+                'next_offset': limit if len(column_ids) > limit else None,
             })
 
         return render_template(
             'process_panel/list_kanban.html',
-            search_query=search_query,
-            status_filter=status_filter,
-            client_filter=client_filter,
-            legal_thesis_filter=legal_thesis_filter,
+            search_query=filters.search_query,
+            status_filter=filters.status,
+            client_filter=filters.client_id,
+            legal_thesis_filter=filters.legal_thesis_id,
             clients=clients,
             legal_theses=legal_theses,
             stats=stats,
             kanban_columns=kanban_columns,
-            process_phases=process_phases,
-            process_legal_theses=process_legal_theses,
+            kanban_filter_args=_kanban_filter_args(filters),
             current_view=view_mode,
-            discovery_view=discovery_view,
+            discovery_view=filters.discovery_view,
         )
 
+    # error_out=False: página fora do alcance mostra lista vazia em vez de 404
+    processes = ordered_query.options(*_PROCESS_CARD_LOADS).paginate(
+        page=page, per_page=15, error_out=False)
+    process_ids = [process.id for process in processes.items]
+
+    # ── Mesa de trabalho: prazos do escritório + radar agregado ──────────────
+    firm_deadline_rows, firm_deadlines_total = process_deadline_service.list_pending_for_firm(
+        law_firm_id, limit=8)
+    firm_deadlines = [
+        {'obj': d, **process_deadline_service.classify_deadline(d)}
+        for d in firm_deadline_rows
+    ]
+
+    radar_items, radar_total = process_radar_service.build_radar(law_firm_id, limit=8)
+
+    # Últimas publicações do Monitoramento (globais — com ou sem processo vinculado);
+    # só as colunas do quadro: o inteiro teor e os JSONs brutos ficam no banco.
+    latest_pubs = (ProcessCommunication.query
+                   .options(load_only(
+                       ProcessCommunication.id,
+                       ProcessCommunication.judicial_process_id,
+                       ProcessCommunication.data_disponibilizacao,
+                       ProcessCommunication.tipo_comunicacao,
+                       ProcessCommunication.tipo_documento,
+                       ProcessCommunication.nome_orgao,
+                       ProcessCommunication.numero_processo,
+                       ProcessCommunication.numero_processo_mascara,
+                       ProcessCommunication.read_at))
+                   .filter_by(law_firm_id=law_firm_id)
+                   .order_by(ProcessCommunication.data_disponibilizacao.desc(),
+                             ProcessCommunication.id.desc())
+                   .limit(10).all())
+
+    process_phases = {}
+    process_legal_theses = {}
+    if process_ids:
+        process_phases = _latest_phases(process_ids)
+
+        thesis_rows = (db.session.query(JudicialProcessBenefit.process_id, JudicialLegalThesis.name)
+                       .join(judicial_process_benefit_legal_theses,
+                             judicial_process_benefit_legal_theses.c.benefit_id
+                             == JudicialProcessBenefit.id)
+                       .join(JudicialLegalThesis,
+                             JudicialLegalThesis.id
+                             == judicial_process_benefit_legal_theses.c.legal_thesis_id)
+                       .filter(JudicialProcessBenefit.process_id.in_(process_ids)))
+        thesis_names_by_process = defaultdict(set)
+        for process_id, thesis_name in thesis_rows:
+            thesis_names_by_process[process_id].add(thesis_name)
+
+        process_legal_theses = {
+            process_id: sorted(thesis_names)
+            for process_id, thesis_names in thesis_names_by_process.items()
+        }
+
     legal_theses = JudicialLegalThesis.query.filter_by(
         law_firm_id=law_firm_id,
         is_active=True,
@@ -1251,17 +1377,17 @@ def list_processes():
     return render_template(
         'process_panel/list.html',
         processes=processes,
-        search_query=search_query,
-        status_filter=status_filter,
-        client_filter=client_filter,
-        legal_thesis_filter=legal_thesis_filter,
+        search_query=filters.search_query,
+        status_filter=filters.status,
+        client_filter=filters.client_id,
+        legal_thesis_filter=filters.legal_thesis_id,
         legal_theses=legal_theses,
         stats=stats,
         process_phases=process_phases,
         process_legal_theses=process_legal_theses,
         judicial_phases_labels=JUDICIAL_PHASES,
         current_view=view_mode,
-        discovery_view=discovery_view,
+        discovery_view=filters.discovery_view,
         firm_deadlines=firm_deadlines,
         firm_deadlines_total=firm_deadlines_total,
         radar_items=radar_items,
@@ -1271,6 +1397,39 @@ def list_processes():
     )
 
 
+
+@process_panel_bp.route('/kanban/column')
+@require_law_firm
+def kanban_column_cards():
+    """Fragmento HTML com os próximos cartões de uma coluna do Kanban ("Carregar mais").
+
+    Mesmos filtros da listagem; ``phase_key`` é a coluna e ``offset`` quantos
+    cartões ela já mostra.
+    """
+    law_firm_id = get_current_law_firm_id()
+    filters = _process_list_filters()
+    phase_key = request.args.get('phase_key', '').strip()
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    phase_keys = {key for (key,) in db.session.query(JudicialPhase.key).filter(
+        JudicialPhase.law_firm_id == law_firm_id)}
+    if phase_key != '__unassigned__' and phase_key not in phase_keys:
+        page_ids = []
+    else:
+        page_ids = _kanban_column_page(_filtered_processes_query(law_firm_id, filters),
+                                       phase_key, phase_keys, offset, KANBAN_COLUMN_LIMIT)
+    has_more = len(page_ids) > KANBAN_COLUMN_LIMIT
+    page_ids = page_ids[:KANBAN_COLUMN_LIMIT]
+    processes_by_id = _kanban_processes(page_ids)
+
+    return render_template(
+        'process_panel/_kanban_cards.html',
+        column_key=phase_key,
+        processes=[processes_by_id[pid] for pid in page_ids if pid in processes_by_id],
+        next_offset=offset + KANBAN_COLUMN_LIMIT if has_more else None,
+        kanban_filter_args=_kanban_filter_args(filters),
+    )
+
 def _vigencia_contexto_processos(law_firm_id, valor):
     """Anos de vigência dos benefícios judiciais + valor selecionado.
 
@@ -3204,13 +3363,19 @@ def api_benefit_documents():
         try:
             from openai import OpenAI
             from qdrant_client import QdrantClient
+            from app.agents.knowledge_base.knowledge_ingestion_agent import tenant_filter
 
             openai_client = OpenAI()
             embedding_resp = openai_client.embeddings.create(model=embedding_model, input=benefit_number)
             vector = embedding_resp.data[0].embedding
 
             qdrant = QdrantClient(host=qdrant_host, port=qdrant_port, timeout=30)
-            points = qdrant.query_points(collection_name=collection, query=vector, limit=15).points
+            points = qdrant.query_points(
+                collection_name=collection,
+                query=vector,
+                query_filter=tenant_filter(session.get('law_firm_id')),
+                limit=15,
+            ).points
             for point in points:
                 payload = point.payload or {}
                 fid  = payload.get('file_id')
@@ -3,7 +3,7 @@ Middlewares e contexto da aplicação
 """
 from flask import session, request, redirect, url_for, jsonify, flash
 from sqlalchemy.orm import joinedload
-from app.models import db, User, Case, CaseComment
+from app.models import Case, CaseComment
 from app.utils.permissions import (
     MODULE_PERMISSIONS,
     can_access_endpoint,
@@ -12,12 +12,42 @@ from app.utils.permissions import (
     parse_module_permissions,
 )
 from app.utils.urls import app_public_url, mcp_public_url
-from app.services import access_audit_service
-from datetime import datetime
+from app.services import access_audit_service, layout_context_cache
 from functools import wraps
 
+def _load_recent_case_comments(law_firm_id):
+    """Últimos 5 comentários do escritório, já como dicts (seguros para cache)."""
+    comments = (CaseComment.query
+        .join(Case, CaseComment.case_id == Case.id)
+        .options(joinedload(CaseComment.user), joinedload(CaseComment.case))
+        .filter(Case.law_firm_id == law_firm_id)
+        .order_by(CaseComment.created_at.desc())
+        .limit(5)
+        .all()
+    )
+
+    recent_items = []
+    for comment in comments:
+        recent_items.append({
+            'id': comment.id,
+            'case_id': comment.case_id,
+            'case_title': comment.case.title if comment.case else 'Caso',
+            'user_name': comment.user.name if comment.user else 'Usuário',
+            'title': comment.title or 'Comentário',
+            'content': comment.content,
+            'created_at': comment.created_at,
+        })
+    return recent_items
+
+
+def _parse_permissions(raw_permissions, role):
+    permissions = parse_module_permissions(raw_permissions, role)
+    return permissions, frozenset(permissions)
+
+
 def init_app_middlewares(app):
     """Inicializa todos os middlewares da aplicação"""
+    access_audit_service.activity_aggregator.init_app(app)
     
     @app.before_request
     def check_session():
@@ -33,31 +63,32 @@ def init_app_middlewares(app):
             else:
                 return redirect(url_for('auth.login'))
         
-        # Se está autenticado, atualizar última atividade
+        # Se está autenticado, registrar atividade (write-behind, sem escrita por request)
         if 'user_id' in session and request.endpoint not in public_endpoints:
-            user = User.query.get(session['user_id'])
+            user = access_audit_service.get_user_snapshot(session['user_id'])
             if not user:
                 session.clear()
                 if request.is_json:
                     return jsonify({"error": "Unauthorized"}), 401
                 return redirect(url_for('auth.login'))
 
-            user.last_activity = datetime.now()
-
-            session['user_role'] = user.role
-            session['user_module_permissions'] = user.get_module_permissions()
+            # Só reatribui quando muda: evita reemitir o cookie de sessão a cada resposta
+            module_permissions = user.get_module_permissions()
+            if session.get('user_role') != user.role:
+                session['user_role'] = user.role
+            if session.get('user_module_permissions') != module_permissions:
+                session['user_module_permissions'] = module_permissions
 
             if not can_access_endpoint(request.endpoint, user.role, user.module_permissions):
-                db.session.commit()
+                access_audit_service.record_activity(user, count_visit=False)
                 if request.is_json:
                     return jsonify({"error": "Acesso negado"}), 403
                 flash('Acesso negado para este modulo.', 'danger')
                 landing_endpoint = get_landing_endpoint(user.role, user.module_permissions)
                 return redirect(url_for(landing_endpoint))
 
-            # Só conta a tela se o acesso foi permitido; mesmo commit da last_activity
-            access_audit_service.record_page_visit(user)
-            db.session.commit()
+            # Só conta a tela se o acesso foi permitido
+            access_audit_service.record_activity(user)
 
     @app.context_processor
     def inject_recent_case_comments():
@@ -69,27 +100,9 @@ def init_app_middlewares(app):
                 'recent_case_comments_count': 0
             }
 
-        comments = (CaseComment.query
-            .join(Case, CaseComment.case_id == Case.id)
-            .options(joinedload(CaseComment.user), joinedload(CaseComment.case))
-            .filter(Case.law_firm_id == law_firm_id)
-            .order_by(CaseComment.created_at.desc())
-            .limit(5)
-            .all()
+        recent_items = layout_context_cache.recent_case_comments_cache.get_or_load(
+            law_firm_id, lambda: _load_recent_case_comments(law_firm_id)
         )
-
-        recent_items = []
-        for comment in comments:
-            recent_items.append({
-                'id': comment.id,
-                'case_id': comment.case_id,
-                'case_title': comment.case.title if comment.case else 'Caso',
-                'user_name': comment.user.name if comment.user else 'Usuário',
-                'title': comment.title or 'Comentário',
-                'content': comment.content,
-                'created_at': comment.created_at,
-            })
-
         return {
             'recent_case_comments': recent_items,
             'recent_case_comments_count': len(recent_items)
@@ -106,8 +119,11 @@ def init_app_middlewares(app):
     @app.context_processor
     def inject_module_permissions():
         role = session.get('user_role')
-        permissions = parse_module_permissions(session.get('user_module_permissions'), role)
-        permissions_set = set(permissions)
+        raw_permissions = session.get('user_module_permissions')
+        cache_key = (role, tuple(raw_permissions) if isinstance(raw_permissions, list) else raw_permissions)
+        permissions, permissions_set = layout_context_cache.module_permissions_cache.get_or_load(
+            cache_key, lambda: _parse_permissions(raw_permissions, role)
+        )
 
         def can_view_module(module_key):
             return module_key in permissions_set
@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import event
 from decimal import Decimal
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -1150,6 +1151,16 @@ class JudicialLegalThesis(db.Model):
 class JudicialProcess(db.Model):
     """Tabela judicial_processes - Painel centralizado de processos judiciais"""
     __tablename__ = 'judicial_processes'
+    __table_args__ = (
+        # Cards da listagem: um GROUP BY status, discovery_status resolvido só no índice
+        db.Index('ix_judicial_processes_firm_discovery_status',
+                 'law_firm_id', 'discovery_status', 'status'),
+        # Busca por número: igualdade/prefixo nos dígitos e sufixo pelos dígitos invertidos
+        db.Index('ix_judicial_processes_firm_number_digits',
+                 'law_firm_id', 'process_number_digits'),
+        db.Index('ix_judicial_processes_firm_number_digits_reversed',
+                 'law_firm_id', 'process_number_digits_reversed'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     law_firm_id = db.Column(db.Integer, db.ForeignKey('law_firms.id'), nullable=False, index=True)
@@ -1162,6 +1173,11 @@ class JudicialProcess(db.Model):
     
     # Identificação do processo (CNJ format: NNNNNNN-DD.AAAA.J.TR.OOOO)
     process_number = db.Column(db.String(25), nullable=True, index=True)
+    # Só os dígitos do número (máscara e número cru coexistem em process_number)
+    # e os mesmos dígitos invertidos — "termina com" vira prefixo indexável.
+    # Mantidos pelos eventos abaixo da classe.
+    process_number_digits = db.Column(db.String(25))
+    process_number_digits_reversed = db.Column(db.String(25))
     
     # Informações do processo
     title = db.Column(db.String(255))
@@ -1244,6 +1260,14 @@ class JudicialProcess(db.Model):
         return f'<JudicialProcess {self.process_number}>'
 
 
+@event.listens_for(JudicialProcess, 'before_insert')
+@event.listens_for(JudicialProcess, 'before_update')
+def _sync_judicial_process_number_digits(_mapper, _connection, target):
+    digits = ''.join(ch for ch in (target.process_number or '') if ch.isdigit())
+    target.process_number_digits = digits or None
+    target.process_number_digits_reversed = digits[::-1] or None
+
+
 class JudicialProcessNote(db.Model):
     """Tabela judicial_process_notes - Notas e comentários vinculados ao processo judicial."""
     __tablename__ = 'judicial_process_notes'
@@ -1664,6 +1688,10 @@ class Benefit(db.Model):
                  'law_firm_id', 'second_instance_status'),
         db.Index('ix_benefits_law_firm_contestation_topic',
                  'law_firm_id', 'fap_contestation_topic'),
+        # Filtro por CNPJ/raiz das tools FAP do MCP: igualdade ou prefixo
+        # sobre os dígitos, sem REPLACE na coluna formatada.
+        db.Index('ix_benefits_law_firm_employer_cnpj_digits',
+                 'law_firm_id', 'employer_cnpj_digits'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -1685,6 +1713,8 @@ class Benefit(db.Model):
 
     # Employer / company data
     employer_cnpj = db.Column(db.String(20), index=True)
+    # employer_cnpj só com dígitos — mantido pelos eventos abaixo da classe
+    employer_cnpj_digits = db.Column(db.String(20))
     employer_name = db.Column(db.String(255))
 
     # Benefit period
@@ -1757,6 +1787,13 @@ class Benefit(db.Model):
         return f'<Benefit {self.benefit_number}>'
 
 
+@event.listens_for(Benefit, 'before_insert')
+@event.listens_for(Benefit, 'before_update')
+def _sync_benefit_employer_cnpj_digits(_mapper, _connection, target):
+    digits = ''.join(ch for ch in (target.employer_cnpj or '') if ch.isdigit())
+    target.employer_cnpj_digits = digits or None
+
+
 class BenefitContestationDecision(db.Model):
     """Uma análise/insumo de contestação FAP de um benefício.
 
@@ -2569,6 +2606,12 @@ class FapWebContestacao(db.Model):
             'ix_fap_web_contestacoes_firm_ano_vigencia',
             'law_firm_id', 'ano_vigencia',
         ),
+        # Linhas de uma página da tela de contestações: IN por tupla
+        # (vigência, CNPJ) dos grupos da página.
+        db.Index(
+            'ix_fap_web_contestacoes_firm_ano_cnpj',
+            'law_firm_id', 'ano_vigencia', 'cnpj',
+        ),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -2714,6 +2757,127 @@ class FapWebContestacaoChangeHistory(db.Model):
         )
 
 
+class FapWebContestacaoListingFingerprint(db.Model):
+    """Impressão digital da listagem de contestações de uma empresa num ano de vigência.
+
+    Guardada pelo cron de sincronização (scripts/fap_sync_cron.py): hash do
+    payload normalizado devolvido pelo portal + quantidade de itens. Se a
+    listagem buscada de novo tem a mesma impressão, nada mudou no portal e o
+    cron pula o diff item a item — só renova o last_synced_at das linhas.
+
+    ``has_open`` marca listagens com alguma contestação ainda não publicada
+    (instância em aberto): essas são consultadas a cada execução; as demais,
+    só depois do intervalo de "listagem fria".
+    """
+    __tablename__ = 'fap_web_contestacao_listing_fingerprints'
+    __table_args__ = (
+        db.UniqueConstraint(
+            'law_firm_id', 'cnpj', 'ano_vigencia',
+            name='uq_fap_web_contestacao_listing_fingerprints_scope',
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    law_firm_id = db.Column(db.Integer, db.ForeignKey('law_firms.id'), nullable=False, index=True)
+    fap_company_id = db.Column(db.Integer, db.ForeignKey('fap_companies.id'), nullable=True, index=True)
+    cnpj = db.Column(db.String(20), nullable=False)  # CNPJ da empresa (só dígitos)
+    ano_vigencia = db.Column(db.Integer, nullable=False)
+
+    payload_hash = db.Column(db.String(64), nullable=False)  # SHA-256 do payload normalizado
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    has_open = db.Column(db.Boolean, nullable=False, default=False)
+
+    last_changed_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    last_synced_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return (
+            f'<FapWebContestacaoListingFingerprint cnpj={self.cnpj} ano={self.ano_vigencia} '
+            f'itens={self.item_count}>'
+        )
+
+
+class FapWebContestacaoGroupSummary(db.Model):
+    """Resumo por grupo (vigência × CNPJ) das contestações de um escritório.
+
+    Unidade de paginação da tela de contestações do Painel FAP. Guarda as
+    chaves de cada ordenação — DOU, transmissão e cadastro mais recentes e a
+    última mudança real (histórico ``updated``) — para que a tela pagine por
+    cursor num índice, sem GROUP BY sobre fap_web_contestacoes.
+
+    Mantida pelas sincronizações (cron e painel) no mesmo commit das
+    contestações, via app/services/fap_contestacao_summary_service.py.
+    """
+    __tablename__ = 'fap_web_contestacao_group_summaries'
+    __table_args__ = (
+        db.UniqueConstraint(
+            'law_firm_id', 'ano_vigencia', 'cnpj',
+            name='uq_fap_web_contestacao_group_summaries_group',
+        ),
+        # Um índice por ordenação, na mesma ordem do ORDER BY da tela.
+        db.Index(
+            'ix_fap_web_contestacao_group_summaries_firm_dou',
+            'law_firm_id', 'max_data_dou', 'ano_vigencia', 'cnpj',
+        ),
+        db.Index(
+            'ix_fap_web_contestacao_group_summaries_firm_transmissao',
+            'law_firm_id', 'max_data_transmissao', 'ano_vigencia', 'cnpj',
+        ),
+        db.Index(
+            'ix_fap_web_contestacao_group_summaries_firm_created',
+            'law_firm_id', 'max_created_at', 'ano_vigencia', 'cnpj',
+        ),
+        db.Index(
+            'ix_fap_web_contestacao_group_summaries_firm_updated',
+            'law_firm_id', 'last_updated_at', 'ano_vigencia', 'cnpj',
+        ),
+        db.Index(
+            'ix_fap_web_contestacao_group_summaries_firm_raiz',
+            'law_firm_id', 'cnpj_raiz',
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    law_firm_id = db.Column(db.Integer, db.ForeignKey('law_firms.id'), nullable=False)
+    ano_vigencia = db.Column(db.Integer, nullable=False)
+    cnpj = db.Column(db.String(20), nullable=False)       # CNPJ do estabelecimento (14 dígitos)
+    cnpj_raiz = db.Column(db.String(10), nullable=False)
+
+    contestacao_count = db.Column(db.Integer, nullable=False, default=0)
+    max_data_dou = db.Column(db.Date)
+    max_data_transmissao = db.Column(db.DateTime)
+    max_created_at = db.Column(db.DateTime)
+    last_updated_at = db.Column(db.DateTime)   # MAX(synced_at) do histórico 'updated'
+
+    refreshed_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    def __repr__(self):
+        return (
+            f'<FapWebContestacaoGroupSummary ano={self.ano_vigencia} cnpj={self.cnpj} '
+            f'contestacoes={self.contestacao_count}>'
+        )
+
+
+class FapDataVersion(db.Model):
+    """Versão dos dados do FAP de um escritório.
+
+    Contador incrementado pelas sincronizações e importações depois de gravar
+    (app/services/fap_data_version.py). Caches de leitura guardam a versão
+    junto com o resultado: versão nova, resultado descartado.
+    """
+    __tablename__ = 'fap_data_versions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    law_firm_id = db.Column(db.Integer, db.ForeignKey('law_firms.id'), nullable=False, unique=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f'<FapDataVersion law_firm={self.law_firm_id} v{self.version}>'
+
+
 class FapWebProcuracao(db.Model):
     """Tabela fap_web_procuracoes — Procurações eletrônicas sincronizadas do portal FAP/Dataprev.
 
@@ -3110,6 +3274,61 @@ class FapReviewAuxExtraction(db.Model):
         return f'<FapReviewAuxExtraction file={self.file_name} sha={self.file_sha256[:8]}>'
 
 
+class FapReviewExecutionStats(db.Model):
+    """Estatísticas pré-computadas de uma revisão, gravadas quando ela conclui.
+
+    A tela de score por advogado lê estas linhas em vez de decodificar o
+    `result_json` de cada execução. `computed_at` anterior ao `updated_at` da
+    execução marca a linha como desatualizada (recalculada na próxima leitura).
+    """
+    __tablename__ = 'fap_review_execution_stats'
+
+    id = db.Column(db.Integer, primary_key=True)
+    law_firm_id = db.Column(db.Integer, db.ForeignKey('law_firms.id'), nullable=False, index=True)
+    execution_id = db.Column(
+        db.Integer,
+        db.ForeignKey('fap_review_executions.id', ondelete='CASCADE'),
+        nullable=False,
+        unique=True,
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    total_findings = db.Column(db.Integer, default=0, nullable=False)
+    critical_findings = db.Column(db.Integer, default=0, nullable=False)
+    moderate_findings = db.Column(db.Integer, default=0, nullable=False)
+    formal_findings = db.Column(db.Integer, default=0, nullable=False)
+    categories_json = db.Column(db.Text, comment='JSON {categoria traduzida: quantidade}')
+    fingerprints_json = db.Column(db.Text, comment='JSON com os fingerprints dos achados, na ordem do resultado')
+    computed_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    execution = db.relationship('FapReviewExecution')
+
+    def __repr__(self):
+        return f'<FapReviewExecutionStats execution_id={self.execution_id} findings={self.total_findings}>'
+
+
+class FapReviewLawyerStats(db.Model):
+    """Agregado por advogado da tela de score, refeito só quando as revisões dele mudam.
+
+    `source_signature` resume as revisões do advogado (ids, status, datas e
+    `computed_at` das estatísticas); se não bater com o estado atual, o
+    agregado é recalculado a partir de `FapReviewExecutionStats`.
+    """
+    __tablename__ = 'fap_review_lawyer_stats'
+    __table_args__ = (
+        db.UniqueConstraint('law_firm_id', 'user_id', name='uq_fap_review_lawyer_stats_scope'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    law_firm_id = db.Column(db.Integer, db.ForeignKey('law_firms.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    source_signature = db.Column(db.String(64), nullable=False)
+    aggregate_json = db.Column(db.Text, nullable=False, comment='JSON com o agregado do advogado')
+    refreshed_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    def __repr__(self):
+        return f'<FapReviewLawyerStats law_firm_id={self.law_firm_id} user_id={self.user_id}>'
+
+
 class FapReviewFindingCheck(db.Model):
     """Pontos de atenção marcados como revisados pelo usuário (triagem por execução)."""
     __tablename__ = 'fap_review_finding_checks'
@@ -3500,6 +3719,59 @@ class ImpugnacaoImportItem(db.Model):
         return f'<ImpugnacaoImportItem {self.id} job={self.job_id} status={self.status}>'
 
 
+class CnpjCompanyCache(db.Model):
+    """Cache das consultas à OpenCNPJ, por CNPJ (só dígitos).
+
+    Dados cadastrais são públicos e iguais para todos os escritórios, então a
+    chave é só o CNPJ. Guarda também o "não encontrado" (404) com validade
+    menor, para a importação de relatórios não repetir a consulta de um
+    estabelecimento que a API não conhece. Erros da API não entram.
+    """
+    __tablename__ = 'cnpj_company_cache'
+
+    cnpj = db.Column(db.String(14), primary_key=True)
+    status = db.Column(db.String(20), nullable=False)  # found, not_found
+    data = db.Column(db.JSON)
+    fetched_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<CnpjCompanyCache {self.cnpj} {self.status}>'
+
+
+class PdfImageVisionDescription(db.Model):
+    """Cache das descrições por visão de imagens de PDF, por hash do PNG renderizado.
+
+    Reingerir o mesmo acervo de peças-modelo (ou peças que repetem os mesmos
+    prints) não paga nova chamada multimodal. O modelo de visão e a versão do
+    prompt integram a chave — trocar qualquer um dos dois => descrição nova.
+    """
+    __tablename__ = 'pdf_image_vision_descriptions'
+    __table_args__ = (
+        db.UniqueConstraint(
+            'law_firm_id',
+            'image_sha256',
+            'vision_model',
+            'prompt_version',
+            name='uq_pdf_image_vision_descriptions_scope',
+        ),
+        db.Index('ix_pdf_image_vision_descriptions_lookup', 'law_firm_id', 'image_sha256'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    law_firm_id = db.Column(db.Integer, db.ForeignKey('law_firms.id'), nullable=True, index=True)
+    image_sha256 = db.Column(db.String(64), nullable=False)
+    vision_model = db.Column(db.String(100), nullable=False)
+    prompt_version = db.Column(db.String(20), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    law_firm = db.relationship('LawFirm')
+
+    def __repr__(self):
+        return f'<PdfImageVisionDescription sha={self.image_sha256[:8]} model={self.vision_model}>'
+
+
 class McpOAuthClient(db.Model):
     """Tabela mcp_oauth_clients - Clientes OAuth registrados via Dynamic Client Registration (MCP)."""
     __tablename__ = 'mcp_oauth_clients'
@@ -3606,8 +3878,9 @@ class NotificationSetting(db.Model):
 class UserPageVisit(db.Model):
     """Tabela user_page_visits - Agregado diário de telas acessadas por usuário.
 
-    Uma linha por (user_id, endpoint, visit_date); o middleware incrementa
-    `hits` no mesmo commit que já atualiza User.last_activity.
+    Uma linha por (user_id, endpoint, visit_date); o middleware acumula os
+    hits em memória e o flush do write-behind (access_audit_service) soma em
+    lote junto com User.last_activity.
     """
     __tablename__ = 'user_page_visits'
 
@@ -3774,6 +4047,8 @@ class ProcessDatajudSnapshot(db.Model):
     __tablename__ = 'process_datajud_snapshots'
     __table_args__ = (
         db.UniqueConstraint('law_firm_id', 'process_id', name='uq_process_datajud_snapshots_firm_process'),
+        # Radar: movimentações da última semana do escritório
+        db.Index('ix_process_datajud_snapshots_firm_last_movement', 'law_firm_id', 'last_movement_at'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
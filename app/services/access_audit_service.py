@@ -2,19 +2,33 @@
 Auditoria de acesso de usuários — fonte única do dashboard admin de atividade.
 
 Responsabilidades:
-- Registrar visitas de tela (agregado diário em user_page_visits, upsert barato
-  no mesmo commit que o middleware já faz para User.last_activity).
+- Registrar visitas de tela (agregado diário em user_page_visits).
+- Write-behind da atividade: o middleware não escreve no banco a cada request.
+  `User.last_activity` e os `hits` de user_page_visits são acumulados em
+  memória (`ActivityAggregator`) e gravados em lote a cada
+  ACTIVITY_FLUSH_INTERVAL_SECONDS, no encerramento do worker e antes de
+  qualquer leitura das telas de auditoria. O mesmo update em `users` a cada
+  request já travou (deadlock) contra transações longas de sincronização.
+- Snapshot do usuário (papel/permissões) por processo, com TTL, para que
+  requests de leitura não precisem carregar o `User` a cada vez.
 - Estatísticas: usuários online agora, logins/ativos do dia, atividade por
   usuário e telas acessadas por usuário.
 """
+import atexit
 import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 
 from flask import request
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import bindparam, event, func, or_, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from app.models import db, User, UserPageVisit
-from app.utils.permissions import MODULE_PERMISSIONS, get_module_from_endpoint
+from app.utils.permissions import MODULE_PERMISSIONS, get_module_from_endpoint, parse_module_permissions
 from app.utils.timezone import now_sp
 
 logger = logging.getLogger(__name__)
@@ -44,56 +58,287 @@ def _is_page_navigation() -> bool:
     return True
 
 
-def _find_visit(user_id: int, endpoint: str, visit_date) -> 'UserPageVisit | None':
-    return UserPageVisit.query.filter_by(
-        user_id=user_id, endpoint=endpoint, visit_date=visit_date
-    ).first()
-
-
-def record_page_visit(user: User) -> None:
+def record_page_visit(user) -> None:
     """Registra a visita de tela da request atual para o usuário.
 
-    Não comita — o commit fica a cargo do chamador (middleware, que já
-    comita a atualização de last_activity). Nunca levanta exceção.
+    Só acumula em memória (ver `ActivityAggregator`); a linha em
+    user_page_visits é gravada no próximo flush. Nunca levanta exceção.
     """
     try:
         if not _is_page_navigation():
             return
+        activity_aggregator.record(user.id, user.law_firm_id, request.endpoint)
+    except Exception:
+        logger.exception('Falha ao registrar visita de tela (ignorada)')
 
-        endpoint = request.endpoint
-        today = now_sp().date()
 
-        visit = _find_visit(user.id, endpoint, today)
+# ── Write-behind de atividade ────────────────────────────────────────────
 
-        if visit:
-            visit.hits += 1
-            visit.last_seen_at = datetime.now()
-            return
 
-        # SAVEPOINT força o INSERT a executar aqui (e não no commit do
-        # middleware, onde o erro escaparia deste try/except).
+def _env_seconds(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, str(default))))
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """O que o middleware precisa do usuário a cada request."""
+    id: int
+    law_firm_id: int
+    role: str
+    module_permissions: str | None
+    loaded_at: float
+
+    def get_module_permissions(self) -> list[str]:
+        return parse_module_permissions(self.module_permissions, self.role)
+
+
+_snapshot_lock = threading.Lock()
+_user_snapshots: dict[int, UserSnapshot] = {}
+
+
+def get_user_snapshot(user_id: int) -> UserSnapshot | None:
+    """Snapshot do usuário com TTL de USER_SNAPSHOT_TTL_SECONDS (default 30).
+
+    Alterações feitas por este processo (tela de usuários) invalidam na hora
+    via evento do ORM; nos demais workers valem ao fim do TTL."""
+    ttl = _env_seconds('USER_SNAPSHOT_TTL_SECONDS', 30)
+    now = time.monotonic()
+    with _snapshot_lock:
+        snapshot = _user_snapshots.get(user_id)
+    if snapshot is not None and now - snapshot.loaded_at < ttl:
+        return snapshot
+
+    user = db.session.get(User, user_id)
+    if not user:
+        invalidate_user_snapshot(user_id)
+        return None
+    snapshot = UserSnapshot(
+        id=user.id,
+        law_firm_id=user.law_firm_id,
+        role=user.role,
+        module_permissions=user.module_permissions,
+        loaded_at=now,
+    )
+    with _snapshot_lock:
+        _user_snapshots[user_id] = snapshot
+    return snapshot
+
+
+def invalidate_user_snapshot(user_id: int | None = None) -> None:
+    """Descarta o snapshot de um usuário (ou de todos, sem argumento)."""
+    with _snapshot_lock:
+        if user_id is None:
+            _user_snapshots.clear()
+        else:
+            _user_snapshots.pop(user_id, None)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_snapshot_on_change(_mapper, _connection, target):
+    invalidate_user_snapshot(target.id)
+
+
+class ActivityAggregator:
+    """Acumula `last_activity` e hits de tela em memória e grava em lote.
+
+    Por processo (cada worker tem o seu). Um flush grava, numa transação
+    própria (fora da sessão da request): um UPDATE em lote de
+    `users.last_activity` (só avança, nunca volta — outro worker pode ter
+    gravado um valor mais novo) e um upsert multi-linha em user_page_visits
+    (`hits = hits + n`). Linhas em ordem de chave para que dois workers
+    gravando ao mesmo tempo travem na mesma ordem. Se o flush falhar, o
+    acumulado volta para o buffer e vai no próximo.
+    """
+
+    _CHUNK_SIZE = 500
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_activity: dict[int, datetime] = {}
+        self._visits: dict[tuple, dict] = {}
+        self._app = None
+        self._thread_pid: int | None = None
+        self._stop = threading.Event()
+
+    def init_app(self, app) -> None:
+        self._app = app
+        atexit.register(self.flush_with_app_context, final=True)
+
+    @staticmethod
+    def flush_interval() -> float:
+        return _env_seconds('ACTIVITY_FLUSH_INTERVAL_SECONDS', 30)
+
+    @staticmethod
+    def max_pending() -> int:
         try:
-            with db.session.begin_nested():
-                db.session.add(UserPageVisit(
-                    law_firm_id=user.law_firm_id,
-                    user_id=user.id,
-                    endpoint=endpoint,
-                    visit_date=today,
-                    hits=1,
-                    last_seen_at=datetime.now(),
-                ))
-        except IntegrityError:
-            # Outra request simultânea inseriu a linha primeiro (sob
-            # REPEATABLE READ o SELECT acima pode não enxergá-la). O UPDATE
-            # direto lê a versão corrente e apenas incrementa.
-            UserPageVisit.query.filter_by(
-                user_id=user.id, endpoint=endpoint, visit_date=today
-            ).update({
-                'hits': UserPageVisit.hits + 1,
-                'last_seen_at': datetime.now(),
-            }, synchronize_session=False)
+            return max(1, int(os.getenv('ACTIVITY_FLUSH_MAX_PENDING', '1000')))
+        except (TypeError, ValueError):
+            return 1000
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._last_activity) + len(self._visits)
+
+    def record(self, user_id: int, law_firm_id: int, endpoint: str | None,
+               when: datetime | None = None, visit_date=None) -> None:
+        when = when or datetime.now()
+        with self._lock:
+            current = self._last_activity.get(user_id)
+            if current is None or when > current:
+                self._last_activity[user_id] = when
+            if endpoint:
+                key = (user_id, endpoint, visit_date or now_sp().date())
+                entry = self._visits.get(key)
+                if entry is None:
+                    self._visits[key] = {'law_firm_id': law_firm_id, 'hits': 1, 'last_seen_at': when}
+                else:
+                    entry['hits'] += 1
+                    if when > entry['last_seen_at']:
+                        entry['last_seen_at'] = when
+            pending = len(self._last_activity) + len(self._visits)
+
+        if self.flush_interval() == 0 or pending >= self.max_pending():
+            self.flush()
+        else:
+            self._ensure_thread()
+
+    def _ensure_thread(self) -> None:
+        # Por PID: com preload do gunicorn a thread do master não sobrevive ao fork.
+        if self._app is None or self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, name='activity-aggregator', daemon=True).start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(max(1.0, self.flush_interval())):
+            self.flush_with_app_context()
+
+    def flush_with_app_context(self, final: bool = False) -> None:
+        if self._app is None:
+            return
+        try:
+            with self._app.app_context():
+                self.flush(final=final)
+        except Exception:
+            logger.exception('Falha no flush da atividade (fora de request)')
+
+    def _swap(self) -> tuple[dict, dict]:
+        with self._lock:
+            last_activity, visits = self._last_activity, self._visits
+            self._last_activity, self._visits = {}, {}
+        return last_activity, visits
+
+    def _restore(self, last_activity: dict, visits: dict) -> None:
+        with self._lock:
+            for user_id, when in last_activity.items():
+                current = self._last_activity.get(user_id)
+                if current is None or when > current:
+                    self._last_activity[user_id] = when
+            for key, entry in visits.items():
+                current = self._visits.get(key)
+                if current is None:
+                    self._visits[key] = entry
+                else:
+                    current['hits'] += entry['hits']
+                    current['last_seen_at'] = max(current['last_seen_at'], entry['last_seen_at'])
+
+    def flush(self, final: bool = False) -> int:
+        """Grava o acumulado. Devolve quantas linhas (usuários + visitas) foram gravadas.
+
+        `final=True` (encerramento do processo) não devolve nada ao buffer e
+        loga sem traceback: não há próximo flush."""
+        with self._flush_lock:
+            last_activity, visits = self._swap()
+            if not last_activity and not visits:
+                return 0
+            try:
+                with db.engine.begin() as connection:
+                    self._write_last_activity(connection, last_activity)
+                    self._write_visits(connection, visits)
+            except Exception as exc:
+                if final:
+                    logger.warning('Atividade acumulada descartada no encerramento: %s', exc.__class__.__name__)
+                    return 0
+                self._restore(last_activity, visits)
+                logger.exception('Falha ao gravar atividade acumulada (fica para o próximo flush)')
+                return 0
+            return len(last_activity) + len(visits)
+
+    def _write_last_activity(self, connection, last_activity: dict) -> None:
+        if not last_activity:
+            return
+        users = User.__table__
+        stmt = (
+            update(users)
+            .where(users.c.id == bindparam('user_id'))
+            .where(or_(users.c.last_activity.is_(None), users.c.last_activity < bindparam('when')))
+            .values(last_activity=bindparam('when'))
+        )
+        rows = [{'user_id': user_id, 'when': when} for user_id, when in sorted(last_activity.items())]
+        connection.execute(stmt, rows)
+
+    def _write_visits(self, connection, visits: dict) -> None:
+        if not visits:
+            return
+        visits_table = UserPageVisit.__table__
+        rows = [
+            {
+                'law_firm_id': entry['law_firm_id'],
+                'user_id': user_id,
+                'endpoint': endpoint,
+                'visit_date': visit_date,
+                'hits': entry['hits'],
+                'last_seen_at': entry['last_seen_at'],
+            }
+            for (user_id, endpoint, visit_date), entry in sorted(visits.items(), key=lambda item: item[0])
+        ]
+        is_mysql = connection.dialect.name == 'mysql'
+        for start in range(0, len(rows), self._CHUNK_SIZE):
+            chunk = rows[start:start + self._CHUNK_SIZE]
+            if is_mysql:
+                stmt = mysql_insert(visits_table).values(chunk)
+                stmt = stmt.on_duplicate_key_update(
+                    hits=visits_table.c.hits + stmt.inserted.hits,
+                    last_seen_at=func.greatest(visits_table.c.last_seen_at, stmt.inserted.last_seen_at),
+                )
+            else:
+                stmt = sqlite_insert(visits_table).values(chunk)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['user_id', 'endpoint', 'visit_date'],
+                    set_={
+                        'hits': visits_table.c.hits + stmt.excluded.hits,
+                        'last_seen_at': func.max(visits_table.c.last_seen_at, stmt.excluded.last_seen_at),
+                    },
+                )
+            connection.execute(stmt)
+
+
+activity_aggregator = ActivityAggregator()
+
+
+def record_activity(snapshot: UserSnapshot, *, count_visit: bool = True) -> None:
+    """Registra a atividade da request atual no acumulador (sem tocar no banco).
+
+    `count_visit=False` atualiza só a última atividade (acesso negado não
+    conta como tela visitada). Nunca levanta exceção."""
+    try:
+        endpoint = request.endpoint if count_visit and _is_page_navigation() else None
+        activity_aggregator.record(snapshot.id, snapshot.law_firm_id, endpoint)
     except Exception:
-        logger.exception('Falha ao registrar visita de tela (ignorada)')
+        logger.exception('Falha ao registrar atividade (ignorada)')
+
+
+def flush_activity() -> int:
+    """Grava agora o acumulado deste processo (telas de auditoria, testes)."""
+    return activity_aggregator.flush()
 
 
 def screen_label(endpoint: str) -> str:
@@ -114,6 +359,7 @@ def get_overview_stats(law_firm_id: int) -> dict:
     Inclui a adoção do login com Google (quantos já usaram e quantos usaram
     hoje), para acompanhar se o caminho novo pegou.
     """
+    flush_activity()
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     base = User.query.filter_by(law_firm_id=law_firm_id)
     return {
@@ -128,6 +374,7 @@ def get_overview_stats(law_firm_id: int) -> dict:
 
 def get_users_activity(law_firm_id: int) -> list[dict]:
     """Atividade por usuário: último login, última atividade, online, última tela."""
+    flush_activity()
     # is_(None) primeiro: portável entre SQLite e MySQL (sem NULLS LAST)
     users = (User.query
              .filter_by(law_firm_id=law_firm_id)
@@ -178,6 +425,7 @@ def get_users_activity(law_firm_id: int) -> list[dict]:
 
 def get_user_screens(law_firm_id: int, user_id: int, days: int = 30) -> list[dict]:
     """Telas acessadas pelo usuário no período, agregadas por endpoint."""
+    flush_activity()
     since = now_sp().date() - timedelta(days=days)
     rows = (db.session.query(
                 UserPageVisit.endpoint,
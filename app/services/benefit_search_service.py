@@ -0,0 +1,330 @@
+"""
+Busca textual dos benefícios da Central de Disputas (Meilisearch).
+
+A caixa de busca da listagem (`/disputes-center/api/list`) filtrava com
+``LIKE '%termo%'`` sobre ``cast(...)`` de onze colunas — nenhum índice do
+MySQL serve a isso, e cada tecla digitada varria a tabela `benefits` inteira.
+Aqui o termo é resolvido para uma lista de ids no índice `benefits` e a
+consulta SQL filtra por ``Benefit.id IN (...)``; os demais filtros da tela
+continuam em SQL.
+
+Mesmas regras do índice do DOU: o MySQL é a fonte da verdade e o índice é
+descartável. Indexar nunca derruba a gravação, buscar nunca derruba a tela.
+Quando o Meilisearch não responde, o índice ainda não foi criado (rode
+``scripts/reindex_benefits.py``), o termo casa com benefícios demais ou um
+número não casou com nada (pode ser o meio de um CPF/NB, que o LIKE acha e
+o Meilisearch não), `search_ids` devolve None e a tela usa o LIKE antigo.
+
+O Meilisearch casa começo de palavra, o LIKE casa qualquer trecho. Para
+termos com dígito (NB, CPF, NIT, CNPJ, id, ano de vigência — ver
+`identificador`) a tela soma os dois: ids do índice OU o LIKE, e o pedaço
+do meio de um número continua achando o que achava. Termos só de texto
+(nomes, tipo, status) ficam só no índice: "silv" acha "Silva", "ilva" não.
+
+Manutenção: `index_benefits` depois do commit da importação de relatórios
+de julgamento e do cadastro/edição manual; `remove_benefits` na exclusão;
+`index_client_benefits` quando o nome de um cliente muda (o nome vai em
+cada documento do cliente).
+
+Config: BENEFITS_MEILI_INDEX (default "benefits"), BENEFITS_MEILI_MAX_IDS
+(default 5000; acima disso o termo é amplo demais e vale o SQL),
+BENEFITS_MEILI_TIMEOUT_SECONDS (default 2) e BENEFITS_MEILI_RETRY_SECONDS
+(default 30; pausa depois de uma falha, para não esperar o timeout a cada
+tecla).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import time
+
+from dotenv import load_dotenv
+from meilisearch_python_sdk import Client as MeilisearchClient
+from meilisearch_python_sdk.models.settings import Pagination, TypoTolerance
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except (TypeError, ValueError):
+        return default
+
+
+MEILISEARCH_HOST = os.getenv('MEILISEARCH_HOST', 'http://localhost:7700')
+MEILISEARCH_API_KEY = os.getenv('MEILISEARCH_API_KEY')
+MEILI_INDEX = os.getenv('BENEFITS_MEILI_INDEX', 'benefits')
+MAX_IDS = max(1, _env_int('BENEFITS_MEILI_MAX_IDS', 5000))
+TIMEOUT_SECONDS = max(1, _env_int('BENEFITS_MEILI_TIMEOUT_SECONDS', 2))
+RETRY_SECONDS = _env_int('BENEFITS_MEILI_RETRY_SECONDS', 30)
+
+LOTE_PADRAO = 1000
+
+# As colunas do LIKE de _apply_benefits_filters, e os identificadores também
+# só em dígitos: o Meilisearch quebra "123.456.789-00" em quatro tokens, e
+# quem digita "12345678900" não acharia nada.
+_SEARCHABLE = [
+    'benefit_number', 'benefit_number_digits',
+    'insured_name', 'client_name', 'employer_name',
+    'insured_cpf', 'insured_cpf_digits', 'insured_nit', 'insured_nit_digits',
+    'employer_cnpj', 'employer_cnpj_digits',
+    'benefit_type', 'status', 'fap_vigencia_years', 'benefit_id',
+]
+_FILTERABLE = ['law_firm_id']
+
+_SO_NUMERO = re.compile(r'^[\d\s.\-/]+$')
+
+# Índices já conferidos neste processo (atributos e paginação aplicados)
+_configured: set[str] = set()
+_unavailable_until = 0.0
+
+
+def so_digitos(valor) -> str:
+    return re.sub(r'\D', '', str(valor or ''))
+
+
+def _client() -> MeilisearchClient:
+    return MeilisearchClient(MEILISEARCH_HOST, MEILISEARCH_API_KEY, timeout=TIMEOUT_SECONDS)
+
+
+def _paused() -> bool:
+    return time.monotonic() < _unavailable_until
+
+
+def _mark_unavailable(exc: Exception) -> None:
+    global _unavailable_until
+    _unavailable_until = time.monotonic() + RETRY_SECONDS
+    logger.warning('Busca de benefícios: Meilisearch indisponível (%s)', exc)
+
+
+def _configure(client, index) -> None:
+    """Atributos, paginação e tolerância a erro de digitação, de forma idempotente."""
+    if list(index.get_searchable_attributes() or []) != _SEARCHABLE:
+        client.wait_for_task(index.update_searchable_attributes(_SEARCHABLE).task_uid,
+                             timeout_in_ms=20000)
+    if set(index.get_filterable_attributes() or []) != set(_FILTERABLE):
+        client.wait_for_task(index.update_filterable_attributes(_FILTERABLE).task_uid,
+                             timeout_in_ms=20000)
+    # O LIKE não tolera erro de digitação: com tolerância, "Silva" traria
+    # "Silvia" e a lista mudaria de conteúdo ao trocar de caminho.
+    if index.get_typo_tolerance().enabled:
+        client.wait_for_task(index.update_typo_tolerance(TypoTolerance(enabled=False)).task_uid,
+                             timeout_in_ms=20000)
+    # Um hit além do teto é o sinal de "amplo demais": o teto precisa cobrir MAX_IDS.
+    if (index.get_pagination().max_total_hits or 0) <= MAX_IDS:
+        client.wait_for_task(index.update_pagination(Pagination(max_total_hits=MAX_IDS + 1)).task_uid,
+                             timeout_in_ms=20000)
+    _configured.add(index.uid)
+
+
+def get_index(create: bool = False):
+    """Índice pronto para uso, ou None se ainda não existe e ``create`` é False.
+
+    Só a reindexação cria o índice: índice criado pela edição de um benefício
+    teria só esse documento, e a busca devolveria só ele.
+    """
+    client = _client()
+    if create:
+        index = client.get_or_create_index(uid=MEILI_INDEX, primary_key='id')
+    else:
+        try:
+            index = client.get_index(MEILI_INDEX)
+        except Exception as exc:  # noqa: BLE001
+            if getattr(exc, 'code', '') == 'index_not_found':
+                return None
+            raise
+    if create or index.uid not in _configured:
+        _configure(client, index)
+    return index
+
+
+def is_available() -> bool:
+    try:
+        _client().health()
+        return True
+    except Exception as exc:  # noqa: BLE001 — indisponibilidade não é erro de programa
+        logger.info('Busca de benefícios: Meilisearch indisponível (%s)', exc)
+        return False
+
+
+def drop_index() -> None:
+    try:
+        _client().delete_index_if_exists(MEILI_INDEX)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning('Busca de benefícios: falha ao remover o índice %s: %s', MEILI_INDEX, exc)
+    _configured.discard(MEILI_INDEX)
+
+
+# ------------------------------------------------------------- indexação
+
+def montar_documento(benefit, client_name: str | None) -> dict:
+    """Benefit (+ nome do cliente) → documento do índice."""
+    return {
+        'id': benefit.id,
+        'law_firm_id': benefit.law_firm_id,
+        'benefit_id': str(benefit.id),
+        'benefit_number': benefit.benefit_number or '',
+        'benefit_number_digits': so_digitos(benefit.benefit_number),
+        'client_name': client_name or '',
+        'insured_name': benefit.insured_name or '',
+        'benefit_type': benefit.benefit_type or '',
+        'insured_cpf': benefit.insured_cpf or '',
+        'insured_cpf_digits': so_digitos(benefit.insured_cpf),
+        'insured_nit': benefit.insured_nit or '',
+        'insured_nit_digits': so_digitos(benefit.insured_nit),
+        'employer_cnpj': benefit.employer_cnpj or '',
+        'employer_cnpj_digits': so_digitos(benefit.employer_cnpj),
+        'employer_name': benefit.employer_name or '',
+        'status': benefit.status or '',
+        'fap_vigencia_years': benefit.fap_vigencia_years or '',
+    }
+
+
+def _documentos(query) -> list[dict]:
+    return [montar_documento(benefit, client_name) for benefit, client_name in query]
+
+
+def _base_query():
+    from app.models import Benefit, Client, db  # import tardio: evita ciclo com models
+    return (
+        db.session.query(Benefit, Client.name)
+        .outerjoin(Client, Benefit.client_id == Client.id)
+    ), Benefit
+
+
+def index_benefits(benefit_ids) -> int:
+    """(Re)indexa os benefícios informados, lendo do banco. Devolve quantos.
+
+    Chamar depois do commit. Falha aqui nunca derruba quem gravou: o
+    benefício entra no índice na próxima reindexação.
+    """
+    ids = sorted({int(i) for i in (benefit_ids or []) if i})
+    if not ids or _paused():
+        return 0
+    try:
+        index = get_index()
+        if index is None:
+            return 0
+        query, Benefit = _base_query()
+        total = 0
+        for inicio in range(0, len(ids), LOTE_PADRAO):
+            lote = ids[inicio:inicio + LOTE_PADRAO]
+            documentos = _documentos(query.filter(Benefit.id.in_(lote)))
+            if documentos:
+                index.add_documents(documentos)
+            total += len(documentos)
+        return total
+    except Exception as exc:  # noqa: BLE001 — indexar não derruba a gravação
+        _mark_unavailable(exc)
+        return 0
+
+
+def index_client_benefits(client_id) -> int:
+    """Reindexa os benefícios de um cliente (o nome do cliente mudou). Devolve quantos.
+
+    Chamar depois do commit; mesmas garantias de `index_benefits`.
+    """
+    if not client_id or _paused():
+        return 0
+    from app.models import Benefit, db
+    try:
+        ids = [benefit_id for (benefit_id,) in
+               db.session.query(Benefit.id).filter(Benefit.client_id == client_id)]
+    except Exception as exc:  # noqa: BLE001 — indexar não derruba a gravação
+        logger.warning('Busca de benefícios: falha ao listar benefícios do cliente %s: %s', client_id, exc)
+        return 0
+    return index_benefits(ids)
+
+
+def remove_benefits(benefit_ids) -> int:
+    """Tira do índice benefícios excluídos do banco. Devolve quantos."""
+    ids = [str(int(i)) for i in (benefit_ids or []) if i]
+    if not ids or _paused():
+        return 0
+    try:
+        index = get_index()
+        if index is None:
+            return 0
+        index.delete_documents(ids)
+        return len(ids)
+    except Exception as exc:  # noqa: BLE001
+        _mark_unavailable(exc)
+        return 0
+
+
+def reindex_all(law_firm_id: int | None = None, lote: int = LOTE_PADRAO) -> int:
+    """Reconstrói o índice a partir do banco, por id crescente. Devolve o total."""
+    index = get_index(create=True)
+    query, Benefit = _base_query()
+    if law_firm_id:
+        query = query.filter(Benefit.law_firm_id == law_firm_id)
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        bloco = query.filter(Benefit.id > ultimo_id).order_by(Benefit.id).limit(lote).all()
+        if not bloco:
+            break
+        index.add_documents(_documentos(bloco))
+        total += len(bloco)
+        ultimo_id = bloco[-1][0].id
+        logger.info('Busca de benefícios: %d benefício(s) indexado(s)', total)
+    return total
+
+
+def aguardar_indexacao(timeout_ms: int = 600000) -> None:
+    """Espera a fila do Meilisearch esvaziar para o índice (reindexação)."""
+    try:
+        client = _client()
+        for tarefa in client.get_tasks(index_ids=[MEILI_INDEX]).results:
+            if tarefa.status in ('enqueued', 'processing'):
+                client.wait_for_task(tarefa.uid, timeout_in_ms=timeout_ms)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning('Busca de benefícios: falha ao aguardar a indexação: %s', exc)
+
+
+# ---------------------------------------------------------------- consulta
+
+def identificador(termo: str) -> bool:
+    """Termo com dígito: NB, CPF, NIT, CNPJ, id ou ano — quem busca pode ter
+    digitado um trecho do meio, que só o LIKE acha."""
+    return any(ch.isdigit() for ch in (termo or ''))
+
+
+def search_ids(law_firm_id: int, termo: str) -> list[int] | None:
+    """Ids dos benefícios do escritório que casam com o termo.
+
+    None = use o LIKE (índice indisponível ou inexistente, termo amplo
+    demais, número sem resultado); [] = busca ok, nada casou.
+    """
+    termo = (termo or '').strip()
+    if not termo or not law_firm_id or _paused():
+        return None
+    try:
+        index = get_index()
+        if index is None:
+            return None
+        resultado = index.search(
+            termo,
+            limit=MAX_IDS + 1,
+            filter=f'law_firm_id = {int(law_firm_id)}',
+            attributes_to_retrieve=['id'],
+            # Todas as palavras, como no LIKE da frase inteira
+            matching_strategy='all',
+        )
+    except Exception as exc:  # noqa: BLE001 — buscar não derruba a tela
+        _mark_unavailable(exc)
+        return None
+
+    hits = resultado.hits or []
+    if len(hits) > MAX_IDS:
+        return None
+    if not hits and _SO_NUMERO.match(termo):
+        # O Meilisearch casa prefixo; "%4321%" do fim de um CPF só o LIKE acha
+        return None
+    return [int(hit['id']) for hit in hits]
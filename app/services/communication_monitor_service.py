@@ -22,7 +22,7 @@ Fluxo de sincronização (cron diário):
 import logging
 from datetime import date, datetime, timedelta
 
-from sqlalchemy import or_, cast, String
+from sqlalchemy import and_, or_, cast, String
 
 from app.models import (
     db,
@@ -130,20 +130,26 @@ def _get_or_create_sync_state(law_firm_id, lawyer_id):
 def _existing_process_ids(law_firm_id, wanted):
     """Dígitos CNJ → id dos JudicialProcess já cadastrados (uma consulta só).
 
-    ``wanted``: dict dígitos → parsed. Casa tanto o número só com dígitos
-    quanto a máscara CNJ (formatos coexistem em ``process_number``).
+    ``wanted``: dict dígitos → parsed. Compara com ``process_number_digits``
+    (índice por escritório), que vale tanto para o número só com dígitos
+    quanto para a máscara CNJ — os formatos coexistem em ``process_number``.
+    Linhas ainda sem a coluna preenchida (antes do backfill) caem na
+    comparação antiga, com cada formato possível do número.
     """
     if not wanted:
         return {}
     forms = set()
     for digits, parsed in wanted.items():
         forms.add(digits)
-        forms.add(parsed.get('numero_processo_mascara') or format_cnj(digits))
-    rows = JudicialProcess.query.filter(
-        JudicialProcess.law_firm_id == law_firm_id,
-        JudicialProcess.process_number.in_(forms),
-    ).all()
-    return {only_digits(p.process_number): p.id for p in rows}
+        forms.add((parsed or {}).get('numero_processo_mascara') or format_cnj(digits))
+    rows = (db.session.query(JudicialProcess.process_number_digits,
+                             JudicialProcess.process_number, JudicialProcess.id)
+            .filter(JudicialProcess.law_firm_id == law_firm_id,
+                    or_(JudicialProcess.process_number_digits.in_(list(wanted)),
+                        and_(JudicialProcess.process_number_digits.is_(None),
+                             JudicialProcess.process_number.in_(list(forms)))))
+            .all())
+    return {(digits or only_digits(number)): process_id for digits, number, process_id in rows}
 
 
 def _create_discovered_process(law_firm_id, parsed, stats):
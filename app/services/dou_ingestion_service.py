@@ -17,15 +17,31 @@ Duas propriedades sustentam o módulo:
 A ordem em ingest_date importa: o hash é calculado **antes** de gravar o
 arquivo. Gravar antes de comparar sobrescreveria um arquivo íntegro por um
 download possivelmente truncado.
+
+Rede e banco ficam em estágios separados: os downloads (ZIP de cada seção e,
+para edição que mudou, o PDF) rodam em paralelo sobre a mesma sessão
+autenticada (DOU_DOWNLOAD_CONCURRENCY, padrão 4; 1 = sequencial), enquanto
+comparação de assinatura, parse e commit seguem na thread principal, na ordem
+de sempre, um commit por (data, seção). Em execuções de várias datas, os ZIPs
+das próximas DOU_DOWNLOAD_PREFETCH_DAYS datas (padrão 2) já vão sendo baixados
+enquanto a data atual é processada — janela limitada para não acumular um mês
+de ZIPs em disco.
+
+Os downloads vão em streaming para um temporário no diretório da data
+(app/services/streamed_download.py), com o SHA-256 calculado no caminho:
+nenhum ZIP ou PDF inteiro fica em memória, e o arquivo definitivo só é
+substituído por rename atômico depois da comparação de assinatura e da
+validação do ZIP.
 """
 
 from __future__ import annotations
 
-import hashlib
 import io
 import logging
 import os
+import tempfile
 import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import date, datetime, timedelta
 from pathlib import Path
 
@@ -37,12 +53,15 @@ from sqlalchemy import func
 from app.models import db, DouEdition, DouArticle, DouSyncRun
 from app.services import inlabs_client
 from app.services.dou_xml_parser import parse_article_xml
+from app.services.streamed_download import StagedFile
 
 logger = logging.getLogger(__name__)
 
 BASE_UPLOAD_DIR = Path('uploads/dou')
 DEFAULT_RECHECK_DAYS = 7
 DEFAULT_PDF_RETENTION_MONTHS = 24
+DEFAULT_DOWNLOAD_CONCURRENCY = 4
+DEFAULT_DOWNLOAD_PREFETCH_DAYS = 2
 
 
 def secoes_configuradas() -> tuple[str, ...]:
@@ -61,6 +80,20 @@ def recheck_days() -> int:
         return DEFAULT_RECHECK_DAYS
 
 
+def download_concurrency() -> int:
+    try:
+        return max(1, int(os.environ.get('DOU_DOWNLOAD_CONCURRENCY', DEFAULT_DOWNLOAD_CONCURRENCY)))
+    except ValueError:
+        return DEFAULT_DOWNLOAD_CONCURRENCY
+
+
+def download_prefetch_days() -> int:
+    try:
+        return max(0, int(os.environ.get('DOU_DOWNLOAD_PREFETCH_DAYS', DEFAULT_DOWNLOAD_PREFETCH_DAYS)))
+    except ValueError:
+        return DEFAULT_DOWNLOAD_PREFETCH_DAYS
+
+
 def storage_dir(data: date) -> Path:
     """uploads/dou/YYYY/MM/DD — sempre relativo (dev e produção têm raízes diferentes)."""
     return BASE_UPLOAD_DIR / data.strftime('%Y') / data.strftime('%m') / data.strftime('%d')
@@ -74,17 +107,99 @@ def _pdf_secao(secao: str) -> str | None:
     return secao.lower() if secao.lower() in DouEdition.PDF_SECTIONS else None
 
 
+# ------------------------------------------------------------------ download
+
+class DownloadStage:
+    """Downloads do INLABS em paralelo, consumidos em ordem pela ingestão.
+
+    `prefetch_*` agenda; `xml`/`pdf` devolvem o StagedFile baixado (ou None
+    para "não publicado") ou levantam a InlabsError do download. O arquivo
+    fica com nome temporário no diretório da data (ou em `staging_dir`, no
+    dry-run): quem consome publica ou descarta. Banco continua na thread da
+    ingestão. Com concorrência 1 não há threads nem prefetch.
+    """
+
+    def __init__(self, client, concurrency: int | None = None,
+                 staging_dir: Path | None = None):
+        self.client = client
+        self.concurrency = concurrency or download_concurrency()
+        self.staging_dir = staging_dir
+        self._executor = (ThreadPoolExecutor(max_workers=self.concurrency,
+                                             thread_name_prefix='dou-download')
+                          if self.concurrency > 1 else None)
+        self._pendentes: dict[tuple, Future] = {}
+
+    def _agendar(self, chave: tuple, fn, *args) -> None:
+        if self._executor is not None and chave not in self._pendentes:
+            self._pendentes[chave] = self._executor.submit(fn, *args)
+
+    def _consumir(self, chave: tuple, fn, *args):
+        futuro = self._pendentes.pop(chave, None)
+        if futuro is None:
+            return fn(*args)
+        return futuro.result()
+
+    def _diretorio(self, data: date) -> Path:
+        return self.staging_dir or storage_dir(data)
+
+    def prefetch_xml(self, data: date, secoes) -> None:
+        for secao in secoes:
+            self._agendar(('xml', data, secao), self.client.download_xml_zip_to,
+                          data, secao, self._diretorio(data))
+
+    def xml(self, data: date, secao: str) -> StagedFile | None:
+        return self._consumir(('xml', data, secao), self.client.download_xml_zip_to,
+                              data, secao, self._diretorio(data))
+
+    def prefetch_pdf(self, data: date, pdf_secao: str) -> None:
+        self._agendar(('pdf', data, pdf_secao), self.client.download_pdf_to,
+                      data, pdf_secao, self._diretorio(data))
+
+    def pdf(self, data: date, pdf_secao: str) -> StagedFile | None:
+        return self._consumir(('pdf', data, pdf_secao), self.client.download_pdf_to,
+                              data, pdf_secao, self._diretorio(data))
+
+    def descartar_pdf(self, data: date, pdf_secao: str) -> None:
+        """Edição falhou no parse: o PDF adiantado não será gravado."""
+        futuro = self._pendentes.pop(('pdf', data, pdf_secao), None)
+        if futuro is not None:
+            _descartar(futuro)
+
+    def close(self) -> None:
+        for futuro in self._pendentes.values():
+            _descartar(futuro)
+        self._pendentes.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+def _descartar(futuro: Future) -> None:
+    """Cancela o download; se já começou, apaga o temporário quando terminar."""
+    if futuro.cancel():
+        return
+
+    def _apagar(f: Future) -> None:
+        if not f.cancelled() and f.exception() is None and f.result() is not None:
+            f.result().discard()
+
+    futuro.add_done_callback(_apagar)
+
+
 # ----------------------------------------------------------------- ingestão
 
-def ingest_zip_bytes(edition: DouEdition, zip_bytes: bytes) -> tuple[int, int]:
+def ingest_zip_bytes(edition: DouEdition, zip_bytes: bytes | str | Path) -> tuple[int, int]:
     """Descompacta o ZIP, parseia cada XML e faz upsert. Devolve (inseridas, atualizadas).
 
+    Aceita o conteúdo em memória ou o caminho do ZIP em disco — a captura
+    passa o caminho, e as matérias são lidas uma a uma do arquivo.
+
     Um XML malformado — ou hostil — não derruba a edição inteira: a matéria é
     registrada em log e o laço segue para a próxima.
     """
     inseridas = atualizadas = 0
 
-    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as z:
+    origem = io.BytesIO(zip_bytes) if isinstance(zip_bytes, bytes) else zip_bytes
+    with zipfile.ZipFile(origem) as z:
         for nome in z.namelist():
             if not nome.lower().endswith('.xml'):
                 continue
@@ -117,36 +232,47 @@ def ingest_zip_bytes(edition: DouEdition, zip_bytes: bytes) -> tuple[int, int]:
     return inseridas, atualizadas
 
 
-def _baixar_pdf(client, data: date, secao: str, edition: DouEdition, destino: Path) -> None:
+def _baixar_pdf(downloads: DownloadStage, data: date, secao: str, edition: DouEdition,
+                destino: Path) -> None:
     """Baixa o PDF assinado da seção, quando ela tem um. Falha aqui não derruba o XML."""
     pdf_secao = _pdf_secao(secao)
     if not pdf_secao:
         return
     try:
-        conteudo = client.download_pdf(data, pdf_secao)
+        arquivo = downloads.pdf(data, pdf_secao)
     except inlabs_client.InlabsError as exc:
         logger.warning('DOU: PDF %s %s falhou (%s) — XML preservado', data, secao, exc)
         return
-    if conteudo is None:
+    if arquivo is None:
         return
 
-    destino.mkdir(parents=True, exist_ok=True)
-    caminho = destino / inlabs_client.pdf_filename(data, pdf_secao)
-    caminho.write_bytes(conteudo)
+    caminho = arquivo.publish(destino / inlabs_client.pdf_filename(data, pdf_secao))
     edition.pdf_path = str(caminho)
-    edition.pdf_bytes = len(conteudo)
+    edition.pdf_bytes = arquivo.size
     edition.pdf_purged_at = None
 
 
 def ingest_date(data: date, secoes=None, with_pdf: bool = True,
-                dry_run: bool = False, client=None) -> dict:
+                dry_run: bool = False, client=None,
+                downloads: DownloadStage | None = None) -> dict:
     """Captura uma data inteira. Devolve o resumo agregado das seções.
 
     Commit por (dia, seção): uma execução interrompida retoma sem perder o que
-    já fez e sem duplicar.
+    já fez e sem duplicar. `downloads` é o estágio compartilhado de uma
+    execução de várias datas; sem ele, um estágio próprio baixa as seções da
+    data em paralelo.
     """
     secoes = tuple(secoes) if secoes else secoes_configuradas()
-    client = client or inlabs_client.InlabsClient()
+    if downloads is None:
+        client = client or inlabs_client.InlabsClient(pool_size=download_concurrency())
+        downloads = DownloadStage(client, staging_dir=_staging_dry_run() if dry_run else None)
+        try:
+            return ingest_date(data, secoes, with_pdf=with_pdf, dry_run=dry_run,
+                               client=client, downloads=downloads)
+        finally:
+            downloads.close()
+
+    downloads.prefetch_xml(data, secoes)
 
     resumo = {
         'data': data.isoformat(), 'edicoes_baixadas': 0, 'materias_inseridas': 0,
@@ -168,7 +294,7 @@ def ingest_date(data: date, secoes=None, with_pdf: bool = True,
 
     for secao in secoes:
         try:
-            conteudo = client.download_xml_zip(data, secao)
+            arquivo = downloads.xml(data, secao)
         except inlabs_client.InlabsError as exc:
             logger.error('DOU: download de %s %s falhou: %s', data, secao, exc)
             resumo['erros'] += 1
@@ -178,19 +304,22 @@ def ingest_date(data: date, secoes=None, with_pdf: bool = True,
             resumo['detalhes'].append({'secao': secao, 'resultado': 'erro', 'erro': str(exc)})
             continue
 
-        if conteudo is None:
+        if arquivo is None:
             resumo['nao_publicados'] += 1
             if not dry_run:
                 _marcar_status(data, secao, DouEdition.STATUS_NOT_PUBLISHED)
             resumo['detalhes'].append({'secao': secao, 'resultado': 'nao_publicado'})
             continue
 
-        assinatura = hashlib.sha256(conteudo).hexdigest()
+        # SHA-256 calculado durante o download, sem reler o arquivo
+        assinatura = arquivo.sha256
         edition = _obter_edicao(data, secao) if not dry_run else None
 
-        # Assinatura igual → o ZIP não mudou. Descarta sem tocar disco nem banco.
+        # Assinatura igual → o ZIP não mudou. Descarta sem tocar o arquivo
+        # definitivo nem o banco.
         if edition is not None and edition.content_signature == assinatura \
                 and edition.status == DouEdition.STATUS_PARSED:
+            arquivo.discard()
             resumo['detalhes'].append({'secao': secao, 'resultado': 'inalterado'})
             continue
 
@@ -198,8 +327,9 @@ def ingest_date(data: date, secoes=None, with_pdf: bool = True,
         resumo['edicoes_baixadas'] += 1
 
         if dry_run:
+            arquivo.discard()
             resumo['detalhes'].append({'secao': secao, 'resultado': 'baixaria',
-                                       'bytes': len(conteudo)})
+                                       'bytes': arquivo.size})
             continue
 
         # Nada vai para o disco antes de provar que é um ZIP. A gravação
@@ -207,10 +337,11 @@ def ingest_date(data: date, secoes=None, with_pdf: bool = True,
         # disco: quando o INLABS devolveu a página HTML do portal para uma data
         # de fim de semana, ficaram 12 arquivos .zip que eram HTML. Qualquer
         # download corrompido ou truncado cairia no mesmo buraco.
-        if not zipfile.is_zipfile(io.BytesIO(conteudo)):
-            amostra = conteudo[:80].decode('utf-8', 'replace').replace('\n', ' ')
+        if not zipfile.is_zipfile(arquivo.path):
+            amostra = arquivo.head(80).decode('utf-8', 'replace').replace('\n', ' ')
+            arquivo.discard()
             mensagem = (f'resposta do INLABS não é um ZIP '
-                        f'({len(conteudo)} bytes; começa com "{amostra}")')
+                        f'({arquivo.size} bytes; começa com "{amostra}")')
             logger.error('DOU: %s %s — %s', data, secao, mensagem)
             resumo['erros'] += 1
             _marcar_erro(data, secao, mensagem)
@@ -218,21 +349,24 @@ def ingest_date(data: date, secoes=None, with_pdf: bool = True,
                                        'erro': mensagem})
             continue
 
+        # O PDF baixa enquanto o ZIP é parseado; só para edição que mudou
+        pdf_secao = _pdf_secao(secao) if with_pdf else None
+        if pdf_secao:
+            downloads.prefetch_pdf(data, pdf_secao)
+
         try:
             destino = storage_dir(data)
-            destino.mkdir(parents=True, exist_ok=True)
-            caminho_zip = destino / inlabs_client.xml_filename(data, secao)
-            caminho_zip.write_bytes(conteudo)
+            caminho_zip = arquivo.publish(destino / inlabs_client.xml_filename(data, secao))
 
             edition.zip_path = str(caminho_zip)
-            edition.zip_bytes = len(conteudo)
+            edition.zip_bytes = arquivo.size
             edition.content_signature = assinatura
             edition.status = DouEdition.STATUS_DOWNLOADED
             edition.baixado_em = datetime.now()
             edition.error_message = None
             db.session.flush()
 
-            inseridas, atualizadas = ingest_zip_bytes(edition, conteudo)
+            inseridas, atualizadas = ingest_zip_bytes(edition, caminho_zip)
 
             # flush antes de contar: as matérias novas ainda estão pendentes na
             # sessão e não apareceriam no COUNT
@@ -242,7 +376,7 @@ def ingest_date(data: date, secoes=None, with_pdf: bool = True,
             edition.processado_em = datetime.now()
 
             if with_pdf:
-                _baixar_pdf(client, data, secao, edition, destino)
+                _baixar_pdf(downloads, data, secao, edition, destino)
 
             db.session.commit()
 
@@ -276,15 +410,24 @@ def ingest_date(data: date, secoes=None, with_pdf: bool = True,
             })
 
         except Exception as exc:  # noqa: BLE001 — erro de uma seção não derruba as outras
+            if pdf_secao:
+                downloads.descartar_pdf(data, pdf_secao)
             db.session.rollback()
             logger.exception('DOU: falha ao processar %s %s', data, secao)
             resumo['erros'] += 1
             _marcar_erro(data, secao, str(exc))
             resumo['detalhes'].append({'secao': secao, 'resultado': 'erro', 'erro': str(exc)})
+        finally:
+            arquivo.discard()  # sem efeito quando já publicado
 
     return resumo
 
 
+def _staging_dry_run() -> Path:
+    """Dry-run baixa para medir, mas não escreve nada em uploads/dou."""
+    return Path(tempfile.gettempdir())
+
+
 def _obter_edicao(data: date, secao: str) -> DouEdition:
     edition = DouEdition.query.filter_by(data_publicacao=data, secao=secao).first()
     if edition is None:
@@ -316,8 +459,19 @@ def _marcar_erro(data: date, secao: str, mensagem: str) -> None:
 
 # ---------------------------------------------------------------- execuções
 
-def _executar(modo: str, datas, with_pdf: bool, dry_run: bool) -> DouSyncRun:
-    """Roda a ingestão sobre uma lista de datas, com auditoria em DouSyncRun."""
+def _acumular(run: DouSyncRun, resumo: dict) -> None:
+    run.edicoes_baixadas += resumo['edicoes_baixadas']
+    run.materias_inseridas += resumo['materias_inseridas']
+    run.materias_atualizadas += resumo['materias_atualizadas']
+    run.nao_publicados += resumo['nao_publicados']
+    run.erros += resumo['erros']
+
+
+def _executar(modo: str, datas, with_pdf: bool, dry_run: bool, client=None) -> DouSyncRun:
+    """Roda a ingestão sobre uma lista de datas, com auditoria em DouSyncRun.
+
+    Uma sessão do INLABS e um estágio de download para todas as datas; os
+    ZIPs das próximas datas são adiantados numa janela curta."""
     # Os contadores são inicializados explicitamente, e não pelo default da
     # coluna: em dry-run o objeto nunca é gravado, o default do INSERT nunca
     # roda, e os atributos ficariam None — o primeiro `+=` estouraria TypeError.
@@ -330,7 +484,7 @@ def _executar(modo: str, datas, with_pdf: bool, dry_run: bool) -> DouSyncRun:
         db.session.add(run)
         db.session.commit()
 
-    client = inlabs_client.InlabsClient()
+    client = client or inlabs_client.InlabsClient(pool_size=download_concurrency())
     detalhes = []
 
     try:
@@ -345,14 +499,19 @@ def _executar(modo: str, datas, with_pdf: bool, dry_run: bool) -> DouSyncRun:
             db.session.commit()
         return run
 
-    for data in datas:
-        resumo = ingest_date(data, with_pdf=with_pdf, dry_run=dry_run, client=client)
-        run.edicoes_baixadas += resumo['edicoes_baixadas']
-        run.materias_inseridas += resumo['materias_inseridas']
-        run.materias_atualizadas += resumo['materias_atualizadas']
-        run.nao_publicados += resumo['nao_publicados']
-        run.erros += resumo['erros']
-        detalhes.append(resumo)
+    secoes = secoes_configuradas()
+    janela = download_prefetch_days()
+    downloads = DownloadStage(client, staging_dir=_staging_dry_run() if dry_run else None)
+    try:
+        for indice, data in enumerate(datas):
+            for proxima in datas[indice + 1:indice + 1 + janela]:
+                downloads.prefetch_xml(proxima, secoes)
+            resumo = ingest_date(data, secoes, with_pdf=with_pdf, dry_run=dry_run,
+                                 client=client, downloads=downloads)
+            _acumular(run, resumo)
+            detalhes.append(resumo)
+    finally:
+        downloads.close()
 
     run.finalizado_em = datetime.now()
     run.detalhe_json = {'dias': detalhes}
@@ -370,16 +529,16 @@ def _executar(modo: str, datas, with_pdf: bool, dry_run: bool) -> DouSyncRun:
 
 def sync_recent(recheck: int | None = None, hoje: date | None = None,
                 with_pdf: bool = True, dry_run: bool = False,
-                modo: str = DouSyncRun.MODO_CRON) -> DouSyncRun:
+                modo: str = DouSyncRun.MODO_CRON, client=None) -> DouSyncRun:
     """Modo do cron: hoje mais a janela de reverificação dos dias anteriores."""
     hoje = hoje or date.today()
     janela = recheck if recheck is not None else recheck_days()
     datas = [hoje - timedelta(days=i) for i in range(janela + 1)]
-    return _executar(modo, sorted(datas), with_pdf, dry_run)
+    return _executar(modo, sorted(datas), with_pdf, dry_run, client=client)
 
 
 def backfill(desde: date, ate: date | None = None,
-             with_pdf: bool = True, dry_run: bool = False) -> DouSyncRun:
+             with_pdf: bool = True, dry_run: bool = False, client=None) -> DouSyncRun:
     """Resgate histórico. Commit por dia — interrompível e retomável."""
     ate = ate or date.today()
     datas = []
@@ -387,7 +546,7 @@ def backfill(desde: date, ate: date | None = None,
     while cursor <= ate:
         datas.append(cursor)
         cursor += timedelta(days=1)
-    return _executar(DouSyncRun.MODO_BACKFILL, datas, with_pdf, dry_run)
+    return _executar(DouSyncRun.MODO_BACKFILL, datas, with_pdf, dry_run, client=client)
 
 
 def ingest_single_date(data: date, with_pdf: bool = True,
@@ -0,0 +1,197 @@
+"""
+Resumo por grupo (vigência × CNPJ) das contestações do Painel FAP.
+
+A tela de contestações pagina grupos, não linhas. Antes, cada página fazia
+um GROUP BY sobre fap_web_contestacoes (com outer join no histórico na
+ordenação "atualização") e pulava os grupos anteriores com OFFSET: quanto
+mais funda a página, mais lenta. A tabela fap_web_contestacao_group_summaries
+guarda as chaves de ordenação de cada grupo, e a tela pagina por cursor
+(keyset) num índice dela.
+
+Manutenção: as sincronizações chamam `refresh_groups` com os grupos que
+tocaram, antes do commit — o resumo vai junto com as contestações.
+`refresh_firm` reconstrói o escritório inteiro (backfill).
+
+Ordem da tela (igual à do GROUP BY): chave da ordenação desc — grupos sem
+a data no fim, como o DESC do MySQL/SQLite já faz com NULL —, depois
+vigência desc e CNPJ asc. O cursor carrega (chave, vigência, CNPJ) do
+último (ou primeiro) grupo da página.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, delete, func, insert, literal, or_, select, tuple_
+
+from app.models import (
+    db, FapWebContestacao, FapWebContestacaoChangeHistory, FapWebContestacaoGroupSummary,
+)
+
+REFRESH_BATCH_SIZE = 500
+
+# Ordenação da tela → coluna do resumo e expressão equivalente sobre as
+# linhas (MAX por grupo). 'padrao' não tem chave: vigência desc, CNPJ asc.
+SORT_KEYS = ('padrao', 'dou', 'transmissao', 'cadastro', 'atualizacao')
+
+_SUMMARY_COLUMNS = {
+    'dou': FapWebContestacaoGroupSummary.max_data_dou,
+    'transmissao': FapWebContestacaoGroupSummary.max_data_transmissao,
+    'cadastro': FapWebContestacaoGroupSummary.max_created_at,
+    'atualizacao': FapWebContestacaoGroupSummary.last_updated_at,
+}
+
+
+def summary_sort_column(sort: str):
+    """Coluna do resumo com a chave da ordenação (None na ordenação padrão)."""
+    return _SUMMARY_COLUMNS.get(sort)
+
+
+def rows_sort_expression(sort: str):
+    """Mesma chave calculada sobre as linhas (exige o join do histórico em 'atualizacao')."""
+    return {
+        'dou': func.max(FapWebContestacao.data_dou_date),
+        'transmissao': func.max(FapWebContestacao.data_transmissao),
+        'cadastro': func.max(FapWebContestacao.created_at),
+        'atualizacao': func.max(FapWebContestacaoChangeHistory.synced_at),
+    }.get(sort)
+
+
+def history_join_condition():
+    """ON do outer join com o histórico de mudanças reais (change_type='updated')."""
+    return and_(
+        FapWebContestacaoChangeHistory.contestacao_db_id == FapWebContestacao.id,
+        FapWebContestacaoChangeHistory.change_type == 'updated',
+    )
+
+
+# ---------------------------------------------------------------------------
+# Manutenção
+# ---------------------------------------------------------------------------
+
+def _aggregate(law_firm_id):
+    W, H = FapWebContestacao, FapWebContestacaoChangeHistory
+    return (
+        select(
+            W.law_firm_id, W.ano_vigencia, W.cnpj,
+            func.max(W.cnpj_raiz),
+            # DISTINCT: o join do histórico repete a linha a cada mudança
+            func.count(func.distinct(W.id)),
+            func.max(W.data_dou_date),
+            func.max(W.data_transmissao),
+            func.max(W.created_at),
+            func.max(H.synced_at),
+            literal(datetime.now(), type_=db.DateTime),
+        )
+        .select_from(W)
+        .outerjoin(H, history_join_condition())
+        .where(W.law_firm_id == law_firm_id)
+        .group_by(W.law_firm_id, W.ano_vigencia, W.cnpj)
+    )
+
+
+_INSERT_COLUMNS = [
+    'law_firm_id', 'ano_vigencia', 'cnpj', 'cnpj_raiz', 'contestacao_count',
+    'max_data_dou', 'max_data_transmissao', 'max_created_at', 'last_updated_at', 'refreshed_at',
+]
+
+
+def refresh_groups(law_firm_id, keys) -> int:
+    """Recalcula o resumo dos grupos (ano_vigencia, cnpj) informados.
+
+    Grupos que ficaram sem contestação saem do resumo. Não faz commit: quem
+    grava as contestações chama antes do próprio commit. Retorna o nº de
+    grupos recalculados.
+    """
+    Summary = FapWebContestacaoGroupSummary
+    keys = sorted({(int(ano), str(cnpj)) for ano, cnpj in keys if ano is not None and cnpj})
+    for start in range(0, len(keys), REFRESH_BATCH_SIZE):
+        batch = keys[start:start + REFRESH_BATCH_SIZE]
+        db.session.execute(
+            delete(Summary)
+            .where(Summary.law_firm_id == law_firm_id)
+            .where(tuple_(Summary.ano_vigencia, Summary.cnpj).in_(batch))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            insert(Summary).from_select(
+                _INSERT_COLUMNS,
+                _aggregate(law_firm_id).where(
+                    tuple_(FapWebContestacao.ano_vigencia, FapWebContestacao.cnpj).in_(batch),
+                ),
+            )
+        )
+    return len(keys)
+
+
+def refresh_firm(law_firm_id) -> int:
+    """Reconstrói o resumo inteiro do escritório (backfill). Não faz commit."""
+    Summary = FapWebContestacaoGroupSummary
+    db.session.execute(
+        delete(Summary)
+        .where(Summary.law_firm_id == law_firm_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(insert(Summary).from_select(_INSERT_COLUMNS, _aggregate(law_firm_id)))
+    return db.session.query(func.count(Summary.id)).filter(Summary.law_firm_id == law_firm_id).scalar() or 0
+
+
+# ---------------------------------------------------------------------------
+# Paginação por cursor
+# ---------------------------------------------------------------------------
+
+def encode_cursor(sort: str, key, ano_vigencia: int, cnpj: str) -> str:
+    """Token opaco (base64 de JSON) com a posição de um grupo na ordenação."""
+    if isinstance(key, (date, datetime)):
+        key = key.isoformat()
+    payload = json.dumps([sort, key, ano_vigencia, cnpj], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str, sort: str):
+    """(chave, vigência, CNPJ) do token, ou None se inválido/de outra ordenação."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        cur_sort, key, ano, cnpj = json.loads(raw)
+        if cur_sort != sort or not isinstance(cnpj, str):
+            return None
+        if sort == 'padrao':
+            key = None
+        elif key is not None:
+            key = date.fromisoformat(key) if sort == 'dou' else datetime.fromisoformat(key)
+        return key, int(ano), cnpj
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+def order_by(sort_expr, ano_expr, cnpj_expr, reverse: bool = False) -> list:
+    """ORDER BY da tela (ou o inverso, para buscar a página anterior)."""
+    if reverse:
+        keys = [ano_expr.asc(), cnpj_expr.desc()]
+        return ([sort_expr.asc()] if sort_expr is not None else []) + keys
+    keys = [ano_expr.desc(), cnpj_expr.asc()]
+    return ([sort_expr.desc()] if sort_expr is not None else []) + keys
+
+
+def keyset_condition(sort_expr, ano_expr, cnpj_expr, cursor, before: bool = False):
+    """Grupos depois (ou antes) do cursor na ordem de `order_by`.
+
+    NULL na chave fica depois de qualquer data (fim da ordem desc).
+    """
+    key, ano, cnpj = cursor
+    if before:
+        tail = or_(ano_expr > ano, and_(ano_expr == ano, cnpj_expr < cnpj))
+        if sort_expr is None:
+            return tail
+        if key is None:
+            return or_(sort_expr.isnot(None), and_(sort_expr.is_(None), tail))
+        return and_(sort_expr.isnot(None), or_(sort_expr > key, and_(sort_expr == key, tail)))
+
+    tail = or_(ano_expr < ano, and_(ano_expr == ano, cnpj_expr > cnpj))
+    if sort_expr is None:
+        return tail
+    if key is None:
+        return and_(sort_expr.is_(None), tail)
+    return or_(sort_expr < key, sort_expr.is_(None), and_(sort_expr == key, tail))
@@ -11,6 +11,8 @@ from time import perf_counter
 
 from rich import print
 from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import load_only
 
 from app.agents.fap.fap_contestation_judgment_metadata_agent import (
     FapContestationJudgmentMetadataAgent,
@@ -33,6 +35,7 @@ from app.models import (
     FapContestationTurnoverRateSourceHistory,
     db,
 )
+from app.services import benefit_search_service, fap_data_version
 from app.services.open_cnpj_service import OpenCNPJService
 
 
@@ -47,6 +50,8 @@ class FapContestationJudgmentReportService:
         self.metadata_agent = FapContestationJudgmentMetadataAgent()
         self.classifier_agent = FAPContestationClassifierAgent()
         self.open_cnpj_service = OpenCNPJService()
+        # Benefícios tocados pelo último relatório importado (reindexação da busca)
+        self.report_benefit_ids: set[int] = set()
 
     @staticmethod
     def _build_benefit_classification_text(benefit: Benefit) -> str:
@@ -526,6 +531,26 @@ class FapContestationJudgmentReportService:
                 return client
         return None
 
+    def prefetch_establishment_companies(self, law_firm_id: int, cnpjs) -> int:
+        """Aquece o cache da OpenCNPJ para os estabelecimentos de um lote de
+        relatórios que ainda não são clientes do escritório.
+
+        A importação em paralelo passa a achar os dados no cache em vez de
+        cada thread consultar a API. Retorna quantos CNPJs foram resolvidos."""
+        wanted = {self._normalize_cnpj(cnpj) for cnpj in cnpjs or ()}
+        wanted = {cnpj for cnpj in wanted if len(cnpj) == 14}
+        if not wanted:
+            return 0
+
+        known = {
+            self._normalize_cnpj(client_cnpj)
+            for (client_cnpj,) in db.session.query(Client.cnpj).filter(Client.law_firm_id == law_firm_id).all()
+        }
+        missing = sorted(wanted - known)
+        if not missing:
+            return 0
+        return len(self.open_cnpj_service.prefetch_companies(missing))
+
     def _upsert_client_from_cnpj(self, law_firm_id: int, cnpj_raw: str | None) -> tuple[Client | None, dict | None, str | None]:
         cnpj_digits = self._normalize_cnpj(cnpj_raw)
         if len(cnpj_digits) != 14:
@@ -637,6 +662,15 @@ class FapContestationJudgmentReportService:
             .order_by(Benefit.id.asc())
             .all()
         )
+        return self._select_benefit_candidate(candidates, validity_year)
+
+    @classmethod
+    def _select_benefit_candidate(
+        cls,
+        candidates: list[Benefit],
+        validity_year: str | None,
+    ) -> Benefit | None:
+        """Escolhe, entre as linhas do mesmo NB (ordenadas por id), a que recebe o relatório."""
         if not candidates:
             return None
 
@@ -646,7 +680,7 @@ class FapContestationJudgmentReportService:
 
         # 1) O ideal: já existe a linha daquele benefício naquela vigência.
         for candidate in candidates:
-            candidate_years = self._parse_vigencia_years(candidate.fap_vigencia_years)
+            candidate_years = cls._parse_vigencia_years(candidate.fap_vigencia_years)
             if normalized_validity_year in candidate_years:
                 return candidate
 
@@ -658,7 +692,7 @@ class FapContestationJudgmentReportService:
         #    segunda — foi assim que 61 benefícios ficaram duplicados, sempre
         #    em blocos contíguos de id (o mesmo relatório lido duas vezes).
         for candidate in candidates:
-            if not self._parse_vigencia_years(candidate.fap_vigencia_years):
+            if not cls._parse_vigencia_years(candidate.fap_vigencia_years):
                 return candidate
 
         # 3) Todos os candidatos já têm vigência, e nenhuma é esta: aí sim é
@@ -666,6 +700,30 @@ class FapContestationJudgmentReportService:
         #    vigência do FAP, uma linha por vigência.
         return None
 
+    @classmethod
+    def _prefetch_benefit_candidates(
+        cls,
+        law_firm_id: int,
+        benefit_numbers,
+    ) -> dict[str, list[Benefit]]:
+        """Carrega em lotes `IN (...)` todas as linhas dos NBs do relatório, agrupadas por número.
+
+        Cada lista sai ordenada por id, na mesma ordem que `_find_existing_benefit_for_report`
+        usa, para que `_select_benefit_candidate` escolha a mesma linha sem uma consulta por NB.
+        """
+        candidates_by_number: dict[str, list[Benefit]] = {}
+        numbers = sorted({number for number in benefit_numbers if number})
+        for chunk in cls._chunked(numbers):
+            rows = (
+                Benefit.query
+                .filter(Benefit.law_firm_id == law_firm_id, Benefit.benefit_number.in_(chunk))
+                .order_by(Benefit.id.asc())
+                .all()
+            )
+            for benefit in rows:
+                candidates_by_number.setdefault(benefit.benefit_number, []).append(benefit)
+        return candidates_by_number
+
     @staticmethod
     def _rss_mb() -> float:
         """Uso de memória residente (RSS) do processo em MB, para diagnóstico."""
@@ -2173,39 +2231,88 @@ class FapContestationJudgmentReportService:
         except InvalidOperation:
             return None
 
-    @staticmethod
-    def _should_apply_cat_update(cat_id: int, reference_dt, is_new_cat: bool) -> bool:
-        """Decide se a atualização da CAT deve ser aplicada com base na data de referência do arquivo.
+    # Tamanho dos lotes de `IN (...)` e dos INSERTs multi-linha da reconciliação em massa.
+    _BULK_CHUNK_SIZE = 500
 
-        Usa a mesma lógica de `_should_apply_benefit_update`: só sobrescreve dados se o
-        arquivo que está sendo importado for mais recente que o último arquivo já registrado.
-        """
-        if is_new_cat:
-            return True
+    @classmethod
+    def _chunked(cls, values: list, size: int | None = None):
+        size = size or cls._BULK_CHUNK_SIZE
+        for start in range(0, len(values), size):
+            yield values[start:start + size]
 
-        latest_history = (
-            FapContestationCatSourceHistory.query
-            .filter(FapContestationCatSourceHistory.cat_id == cat_id)
-            .filter(
-                db.func.coalesce(
-                    FapContestationCatSourceHistory.publication_datetime,
-                    FapContestationCatSourceHistory.transmission_datetime,
-                ).is_not(None)
-            )
-            .order_by(
-                db.func.coalesce(
-                    FapContestationCatSourceHistory.publication_datetime,
-                    FapContestationCatSourceHistory.transmission_datetime,
-                ).desc()
+    @classmethod
+    def _load_latest_source_references(
+        cls,
+        history_model,
+        fk_column_name: str,
+        entity_ids,
+        report_id: int,
+    ) -> dict[int, dict]:
+        """Referência (publicação ou transmissão) mais recente do histórico de fonte, por entidade.
+
+        Substitui a consulta por linha que decidia se o arquivo importado é mais novo que o
+        último registrado. Devolve ``{entity_id: {'others': dt, 'own': dt}}``, separando a
+        linha do próprio relatório — que o upsert do histórico sobrescreve durante a
+        importação — das linhas dos demais relatórios.
+        """
+        fk_column = getattr(history_model, fk_column_name)
+        reference_expr = db.func.coalesce(
+            history_model.publication_datetime,
+            history_model.transmission_datetime,
+        )
+        is_own_report = db.case((history_model.report_id == report_id, 1), else_=0)
+
+        references: dict[int, dict] = {}
+        ids = sorted({entity_id for entity_id in entity_ids if entity_id is not None})
+        for chunk in cls._chunked(ids):
+            rows = (
+                db.session.query(fk_column, is_own_report, db.func.max(reference_expr))
+                .filter(fk_column.in_(chunk))
+                .group_by(fk_column, is_own_report)
+                .all()
             )
-            .first()
-        )
+            for entity_id, own_flag, latest_reference in rows:
+                entry = references.setdefault(entity_id, {'others': None, 'own': None})
+                entry['own' if own_flag else 'others'] = latest_reference
+        return references
 
-        latest_reference = (
-            latest_history.publication_datetime
-            or latest_history.transmission_datetime
-            if latest_history else None
+    @classmethod
+    def _load_entity_source_references(
+        cls,
+        history_model,
+        fk_column_name: str,
+        entities,
+        report_id: int,
+    ) -> dict:
+        """Variante de `_load_latest_source_references` indexada pelo próprio objeto.
+
+        Linhas criadas durante a importação ainda não têm id; indexar pelo objeto
+        permite que a reconciliação em memória as trate como as já existentes.
+        """
+        entities = list(entities)
+        prefetched = cls._load_latest_source_references(
+            history_model,
+            fk_column_name,
+            (entity.id for entity in entities),
+            report_id,
         )
+        return {
+            entity: prefetched.get(entity.id, {'others': None, 'own': None})
+            for entity in entities
+        }
+
+    @staticmethod
+    def _should_apply_source_update(reference_entry: dict | None, reference_dt, is_new: bool) -> bool:
+        """Só sobrescreve dados se o arquivo importado for mais recente que o último já registrado."""
+        if is_new:
+            return True
+
+        known_references = [
+            value
+            for value in ((reference_entry or {}).get('others'), (reference_entry or {}).get('own'))
+            if value is not None
+        ]
+        latest_reference = max(known_references) if known_references else None
         if latest_reference is None:
             return True
 
@@ -2214,6 +2321,79 @@ class FapContestationJudgmentReportService:
 
         return reference_dt > latest_reference
 
+    @classmethod
+    def _bulk_upsert_source_history(
+        cls,
+        history_model,
+        fk_column_name: str,
+        report: FapContestationJudgmentReport,
+        entries: dict,
+        transmission_dt,
+        publication_dt,
+    ) -> None:
+        """Grava o histórico de fonte do relatório em INSERTs multi-linha (idempotente em concorrência).
+
+        ``entries`` mapeia a entidade (já com id) para ``(action, created_at)``; quando o mesmo
+        registro aparece mais de uma vez no relatório vale a última ação, como no upsert por linha.
+        """
+        rows = [
+            {
+                'law_firm_id': report.law_firm_id,
+                fk_column_name: entity.id,
+                'report_id': report.id,
+                'knowledge_base_id': report.knowledge_base_id,
+                'action': action,
+                'transmission_datetime': transmission_dt,
+                'publication_datetime': publication_dt,
+                'created_at': created_at,
+                'updated_at': datetime.now(),
+            }
+            for entity, (action, created_at) in entries.items()
+        ]
+        is_mysql = db.session.get_bind().dialect.name == 'mysql'
+        for chunk in cls._chunked(rows):
+            if is_mysql:
+                history_insert_stmt = mysql_insert(history_model.__table__).values(chunk)
+                history_upsert_stmt = history_insert_stmt.on_duplicate_key_update(
+                    knowledge_base_id=history_insert_stmt.inserted.knowledge_base_id,
+                    action=history_insert_stmt.inserted.action,
+                    transmission_datetime=history_insert_stmt.inserted.transmission_datetime,
+                    publication_datetime=history_insert_stmt.inserted.publication_datetime,
+                    updated_at=history_insert_stmt.inserted.updated_at,
+                )
+            else:
+                # SQLite (testes): mesma chave única (entidade, relatório)
+                history_insert_stmt = sqlite_insert(history_model.__table__).values(chunk)
+                history_upsert_stmt = history_insert_stmt.on_conflict_do_update(
+                    index_elements=[fk_column_name, 'report_id'],
+                    set_={
+                        'knowledge_base_id': history_insert_stmt.excluded.knowledge_base_id,
+                        'action': history_insert_stmt.excluded.action,
+                        'transmission_datetime': history_insert_stmt.excluded.transmission_datetime,
+                        'publication_datetime': history_insert_stmt.excluded.publication_datetime,
+                        'updated_at': history_insert_stmt.excluded.updated_at,
+                    },
+                )
+            db.session.execute(history_upsert_stmt)
+
+    @staticmethod
+    def _register_source_history(
+        references: dict,
+        history_entries: dict,
+        entity,
+        is_new: bool,
+        own_reference,
+    ) -> None:
+        """Registra em memória a linha de histórico que o relatório grava para a entidade.
+
+        Atualiza também a referência "própria" da entidade, para que uma segunda aparição
+        do mesmo registro no relatório veja o histórico como o upsert por linha deixaria.
+        """
+        _, created_at = history_entries.get(entity, (None, datetime.now()))
+        history_entries[entity] = ('added' if is_new else 'updated', created_at)
+        entry = references.setdefault(entity, {'others': None, 'own': None})
+        entry['own'] = own_reference
+
     @staticmethod
     def _map_status(raw_status: str | None) -> str:
         if not raw_status:
@@ -2232,42 +2412,6 @@ class FapContestationJudgmentReportService:
             return 'pending'
         return 'pending'
 
-    @staticmethod
-    def _should_apply_benefit_update(benefit_id: int, reference_dt, is_new_benefit: bool) -> bool:
-        if is_new_benefit:
-            return True
-
-        latest_history = (
-            BenefitFapSourceHistory.query
-            .filter(BenefitFapSourceHistory.benefit_id == benefit_id)
-            .filter(
-                db.func.coalesce(
-                    BenefitFapSourceHistory.publication_datetime,
-                    BenefitFapSourceHistory.transmission_datetime,
-                ).is_not(None)
-            )
-            .order_by(
-                db.func.coalesce(
-                    BenefitFapSourceHistory.publication_datetime,
-                    BenefitFapSourceHistory.transmission_datetime,
-                ).desc()
-            )
-            .first()
-        )
-
-        latest_reference = (
-            latest_history.publication_datetime
-            or latest_history.transmission_datetime
-            if latest_history else None
-        )
-        if latest_reference is None:
-            return True
-
-        if reference_dt is None:
-            return False
-
-        return reference_dt > latest_reference
-
     @staticmethod
     def _strip_decision_noise(text: str | None) -> str:
         """Remove o despejo de sistema DATAPREV/CONBAS do fim do texto.
@@ -2323,17 +2467,61 @@ class FapContestationJudgmentReportService:
             })
         return decisions
 
+    @classmethod
+    def _prefetch_benefit_decisions(
+        cls,
+        law_firm_id: int,
+        benefit_ids,
+    ) -> tuple[dict[tuple[int, str], BenefitContestationDecision], dict[tuple[int, int], int]]:
+        """Carrega em lotes as análises já gravadas dos benefícios do relatório.
+
+        Devolve o índice ``(benefit_id, fingerprint) -> decisão`` usado no upsert por
+        conteúdo e a contagem ``(benefit_id, instancia) -> análises`` que inicializa
+        o `sequence` das novas análises.
+        """
+        decisions_by_fingerprint: dict[tuple[int, str], BenefitContestationDecision] = {}
+        decision_counts: dict[tuple[int, int], int] = {}
+        ids = sorted({benefit_id for benefit_id in benefit_ids if benefit_id is not None})
+        for chunk in cls._chunked(ids):
+            decisions = (
+                BenefitContestationDecision.query
+                .options(load_only(
+                    BenefitContestationDecision.id,
+                    BenefitContestationDecision.benefit_id,
+                    BenefitContestationDecision.instancia,
+                    BenefitContestationDecision.fingerprint,
+                    BenefitContestationDecision.report_id,
+                    BenefitContestationDecision.status,
+                    BenefitContestationDecision.status_raw,
+                    BenefitContestationDecision.updated_at,
+                ))
+                .filter(
+                    BenefitContestationDecision.law_firm_id == law_firm_id,
+                    BenefitContestationDecision.benefit_id.in_(chunk),
+                )
+                .all()
+            )
+            for decision in decisions:
+                decisions_by_fingerprint.setdefault((decision.benefit_id, decision.fingerprint), decision)
+                count_key = (decision.benefit_id, decision.instancia)
+                decision_counts[count_key] = decision_counts.get(count_key, 0) + 1
+        return decisions_by_fingerprint, decision_counts
+
     def _upsert_benefit_decisions(
         self,
         report: FapContestationJudgmentReport,
         benefit: Benefit,
         item: dict,
         seq_state: dict[tuple[int, int], int],
+        decisions_by_fingerprint: dict[tuple[int, str], BenefitContestationDecision],
     ) -> tuple[int, int]:
         """Cria/atualiza as decisões de um bloco. Retorna (criadas, atualizadas).
 
         seq_state mapeia (benefit_id, instancia) -> próximo sequence, garantindo
-        ordenação estável das sub-abas entre blocos do mesmo relatório.
+        ordenação estável das sub-abas entre blocos do mesmo relatório; vem
+        inicializado com as contagens de `_prefetch_benefit_decisions`.
+        decisions_by_fingerprint é o índice pré-carregado, atualizado aqui com as
+        análises criadas para que blocos repetidos do relatório as reaproveitem.
         """
         created = 0
         updated = 0
@@ -2341,11 +2529,7 @@ class FapContestationJudgmentReportService:
             fingerprint = self._decision_fingerprint(
                 dec['instancia'], dec['justification'], dec['opinion']
             )
-            existing = BenefitContestationDecision.query.filter_by(
-                law_firm_id=report.law_firm_id,
-                benefit_id=benefit.id,
-                fingerprint=fingerprint,
-            ).first()
+            existing = decisions_by_fingerprint.get((benefit.id, fingerprint))
 
             if existing is not None:
                 existing.report_id = report.id
@@ -2356,20 +2540,10 @@ class FapContestationJudgmentReportService:
                 continue
 
             key = (benefit.id, dec['instancia'])
-            if key not in seq_state:
-                seq_state[key] = (
-                    BenefitContestationDecision.query
-                    .filter_by(
-                        law_firm_id=report.law_firm_id,
-                        benefit_id=benefit.id,
-                        instancia=dec['instancia'],
-                    )
-                    .count()
-                )
-            sequence = seq_state[key]
+            sequence = seq_state.get(key, 0)
             seq_state[key] = sequence + 1
 
-            db.session.add(BenefitContestationDecision(
+            decision = BenefitContestationDecision(
                 law_firm_id=report.law_firm_id,
                 benefit_id=benefit.id,
                 report_id=report.id,
@@ -2380,7 +2554,9 @@ class FapContestationJudgmentReportService:
                 justification=dec['justification'],
                 opinion=dec['opinion'],
                 fingerprint=fingerprint,
-            ))
+            )
+            db.session.add(decision)
+            decisions_by_fingerprint[(benefit.id, fingerprint)] = decision
             created += 1
         return created, updated
 
@@ -2390,7 +2566,19 @@ class FapContestationJudgmentReportService:
         extracted_benefits: list[dict],
         metadata,
     ) -> int:
+        """Reconcilia em massa os benefícios do relatório com a tabela `benefits`.
+
+        As linhas candidatas, o histórico de fonte e as análises já gravadas são
+        pré-carregados em lotes `IN (...)`; a escolha da linha por vigência e a
+        decisão de sobrescrever rodam em memória, na ordem dos blocos do PDF, e
+        as escritas saem em um único flush e em INSERTs multi-linha. O número de
+        idas ao banco deixa de crescer com a quantidade de blocos.
+
+        Os ids dos benefícios do relatório ficam em ``self.report_benefit_ids``
+        para a reindexação da busca depois do commit.
+        """
         imported_count = 0
+        self.report_benefit_ids = set()
 
         if not extracted_benefits:
             return 0
@@ -2428,11 +2616,21 @@ class FapContestationJudgmentReportService:
         empty_number_count = 0
         number_counts: dict[str, int] = {}
 
-        # Estado das decisões (uma linha por análise de contestação).
-        seq_state: dict[tuple[int, int], int] = {}
-        decisions_created = 0
-        decisions_updated = 0
+        # ── Pré-carga em lotes ──────────────────────────────────────────
+        candidates_by_number = self._prefetch_benefit_candidates(
+            report.law_firm_id,
+            (str(item.get('benefit_number') or '').strip() for item in extracted_benefits),
+        )
+        references = self._load_entity_source_references(
+            BenefitFapSourceHistory,
+            'benefit_id',
+            (benefit for candidates in candidates_by_number.values() for benefit in candidates),
+            report.id,
+        )
+        history_entries: dict[Benefit, tuple[str, datetime]] = {}
+        resolved_blocks: list[tuple[Benefit, dict]] = []
 
+        # ── Reconciliação em memória, na ordem dos blocos ───────────────
         for item in extracted_benefits:
             benefit_number = str(item.get('benefit_number') or '').strip()
             if not benefit_number:
@@ -2441,11 +2639,8 @@ class FapContestationJudgmentReportService:
             number_counts[benefit_number] = number_counts.get(benefit_number, 0) + 1
 
             is_new_benefit = False
-            benefit = self._find_existing_benefit_for_report(
-                law_firm_id=report.law_firm_id,
-                benefit_number=benefit_number,
-                validity_year=validity_year,
-            )
+            candidates = candidates_by_number.setdefault(benefit_number, [])
+            benefit = self._select_benefit_candidate(candidates, validity_year)
 
             if benefit is None:
                 is_new_benefit = True
@@ -2454,13 +2649,13 @@ class FapContestationJudgmentReportService:
                     benefit_number=benefit_number,
                 )
                 db.session.add(benefit)
+                # Linhas novas recebem id maior que as existentes: entram no fim da lista.
+                candidates.append(benefit)
 
-            db.session.flush()
-
-            should_apply_update = self._should_apply_benefit_update(
-                benefit_id=benefit.id,
-                reference_dt=reference_dt,
-                is_new_benefit=is_new_benefit,
+            should_apply_update = self._should_apply_source_update(
+                references.get(benefit),
+                reference_dt,
+                is_new_benefit,
             )
 
             if should_apply_update:
@@ -2520,34 +2715,41 @@ class FapContestationJudgmentReportService:
 
                 benefit.updated_at = datetime.now()
 
-            history_now = datetime.now()
-            history_insert_stmt = mysql_insert(BenefitFapSourceHistory.__table__).values(
-                law_firm_id=report.law_firm_id,
-                benefit_id=benefit.id,
-                report_id=report.id,
-                knowledge_base_id=report.knowledge_base_id,
-                action='added' if is_new_benefit else 'updated',
-                transmission_datetime=transmission_dt,
-                publication_datetime=publication_dt,
-                created_at=history_now,
-                updated_at=history_now,
-            )
-            history_upsert_stmt = history_insert_stmt.on_duplicate_key_update(
-                knowledge_base_id=history_insert_stmt.inserted.knowledge_base_id,
-                action=history_insert_stmt.inserted.action,
-                transmission_datetime=history_insert_stmt.inserted.transmission_datetime,
-                publication_datetime=history_insert_stmt.inserted.publication_datetime,
-                updated_at=history_insert_stmt.inserted.updated_at,
+            self._register_source_history(
+                references, history_entries, benefit, is_new_benefit, publication_dt or transmission_dt,
             )
-            db.session.execute(history_upsert_stmt)
-
-            d_created, d_updated = self._upsert_benefit_decisions(report, benefit, item, seq_state)
-            decisions_created += d_created
-            decisions_updated += d_updated
+            resolved_blocks.append((benefit, item))
 
             if should_apply_update:
                 imported_count += 1
 
+        # ── Escritas em lote ────────────────────────────────────────────
+        # Um único flush atribui id às linhas novas antes do histórico e das análises.
+        db.session.flush()
+        self.report_benefit_ids = {benefit.id for benefit, _ in resolved_blocks}
+
+        self._bulk_upsert_source_history(
+            BenefitFapSourceHistory,
+            'benefit_id',
+            report,
+            history_entries,
+            transmission_dt,
+            publication_dt,
+        )
+
+        decisions_by_fingerprint, seq_state = self._prefetch_benefit_decisions(
+            report.law_firm_id,
+            (benefit.id for benefit in history_entries),
+        )
+        decisions_created = 0
+        decisions_updated = 0
+        for benefit, item in resolved_blocks:
+            d_created, d_updated = self._upsert_benefit_decisions(
+                report, benefit, item, seq_state, decisions_by_fingerprint,
+            )
+            decisions_created += d_created
+            decisions_updated += d_updated
+
         # ── Detalhamento (diagnóstico) ──────────────────────────────────
         total_blocks = len(extracted_benefits)
         distinct_numbers = len(number_counts)
@@ -2614,16 +2816,25 @@ class FapContestationJudgmentReportService:
                 vigencia_year_raw=metadata_vigencia,
             )
 
+        cats_by_number: dict[str, FapContestationCat] = {}
+        for existing_cat in (
+            FapContestationCat.query
+            .filter_by(law_firm_id=report.law_firm_id, report_id=report.id)
+            .order_by(FapContestationCat.id.asc())
+            .all()
+        ):
+            cats_by_number.setdefault(existing_cat.cat_number, existing_cat)
+        references = self._load_entity_source_references(
+            FapContestationCatSourceHistory, 'cat_id', cats_by_number.values(), report.id,
+        )
+        history_entries: dict[FapContestationCat, tuple[str, datetime]] = {}
+
         for item in extracted_cats:
             cat_number = str(item.get('benefit_number') or '').strip()
             if not cat_number:
                 continue
 
-            cat = FapContestationCat.query.filter_by(
-                law_firm_id=report.law_firm_id,
-                report_id=report.id,
-                cat_number=cat_number,
-            ).first()
+            cat = cats_by_number.get(cat_number)
 
             is_new_cat = cat is None
             if is_new_cat:
@@ -2633,13 +2844,12 @@ class FapContestationJudgmentReportService:
                     cat_number=cat_number,
                 )
                 db.session.add(cat)
+                cats_by_number[cat_number] = cat
 
-            db.session.flush()
-
-            should_apply_update = self._should_apply_cat_update(
-                cat_id=cat.id,
-                reference_dt=reference_dt,
-                is_new_cat=is_new_cat,
+            should_apply_update = self._should_apply_source_update(
+                references.get(cat),
+                reference_dt,
+                is_new_cat,
             )
 
             if should_apply_update:
@@ -2689,64 +2899,22 @@ class FapContestationJudgmentReportService:
                 cat.updated_at = datetime.now()
                 imported_count += 1
 
-            # Registra histórico de arquivo para rastreabilidade (idempotente em concorrência)
-            cat_history_now = datetime.now()
-            cat_history_insert_stmt = mysql_insert(FapContestationCatSourceHistory.__table__).values(
-                law_firm_id=report.law_firm_id,
-                cat_id=cat.id,
-                report_id=report.id,
-                knowledge_base_id=report.knowledge_base_id,
-                action='added' if is_new_cat else 'updated',
-                transmission_datetime=transmission_dt,
-                publication_datetime=publication_dt,
-                created_at=cat_history_now,
-                updated_at=cat_history_now,
-            )
-            cat_history_upsert_stmt = cat_history_insert_stmt.on_duplicate_key_update(
-                knowledge_base_id=cat_history_insert_stmt.inserted.knowledge_base_id,
-                action=cat_history_insert_stmt.inserted.action,
-                transmission_datetime=cat_history_insert_stmt.inserted.transmission_datetime,
-                publication_datetime=cat_history_insert_stmt.inserted.publication_datetime,
-                updated_at=cat_history_insert_stmt.inserted.updated_at,
+            # Registra histórico de arquivo para rastreabilidade (gravado em lote ao final)
+            self._register_source_history(
+                references, history_entries, cat, is_new_cat, publication_dt or transmission_dt,
             )
-            db.session.execute(cat_history_upsert_stmt)
 
-        return imported_count
-
-    @staticmethod
-    def _should_apply_payroll_mass_update(payroll_mass_id: int, reference_dt, is_new: bool) -> bool:
-        """Decide se a atualização de Massa Salarial deve ser aplicada com base na data de referência."""
-        if is_new:
-            return True
-
-        latest_history = (
-            FapContestationPayrollMassSourceHistory.query
-            .filter(FapContestationPayrollMassSourceHistory.payroll_mass_id == payroll_mass_id)
-            .filter(
-                db.func.coalesce(
-                    FapContestationPayrollMassSourceHistory.publication_datetime,
-                    FapContestationPayrollMassSourceHistory.transmission_datetime,
-                ).is_not(None)
-            )
-            .order_by(
-                db.func.coalesce(
-                    FapContestationPayrollMassSourceHistory.publication_datetime,
-                    FapContestationPayrollMassSourceHistory.transmission_datetime,
-                ).desc()
-            )
-            .first()
+        db.session.flush()
+        self._bulk_upsert_source_history(
+            FapContestationCatSourceHistory,
+            'cat_id',
+            report,
+            history_entries,
+            transmission_dt,
+            publication_dt,
         )
 
-        latest_reference = (
-            latest_history.publication_datetime
-            or latest_history.transmission_datetime
-            if latest_history else None
-        )
-        if latest_reference is None:
-            return True
-        if reference_dt is None:
-            return False
-        return reference_dt > latest_reference
+        return imported_count
 
     def _upsert_payroll_masses_from_report(
         self,
@@ -2789,6 +2957,19 @@ class FapContestationJudgmentReportService:
                 vigencia_year_raw=metadata_vigencia,
             )
 
+        payroll_mass_by_key: dict[tuple[str, str], FapContestationPayrollMass] = {}
+        for existing_row in (
+            FapContestationPayrollMass.query
+            .filter_by(law_firm_id=report.law_firm_id, report_id=report.id)
+            .order_by(FapContestationPayrollMass.id.asc())
+            .all()
+        ):
+            payroll_mass_by_key.setdefault((existing_row.employer_cnpj, existing_row.competence), existing_row)
+        references = self._load_entity_source_references(
+            FapContestationPayrollMassSourceHistory, 'payroll_mass_id', payroll_mass_by_key.values(), report.id,
+        )
+        history_entries: dict[FapContestationPayrollMass, tuple[str, datetime]] = {}
+
         for item in extracted_masses:
             employer_cnpj_raw = item.get('employer_cnpj')
             competence = str(item.get('competence') or '').strip()
@@ -2799,12 +2980,7 @@ class FapContestationJudgmentReportService:
             if not employer_cnpj_digits:
                 continue
 
-            payroll_mass = FapContestationPayrollMass.query.filter_by(
-                law_firm_id=report.law_firm_id,
-                report_id=report.id,
-                employer_cnpj=employer_cnpj_digits,
-                competence=competence,
-            ).first()
+            payroll_mass = payroll_mass_by_key.get((employer_cnpj_digits, competence))
 
             is_new = payroll_mass is None
             if is_new:
@@ -2815,13 +2991,12 @@ class FapContestationJudgmentReportService:
                     competence=competence,
                 )
                 db.session.add(payroll_mass)
+                payroll_mass_by_key[(employer_cnpj_digits, competence)] = payroll_mass
 
-            db.session.flush()
-
-            should_apply_update = self._should_apply_payroll_mass_update(
-                payroll_mass_id=payroll_mass.id,
-                reference_dt=reference_dt,
-                is_new=is_new,
+            should_apply_update = self._should_apply_source_update(
+                references.get(payroll_mass),
+                reference_dt,
+                is_new,
             )
 
             if should_apply_update:
@@ -2868,98 +3043,22 @@ class FapContestationJudgmentReportService:
                 payroll_mass.updated_at = datetime.now()
                 imported_count += 1
 
-            payroll_history_now = datetime.now()
-            payroll_history_insert_stmt = mysql_insert(FapContestationPayrollMassSourceHistory.__table__).values(
-                law_firm_id=report.law_firm_id,
-                payroll_mass_id=payroll_mass.id,
-                report_id=report.id,
-                knowledge_base_id=report.knowledge_base_id,
-                action='added' if is_new else 'updated',
-                transmission_datetime=transmission_dt,
-                publication_datetime=publication_dt,
-                created_at=payroll_history_now,
-                updated_at=payroll_history_now,
-            )
-            payroll_history_upsert_stmt = payroll_history_insert_stmt.on_duplicate_key_update(
-                knowledge_base_id=payroll_history_insert_stmt.inserted.knowledge_base_id,
-                action=payroll_history_insert_stmt.inserted.action,
-                transmission_datetime=payroll_history_insert_stmt.inserted.transmission_datetime,
-                publication_datetime=payroll_history_insert_stmt.inserted.publication_datetime,
-                updated_at=payroll_history_insert_stmt.inserted.updated_at,
-            )
-            db.session.execute(payroll_history_upsert_stmt)
-
-        return imported_count
-
-    @staticmethod
-    def _should_apply_turnover_rate_update(turnover_rate_id: int, reference_dt, is_new: bool) -> bool:
-        """Decide se a atualização de Taxa de Rotatividade deve ser aplicada com base na data de referência."""
-        if is_new:
-            return True
-
-        latest_history = (
-            FapContestationTurnoverRateSourceHistory.query
-            .filter(FapContestationTurnoverRateSourceHistory.turnover_rate_id == turnover_rate_id)
-            .filter(
-                db.func.coalesce(
-                    FapContestationTurnoverRateSourceHistory.publication_datetime,
-                    FapContestationTurnoverRateSourceHistory.transmission_datetime,
-                ).is_not(None)
+            # Histórico de arquivo gravado em lote ao final.
+            self._register_source_history(
+                references, history_entries, payroll_mass, is_new, publication_dt or transmission_dt,
             )
-            .order_by(
-                db.func.coalesce(
-                    FapContestationTurnoverRateSourceHistory.publication_datetime,
-                    FapContestationTurnoverRateSourceHistory.transmission_datetime,
-                ).desc()
-            )
-            .first()
-        )
-
-        latest_reference = (
-            latest_history.publication_datetime
-            or latest_history.transmission_datetime
-            if latest_history else None
-        )
-        if latest_reference is None:
-            return True
-        if reference_dt is None:
-            return False
-        return reference_dt > latest_reference
-
-    @staticmethod
-    def _should_apply_employment_link_update(employment_link_id: int, reference_dt, is_new: bool) -> bool:
-        """Decide se a atualização de Vínculo deve ser aplicada com base na data de referência."""
-        if is_new:
-            return True
 
-        latest_history = (
-            FapContestationEmploymentLinkSourceHistory.query
-            .filter(FapContestationEmploymentLinkSourceHistory.employment_link_id == employment_link_id)
-            .filter(
-                db.func.coalesce(
-                    FapContestationEmploymentLinkSourceHistory.publication_datetime,
-                    FapContestationEmploymentLinkSourceHistory.transmission_datetime,
-                ).is_not(None)
-            )
-            .order_by(
-                db.func.coalesce(
-                    FapContestationEmploymentLinkSourceHistory.publication_datetime,
-                    FapContestationEmploymentLinkSourceHistory.transmission_datetime,
-                ).desc()
-            )
-            .first()
+        db.session.flush()
+        self._bulk_upsert_source_history(
+            FapContestationPayrollMassSourceHistory,
+            'payroll_mass_id',
+            report,
+            history_entries,
+            transmission_dt,
+            publication_dt,
         )
 
-        latest_reference = (
-            latest_history.publication_datetime
-            or latest_history.transmission_datetime
-            if latest_history else None
-        )
-        if latest_reference is None:
-            return True
-        if reference_dt is None:
-            return False
-        return reference_dt > latest_reference
+        return imported_count
 
     def _upsert_employment_links_from_report(
         self,
@@ -3002,6 +3101,19 @@ class FapContestationJudgmentReportService:
                 vigencia_year_raw=metadata_vigencia,
             )
 
+        employment_link_by_key: dict[tuple[str, str], FapContestationEmploymentLink] = {}
+        for existing_row in (
+            FapContestationEmploymentLink.query
+            .filter_by(law_firm_id=report.law_firm_id, report_id=report.id)
+            .order_by(FapContestationEmploymentLink.id.asc())
+            .all()
+        ):
+            employment_link_by_key.setdefault((existing_row.employer_cnpj, existing_row.competence), existing_row)
+        references = self._load_entity_source_references(
+            FapContestationEmploymentLinkSourceHistory, 'employment_link_id', employment_link_by_key.values(), report.id,
+        )
+        history_entries: dict[FapContestationEmploymentLink, tuple[str, datetime]] = {}
+
         for item in extracted_links:
             employer_cnpj_raw = item.get('employer_cnpj')
             competence = str(item.get('competence') or '').strip()
@@ -3012,12 +3124,7 @@ class FapContestationJudgmentReportService:
             if not employer_cnpj_digits:
                 continue
 
-            employment_link = FapContestationEmploymentLink.query.filter_by(
-                law_firm_id=report.law_firm_id,
-                report_id=report.id,
-                employer_cnpj=employer_cnpj_digits,
-                competence=competence,
-            ).first()
+            employment_link = employment_link_by_key.get((employer_cnpj_digits, competence))
 
             is_new = employment_link is None
             if is_new:
@@ -3028,13 +3135,12 @@ class FapContestationJudgmentReportService:
                     competence=competence,
                 )
                 db.session.add(employment_link)
+                employment_link_by_key[(employer_cnpj_digits, competence)] = employment_link
 
-            db.session.flush()
-
-            should_apply_update = self._should_apply_employment_link_update(
-                employment_link_id=employment_link.id,
-                reference_dt=reference_dt,
-                is_new=is_new,
+            should_apply_update = self._should_apply_source_update(
+                references.get(employment_link),
+                reference_dt,
+                is_new,
             )
 
             if should_apply_update:
@@ -3085,26 +3191,20 @@ class FapContestationJudgmentReportService:
                 employment_link.updated_at = datetime.now()
                 imported_count += 1
 
-            employment_history_now = datetime.now()
-            employment_history_insert_stmt = mysql_insert(FapContestationEmploymentLinkSourceHistory.__table__).values(
-                law_firm_id=report.law_firm_id,
-                employment_link_id=employment_link.id,
-                report_id=report.id,
-                knowledge_base_id=report.knowledge_base_id,
-                action='added' if is_new else 'updated',
-                transmission_datetime=transmission_dt,
-                publication_datetime=publication_dt,
-                created_at=employment_history_now,
-                updated_at=employment_history_now,
-            )
-            employment_history_upsert_stmt = employment_history_insert_stmt.on_duplicate_key_update(
-                knowledge_base_id=employment_history_insert_stmt.inserted.knowledge_base_id,
-                action=employment_history_insert_stmt.inserted.action,
-                transmission_datetime=employment_history_insert_stmt.inserted.transmission_datetime,
-                publication_datetime=employment_history_insert_stmt.inserted.publication_datetime,
-                updated_at=employment_history_insert_stmt.inserted.updated_at,
+            # Histórico de arquivo gravado em lote ao final.
+            self._register_source_history(
+                references, history_entries, employment_link, is_new, publication_dt or transmission_dt,
             )
-            db.session.execute(employment_history_upsert_stmt)
+
+        db.session.flush()
+        self._bulk_upsert_source_history(
+            FapContestationEmploymentLinkSourceHistory,
+            'employment_link_id',
+            report,
+            history_entries,
+            transmission_dt,
+            publication_dt,
+        )
 
         return imported_count
 
@@ -3146,6 +3246,19 @@ class FapContestationJudgmentReportService:
                 vigencia_year_raw=metadata_vigencia,
             )
 
+        turnover_rate_by_key: dict[tuple[str, str], FapContestationTurnoverRate] = {}
+        for existing_row in (
+            FapContestationTurnoverRate.query
+            .filter_by(law_firm_id=report.law_firm_id, report_id=report.id)
+            .order_by(FapContestationTurnoverRate.id.asc())
+            .all()
+        ):
+            turnover_rate_by_key.setdefault((existing_row.employer_cnpj, existing_row.year), existing_row)
+        references = self._load_entity_source_references(
+            FapContestationTurnoverRateSourceHistory, 'turnover_rate_id', turnover_rate_by_key.values(), report.id,
+        )
+        history_entries: dict[FapContestationTurnoverRate, tuple[str, datetime]] = {}
+
         for item in extracted_rates:
             employer_cnpj_raw = item.get('employer_cnpj')
             year = str(item.get('year') or '').strip()
@@ -3156,12 +3269,7 @@ class FapContestationJudgmentReportService:
             if not employer_cnpj_digits:
                 continue
 
-            turnover_rate = FapContestationTurnoverRate.query.filter_by(
-                law_firm_id=report.law_firm_id,
-                report_id=report.id,
-                employer_cnpj=employer_cnpj_digits,
-                year=year,
-            ).first()
+            turnover_rate = turnover_rate_by_key.get((employer_cnpj_digits, year))
 
             is_new = turnover_rate is None
             if is_new:
@@ -3172,13 +3280,12 @@ class FapContestationJudgmentReportService:
                     year=year,
                 )
                 db.session.add(turnover_rate)
+                turnover_rate_by_key[(employer_cnpj_digits, year)] = turnover_rate
 
-            db.session.flush()
-
-            should_apply_update = self._should_apply_turnover_rate_update(
-                turnover_rate_id=turnover_rate.id,
-                reference_dt=reference_dt,
-                is_new=is_new,
+            should_apply_update = self._should_apply_source_update(
+                references.get(turnover_rate),
+                reference_dt,
+                is_new,
             )
 
             if should_apply_update:
@@ -3253,26 +3360,20 @@ class FapContestationJudgmentReportService:
                 turnover_rate.updated_at = datetime.now()
                 imported_count += 1
 
-            turnover_history_now = datetime.now()
-            turnover_history_insert_stmt = mysql_insert(FapContestationTurnoverRateSourceHistory.__table__).values(
-                law_firm_id=report.law_firm_id,
-                turnover_rate_id=turnover_rate.id,
-                report_id=report.id,
-                knowledge_base_id=report.knowledge_base_id,
-                action='added' if is_new else 'updated',
-                transmission_datetime=transmission_dt,
-                publication_datetime=publication_dt,
-                created_at=turnover_history_now,
-                updated_at=turnover_history_now,
+            # Histórico de arquivo gravado em lote ao final.
+            self._register_source_history(
+                references, history_entries, turnover_rate, is_new, publication_dt or transmission_dt,
             )
-            turnover_history_upsert_stmt = turnover_history_insert_stmt.on_duplicate_key_update(
-                knowledge_base_id=turnover_history_insert_stmt.inserted.knowledge_base_id,
-                action=turnover_history_insert_stmt.inserted.action,
-                transmission_datetime=turnover_history_insert_stmt.inserted.transmission_datetime,
-                publication_datetime=turnover_history_insert_stmt.inserted.publication_datetime,
-                updated_at=turnover_history_insert_stmt.inserted.updated_at,
-            )
-            db.session.execute(turnover_history_upsert_stmt)
+
+        db.session.flush()
+        self._bulk_upsert_source_history(
+            FapContestationTurnoverRateSourceHistory,
+            'turnover_rate_id',
+            report,
+            history_entries,
+            transmission_dt,
+            publication_dt,
+        )
 
         return imported_count
 
@@ -3335,6 +3436,9 @@ class FapContestationJudgmentReportService:
             report.processed_at = datetime.now()
             report.updated_at = datetime.now()
             db.session.commit()
+            # Busca da Central de Disputas e caches do FAP: só depois do commit
+            benefit_search_service.index_benefits(self.report_benefit_ids)
+            fap_data_version.bump(report.law_firm_id)
 
             print(
                 f'Relatório #{report.id} processado com sucesso. '
@@ -0,0 +1,69 @@
+"""
+Versão dos dados do FAP, por escritório.
+
+Um contador em fap_data_versions que as sincronizações e importações
+incrementam depois de gravar: empresas, procurações, contestações e PDFs
+(cron e telas de sync do painel), relatórios de julgamento (envio, exclusão,
+importação automática e processamento), cadastro, edição e exclusão de
+benefícios e edição de CAT, massa salarial, vínculos e rotatividade na
+Central de Disputas.
+
+Quem cacheia leituras do FAP — hoje as tools do MCP, em outro processo
+(mcp_server/tools/result_cache.py) — lê a versão antes de carregar e a guarda
+na chave: a gravação seguinte muda a versão e o resultado velho deixa de ser
+servido. Ler a versão é um SELECT pela chave única do escritório.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from app.models import db, FapDataVersion
+
+logger = logging.getLogger(__name__)
+
+
+def current(law_firm_id) -> int:
+    """Versão atual dos dados do escritório (0 se nunca houve gravação)."""
+    if not law_firm_id:
+        return 0
+    version = (
+        db.session.query(FapDataVersion.version)
+        .filter(FapDataVersion.law_firm_id == law_firm_id)
+        .scalar()
+    )
+    return int(version or 0)
+
+
+def bump(law_firm_id) -> int | None:
+    """Incrementa a versão do escritório, em commit próprio. Devolve a nova versão.
+
+    Chamar depois do commit de quem gravou: a versão nova não pode ficar
+    visível antes dos dados. Falha aqui nunca derruba a gravação — o cache
+    expira pelo TTL.
+    """
+    if not law_firm_id:
+        return None
+    for _tentativa in range(2):
+        try:
+            agora = datetime.now()
+            alteradas = db.session.execute(
+                update(FapDataVersion)
+                .where(FapDataVersion.law_firm_id == law_firm_id)
+                .values(version=FapDataVersion.version + 1, updated_at=agora)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not alteradas:
+                db.session.add(FapDataVersion(law_firm_id=law_firm_id, version=1, updated_at=agora))
+            db.session.commit()
+            return current(law_firm_id)
+        except IntegrityError:
+            # Outro processo criou a linha do escritório ao mesmo tempo: o UPDATE resolve
+            db.session.rollback()
+        except Exception as exc:  # noqa: BLE001 — versionar não derruba a gravação
+            db.session.rollback()
+            logger.warning('Versão dos dados do FAP: falha ao incrementar (escritório %s): %s',
+                           law_firm_id, exc)
+            return None
+    return None
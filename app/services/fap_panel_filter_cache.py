@@ -0,0 +1,144 @@
+"""
+Cache, por escritório, das opções de filtro da tela de contestações do Painel FAP.
+
+A tela montava a cada carga, varrendo fap_web_contestacoes inteira do
+escritório: o mapa raiz → CNPJs de estabelecimento (DISTINCT), os valores de
+instância e de situação (dois DISTINCT) e a lista de empresas. Tudo isso só
+muda quando a sincronização grava — então fica num LRU com TTL por processo.
+
+Invalidação: a sincronização (cron e telas de sync do painel) chama
+`invalidate(law_firm_id)`. Além de limpar o cache do próprio processo, grava
+um carimbo em ``uploads/fap_web_contestacoes/{law_firm_id}/.sync_stamp``;
+cada leitura confere o carimbo (um read de arquivo, nenhum SQL), e é assim
+que o cron — outro processo — invalida o cache dos workers web.
+
+Config: FAP_PANEL_FILTER_CACHE_TTL_SECONDS (default 3600; 0 desliga) e
+FAP_PANEL_FILTER_CACHE_MAX_ENTRIES (default 256).
+"""
+import os
+import uuid
+
+from flask import current_app
+
+from app.models import db, FapCompany, FapWebContestacao
+from app.services.layout_context_cache import TTLCache
+
+STAMP_NAME = '.sync_stamp'
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except (TypeError, ValueError):
+        return default
+
+
+class FilterOptionsCache(TTLCache):
+    """TTLCache com TTL/tamanho próprios (FAP_PANEL_FILTER_CACHE_*)."""
+
+    @staticmethod
+    def ttl_seconds() -> int:
+        return _env_int('FAP_PANEL_FILTER_CACHE_TTL_SECONDS', 3600)
+
+    @staticmethod
+    def max_entries() -> int:
+        return max(1, _env_int('FAP_PANEL_FILTER_CACHE_MAX_ENTRIES', 256))
+
+
+contestacoes_filter_cache = FilterOptionsCache('fap_contestacoes_filters')
+
+
+def _stamp_path(law_firm_id) -> str:
+    return os.path.join(
+        current_app.root_path, 'uploads', 'fap_web_contestacoes', str(law_firm_id), STAMP_NAME,
+    )
+
+
+def _read_stamp(law_firm_id) -> str:
+    try:
+        with open(_stamp_path(law_firm_id), encoding='ascii') as fh:
+            return fh.read().strip()
+    except OSError:
+        return ''
+
+
+def _load(law_firm_id, stamp: str) -> dict:
+    companies = [
+        {'cnpj': cnpj, 'nome': nome}
+        for cnpj, nome in (
+            db.session.query(FapCompany.cnpj, FapCompany.nome)
+            .filter(FapCompany.law_firm_id == law_firm_id)
+            .order_by(FapCompany.nome)
+        )
+    ]
+
+    # Mapa de CNPJs (14 dígitos) por raiz para o filtro de estabelecimento
+    cnpjs_by_raiz: dict[str, list[str]] = {}
+    for raiz, cnpj_full in (
+        db.session.query(FapWebContestacao.cnpj_raiz, FapWebContestacao.cnpj)
+        .filter(FapWebContestacao.law_firm_id == law_firm_id)
+        .distinct()
+    ):
+        if raiz and cnpj_full:
+            cnpjs_by_raiz.setdefault(raiz, set()).add(cnpj_full)
+
+    # Instância e situação num DISTINCT só: as combinações são poucas.
+    instancias, situacoes = set(), set()
+    for inst_cod, inst_desc, sit_cod, sit_desc in (
+        db.session.query(
+            FapWebContestacao.instancia_codigo, FapWebContestacao.instancia_descricao,
+            FapWebContestacao.situacao_codigo, FapWebContestacao.situacao_descricao,
+        )
+        .filter(FapWebContestacao.law_firm_id == law_firm_id)
+        .distinct()
+    ):
+        if inst_cod:
+            instancias.add((inst_cod, inst_desc))
+        if sit_cod:
+            situacoes.add((sit_cod, sit_desc))
+
+    return {
+        'stamp': stamp,
+        'companies': companies,
+        'cnpjs_by_raiz': {raiz: sorted(cnpjs) for raiz, cnpjs in cnpjs_by_raiz.items()},
+        'instancias': sorted(instancias, key=lambda par: (par[0], par[1] or '')),
+        'situacoes': sorted(situacoes, key=lambda par: (par[0], par[1] or '')),
+    }
+
+
+def get_contestacoes_filter_options(law_firm_id) -> dict:
+    """{'companies', 'cnpjs_by_raiz', 'instancias', 'situacoes'} do escritório.
+
+    ``companies`` são dicts com cnpj e nome (o template só usa os dois).
+    """
+    stamp = _read_stamp(law_firm_id)
+    options = contestacoes_filter_cache.get_or_load(law_firm_id, lambda: _load(law_firm_id, stamp))
+    if options['stamp'] != stamp:
+        # Gravado por outro processo (cron) depois da carga em cache
+        contestacoes_filter_cache.invalidate(law_firm_id)
+        options = contestacoes_filter_cache.get_or_load(law_firm_id, lambda: _load(law_firm_id, stamp))
+    return options
+
+
+def invalidate(law_firm_id) -> None:
+    """Chamada depois de gravar contestações ou empresas do escritório."""
+    if not law_firm_id:
+        return
+    contestacoes_filter_cache.invalidate(law_firm_id)
+    path = _stamp_path(law_firm_id)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'w', encoding='ascii') as fh:
+            fh.write(uuid.uuid4().hex)
+        os.replace(tmp, path)
+    except OSError:
+        current_app.logger.warning('Não foi possível gravar o carimbo de sincronização do FAP em %s', path)
+
+
+def stats() -> dict:
+    return {
+        'ttl_seconds': FilterOptionsCache.ttl_seconds(),
+        'max_entries': FilterOptionsCache.max_entries(),
+        contestacoes_filter_cache.name: contestacoes_filter_cache.stats(),
+    }
@@ -27,6 +27,7 @@ import logging
 from datetime import date, datetime, timedelta, timezone
 
 from app.models import db, FapWebProcuracao, FapWebProcuracaoChangeHistory
+from app.services import fap_data_version
 from app.utils.timezone import SP_TZ
 
 logger = logging.getLogger(__name__)
@@ -231,6 +232,8 @@ def sync_procuracoes(svc, law_firm_id: int) -> dict:
             alertaveis += 1
 
     db.session.commit()
+    if created or updated:
+        fap_data_version.bump(law_firm_id)
 
     return {
         'ok': True, 'expired': False, 'message': '',
@@ -18,10 +18,12 @@ from datetime import datetime
 from pathlib import Path
 
 from sqlalchemy import func
+from sqlalchemy.orm import Session, load_only
 
 from app.models import (
-    db, FapReviewAuditLog, FapReviewExecution, FapReviewPetition,
-    FapReviewPromptVersion, FapReviewReferenceVersion,
+    db, FapReviewAuditLog, FapReviewExecution, FapReviewExecutionStats,
+    FapReviewLawyerStats, FapReviewPetition, FapReviewPromptVersion,
+    FapReviewReferenceVersion, User,
 )
 
 logger = logging.getLogger(__name__)
@@ -391,6 +393,7 @@ def record_text_review(law_firm_id: int, user_id: int | None, identifier: str,
     db.session.flush()
 
     sync_petition_after_revision(execution)
+    record_execution_statistics(execution)
     db.session.commit()
 
     if petition_created:
@@ -502,66 +505,222 @@ def translate_finding_category(category: str | None) -> str:
 
 
 
-def build_lawyer_statistics(law_firm_id: int) -> dict:
-    """Consolida score e métricas dos advogados a partir do histórico de revisões."""
-    revisions = FapReviewExecution.query.filter_by(
-        law_firm_id=law_firm_id,
-        execution_type='revision',
-    ).order_by(
-        FapReviewExecution.created_at.asc(),
-        FapReviewExecution.id.asc(),
-    ).all()
+# Bump ao mudar a forma do agregado por advogado — invalida os já gravados.
+_LAWYER_STATS_VERSION = '1'
+_STATS_CHUNK_SIZE = 500
+_STATS_EXECUTION_COLUMNS = (
+    FapReviewExecution.id,
+    FapReviewExecution.user_id,
+    FapReviewExecution.petition_id,
+    FapReviewExecution.status,
+    FapReviewExecution.revision_number,
+    FapReviewExecution.created_at,
+    FapReviewExecution.updated_at,
+    FapReviewExecution.main_document_filename,
+    FapReviewExecution.law_firm_document_identifier,
+)
 
-    lawyer_stats: dict[int, dict] = {}
-    petition_user_groups: dict[tuple[int, int], list[FapReviewExecution]] = defaultdict(list)
 
-    for execution in revisions:
-        if not execution.user_id or not execution.user:
+def _chunked(values: list, size: int = _STATS_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+def compute_execution_statistics(payload: dict) -> dict:
+    """Contagens por severidade/categoria e fingerprints (na ordem) dos achados de um resultado."""
+    categories: Counter = Counter()
+    counts = {'CRÍTICO': 0, 'MODERADO': 0, 'FORMAL': 0}
+    fingerprints: list[str] = []
+    total = 0
+
+    for finding in payload.get('findings') or []:
+        if not isinstance(finding, dict):
             continue
+        total += 1
+        severity = normalize_finding_severity(finding.get('severity'))
+        categories[translate_finding_category(finding.get('category') or 'SEM_CATEGORIA')] += 1
+        counts[severity if severity in ('CRÍTICO', 'MODERADO') else 'FORMAL'] += 1
+        fingerprint = build_finding_fingerprint(finding)
+        if fingerprint:
+            fingerprints.append(fingerprint)
+
+    return {
+        'total_findings': total,
+        'critical_findings': counts['CRÍTICO'],
+        'moderate_findings': counts['MODERADO'],
+        'formal_findings': counts['FORMAL'],
+        'categories': dict(categories),
+        'fingerprints': fingerprints,
+    }
+
+
+def _apply_execution_statistics(execution: FapReviewExecution,
+                                row: FapReviewExecutionStats | None,
+                                session=None) -> FapReviewExecutionStats:
+    stats = compute_execution_statistics(load_execution_result_payload(execution))
+    if row is None:
+        row = FapReviewExecutionStats(execution_id=execution.id)
+        (session or db.session).add(row)
+    row.law_firm_id = execution.law_firm_id
+    row.user_id = execution.user_id
+    row.total_findings = stats['total_findings']
+    row.critical_findings = stats['critical_findings']
+    row.moderate_findings = stats['moderate_findings']
+    row.formal_findings = stats['formal_findings']
+    row.categories_json = json.dumps(stats['categories'], ensure_ascii=False)
+    row.fingerprints_json = json.dumps(stats['fingerprints'])
+    # Nunca antes do updated_at da execução: senão a linha nasceria "desatualizada".
+    now = datetime.now()
+    row.computed_at = max(now, execution.updated_at) if execution.updated_at else now
+    return row
+
+
+def record_execution_statistics(execution: FapReviewExecution) -> FapReviewExecutionStats | None:
+    """Grava as estatísticas de uma revisão recém-concluída e refaz o agregado
+    do seu advogado. Não faz commit — entra na mesma transação que grava o
+    resultado."""
+    if execution.execution_type != 'revision':
+        return None
+    # Fixa o updated_at (onupdate) antes de carimbar o computed_at.
+    db.session.flush()
+    row = FapReviewExecutionStats.query.filter_by(execution_id=execution.id).first()
+    row = _apply_execution_statistics(execution, row)
+    if execution.user_id and db.session.get(User, execution.user_id) is not None:
+        db.session.flush()
+        # Datas relidas do banco: a assinatura tem de bater com a da leitura da tela.
+        db.session.expire(execution, ['created_at', 'updated_at'])
+        revisions = FapReviewExecution.query.options(load_only(*_STATS_EXECUTION_COLUMNS)).filter_by(
+            law_firm_id=execution.law_firm_id,
+            user_id=execution.user_id,
+            execution_type='revision',
+        ).order_by(
+            FapReviewExecution.created_at.asc(),
+            FapReviewExecution.id.asc(),
+        ).all()
+        computed_at_by_execution = {}
+        for chunk in _chunked([revision.id for revision in revisions]):
+            computed_at_by_execution.update(
+                db.session.query(FapReviewExecutionStats.execution_id, FapReviewExecutionStats.computed_at)
+                .filter(FapReviewExecutionStats.execution_id.in_(chunk))
+                .all()
+            )
+        _load_lawyer_aggregates(db.session, execution.law_firm_id,
+                                {execution.user_id: revisions}, computed_at_by_execution)
+    return row
+
+
+def refresh_execution_statistics(session, law_firm_id: int,
+                                 revisions: list[FapReviewExecution]) -> dict[int, datetime]:
+    """Garante linha de estatísticas atualizada para cada revisão e devolve
+    {execution_id: computed_at}. Só as ausentes (revisões anteriores ao
+    recurso) ou desatualizadas (execução alterada depois do cálculo) têm o
+    `result_json` lido.
+
+    Lê e grava (com commit) em ``session``, que deve ser uma sessão própria:
+    a tela que chama é um GET e a sessão do request não é tocada."""
+    computed_at_by_execution = dict(
+        session.query(FapReviewExecutionStats.execution_id, FapReviewExecutionStats.computed_at)
+        .filter(FapReviewExecutionStats.law_firm_id == law_firm_id)
+        .all()
+    )
+    stale_ids = [
+        execution.id for execution in revisions
+        if execution.id not in computed_at_by_execution
+        or (execution.updated_at and computed_at_by_execution[execution.id] < execution.updated_at)
+    ]
+    if not stale_ids:
+        return computed_at_by_execution
+
+    previous = dict(computed_at_by_execution)
+    try:
+        for chunk in _chunked(stale_ids):
+            executions = session.query(FapReviewExecution).options(load_only(
+                FapReviewExecution.id, FapReviewExecution.law_firm_id, FapReviewExecution.user_id,
+                FapReviewExecution.updated_at, FapReviewExecution.result_json,
+            )).filter(FapReviewExecution.id.in_(chunk)).all()
+            existing = {
+                row.execution_id: row
+                for row in session.query(FapReviewExecutionStats).filter(
+                    FapReviewExecutionStats.execution_id.in_(chunk)).all()
+            }
+            for execution in executions:
+                row = _apply_execution_statistics(execution, existing.get(execution.id), session)
+                computed_at_by_execution[execution.id] = row.computed_at
+                # O resultado bruto não é mais necessário — libera a memória.
+                session.expire(execution, ['result_json'])
+        session.commit()
+        # Relido do banco (precisão do DATETIME), como na próxima leitura.
+        computed_at_by_execution = dict(
+            session.query(FapReviewExecutionStats.execution_id, FapReviewExecutionStats.computed_at)
+            .filter(FapReviewExecutionStats.law_firm_id == law_firm_id)
+            .all()
+        )
+    except Exception as exc:
+        session.rollback()
+        logger.warning('Falha ao gravar estatísticas das revisões do escritório %s: %s', law_firm_id, exc)
+        return previous
+    return computed_at_by_execution
+
+
+def _lawyer_signature(executions: list[FapReviewExecution], computed_at_by_execution: dict[int, datetime]) -> str:
+    parts = [_LAWYER_STATS_VERSION] + [
+        [
+            execution.id, execution.status, execution.revision_number, execution.petition_id,
+            _iso(execution.created_at), _iso(execution.updated_at),
+            execution.main_document_filename, execution.law_firm_document_identifier,
+            _iso(computed_at_by_execution.get(execution.id)),
+        ]
+        for execution in executions
+    ]
+    serialized = json.dumps(parts, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
 
-        stats = lawyer_stats.setdefault(execution.user_id, {
-            'user': execution.user,
-            'total_revisions': 0,
-            'completed_revisions': 0,
-            'petitions': set(),
-            'petition_history': {},
-            'total_findings': 0,
-            'critical_findings': 0,
-            'moderate_findings': 0,
-            'formal_findings': 0,
-            'repeated_findings': 0,
-            'categories': Counter(),
-            'monthly': defaultdict(lambda: {'revisions': 0, 'findings': 0, 'repeated_findings': 0}),
-        })
 
-        stats['total_revisions'] += 1
+def _aggregate_lawyer(executions: list[FapReviewExecution], stats_by_execution: dict[int, FapReviewExecutionStats]) -> dict:
+    """Agregado de um advogado a partir das linhas de estatística das suas
+    revisões (em ordem cronológica). Serializável em JSON: o título/
+    identificador da petição é resolvido na leitura."""
+    aggregate = {
+        'total_revisions': 0,
+        'completed_revisions': 0,
+        'petitions': [],
+        'petition_history': {},
+        'total_findings': 0,
+        'critical_findings': 0,
+        'moderate_findings': 0,
+        'formal_findings': 0,
+        'repeated_findings': 0,
+        'categories': Counter(),
+        'monthly': {},
+    }
+    petitions: set[int] = set()
+    petition_groups: dict[int, list[FapReviewExecution]] = defaultdict(list)
+
+    for execution in executions:
+        aggregate['total_revisions'] += 1
         if execution.petition_id:
-            stats['petitions'].add(execution.petition_id)
-            petition_user_groups[(execution.user_id, execution.petition_id)].append(execution)
+            petitions.add(execution.petition_id)
+            petition_groups[execution.petition_id].append(execution)
 
         month_key = (execution.created_at or execution.updated_at or datetime.now()).strftime('%Y-%m')
-        stats['monthly'][month_key]['revisions'] += 1
-
-        payload = load_execution_result_payload(execution)
-        findings = payload.get('findings') or []
+        month = aggregate['monthly'].setdefault(month_key, {'revisions': 0, 'findings': 0, 'repeated_findings': 0})
+        month['revisions'] += 1
         if execution.status == 'completed':
-            stats['completed_revisions'] += 1
-
-        petition_key = execution.petition_id or execution.id
-        petition_title = execution.petition.title if execution.petition else (execution.main_document_filename or 'Petição')
-        petition_identifier = (
-            execution.petition.office_document_identifier
-            if execution.petition and execution.petition.office_document_identifier
-            else (execution.law_firm_document_identifier or '-')
-        )
-        petition_history = stats['petition_history'].setdefault(petition_key, {
+            aggregate['completed_revisions'] += 1
+
+        petition_key = str(execution.petition_id or execution.id)
+        petition_history = aggregate['petition_history'].setdefault(petition_key, {
             'petition_id': execution.petition_id,
-            'title': petition_title,
-            'identifier': petition_identifier,
+            'fallback_title': execution.main_document_filename or 'Petição',
+            'fallback_identifier': execution.law_firm_document_identifier or '-',
             'revision_count': 0,
             'latest_revision_number': 0,
             'latest_status': execution.status,
-            'latest_at': execution.created_at or execution.updated_at,
+            'latest_at': None,
             'total_findings': 0,
             'repeated_findings': 0,
             'categories': Counter(),
@@ -572,56 +731,161 @@ def build_lawyer_statistics(law_firm_id: int) -> dict:
             execution.revision_number or petition_history['revision_count'],
         )
         petition_history['latest_status'] = execution.status
-        petition_history['latest_at'] = execution.created_at or execution.updated_at
-
-        for finding in findings:
-            severity = normalize_finding_severity(finding.get('severity'))
-            category = translate_finding_category(finding.get('category') or 'SEM_CATEGORIA')
-
-            stats['total_findings'] += 1
-            petition_history['total_findings'] += 1
-            stats['categories'][category] += 1
-            petition_history['categories'][category] += 1
-            stats['monthly'][month_key]['findings'] += 1
-
-            if severity == 'CRÍTICO':
-                stats['critical_findings'] += 1
-            elif severity == 'MODERADO':
-                stats['moderate_findings'] += 1
-            else:
-                stats['formal_findings'] += 1
-
-    for (user_id, petition_id), grouped_revisions in petition_user_groups.items():
-        if petition_id is None:
-            continue
+        petition_history['latest_at'] = _iso(execution.created_at or execution.updated_at)
 
+        row = stats_by_execution.get(execution.id)
+        if row is None:
+            continue
+        categories = json.loads(row.categories_json or '{}')
+        aggregate['total_findings'] += row.total_findings
+        aggregate['critical_findings'] += row.critical_findings
+        aggregate['moderate_findings'] += row.moderate_findings
+        aggregate['formal_findings'] += row.formal_findings
+        aggregate['categories'].update(categories)
+        petition_history['total_findings'] += row.total_findings
+        petition_history['categories'].update(categories)
+        month['findings'] += row.total_findings
+
+    # Reincidência: achado que já apareceu numa revisão anterior (ou antes,
+    # na mesma revisão) da mesma petição.
+    for grouped in petition_groups.values():
         seen_fingerprints: set[str] = set()
-        for execution in sorted(grouped_revisions, key=lambda item: ((item.revision_number or 0), item.created_at or datetime.now(), item.id)):
-            payload = load_execution_result_payload(execution)
-            findings = payload.get('findings') or []
+        for execution in sorted(grouped, key=lambda item: ((item.revision_number or 0), item.created_at or datetime.now(), item.id)):
+            row = stats_by_execution.get(execution.id)
+            if row is None:
+                continue
             month_key = (execution.created_at or execution.updated_at or datetime.now()).strftime('%Y-%m')
-            petition_key = execution.petition_id or execution.id
-            petition_history = lawyer_stats[user_id]['petition_history'].get(petition_key)
-
-            for finding in findings:
-                fingerprint = build_finding_fingerprint(finding)
-                if not fingerprint:
-                    continue
+            petition_history = aggregate['petition_history'][str(execution.petition_id)]
+            for fingerprint in json.loads(row.fingerprints_json or '[]'):
                 if fingerprint in seen_fingerprints:
-                    lawyer_stats[user_id]['repeated_findings'] += 1
-                    lawyer_stats[user_id]['monthly'][month_key]['repeated_findings'] += 1
-                    if petition_history:
-                        petition_history['repeated_findings'] += 1
+                    aggregate['repeated_findings'] += 1
+                    aggregate['monthly'][month_key]['repeated_findings'] += 1
+                    petition_history['repeated_findings'] += 1
                 seen_fingerprints.add(fingerprint)
 
+    aggregate['petitions'] = sorted(petitions)
+    aggregate['categories'] = dict(aggregate['categories'])
+    for petition_history in aggregate['petition_history'].values():
+        petition_history['categories'] = dict(petition_history['categories'])
+    aggregate['petition_history'] = list(aggregate['petition_history'].values())
+    return aggregate
+
+
+def _load_lawyer_aggregates(session, law_firm_id: int,
+                            revisions_by_user: dict[int, list[FapReviewExecution]],
+                            computed_at_by_execution: dict[int, datetime]) -> dict[int, dict]:
+    """Agregados por advogado, refazendo só os de quem teve revisão nova/alterada.
+
+    Os refeitos vão para ``session`` sem commit: quem chama decide a transação.
+    """
+    stored = {
+        row.user_id: row
+        for row in session.query(FapReviewLawyerStats).filter(
+            FapReviewLawyerStats.law_firm_id == law_firm_id,
+            FapReviewLawyerStats.user_id.in_(list(revisions_by_user)),
+        ).all()
+    }
+    aggregates: dict[int, dict] = {}
+    dirty: dict[int, str] = {}
+    for user_id, executions in revisions_by_user.items():
+        signature = _lawyer_signature(executions, computed_at_by_execution)
+        row = stored.get(user_id)
+        if row is not None and row.source_signature == signature:
+            try:
+                aggregates[user_id] = json.loads(row.aggregate_json)
+                continue
+            except (TypeError, json.JSONDecodeError):
+                pass
+        dirty[user_id] = signature
+
+    if not dirty:
+        return aggregates
+
+    execution_ids = [execution.id for user_id in dirty for execution in revisions_by_user[user_id]]
+    stats_by_execution: dict[int, FapReviewExecutionStats] = {}
+    for chunk in _chunked(execution_ids):
+        for row in session.query(FapReviewExecutionStats).filter(
+                FapReviewExecutionStats.execution_id.in_(chunk)).all():
+            stats_by_execution[row.execution_id] = row
+
+    for user_id, signature in dirty.items():
+        aggregate = _aggregate_lawyer(revisions_by_user[user_id], stats_by_execution)
+        aggregates[user_id] = aggregate
+        row = stored.get(user_id)
+        if row is None:
+            row = FapReviewLawyerStats(law_firm_id=law_firm_id, user_id=user_id)
+            session.add(row)
+        row.source_signature = signature
+        row.aggregate_json = json.dumps(aggregate, ensure_ascii=False)
+        row.refreshed_at = datetime.now()
+    return aggregates
+
+
+def build_lawyer_statistics(law_firm_id: int) -> dict:
+    """Consolida score e métricas dos advogados a partir do histórico de revisões.
+
+    Lê o agregado pré-computado de cada advogado (`FapReviewLawyerStats`);
+    só quem teve revisão nova ou alterada é recalculado, a partir das
+    estatísticas por execução (`FapReviewExecutionStats`) — o `result_json`
+    das revisões não é decodificado na leitura da tela.
+
+    A conclusão da revisão já grava os dois (record_execution_statistics); o
+    que faltar (revisões antigas, execução alterada depois) é preenchido
+    aqui numa sessão própria, com commit próprio: esta leitura vem de GET e
+    não faz commit nem rollback na sessão do request.
+    """
+    revisions = FapReviewExecution.query.options(load_only(*_STATS_EXECUTION_COLUMNS)).filter_by(
+        law_firm_id=law_firm_id,
+        execution_type='revision',
+    ).order_by(
+        FapReviewExecution.created_at.asc(),
+        FapReviewExecution.id.asc(),
+    ).all()
+
+    user_ids = {execution.user_id for execution in revisions if execution.user_id}
+    users = {
+        user.id: user
+        for chunk in _chunked(sorted(user_ids))
+        for user in User.query.filter(User.id.in_(chunk)).all()
+    }
+    revisions_by_user: dict[int, list[FapReviewExecution]] = {}
+    for execution in revisions:
+        if execution.user_id in users:
+            revisions_by_user.setdefault(execution.user_id, []).append(execution)
+
+    with Session(db.engine) as stats_session:
+        computed_at_by_execution = refresh_execution_statistics(stats_session, law_firm_id, revisions)
+        aggregates = _load_lawyer_aggregates(stats_session, law_firm_id, revisions_by_user, computed_at_by_execution)
+        try:
+            stats_session.commit()
+        except Exception as exc:
+            stats_session.rollback()
+            logger.warning('Falha ao gravar agregado por advogado do escritório %s: %s', law_firm_id, exc)
+
+    petition_ids = sorted({
+        petition_data['petition_id']
+        for aggregate in aggregates.values()
+        for petition_data in aggregate['petition_history']
+        if petition_data['petition_id']
+    })
+    petitions = {
+        petition.id: petition
+        for chunk in _chunked(petition_ids)
+        for petition in FapReviewPetition.query.options(load_only(
+            FapReviewPetition.id, FapReviewPetition.title, FapReviewPetition.office_document_identifier,
+        )).filter(FapReviewPetition.id.in_(chunk)).all()
+    }
+
     lawyers: list[dict] = []
     total_findings_overall = 0
     total_repeated_overall = 0
 
-    for stats in lawyer_stats.values():
+    for user_id in revisions_by_user:
+        user = users[user_id]
+        stats = aggregates[user_id]
         petitions_count = len(stats['petitions'])
         rework_petitions = sum(
-            1 for petition_data in stats['petition_history'].values()
+            1 for petition_data in stats['petition_history']
             if petition_data['revision_count'] > 1
         )
         completed_revisions = stats['completed_revisions'] or 0
@@ -643,10 +907,25 @@ def build_lawyer_statistics(law_firm_id: int) -> dict:
             })
 
         petition_history_rows = []
-        for petition_data in stats['petition_history'].values():
-            top_category = petition_data['categories'].most_common(1)
+        for petition_data in stats['petition_history']:
+            petition = petitions.get(petition_data['petition_id'])
+            categories = Counter(petition_data['categories'])
+            top_category = categories.most_common(1)
             petition_history_rows.append({
-                **petition_data,
+                'petition_id': petition_data['petition_id'],
+                'title': petition.title if petition else petition_data['fallback_title'],
+                'identifier': (
+                    petition.office_document_identifier
+                    if petition and petition.office_document_identifier
+                    else petition_data['fallback_identifier']
+                ),
+                'revision_count': petition_data['revision_count'],
+                'latest_revision_number': petition_data['latest_revision_number'],
+                'latest_status': petition_data['latest_status'],
+                'latest_at': datetime.fromisoformat(petition_data['latest_at']) if petition_data['latest_at'] else None,
+                'total_findings': petition_data['total_findings'],
+                'repeated_findings': petition_data['repeated_findings'],
+                'categories': categories,
                 'top_category': top_category[0][0] if top_category else '-',
             })
 
@@ -659,9 +938,9 @@ def build_lawyer_statistics(law_firm_id: int) -> dict:
         total_repeated_overall += repeated_findings
 
         lawyers.append({
-            'user_id': stats['user'].id,
-            'name': stats['user'].name,
-            'role': translate_user_role(stats['user'].role),
+            'user_id': user.id,
+            'name': user.name,
+            'role': translate_user_role(user.role),
             'score': calculate_lawyer_score(total_findings, completed_revisions, rework_ratio, recurrence_rate),
             'total_revisions': stats['total_revisions'],
             'completed_revisions': completed_revisions,
@@ -675,7 +954,7 @@ def build_lawyer_statistics(law_firm_id: int) -> dict:
             'repeated_findings': repeated_findings,
             'recurrence_rate': recurrence_rate,
             'avg_findings_per_revision': avg_findings_per_revision,
-            'top_categories': stats['categories'].most_common(5),
+            'top_categories': Counter(stats['categories']).most_common(5),
             'petition_history': petition_history_rows,
             'monthly_trend': monthly_trend,
         })
@@ -699,4 +978,3 @@ def build_lawyer_statistics(law_firm_id: int) -> dict:
         'overview': overview,
         'lawyers': lawyers,
     }
-
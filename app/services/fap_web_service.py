@@ -9,18 +9,40 @@ Uso:
     companies  = service.fetch_companies()
     items      = service.fetch_contestacoes(cnpj="12345678", year=2023)
     pdf_bytes, filename = service.download_contestacao(year=2023, cnpj="12345678000195", contestacao_id=42)
+
+    # Em lote (cron, painel): PDF direto para disco, sem passar inteiro pela memória
+    dl = service.download_contestacao_to(2023, "12345678000195", 42, directory=save_dir)
+    dl.data['file'].publish(os.path.join(save_dir, dl.data['filename']))
+
+Transporte: todas as instâncias compartilham um pool de conexões keep-alive
+(FapHttpTransport, sobre urllib3) — o cron cria um serviço por download e por
+empresa, e antes cada chamada abria TCP + TLS do zero. Limite de conexões por
+host, retry com backoff em 5xx/conexão resetada e descompressão gzip ficam
+no transporte; erros continuam saindo como urllib.error.HTTPError/URLError,
+então o tratamento nos métodos e o fallback de autenticação não mudam.
+
+Config (.env): FAP_HTTP_POOL_SIZE (conexões por host, padrão 30),
+FAP_HTTP_RETRIES (padrão 2) e FAP_HTTP_BACKOFF (segundos, padrão 0.5).
 """
 
 from __future__ import annotations
 
+import io
 import json
+import os
+import re
 import ssl
+import threading
 import urllib.error
-import urllib.request
 import base64
 from dataclasses import dataclass, field
 from typing import Any
 
+import urllib3
+from urllib3.util import Retry
+
+from app.services.streamed_download import CHUNK_SIZE, StagingWriter
+
 
 # ---------------------------------------------------------------------------
 # Constantes
@@ -34,6 +56,106 @@ _DEFAULT_UA = (
 )
 
 
+_BASE64_FIELD_RE = re.compile(rb'"base64"\s*:\s*"')
+
+
+def _env_number(name: str, default, cast=int):
+    try:
+        return max(0, cast(os.environ.get(name, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+# ---------------------------------------------------------------------------
+# Transporte HTTP (pool keep-alive compartilhado)
+# ---------------------------------------------------------------------------
+
+class FapHttpTransport:
+    """Pool de conexões keep-alive para o portal FAP, seguro entre threads.
+
+    ``maxsize`` conexões por host, com ``block=True``: acima disso a thread
+    espera uma conexão livre em vez de abrir outra. Retry com backoff só para
+    GET, em falha de conexão/leitura e em 5xx. Respostas >= 400 viram
+    ``urllib.error.HTTPError`` (com o corpo legível em ``e.read()``) e falhas
+    de rede viram ``urllib.error.URLError`` — o mesmo contrato do urlopen.
+    """
+
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    def __init__(
+        self,
+        ssl_context: ssl.SSLContext | None = None,
+        maxsize: int | None = None,
+        retries: int | None = None,
+        backoff: float | None = None,
+    ) -> None:
+        self.maxsize = max(1, maxsize or _env_number('FAP_HTTP_POOL_SIZE', 30))
+        retries = retries if retries is not None else _env_number('FAP_HTTP_RETRIES', 2)
+        backoff = backoff if backoff is not None else _env_number('FAP_HTTP_BACKOFF', 0.5, float)
+        self._retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset({'GET'}),
+            backoff_factor=backoff,
+            raise_on_status=False,
+        )
+        self._pool = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=self.maxsize,
+            block=True,
+            ssl_context=ssl_context,
+            # O contexto já desliga a verificação (portal com cadeia antiga);
+            # sem isto o urllib3 religaria CERT_REQUIRED por cima dele.
+            cert_reqs='CERT_NONE',
+            assert_hostname=False,
+            retries=self._retry,
+        )
+
+    def request(self, method: str, url: str, headers: dict, timeout: float, stream: bool = False):
+        """Resposta urllib3 de status < 400. Com ``stream``, o corpo ainda não
+        foi lido: quem chama lê com ``resp.read(n)`` e devolve a conexão com
+        ``resp.release_conn()``."""
+        headers = {'Accept-Encoding': 'gzip, deflate', **headers}
+        try:
+            resp = self._pool.request(
+                method, url,
+                headers=headers,
+                timeout=urllib3.Timeout(total=timeout),
+                preload_content=not stream,
+                decode_content=True,
+            )
+        except urllib3.exceptions.MaxRetryError as e:
+            raise urllib.error.URLError(e.reason or e) from e
+        except urllib3.exceptions.HTTPError as e:
+            raise urllib.error.URLError(e) from e
+
+        if resp.status >= 400:
+            body = resp.data
+            resp.release_conn()
+            raise urllib.error.HTTPError(url, resp.status, resp.reason or '', resp.headers, io.BytesIO(body))
+        return resp
+
+    def clear(self) -> None:
+        self._pool.clear()
+
+
+_shared_transport: FapHttpTransport | None = None
+_shared_transport_lock = threading.Lock()
+
+
+def get_shared_transport() -> FapHttpTransport:
+    """Transporte do processo, criado no primeiro uso."""
+    global _shared_transport
+    if _shared_transport is None:
+        with _shared_transport_lock:
+            if _shared_transport is None:
+                _shared_transport = FapHttpTransport(ssl_context=FapWebService._build_ssl_ctx())
+    return _shared_transport
+
+
 # ---------------------------------------------------------------------------
 # Tipos de resultado
 # ---------------------------------------------------------------------------
@@ -122,6 +244,7 @@ class FapWebService:
         auth: FapWebAuthPayload,
         fallback_auth: 'FapWebAuthPayload | None' = None,
         use_env_fallback: bool = True,
+        transport: FapHttpTransport | None = None,
     ) -> None:
         self.auth = auth
         self._using_fallback = False
@@ -138,25 +261,33 @@ class FapWebService:
             self.auth = fallback_auth
 
         self._fallback_auth = fallback_auth
-        self._ssl_ctx = self._build_ssl_ctx()
+        self._transport = transport or get_shared_transport()
+        # Uma instância pode ser compartilhada por vários workers (download do
+        # cron): a troca para o fallback acontece uma vez só.
+        self._auth_lock = threading.Lock()
 
     # ── Fallback de autenticação ──────────────────────────────────────────
 
-    def _switch_to_fallback(self) -> bool:
+    def _switch_to_fallback(self, failed_auth: 'FapWebAuthPayload | None' = None) -> bool:
         """Troca a autenticação atual pela de fallback (.env), se aplicável.
 
-        Retorna True se trocou (vale a pena reenviar a requisição).
+        Retorna True se trocou (vale a pena reenviar a requisição). Com
+        ``failed_auth`` (a autenticação usada na requisição recusada), também
+        retorna True se outra thread já trocou nesse meio-tempo.
         """
-        fb = self._fallback_auth
-        if not fb or self._using_fallback:
-            return False
-        if not fb.cookie_string:
-            return False
-        if fb.cookie_string == self.auth.cookie_string:
-            return False  # mesmo conjunto de cookies — reenviar não adianta
-        self.auth = fb
-        self._using_fallback = True
-        return True
+        with self._auth_lock:
+            if failed_auth is not None and self.auth is not failed_auth:
+                return True
+            fb = self._fallback_auth
+            if not fb or self._using_fallback:
+                return False
+            if not fb.cookie_string:
+                return False
+            if fb.cookie_string == self.auth.cookie_string:
+                return False  # mesmo conjunto de cookies — reenviar não adianta
+            self.auth = fb
+            self._using_fallback = True
+            return True
 
     # ── SSL ──────────────────────────────────────────────────────────────
 
@@ -200,9 +331,35 @@ class FapWebService:
         timeout: int,
         referer: str,
     ) -> tuple[bytes, int]:
-        req = urllib.request.Request(url, headers=self._base_headers(referer=referer), method='GET')
-        with urllib.request.urlopen(req, timeout=timeout, context=self._ssl_ctx) as resp:
-            return resp.read(), resp.status
+        resp = self._transport.request('GET', url, self._base_headers(referer=referer), timeout)
+        return resp.data, resp.status
+
+    def _raw_stream(self, url: str, timeout: int, referer: str, consumer):
+        resp = self._transport.request('GET', url, self._base_headers(referer=referer), timeout, stream=True)
+        try:
+            return consumer(resp), resp.status
+        except BaseException:
+            resp.close()  # corpo não lido até o fim: a conexão não serve mais
+            raise
+        finally:
+            resp.release_conn()  # sempre: o pool é bloqueante, a vaga precisa voltar
+
+    def _get_stream(
+        self,
+        url: str,
+        consumer,
+        timeout: int = 30,
+        referer: str = 'https://fap-mps.dataprev.gov.br/contestacoes-eletronicas',
+    ):
+        """Como ``_get``, mas entrega a resposta aberta a ``consumer(resp)``
+        em vez de ler o corpo inteiro. Retorna (resultado do consumer, status)."""
+        auth = self.auth
+        try:
+            return self._raw_stream(url, timeout, referer, consumer)
+        except urllib.error.HTTPError as e:
+            if e.code in (401, 403) and self._switch_to_fallback(auth):
+                return self._raw_stream(url, timeout, referer, consumer)
+            raise
 
     def _get(
         self,
@@ -216,10 +373,11 @@ class FapWebService:
         autenticação de fallback (.env), troca os cookies e reenvia uma vez.
         Lança urllib.error.HTTPError / URLError em caso de falha.
         """
+        auth = self.auth
         try:
             return self._raw_get(url, timeout, referer)
         except urllib.error.HTTPError as e:
-            if e.code in (401, 403) and self._switch_to_fallback():
+            if e.code in (401, 403) and self._switch_to_fallback(auth):
                 return self._raw_get(url, timeout, referer)
             raise
 
@@ -445,6 +603,57 @@ class FapWebService:
 
         return FapWebResult(ok=True, data={'pdf_bytes': pdf_bytes, 'filename': filename})
 
+    def _download_contestacao_to_once(
+        self,
+        year: int | str,
+        cnpj: str,
+        contestacao_id: int | str,
+        directory: str,
+    ) -> FapWebResult:
+        """Uma tentativa de download em streaming para um formato de CNPJ."""
+        url = (
+            f'{_BASE_URL}/gateway/fap/v1'
+            f'/vigencias/{year}/empresa/{cnpj}/contestacoes/{contestacao_id}/imprimir'
+        )
+
+        def _consume(resp):
+            with StagingWriter(directory, f'{contestacao_id}.pdf') as writer:
+                decoder = _Base64FieldDecoder(writer.write)
+                while True:
+                    chunk = resp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    decoder.feed(chunk)
+                envelope = decoder.finish()
+            return writer.staged, envelope
+
+        try:
+            (staged, envelope), _ = self._get_stream(url, _consume, timeout=60)
+        except urllib.error.HTTPError as e:
+            if e.code in (401, 403):
+                return FapWebResult(
+                    ok=False,
+                    expired=True,
+                    status_code=e.code,
+                    message='Sessão expirada ou não autorizada. Atualize os dados de autenticação.',
+                )
+            return FapWebResult(ok=False, status_code=e.code, message=f'Erro HTTP {e.code} ao buscar documento.')
+        except urllib.error.URLError as e:
+            return FapWebResult(ok=False, message=f'Falha de conexão: {e.reason}')
+        except ValueError as e:  # base64/JSON inválido (binascii.Error é ValueError)
+            return FapWebResult(ok=False, message=f'Erro ao processar resposta do servidor: {str(e)}')
+        except Exception as e:
+            return FapWebResult(ok=False, message=f'Erro inesperado: {str(e)}')
+
+        try:
+            api_data = json.loads(envelope)
+            filename = api_data.get('nome') or f'contestacao_{contestacao_id}.pdf'
+        except Exception as e:
+            staged.discard()
+            return FapWebResult(ok=False, message=f'Erro ao processar resposta do servidor: {str(e)}')
+
+        return FapWebResult(ok=True, data={'file': staged, 'filename': filename})
+
     def download_contestacao(
         self,
         year: int | str,
@@ -461,9 +670,35 @@ class FapWebService:
         Returns:
             FapWebResult com data={'pdf_bytes': bytes, 'filename': str} em caso de sucesso.
         """
+        return self._download_variants(
+            cnpj, lambda variant: self._download_contestacao_once(year, variant, contestacao_id)
+        )
+
+    def download_contestacao_to(
+        self,
+        year: int | str,
+        cnpj: str,
+        contestacao_id: int | str,
+        directory: str,
+    ) -> FapWebResult:
+        """Como ``download_contestacao``, mas em streaming para disco.
+
+        O PDF é decodificado do JSON do portal à medida que chega e gravado num
+        temporário em ``directory`` (SHA-256 calculado no caminho); nada do
+        documento fica inteiro em memória. Quem chama publica com
+        ``data['file'].publish(destino)`` — rename atômico — ou descarta.
+
+        Returns:
+            FapWebResult com data={'file': StagedFile, 'filename': str} em caso de sucesso.
+        """
+        return self._download_variants(
+            cnpj, lambda variant: self._download_contestacao_to_once(year, variant, contestacao_id, directory)
+        )
+
+    def _download_variants(self, cnpj: str, attempt) -> FapWebResult:
         first_result: FapWebResult | None = None
         for variant in self._cnpj_download_variants(cnpj):
-            result = self._download_contestacao_once(year, variant, contestacao_id)
+            result = attempt(variant)
             if result.ok:
                 return result
             if first_result is None:
@@ -473,6 +708,76 @@ class FapWebService:
         )
 
 
+class _Base64FieldDecoder:
+    """Decodifica em streaming o campo "base64" da resposta do /imprimir.
+
+    O portal devolve ``{"nome": ..., "base64": "<PDF inteiro>"}``. Os bytes do
+    PDF vão direto para ``sink`` em blocos; o resto do JSON (pequeno) é
+    guardado com o campo vazio e devolvido por ``finish`` para ler ``nome``.
+    """
+
+    def __init__(self, sink) -> None:
+        self._sink = sink
+        self._head = bytearray()     # JSON até a abertura do valor
+        self._tail = bytearray()     # JSON depois do fechamento do valor
+        self._pending = bytearray()  # base64 ainda fora de um múltiplo de 4
+        self._state = 'key'          # key → value → tail
+        self._escape = False
+
+    def feed(self, chunk: bytes) -> None:
+        if self._state == 'key':
+            self._head += chunk
+            match = _BASE64_FIELD_RE.search(self._head)
+            if not match:
+                return
+            chunk = bytes(self._head[match.end():])
+            del self._head[match.end():]
+            self._state = 'value'
+        if self._state == 'value':
+            end = self._feed_value(chunk)
+            if end is None:
+                return
+            chunk = chunk[end:]  # a partir das aspas de fechamento
+            self._state = 'tail'
+        self._tail += chunk
+
+    def _feed_value(self, chunk: bytes) -> int | None:
+        """Consome o valor; devolve a posição das aspas de fechamento, se vieram."""
+        i, n = 0, len(chunk)
+        while i < n:
+            if self._escape:
+                # JSON pode escapar a barra (\/); \n e \r de quebra de linha são ignorados
+                if chunk[i:i + 1] == b'/':
+                    self._pending += b'/'
+                self._escape = False
+                i += 1
+                continue
+            stops = [pos for pos in (chunk.find(b'"', i), chunk.find(b'\\', i)) if pos != -1]
+            stop = min(stops) if stops else n
+            self._pending += chunk[i:stop]
+            if stop == n:
+                break
+            if chunk[stop:stop + 1] == b'\\':
+                self._escape = True
+                i = stop + 1
+                continue
+            self._flush(final=True)
+            return stop
+        self._flush(final=False)
+        return None
+
+    def _flush(self, final: bool) -> None:
+        usable = len(self._pending) if final else len(self._pending) // 4 * 4
+        if usable:
+            self._sink(base64.b64decode(bytes(self._pending[:usable])))
+            del self._pending[:usable]
+
+    def finish(self) -> bytes:
+        if self._state != 'tail':
+            raise ValueError('campo base64 ausente ou incompleto na resposta')
+        return bytes(self._head) + bytes(self._tail)
+
+
 # ---------------------------------------------------------------------------
 # Resolução de autenticação (sessão do usuário → fallback no .env)
 # ---------------------------------------------------------------------------
@@ -15,7 +15,8 @@ from app.agents.legal_drafting.impugnacao_process_context import (
     chunk_match_layer,
 )
 from app.agents.legal_drafting.impugnacao_thesis_coverage import (
-    search_thesis_references,
+    build_thesis_coverage,
+    build_thesis_search_request,
 )
 
 # Planos de busca do preview: mesmos kinds da geração, caps generosos para
@@ -171,21 +172,22 @@ def build_documents_preview(
                     .all()
                 )
 
-            all_chunks: list[dict] = []
-            for section_label, kind_plan in _PREVIEW_SECTION_PLANS:
-                all_chunks.extend(retriever.fetch_style_references(
-                    law_firm_id=law_firm_id,
-                    query_text=f"Seção da peça: {section_label} | impugnação à contestação FAP",
-                    context=context,
-                    kind_plan=kind_plan,
-                    max_chunks=_PREVIEW_MAX_CHUNKS,
-                    max_chars=_PREVIEW_MAX_CHARS,
-                ))
-            for thesis in theses:
-                thesis_chunks, thesis_coverage = search_thesis_references(
-                    retriever,
+            # Seções, teses e a busca geral de jurisprudência vão ao
+            # retriever num único lote (um embedding e uma rodada de Qdrant).
+            section_requests = [
+                {
+                    "law_firm_id": law_firm_id,
+                    "query_text": f"Seção da peça: {section_label} | impugnação à contestação FAP",
+                    "context": context,
+                    "kind_plan": kind_plan,
+                    "max_chunks": _PREVIEW_MAX_CHUNKS,
+                    "max_chars": _PREVIEW_MAX_CHARS,
+                }
+                for section_label, kind_plan in _PREVIEW_SECTION_PLANS
+            ]
+            thesis_requests = [
+                build_thesis_search_request(
                     law_firm_id=law_firm_id,
-                    thesis_label=thesis.name,
                     thesis_key=(thesis.key or None),
                     query_text=f"Tese principal do caso: {thesis.name}",
                     context=context,
@@ -194,21 +196,35 @@ def build_documents_preview(
                     max_chars=_PREVIEW_MAX_CHARS,
                     min_distinct=2,
                 )
-                all_chunks.extend(thesis_chunks)
-                cobertura_teses.append(thesis_coverage)
-
+                for thesis in theses
+            ]
             # Espelha a busca geral de jurisprudência do enriquecimento — sem
             # ela, peças ricas em jurisprudência ficavam com menos trechos no
             # preview do que na geração e podiam não bater o mínimo de
             # confirmação, sendo excluídas mesmo com o usuário confirmando tudo.
-            all_chunks.extend(retriever.fetch_style_references(
-                law_firm_id=law_firm_id,
-                query_text=_PREVIEW_GENERAL_JURISPRUDENCE_QUERY,
-                context=context,
-                kind_plan=[("jurisprudence", 20)],
-                max_chunks=_PREVIEW_MAX_CHUNKS,
-                max_chars=_PREVIEW_MAX_CHARS,
-            ))
+            general_jurisprudence_request = {
+                "law_firm_id": law_firm_id,
+                "query_text": _PREVIEW_GENERAL_JURISPRUDENCE_QUERY,
+                "context": context,
+                "kind_plan": [("jurisprudence", 20)],
+                "max_chunks": _PREVIEW_MAX_CHUNKS,
+                "max_chars": _PREVIEW_MAX_CHARS,
+            }
+            search_results = retriever.fetch_style_references_batch(
+                section_requests + thesis_requests + [general_jurisprudence_request]
+            )
+            section_results = search_results[:len(section_requests)]
+            thesis_results = search_results[len(section_requests):len(section_requests) + len(thesis_requests)]
+
+            all_chunks: list[dict] = []
+            for section_chunks in section_results:
+                all_chunks.extend(section_chunks)
+            for thesis, thesis_chunks in zip(theses, thesis_results):
+                all_chunks.extend(thesis_chunks)
+                cobertura_teses.append(
+                    build_thesis_coverage(thesis.name, (thesis.key or None), thesis_chunks, context)
+                )
+            all_chunks.extend(search_results[-1])
 
             # F4: unifica os badges de tese do card da peça (que vêm de TODOS
             # os chunks, inclusive das buscas por seção) com `exemplos` da
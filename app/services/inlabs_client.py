@@ -25,10 +25,14 @@ from __future__ import annotations
 
 import logging
 import os
+import threading
 import time
 from datetime import date
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from app.services.streamed_download import CHUNK_SIZE, StagedFile, stage_chunks
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +44,9 @@ URL_DOWNLOAD = 'https://inlabs.in.gov.br/index.php?p='
 ORIGEM_SCRIPT = '736372697074'
 
 DEFAULT_TIMEOUT = int(os.environ.get('DOU_DOWNLOAD_TIMEOUT', '120'))
+# Conexões keep-alive mantidas por host: cobre os downloads simultâneos da
+# ingestão (DOU_DOWNLOAD_CONCURRENCY) sem abrir conexão nova a cada arquivo
+DEFAULT_POOL_SIZE = 10
 MAX_RETRIES = 3
 BACKOFF_BASE = 2  # segundos: 2, 4, 8
 
@@ -75,21 +82,41 @@ def pdf_filename(data: date, secao: str) -> str:
     return f"{data.strftime('%Y_%m_%d')}_ASSINADO_{secao.lower()}.pdf"
 
 
+def _fechar(resposta) -> None:
+    """Devolve a conexão ao pool sem ler o corpo (respostas em streaming)."""
+    close = getattr(resposta, 'close', None)
+    if close is not None:
+        close()
+
+
 class InlabsClient:
-    """Sessão autenticada com o INLABS. Reutilize a instância entre downloads."""
+    """Sessão autenticada com o INLABS. Reutilize a instância entre downloads.
+
+    Pode ser compartilhada entre threads: login e relogin são serializados
+    (um cookie por vez) e a sessão HTTP tem pool de conexões dimensionado
+    para downloads simultâneos.
+    """
 
     def __init__(self, email: str | None = None, password: str | None = None,
-                 timeout: int | None = None):
+                 timeout: int | None = None, pool_size: int | None = None):
         self._email = email or os.environ.get('INLABS_EMAIL')
         self._password = password or os.environ.get('INLABS_PASSWORD')
         self._timeout = timeout or DEFAULT_TIMEOUT
         self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size or DEFAULT_POOL_SIZE))
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
         self._cookie: str | None = None
+        self._login_lock = threading.RLock()
 
     # ------------------------------------------------------------------ login
 
     def login(self) -> None:
         """Autentica e guarda o cookie de sessão. Idempotente por instância."""
+        with self._login_lock:
+            self._login()
+
+    def _login(self) -> None:
         if not self._email or not self._password:
             raise InlabsNotConfigured(
                 'INLABS_EMAIL e INLABS_PASSWORD não configurados no .env'
@@ -125,8 +152,19 @@ class InlabsClient:
         logger.info('INLABS: sessão autenticada')
 
     def _garantir_sessao(self) -> None:
-        if not self._cookie:
-            self.login()
+        if self._cookie:
+            return
+        with self._login_lock:
+            if not self._cookie:
+                self._login()
+
+    def _relogin(self, cookie_recusado: str | None) -> None:
+        """Refaz o login uma vez por cookie expirado: com downloads simultâneos,
+        só a primeira thread que recebe 401/403 loga; as outras reaproveitam."""
+        with self._login_lock:
+            if self._cookie == cookie_recusado:
+                self._cookie = None
+                self._login()
 
     # --------------------------------------------------------------- download
 
@@ -138,24 +176,54 @@ class InlabsClient:
         """Baixa o PDF assinado da (data, seção). None quando não publicado (404)."""
         return self._download(data, pdf_filename(data, secao))
 
+    def download_xml_zip_to(self, data: date, secao: str, diretorio) -> StagedFile | None:
+        """Como download_xml_zip, mas em streaming para um temporário em
+        `diretorio` (SHA-256 já calculado). Quem chama publica ou descarta."""
+        return self._download_to(data, xml_filename(data, secao), diretorio)
+
+    def download_pdf_to(self, data: date, secao: str, diretorio) -> StagedFile | None:
+        """Como download_pdf, em streaming (ver download_xml_zip_to)."""
+        return self._download_to(data, pdf_filename(data, secao), diretorio)
+
     def _download(self, data: date, arquivo: str) -> bytes | None:
+        resposta = self._abrir(data, arquivo)
+        return resposta.content if resposta is not None else None
+
+    def _download_to(self, data: date, arquivo: str, diretorio) -> StagedFile | None:
+        resposta = self._abrir(data, arquivo, stream=True)
+        if resposta is None:
+            return None
+        try:
+            return stage_chunks(resposta.iter_content(CHUNK_SIZE), diretorio, arquivo)
+        except requests.exceptions.RequestException as exc:
+            raise InlabsError(f'download de {arquivo} interrompido: {exc}') from exc
+        finally:
+            resposta.close()
+
+    def _abrir(self, data: date, arquivo: str, stream: bool = False):
+        """Faz o GET e devolve a resposta 200 (corpo ainda não lido quando
+        `stream`), ou None quando não publicado."""
         self._garantir_sessao()
         url = f"{URL_DOWNLOAD}{data.strftime('%Y-%m-%d')}&dl={arquivo}"
+        extra = {'stream': True} if stream else {}
 
-        resposta = self._request_com_retry('GET', url, headers=self._headers_download())
+        cookie_usado = self._cookie
+        resposta = self._request_com_retry('GET', url, headers=self._headers_download(), **extra)
 
         # Cookie expirado no meio de um backfill longo: relogin transparente,
         # uma única retentativa. Segunda falha propaga.
         if resposta.status_code in (401, 403):
             logger.info('INLABS: sessão expirada, refazendo login')
-            self._cookie = None
-            self.login()
-            resposta = self._request_com_retry('GET', url, headers=self._headers_download())
+            _fechar(resposta)
+            self._relogin(cookie_usado)
+            resposta = self._request_com_retry('GET', url, headers=self._headers_download(), **extra)
 
         if resposta.status_code == 404:
             logger.info('INLABS: %s não publicado (404)', arquivo)
+            _fechar(resposta)
             return None
         if resposta.status_code != 200:
+            _fechar(resposta)
             raise InlabsError(f'INLABS devolveu HTTP {resposta.status_code} para {arquivo}')
 
         # O INLABS tem DUAS formas de dizer "não publicado", e só uma delas é
@@ -167,9 +235,10 @@ class InlabsClient:
         tipo = (resposta.headers.get('Content-Type') or '').lower()
         if 'text/html' in tipo:
             logger.info('INLABS: %s não publicado (portal devolveu HTML)', arquivo)
+            _fechar(resposta)
             return None
 
-        return resposta.content
+        return resposta
 
     def _headers_download(self) -> dict:
         return {'Cookie': f'inlabs_session_cookie={self._cookie}', 'origem': ORIGEM_SCRIPT}
@@ -136,7 +136,7 @@ def build_attachments_context(
     total_chars = 0
     max_total_chars = 30000
     query_enhancer = QueryEnhancerAgent()
-    improved_query = query_enhancer.enhance_question(question, history=history)
+    improved_query = query_enhancer.enhance_question(question, history=history, law_firm_id=law_firm_id)
 
     for raw_file in uploaded_files:
         if not raw_file or not raw_file.filename:
@@ -0,0 +1,303 @@
+"""Cache em disco das páginas renderizadas do visualizador de trechos.
+
+O modal de trechos pede várias páginas por resultado e cada pedido abria o
+PDF, renderizava a página a 2x e procurava os termos. Aqui a página limpa
+(PNG) e o índice de palavras (`page.get_text("words")`) ficam em disco,
+chaveados por hash do arquivo + página (+ escala no PNG); por pedido só se
+calculam os retângulos dos termos e se desenha o destaque por cima.
+
+Layout: `<KB_PAGE_IMAGE_CACHE_DIR>/<hash[:2]>/<hash>/p<página>@<escala>.png`,
+`p<página>.words.json` e `meta.json` (número de páginas). Escritas atômicas
+(arquivo temporário + `os.replace`), seguras entre workers.
+
+Despejo LRU por tamanho: cada acerto atualiza o mtime do arquivo; quando o
+processo já escreveu ~5% do limite desde a última varredura, apaga os mais
+antigos até ficar abaixo de 90% de KB_PAGE_IMAGE_CACHE_MAX_MB. O despejo
+pode rodar em outro worker a qualquer momento: o PNG é lido para a memória
+na própria consulta e, se tiver sumido, a página é renderizada de novo.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[3]
+
+KB_PAGE_IMAGE_CACHE_DIR = os.getenv(
+    'KB_PAGE_IMAGE_CACHE_DIR',
+    str(_PROJECT_ROOT / 'uploads' / 'cache' / 'kb_page_images'),
+)
+try:
+    KB_PAGE_IMAGE_CACHE_MAX_MB = max(16, int(os.getenv('KB_PAGE_IMAGE_CACHE_MAX_MB', '1024')))
+except ValueError:
+    KB_PAGE_IMAGE_CACHE_MAX_MB = 1024
+
+# Cache do navegador: o conteúdo de um file_id não muda; o ETag cobre o resto
+PAGE_IMAGE_MAX_AGE_SECONDS = 86400
+
+# Muda quando o formato do PNG/índice ou o desenho do destaque mudar
+CACHE_VERSION = 'v1'
+
+HIGHLIGHT_FILL = (255, 230, 0, 140)
+HIGHLIGHT_PADDING = 2
+
+
+@dataclass
+class CachedPage:
+    png_path: str
+    png_bytes: bytes
+    words: list
+    page_index: int
+    scale: float
+
+
+def file_cache_key(file_hash: str | None, resolved_path: str) -> str:
+    """Chave do arquivo: file_hash da knowledge_base; para linhas antigas sem
+    hash, caminho + mtime + tamanho (muda se o arquivo for trocado)."""
+    if file_hash:
+        return file_hash.lower()
+    stat = os.stat(resolved_path)
+    raw = f"{os.path.abspath(resolved_path)}:{stat.st_mtime_ns}:{stat.st_size}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def page_etag(cache_key: str, page_no: int, scale: float, terms: list[str]) -> str:
+    """ETag do PNG final (página + destaque); calculável sem abrir o PDF."""
+    raw = '\x1f'.join([CACHE_VERSION, cache_key, str(page_no), f"{scale:g}", *terms])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class PageImageCache:
+    """Páginas renderizadas + índice de palavras em disco, com despejo LRU."""
+
+    def __init__(self, base_dir: str, max_bytes: int):
+        self.base_dir = Path(base_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._written_since_sweep = 0
+        self._swept_once = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ── caminhos ────────────────────────────────────────────────────────
+    def _file_dir(self, cache_key: str) -> Path:
+        return self.base_dir / cache_key[:2] / cache_key
+
+    @staticmethod
+    def _png_name(page_index: int, scale: float) -> str:
+        return f"p{page_index + 1}@{scale:g}.png"
+
+    @staticmethod
+    def _words_name(page_index: int) -> str:
+        return f"p{page_index + 1}.words.json"
+
+    # ── leitura ─────────────────────────────────────────────────────────
+    def _read_page_count(self, file_dir: Path) -> int | None:
+        try:
+            with open(file_dir / 'meta.json', encoding='utf-8') as fh:
+                return int(json.load(fh)['page_count'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def _clamp(page_no: int, page_count: int) -> int:
+        page_index = max(0, page_no - 1)  # 1-based → 0-based
+        return min(page_index, max(page_count - 1, 0))
+
+    def _lookup(self, file_dir: Path, page_no: int, scale: float) -> CachedPage | None:
+        page_count = self._read_page_count(file_dir)
+        if page_count is None:
+            return None
+        page_index = self._clamp(page_no, page_count)
+        png_path = file_dir / self._png_name(page_index, scale)
+        words_path = file_dir / self._words_name(page_index)
+        try:
+            with open(words_path, encoding='utf-8') as fh:
+                words = json.load(fh)
+            with open(png_path, 'rb') as fh:
+                png_bytes = fh.read()
+            now = time.time()
+            os.utime(png_path, (now, now))
+            os.utime(words_path, (now, now))
+        except (OSError, ValueError):
+            # Inclui o arquivo despejado entre a leitura do índice e a do PNG
+            return None
+        return CachedPage(str(png_path), png_bytes, words, page_index, scale)
+
+    def get_page(self, cache_key: str, resolved_path: str, page_no: int, scale: float = 2.0) -> CachedPage:
+        """Página limpa + palavras; renderiza e grava no primeiro acesso."""
+        file_dir = self._file_dir(cache_key)
+        cached = self._lookup(file_dir, page_no, scale)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        import fitz
+
+        with fitz.open(resolved_path) as doc:
+            page_count = len(doc)
+            page_index = self._clamp(page_no, page_count)
+            page = doc[page_index]
+            words = [list(w) for w in page.get_text("words")]  # (x0,y0,x1,y1,word,block,line,word_idx)
+            pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csRGB)
+            png_bytes = pix.tobytes("png")
+
+        file_dir.mkdir(parents=True, exist_ok=True)
+        written = self._write_atomic(file_dir / 'meta.json', json.dumps({'page_count': page_count}).encode('utf-8'))
+        written += self._write_atomic(file_dir / self._words_name(page_index),
+                                      json.dumps(words, ensure_ascii=False).encode('utf-8'))
+        written += self._write_atomic(file_dir / self._png_name(page_index, scale), png_bytes)
+        self._after_write(written)
+        return CachedPage(str(file_dir / self._png_name(page_index, scale)), png_bytes, words, page_index, scale)
+
+    # ── escrita e despejo ───────────────────────────────────────────────
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> int:
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def _after_write(self, written: int) -> None:
+        with self._lock:
+            self._written_since_sweep += written
+            due = not self._swept_once or self._written_since_sweep >= self.max_bytes // 20
+            if due:
+                self._written_since_sweep = 0
+                self._swept_once = True
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Apaga os arquivos menos usados até ficar abaixo de 90% do limite."""
+        entries = []
+        total = 0
+        for root, _dirs, files in os.walk(self.base_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                total += stat.st_size
+                # meta.json é minúsculo e compartilhado pelas páginas: sai por último
+                entries.append((name == 'meta.json', stat.st_mtime, stat.st_size, path))
+        if total <= self.max_bytes:
+            return 0
+
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _is_meta, _mtime, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        for root, dirs, files in os.walk(self.base_dir, topdown=False):
+            if root != str(self.base_dir) and not dirs and not files:
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+        self.evictions += removed
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            'dir': str(self.base_dir),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+page_image_cache = PageImageCache(KB_PAGE_IMAGE_CACHE_DIR, KB_PAGE_IMAGE_CACHE_MAX_MB * 1024 * 1024)
+
+
+# ── destaque ────────────────────────────────────────────────────────────
+def _group_lines(words: list) -> dict:
+    lines: dict = {}
+    for w in words:
+        lines.setdefault((w[5], w[6]), []).append(w)  # (block_no, line_no)
+    for line_words in lines.values():
+        line_words.sort(key=lambda w: w[7])
+    return lines
+
+
+def _phrase_rects(lines: dict, term: str) -> list:
+    """Equivalente por palavras do `page.search_for`: sem diferenciar
+    maiúsculas, aceita o termo atravessando palavras da mesma linha."""
+    needle = ' '.join(term.lower().split())
+    if not needle:
+        return []
+    rects = []
+    for line_words in lines.values():
+        spans, parts, offset = [], [], 0
+        for w in line_words:
+            text = str(w[4]).lower()
+            spans.append((offset, offset + len(text)))
+            parts.append(text)
+            offset += len(text) + 1
+        line_text = ' '.join(parts)
+        start = line_text.find(needle)
+        while start != -1:
+            end = start + len(needle)
+            rects.extend(w[:4] for w, (s, e) in zip(line_words, spans) if s < end and e > start)
+            start = line_text.find(needle, end)
+    return rects
+
+
+def find_match_rects(words: list, terms: list[str]) -> list:
+    """Retângulos (coordenadas do PDF) dos termos na página, a partir do
+    índice de palavras em cache."""
+    lines = _group_lines(words)
+    match_rects = []
+    for term in terms:
+        found = _phrase_rects(lines, term)
+        if not found:
+            # Fallback: substring dentro da palavra (ex: número dividido em partes)
+            found = [w[:4] for w in words if term in w[4]]
+        if not found:
+            # Fallback 2: concatena as palavras da linha e destaca a primeira linha que contém o termo
+            for line_words in lines.values():
+                if term in ''.join(w[4] for w in line_words):
+                    found = [w[:4] for w in line_words]
+                    break
+        match_rects.extend(found)
+    return match_rects
+
+
+def render_highlighted_png(cached: CachedPage, terms: list[str]) -> tuple[io.BytesIO, int]:
+    """PNG final: a página em cache com os destaques desenhados por cima."""
+    import PIL.Image
+    import PIL.ImageDraw
+
+    match_rects = find_match_rects(cached.words, terms) if terms else []
+    buf = io.BytesIO()
+    with PIL.Image.open(io.BytesIO(cached.png_bytes)) as page_img:
+        img = page_img.convert("RGB")
+    if match_rects:
+        scale = cached.scale
+        overlay = PIL.Image.new("RGBA", img.size, (0, 0, 0, 0))
+        draw = PIL.ImageDraw.Draw(overlay)
+        pad = HIGHLIGHT_PADDING
+        for x0, y0, x1, y1 in match_rects:
+            # Escala as coordenadas PDF para as da imagem, com área levemente maior
+            draw.rectangle([int(x0 * scale) - pad, int(y0 * scale) - pad,
+                            int(x1 * scale) + pad, int(y1 * scale) + pad], fill=HIGHLIGHT_FILL)
+        img = PIL.Image.alpha_composite(img.convert("RGBA"), overlay).convert("RGB")
+    img.save(buf, format="PNG", compress_level=3)
+    buf.seek(0)
+    return buf, len(match_rects)
@@ -0,0 +1,222 @@
+"""Atalho sem LLM para o pré-processamento das perguntas da base de conhecimento.
+
+Antes da busca, uma pergunta podia passar por até três chamadas a modelos
+pequenos em sequência: QueryEnhancerAgent (reformulação), ContextRetrieval
+RoutingAgent (buscar? em qual modo?) e KeywordExtractionAgent (termos para o
+full-text). Este módulo evita essas chamadas quando dá:
+
+1. pré-classificador determinístico (`preclassify`): regex para CNJ, CNPJ,
+   CPF, NB, espécie de benefício (B91…) e números longos, cumprimentos e
+   perguntas curtas. Quando é confiável, a decisão/termos saem direto daqui;
+2. cache TTL/LRU por processo das respostas do LLM, chave
+   `(law_firm_id, pergunta normalizada, hash do histórico)`. Falhas do LLM
+   não entram no cache.
+
+Contadores por etapa (regra / cache / llm) e latência média do LLM em
+`stats()` — a economia estimada é (regra + cache) × latência média do LLM.
+Expostos em /admin/access-audit/kb-query-fast-path.
+
+Config: KB_QUERY_FAST_PATH (default true; false desliga só as regras),
+KB_QUERY_CACHE_TTL_SECONDS (default 900; 0 desliga o cache) e
+KB_QUERY_CACHE_MAX_ENTRIES (default 2048).
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+from app.services.layout_context_cache import TTLCache
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except (TypeError, ValueError):
+        return default
+
+
+KB_QUERY_FAST_PATH = os.getenv("KB_QUERY_FAST_PATH", "true").strip().lower() in {"1", "true", "yes", "on"}
+
+# Acima disso a pergunta é tratada como análise, mesmo com número no meio
+FAST_PATH_MAX_WORDS = 12
+SHORT_QUERY_MAX_WORDS = 3
+
+_CNJ_RE = re.compile(r"(?<!\d)\d{7}-?\d{2}\.?\d{4}\.?\d\.?\d{2}\.?\d{4}(?!\d)")
+_CNPJ_RE = re.compile(r"(?<!\d)\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}(?!\d)")
+_CPF_RE = re.compile(r"(?<!\d)\d{3}\.?\d{3}\.?\d{3}[.\-]{0,2}\d{2}(?!\d)")
+_NB_RE = re.compile(r"\bNB\s*(?:n[ºo°.]*)?\s*:?\s*(\d[\d.\-/]{6,14}\d)", re.IGNORECASE)
+_BENEFIT_SPECIES_RE = re.compile(r"\bB\s?-?(\d{2})\b")
+_LONG_NUMBER_RE = re.compile(r"(?<![\d.\-/])\d{8,}(?![\d.\-/])")
+_SMALL_TALK_RE = re.compile(
+    r"^(oi|ol[aá]|e a[ií]|bom dia|boa tarde|boa noite|obrigad[oa]|muito obrigad[oa]|valeu|tchau|"
+    r"ok|okay|certo|beleza|entendi|perfeito|tudo bem|at[eé] mais)[\s!.,?]*$",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class Preclassification:
+    identifiers: list[tuple[str, str]] = field(default_factory=list)  # (tipo, valor como veio)
+    keywords: list[str] = field(default_factory=list)
+    word_count: int = 0
+    small_talk: bool = False
+
+    @property
+    def has_identifiers(self) -> bool:
+        return bool(self.identifiers)
+
+    @property
+    def identifier_lookup(self) -> bool:
+        """Pergunta curta com identificador: busca direta por termo."""
+        return self.has_identifiers and self.word_count <= FAST_PATH_MAX_WORDS
+
+    @property
+    def short(self) -> bool:
+        return 0 < self.word_count <= SHORT_QUERY_MAX_WORDS
+
+
+def _digits(value: str) -> str:
+    return re.sub(r"\D", "", value)
+
+
+def preclassify(question: str) -> Preclassification:
+    """Identificadores, termos-chave (original + só dígitos, como o
+    KeywordExtractionAgent devolve) e cumprimentos, sem LLM."""
+    text = (question or "").strip()
+    result = Preclassification(word_count=len(text.split()))
+    if not text:
+        return result
+    if _SMALL_TALK_RE.match(text):
+        result.small_talk = True
+        return result
+
+    remaining = text
+    for kind, pattern in (("cnj", _CNJ_RE), ("cnpj", _CNPJ_RE), ("cpf", _CPF_RE), ("nb", _NB_RE)):
+        for match in pattern.finditer(remaining):
+            value = match.group(1) if pattern.groups else match.group(0)
+            result.identifiers.append((kind, value))
+        # Remove o que já casou para um CNJ não virar também CPF/número solto
+        remaining = pattern.sub(" ", remaining)
+    for match in _LONG_NUMBER_RE.finditer(remaining):
+        result.identifiers.append(("number", match.group(0)))
+    for match in _BENEFIT_SPECIES_RE.finditer(remaining):
+        result.identifiers.append(("benefit_species", f"B{match.group(1)}"))
+
+    for kind, value in result.identifiers:
+        variants = (value,) if kind == "benefit_species" else (value, _digits(value))
+        for keyword in variants:
+            if keyword and keyword not in result.keywords:
+                result.keywords.append(keyword)
+    return result
+
+
+def normalize_question(question: str) -> str:
+    return " ".join((question or "").lower().split())
+
+
+def history_hash(history) -> str:
+    if not history:
+        return ""
+    raw = json.dumps(
+        [(item.get("role"), item.get("content")) for item in history if isinstance(item, dict)],
+        ensure_ascii=False, default=str,
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def cache_key(law_firm_id, question: str, history=None) -> tuple:
+    return (law_firm_id, normalize_question(question), history_hash(history))
+
+
+class QueryCache(TTLCache):
+    """TTLCache com TTL/tamanho próprios (KB_QUERY_CACHE_*)."""
+
+    @staticmethod
+    def ttl_seconds() -> int:
+        return _env_int("KB_QUERY_CACHE_TTL_SECONDS", 900)
+
+    @staticmethod
+    def max_entries() -> int:
+        return max(1, _env_int("KB_QUERY_CACHE_MAX_ENTRIES", 2048))
+
+
+enhanced_question_cache = QueryCache("enhanced_question")
+routing_decision_cache = QueryCache("routing_decision")
+keywords_cache = QueryCache("keywords")
+
+
+class FastPathStats:
+    """Quantas vezes cada etapa saiu por regra, cache ou LLM (por processo)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: dict[str, dict] = {}
+
+    def _stage(self, stage: str) -> dict:
+        return self._counts.setdefault(stage, {"rule": 0, "cache": 0, "llm": 0, "llm_ms_total": 0.0})
+
+    def record(self, stage: str, path: str, llm_ms: float | None = None) -> None:
+        with self._lock:
+            counts = self._stage(stage)
+            counts[path] += 1
+            if llm_ms is not None:
+                counts["llm_ms_total"] += llm_ms
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for stage, counts in self._counts.items():
+                total = counts["rule"] + counts["cache"] + counts["llm"]
+                avg_llm_ms = counts["llm_ms_total"] / counts["llm"] if counts["llm"] else None
+                skipped = counts["rule"] + counts["cache"]
+                result[stage] = {
+                    "rule": counts["rule"],
+                    "cache": counts["cache"],
+                    "llm": counts["llm"],
+                    "skip_rate": round(skipped / total, 4) if total else None,
+                    "avg_llm_ms": round(avg_llm_ms, 1) if avg_llm_ms is not None else None,
+                    "estimated_saved_ms": round(skipped * avg_llm_ms) if avg_llm_ms is not None else None,
+                }
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+fast_path_stats = FastPathStats()
+
+
+def cached_llm_call(stage: str, cache: QueryCache, key: tuple, loader):
+    """`loader()` (a chamada ao LLM) via cache, registrando cache × llm.
+
+    Exceções do loader sobem sem gravar no cache."""
+    loaded = False
+
+    def _load():
+        nonlocal loaded
+        loaded = True
+        started = time.perf_counter()
+        value = loader()
+        fast_path_stats.record(stage, "llm", (time.perf_counter() - started) * 1000)
+        return value
+
+    value = cache.get_or_load(key, _load)
+    if not loaded:
+        fast_path_stats.record(stage, "cache")
+    return value
+
+
+def stats() -> dict:
+    return {
+        "fast_path_enabled": KB_QUERY_FAST_PATH,
+        "ttl_seconds": QueryCache.ttl_seconds(),
+        "max_entries": QueryCache.max_entries(),
+        "stages": fast_path_stats.snapshot(),
+        enhanced_question_cache.name: enhanced_question_cache.stats(),
+        routing_decision_cache.name: routing_decision_cache.stats(),
+        keywords_cache.name: keywords_cache.stats(),
+    }
@@ -0,0 +1,83 @@
+"""Hidratação dos resultados de busca da base de conhecimento.
+
+Os trechos vêm do Qdrant/Meilisearch com `file_id` no payload; as telas
+precisam do arquivo (nome, descrição, tipo) e de conferir que ele é do
+escritório. Em vez de um `KnowledgeBase.query...first()` por trecho, junta os
+`file_id` e carrega tudo em uma consulta `IN` (em lotes), só com as colunas
+usadas. O banco segue como fonte dos metadados (descrição pode ter sido
+editada depois da ingestão); o que já vem no payload (source, description)
+completa o que faltar no banco.
+
+Usado pela Pesquisa Inteligente (tela), pelo chat (/api/ask, tela /search)
+e pelas tools MCP da base de conhecimento.
+"""
+from sqlalchemy.orm import load_only
+
+from app.models import KnowledgeBase
+
+_IN_CHUNK_SIZE = 500
+
+
+def _payload_of(item) -> dict:
+    if isinstance(item, dict):
+        return item
+    return getattr(item, 'payload', None) or {}
+
+
+def collect_file_ids(items, file_id_key: str = 'file_id') -> set[int]:
+    """file_ids distintos de pontos (payload) ou dicts de resultado."""
+    file_ids = set()
+    for item in items or []:
+        file_id = _payload_of(item).get(file_id_key)
+        if file_id:
+            file_ids.add(file_id)
+    return file_ids
+
+
+def load_result_files(file_ids, law_firm_id: int, active_only: bool = False) -> dict[int, KnowledgeBase]:
+    """Arquivos do escritório por id, em uma consulta por lote de 500 ids."""
+    ids = sorted({file_id for file_id in file_ids or () if file_id})
+    if not ids or not law_firm_id:
+        return {}
+
+    files: dict[int, KnowledgeBase] = {}
+    for start in range(0, len(ids), _IN_CHUNK_SIZE):
+        query = KnowledgeBase.query.options(load_only(
+            KnowledgeBase.id,
+            KnowledgeBase.law_firm_id,
+            KnowledgeBase.original_filename,
+            KnowledgeBase.description,
+            KnowledgeBase.file_type,
+            KnowledgeBase.category,
+            KnowledgeBase.is_active,
+        )).filter(
+            KnowledgeBase.id.in_(ids[start:start + _IN_CHUNK_SIZE]),
+            KnowledgeBase.law_firm_id == law_firm_id,
+        )
+        if active_only:
+            query = query.filter(KnowledgeBase.is_active.is_(True))
+        for kb in query.all():
+            files[kb.id] = kb
+    return files
+
+
+def file_info_for(payload: dict, kb: KnowledgeBase | None) -> dict | None:
+    """Metadados do arquivo para a tela: banco, com o payload completando."""
+    if kb is None:
+        return None
+    return {
+        'original_filename': kb.original_filename or payload.get('source') or None,
+        'description': kb.description or payload.get('description') or None,
+        'file_type': kb.file_type,
+    }
+
+
+def filter_sources_detail(sources_detail: list[dict], law_firm_id: int) -> list[dict]:
+    """Fontes citadas pelo chat restritas a arquivos ativos do escritório.
+
+    Entradas sem file_id (documentos antigos) são mantidas como antes."""
+    files = load_result_files(collect_file_ids(sources_detail), law_firm_id, active_only=True)
+    return [
+        item for item in sources_detail or []
+        if not item.get('file_id') or item.get('file_id') in files
+    ]
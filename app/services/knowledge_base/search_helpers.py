@@ -1,5 +1,16 @@
 import re
 import unicodedata
+from functools import lru_cache
+
+
+@lru_cache(maxsize=128)
+def _highlight_pattern(search_query: str):
+    """Uma regex por busca (não por trecho); termos mais longos primeiro."""
+    search_terms = {term for term in search_query.strip().split() if len(term) > 2}
+    if not search_terms:
+        return None
+    alternatives = '|'.join(re.escape(term) for term in sorted(search_terms, key=len, reverse=True))
+    return re.compile(f'({alternatives})', re.IGNORECASE)
 
 
 def highlight_search_terms(text: str, search_query: str) -> str:
@@ -7,16 +18,10 @@ def highlight_search_terms(text: str, search_query: str) -> str:
     if not search_query or not text:
         return text
 
-    search_terms = search_query.strip().split()
-    search_terms = [term for term in search_terms if len(term) > 2]
-
-    highlighted_text = text
-    for term in search_terms:
-        escaped_term = re.escape(term)
-        pattern = re.compile(f'({escaped_term})', re.IGNORECASE)
-        highlighted_text = pattern.sub(r'<mark class="highlight-term">\1</mark>', highlighted_text)
-
-    return highlighted_text
+    pattern = _highlight_pattern(search_query)
+    if pattern is None:
+        return text
+    return pattern.sub(r'<mark class="highlight-term">\1</mark>', text)
 
 
 def looks_like_name_query(query: str) -> bool:
@@ -70,24 +75,29 @@ def name_tokens(query: str):
     return [token for token in normalized_query.split(' ') if token and token not in ignored and len(token) >= 2]
 
 
-# Cortes mínimos de score usados pela Pesquisa Inteligente (tela e MCP)
+# Cortes mínimos de score usados pela Pesquisa Inteligente (tela e MCP).
+# No modo híbrido cada ramo já passou pelo próprio corte (semântico ou
+# full-text) antes da fusão RRF: cosseno e _rankingScore não têm a mesma
+# escala, então não se corta o maior dos dois. O corte híbrido sobre o score
+# fundido, igual ao semântico, não descarta nada que os ramos aceitaram.
 SEMANTIC_SCORE_CUTOFF = 0.30
 FULL_TEXT_SCORE_CUTOFF = 0.40
+HYBRID_SCORE_CUTOFF = SEMANTIC_SCORE_CUTOFF
 
 
 def adjust_search_score(search_query: str, search_mode: str, base_score: float,
                         candidate_text: str) -> tuple[float, bool]:
     """Regra compartilhada de pontuação da busca.
 
-    Aplica os reforços de match literal e cobertura de tokens de nome (modo
-    semântico) sobre o score bruto. Retorna (score_ajustado, match_literal).
+    Aplica os reforços de match literal e cobertura de tokens de nome (modos
+    semântico e híbrido) sobre o score bruto. Retorna (score_ajustado, match_literal).
     """
     query_normalized = normalize_for_match(search_query)
     candidate_normalized = normalize_for_match(candidate_text)
     has_literal_match = bool(query_normalized) and query_normalized in candidate_normalized
 
     adjusted = float(base_score or 0)
-    if search_mode == 'semantic':
+    if search_mode in ('semantic', 'hybrid'):
         name_query = looks_like_name_query(search_query)
         if has_literal_match:
             adjusted += 0.30 if name_query else 0.08
@@ -108,4 +118,6 @@ def passes_score_cutoff(score: float, search_mode: str) -> bool:
     """Corte mínimo de relevância por modo de busca (mesma regra da tela)."""
     if search_mode == 'semantic':
         return score > SEMANTIC_SCORE_CUTOFF
+    if search_mode == 'hybrid':
+        return score > HYBRID_SCORE_CUTOFF
     return score >= FULL_TEXT_SCORE_CUTOFF
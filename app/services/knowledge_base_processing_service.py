@@ -759,6 +759,7 @@ class KnowledgeBaseProcessingService:
                         tags=item.tags,
                         lawsuit_number=None if is_fap_report else item.lawsuit_number,
                         file_id=item.id,
+                        law_firm_id=item.law_firm_id,
                     )
 
                 if not markdown_content:
@@ -0,0 +1,119 @@
+"""
+Cache do contexto de layout (header) por processo.
+
+Os context processors do layout rodam em todo render de template: os
+comentários recentes do escritório eram uma consulta com join
+(CaseComment/Case/User) por página, e as permissões de módulo eram
+re-parseadas a cada vez. Os dois mudam raramente, então ficam num LRU com
+TTL por processo:
+
+- comentários recentes: chave = law_firm_id; invalidado pelo blueprint
+  case_comments (criar/responder/editar/excluir) e pela edição/exclusão de
+  casos. Em outros workers a mudança aparece no fim do TTL.
+- permissões de módulo: chave = (papel, permissões cruas da sessão).
+
+TTL em LAYOUT_CONTEXT_CACHE_TTL_SECONDS (default 60; 0 desliga) e tamanho em
+LAYOUT_CONTEXT_CACHE_MAX_ENTRIES (default 512). Contadores de acerto/falta
+em `stats()` (expostos em /admin/access-audit/layout-cache).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except (TypeError, ValueError):
+        return default
+
+
+class TTLCache:
+    """LRU com TTL, thread-safe, com contadores de acerto/falta."""
+
+    _MISSING = object()
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def ttl_seconds() -> int:
+        return _env_int('LAYOUT_CONTEXT_CACHE_TTL_SECONDS', 60)
+
+    @staticmethod
+    def max_entries() -> int:
+        return max(1, _env_int('LAYOUT_CONTEXT_CACHE_MAX_ENTRIES', 512))
+
+    def get_or_load(self, key, loader):
+        """Devolve o valor da chave; em falta (ou expirado) chama `loader()`.
+
+        O loader roda fora do lock: duas requests simultâneas na mesma chave
+        podem carregar em dobro, o que é aceitável para dados de header."""
+        ttl = self.ttl_seconds()
+        if ttl == 0:
+            return loader()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            if entry is not self._MISSING and now - entry[0] < ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self.invalidations
+
+        value = loader()
+
+        with self._lock:
+            # Invalidação durante a carga: não guarda um valor possivelmente velho
+            if generation == self.invalidations:
+                self._entries[key] = (now, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries():
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key=_MISSING) -> None:
+        """Descarta uma chave (ou tudo, sem argumento)."""
+        with self._lock:
+            if key is self._MISSING:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+recent_case_comments_cache = TTLCache('recent_case_comments')
+module_permissions_cache = TTLCache('module_permissions')
+
+
+def invalidate_recent_case_comments(law_firm_id) -> None:
+    if law_firm_id:
+        recent_case_comments_cache.invalidate(law_firm_id)
+
+
+def stats() -> dict:
+    return {
+        'ttl_seconds': TTLCache.ttl_seconds(),
+        'max_entries': TTLCache.max_entries(),
+        recent_case_comments_cache.name: recent_case_comments_cache.stats(),
+        module_permissions_cache.name: module_permissions_cache.stats(),
+    }
@@ -1,14 +1,61 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
 
 import requests
+from flask import current_app, has_app_context
 from opencnpj import OpenCNPJ
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models import db, CnpjCompanyCache
+from app.services import benefit_search_service
+
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except (TypeError, ValueError):
+        return default
+
+
+# Validade do cache (tabela cnpj_company_cache). 0 desliga a camada.
+OPENCNPJ_CACHE_TTL_DAYS = _env_int("OPENCNPJ_CACHE_TTL_DAYS", 30)
+OPENCNPJ_NEGATIVE_CACHE_TTL_HOURS = _env_int("OPENCNPJ_NEGATIVE_CACHE_TTL_HOURS", 24)
+OPENCNPJ_PREFETCH_WORKERS = max(1, _env_int("OPENCNPJ_PREFETCH_WORKERS", 4))
+# Quanto um pedido concorrente espera a consulta em andamento do mesmo CNPJ
+_COALESCE_WAIT_SECONDS = 60
+
+
+class _InFlightLookup:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+
+
+_inflight_lock = threading.Lock()
+_inflight: Dict[str, _InFlightLookup] = {}
 
 
 class OpenCNPJService:
-    """Service de integração com OpenCNPJ via SDK e fallback HTTP."""
+    """Service de integração com OpenCNPJ via SDK e fallback HTTP.
+
+    As consultas passam por um cache em banco (cnpj_company_cache): sucesso
+    vale OPENCNPJ_CACHE_TTL_DAYS (default 30) e "não encontrado" vale
+    OPENCNPJ_NEGATIVE_CACHE_TTL_HOURS (default 24). Erros da API (5xx, rede)
+    não entram. Consultas simultâneas do mesmo CNPJ no processo viram uma só
+    ida à API (as outras esperam o resultado). `prefetch_companies` resolve
+    uma lista de CNPJs de uma vez (importação de relatórios em lote).
+    """
 
     BASE_URL = "https://api.opencnpj.org"
 
@@ -20,9 +67,23 @@ class OpenCNPJService:
     def format_cnpj(cnpj_limpo: str) -> str:
         return f"{cnpj_limpo[:2]}.{cnpj_limpo[2:5]}.{cnpj_limpo[5:8]}/{cnpj_limpo[8:12]}-{cnpj_limpo[12:14]}"
 
-    def lookup_company(self, cnpj: str) -> Dict[str, Any]:
+    def __init__(self):
+        self._local = threading.local()
+
+    def _sdk_client(self) -> OpenCNPJ:
+        # Um cliente do SDK por thread (a importação em lote consulta em paralelo)
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = OpenCNPJ()
+            self._local.api = api
+        return api
+
+    def lookup_company(self, cnpj: str, use_cache: bool = True) -> Dict[str, Any]:
         """Busca empresa e retorna payload padronizado para uso em rota/UI.
 
+        Consulta o cache antes da API; `use_cache=False` força a ida à API
+        (o resultado ainda atualiza o cache).
+
         Retorno:
             {"success": bool, "status_code": int, "message": str|None, "data": dict|None}
         """
@@ -35,18 +96,159 @@ class OpenCNPJService:
                 "data": None,
             }
 
+        if use_cache:
+            cached = self._read_cache([cnpj_limpo]).get(cnpj_limpo)
+            if cached is not None:
+                return cached
+
+        return self._coalesced_fetch(cnpj, cnpj_limpo)
+
+    def prefetch_companies(self, cnpjs: Iterable[str], max_workers: int | None = None) -> Dict[str, Dict[str, Any]]:
+        """Resolve vários CNPJs de uma vez: uma leitura do cache para todos e
+        consultas paralelas à API só para os que faltam.
+
+        Retorna {cnpj_só_dígitos: resultado no formato de `lookup_company`}."""
+        digits_list = sorted({
+            digits for digits in (self.sanitize_cnpj(cnpj) for cnpj in cnpjs or ())
+            if len(digits) == 14
+        })
+        if not digits_list:
+            return {}
+
+        results = self._read_cache(digits_list)
+        missing = [digits for digits in digits_list if digits not in results]
+        if not missing:
+            return results
+
+        app = current_app._get_current_object() if has_app_context() else None
+
+        def _fetch(digits: str):
+            if app is None:
+                return digits, self._coalesced_fetch(digits, digits)
+            with app.app_context():
+                return digits, self._coalesced_fetch(digits, digits)
+
+        workers = min(max_workers or OPENCNPJ_PREFETCH_WORKERS, len(missing))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for digits, result in executor.map(_fetch, missing):
+                results[digits] = result
+        return results
+
+    # ── cache ───────────────────────────────────────────────────────────
+    @staticmethod
+    def _cache_enabled() -> bool:
+        return OPENCNPJ_CACHE_TTL_DAYS > 0 and has_app_context()
+
+    def _read_cache(self, digits_list: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Resultados ainda válidos do cache. Conexão própria: não mexe na
+        sessão de quem chama (a importação tem objetos pendentes)."""
+        if not digits_list or not self._cache_enabled():
+            return {}
+        table = CnpjCompanyCache.__table__
+        found: Dict[str, Dict[str, Any]] = {}
+        try:
+            with db.engine.connect() as connection:
+                rows = connection.execute(
+                    select(table.c.cnpj, table.c.status, table.c.data).where(
+                        table.c.cnpj.in_(digits_list),
+                        table.c.expires_at > datetime.now(),
+                    )
+                ).all()
+        except Exception:
+            logger.warning("Falha ao ler cache da OpenCNPJ; seguindo sem cache", exc_info=True)
+            return {}
+        for row in rows:
+            if row.status == "found":
+                found[row.cnpj] = {"success": True, "status_code": 200, "message": None, "data": row.data}
+            else:
+                found[row.cnpj] = self._not_found_result()
+        return found
+
+    def _write_cache(self, digits: str, result: Dict[str, Any]) -> None:
+        if not self._cache_enabled():
+            return
+        status_code = result.get("status_code")
+        if status_code == 200 and result.get("success"):
+            status, data, ttl = "found", result.get("data"), timedelta(days=OPENCNPJ_CACHE_TTL_DAYS)
+        elif status_code == 404:
+            status, data, ttl = "not_found", None, timedelta(hours=OPENCNPJ_NEGATIVE_CACHE_TTL_HOURS)
+        else:
+            return
+
+        now = datetime.now()
+        row = {"cnpj": digits, "status": status, "data": data, "fetched_at": now, "expires_at": now + ttl}
+        table = CnpjCompanyCache.__table__
+        try:
+            with db.engine.begin() as connection:
+                if connection.dialect.name == "mysql":
+                    stmt = mysql_insert(table).values(row)
+                    stmt = stmt.on_duplicate_key_update(
+                        status=stmt.inserted.status,
+                        data=stmt.inserted.data,
+                        fetched_at=stmt.inserted.fetched_at,
+                        expires_at=stmt.inserted.expires_at,
+                    )
+                else:
+                    stmt = sqlite_insert(table).values(row)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["cnpj"],
+                        set_={
+                            "status": stmt.excluded.status,
+                            "data": stmt.excluded.data,
+                            "fetched_at": stmt.excluded.fetched_at,
+                            "expires_at": stmt.excluded.expires_at,
+                        },
+                    )
+                connection.execute(stmt)
+        except Exception:
+            logger.warning("Falha ao gravar cache da OpenCNPJ (cnpj=%s)", digits, exc_info=True)
+
+    def _coalesced_fetch(self, cnpj: str, cnpj_limpo: str) -> Dict[str, Any]:
+        """Uma ida à API por CNPJ no processo: quem chega durante uma consulta
+        em andamento espera o resultado dela."""
+        with _inflight_lock:
+            pending = _inflight.get(cnpj_limpo)
+            leader = pending is None
+            if leader:
+                pending = _inflight[cnpj_limpo] = _InFlightLookup()
+
+        if not leader:
+            if pending.done.wait(_COALESCE_WAIT_SECONDS) and pending.result is not None:
+                return dict(pending.result)
+            return self._fetch_remote(cnpj, cnpj_limpo)
+
+        try:
+            result = self._fetch_remote(cnpj, cnpj_limpo)
+            self._write_cache(cnpj_limpo, result)
+            pending.result = result
+            return result
+        finally:
+            with _inflight_lock:
+                _inflight.pop(cnpj_limpo, None)
+            pending.done.set()
+
+    @staticmethod
+    def _not_found_result() -> Dict[str, Any]:
+        return {
+            "success": False,
+            "status_code": 404,
+            "message": "CNPJ não encontrado na OpenCNPJ.",
+            "data": None,
+        }
+
+    # ── API ─────────────────────────────────────────────────────────────
+    def _fetch_remote(self, cnpj: str, cnpj_limpo: str) -> Dict[str, Any]:
         cnpj_formatado = self.format_cnpj(cnpj_limpo)
-        tentativas = [cnpj or "", cnpj_formatado, cnpj_limpo]
+        tentativas = list(dict.fromkeys(
+            cnpj_teste for cnpj_teste in ((cnpj or "").strip(), cnpj_formatado, cnpj_limpo) if cnpj_teste
+        ))
 
         sdk_fatal_message: Optional[str] = None
 
         # 1) SDK
         try:
-            api = OpenCNPJ()
+            api = self._sdk_client()
             for cnpj_teste in tentativas:
-                cnpj_teste = (cnpj_teste or "").strip()
-                if not cnpj_teste:
-                    continue
 
                 try:
                     empresa = api.find_by_cnpj(cnpj_teste)
@@ -65,7 +267,12 @@ class OpenCNPJService:
         except Exception as sdk_fatal_error:
             sdk_fatal_message = str(sdk_fatal_error)
 
-        # 2) Fallback HTTP
+        if sdk_fatal_message is None:
+            # O SDK respondeu "não encontrado" para todas as grafias: o HTTP
+            # consulta a mesma API, repetir só gastaria mais duas chamadas.
+            return self._not_found_result()
+
+        # 2) Fallback HTTP (só quando o SDK falhou)
         try:
             for cnpj_teste in [cnpj_limpo, cnpj_formatado]:
                 response = requests.get(f"{self.BASE_URL}/{cnpj_teste}", timeout=15)
@@ -106,12 +313,7 @@ class OpenCNPJService:
                 "data": None,
             }
 
-        return {
-            "success": False,
-            "status_code": 404,
-            "message": "CNPJ não encontrado na OpenCNPJ.",
-            "data": None,
-        }
+        return self._not_found_result()
 
     def lookup_and_sync_client(self, client: Any, db_session: Any) -> Dict[str, Any]:
         """Consulta CNPJ e sincroniza o cadastro local do cliente quando houver sucesso."""
@@ -122,8 +324,11 @@ class OpenCNPJService:
 
         data = result.get("data") or {}
         try:
+            previous_name = client.name
             self._apply_company_data_to_client(client, data)
             db_session.commit()
+            if client.name != previous_name:
+                benefit_search_service.index_client_benefits(client.id)
             return result
         except Exception as sync_error:
             db_session.rollback()
@@ -14,7 +14,10 @@ imediatamente acima (a "âncora") e inserir um marcador textual —
 `[IMAGEM: <descrição>]` ou, sem descrição,
 `[IMAGEM — print citado no parágrafo acima]` — na posição correta do fluxo de
 texto vindo do `pdfplumber`. Opcionalmente, descreve as imagens via um modelo
-de visão barato (lotes numa única chamada multimodal).
+de visão barato (lotes numa única chamada multimodal, vários lotes em voo ao
+mesmo tempo, com a renderização dos recortes num pool de processos), reaproveitando
+descrições já geradas para o mesmo PNG renderizado (cache por hash + modelo +
+versão do prompt, tabela `pdf_image_vision_descriptions`).
 
 Este módulo nunca levanta exceção para o chamador: qualquer falha (PyMuPDF,
 render, visão) é registrada em log e o texto original (ou parcialmente
@@ -27,11 +30,14 @@ caso/base de conhecimento (aqui é usado só pela ingestão de peças-modelo).
 from __future__ import annotations
 
 import base64
+import hashlib
+import multiprocessing
 import os
 import re
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional
+from typing import Iterator, Optional
 
 import fitz  # PyMuPDF
 
@@ -71,6 +77,10 @@ _VISION_PROMPT = (
     "..."
 )
 
+# Bump ao mudar `_VISION_PROMPT` — invalida o cache de descrições antigas
+# (ver `PdfImageVisionDescription`).
+_VISION_PROMPT_VERSION = "1"
+
 
 # ── Configuração via env (lida a cada chamada, para testabilidade) ─────────
 
@@ -84,6 +94,16 @@ def _vision_enabled() -> bool:
     return raw.strip().lower() not in {"false", "0", "no", "off"}
 
 
+def _vision_cache_enabled() -> bool:
+    """IMPUGNACAO_IMAGE_VISION_CACHE_ENABLED ausente = ligado. Mesma regra de
+    `_vision_enabled`; desligar força toda imagem a ir para o modelo de visão
+    (útil para regerar descrições sem apagar a tabela)."""
+    raw = os.getenv("IMPUGNACAO_IMAGE_VISION_CACHE_ENABLED")
+    if raw is None:
+        return True
+    return raw.strip().lower() not in {"false", "0", "no", "off"}
+
+
 def _min_area() -> float:
     try:
         return float(os.getenv("IMPUGNACAO_IMAGE_MIN_AREA", "15000"))
@@ -105,6 +125,27 @@ def _vision_batch_size() -> int:
         return 5
 
 
+def _vision_concurrency() -> int:
+    """IMPUGNACAO_IMAGE_VISION_CONCURRENCY (default 3): quantos lotes de
+    `_vision_batch_size` imagens ficam em voo ao mesmo tempo. 1 = um lote
+    por vez (comportamento antigo)."""
+    try:
+        return max(1, int(os.getenv("IMPUGNACAO_IMAGE_VISION_CONCURRENCY", "3")))
+    except (TypeError, ValueError):
+        return 3
+
+
+def _render_workers() -> int:
+    """IMPUGNACAO_IMAGE_RENDER_WORKERS: processos que renderizam os recortes
+    em paralelo (default min(4, CPUs)). 0/1 = renderiza no próprio processo.
+    Processos, não threads: o PyMuPDF não é seguro entre threads."""
+    default = min(4, os.cpu_count() or 1)
+    try:
+        return max(0, int(os.getenv("IMPUGNACAO_IMAGE_RENDER_WORKERS", str(default))))
+    except (TypeError, ValueError):
+        return default
+
+
 def _vision_model() -> str:
     """IMPUGNACAO_IMAGE_VISION_MODEL: default `openai/gpt-4o-mini` — este
     ambiente fala com o gateway via `OPENAI_BASE_URL` (OpenRouter), cujo
@@ -514,15 +555,74 @@ def _build_marker(description: Optional[str]) -> str:
 # ── Visão (descrição por lote) ───────────────────────────────────────────
 
 
-def _render_image_png_b64(page: "fitz.Page", rect: "fitz.Rect", dpi: int) -> Optional[str]:
+# Abaixo disso o custo de subir o pool de processos supera o ganho.
+_RENDER_POOL_MIN_IMAGES = 8
+
+# "spawn", não o fork padrão: o processo web já tem threads (flush de
+# atividade, pool do SQLAlchemy, lotes de visão) e um fork com um lock
+# tomado por outra thread trava o filho, além de herdar os sockets abertos do
+# banco. Com spawn o filho só importa este módulo e recebe `_render_worker`
+# e argumentos simples (caminho, tuplas, dpi) por pickle.
+_RENDER_POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def _render_image_png(page: "fitz.Page", rect: "fitz.Rect", dpi: int) -> Optional[bytes]:
     try:
         pix = page.get_pixmap(clip=rect, dpi=dpi)
-        return base64.b64encode(pix.tobytes("png")).decode("ascii")
+        return pix.tobytes("png")
     except Exception as exc:
         print(f"{_LOG_PREFIX} falha ao renderizar imagem para visão: {exc}")
         return None
 
 
+def _render_worker(
+    pdf_path: str, items: list[tuple[int, int, tuple]], dpi: int
+) -> list[tuple[int, Optional[bytes]]]:
+    """Roda num processo do pool: abre o próprio `fitz.Document` (um
+    documento não pode ser compartilhado entre processos) e renderiza a fatia
+    de `(xref, página 1-based, retângulo)` recebida."""
+    doc = fitz.open(pdf_path)
+    try:
+        return [
+            (xref, _render_image_png(doc[page_number - 1], fitz.Rect(*rect), dpi))
+            for xref, page_number, rect in items
+        ]
+    finally:
+        doc.close()
+
+
+def _render_images(
+    doc: "fitz.Document",
+    pdf_path: Optional[str],
+    occurrences: list[_ImageOccurrence],
+    dpi: int,
+) -> dict[int, bytes]:
+    """{xref: PNG} de cada ocorrência. Com `pdf_path` e imagens suficientes,
+    distribui a renderização num pool de processos (`_render_workers`); se o
+    pool falhar, ou para poucas imagens, renderiza em sequência com `doc`."""
+    workers = min(_render_workers(), len(occurrences))
+    if pdf_path and workers > 1 and len(occurrences) >= _RENDER_POOL_MIN_IMAGES:
+        items = [(occ.xref, occ.page_number, tuple(occ.rect)) for occ in occurrences]
+        slices = [items[i::workers] for i in range(workers)]
+        try:
+            rendered: dict[int, bytes] = {}
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_RENDER_POOL_CONTEXT) as pool:
+                for part in pool.map(_render_worker, [pdf_path] * workers, slices, [dpi] * workers):
+                    for xref, png_bytes in part:
+                        if png_bytes is not None:
+                            rendered[xref] = png_bytes
+            return rendered
+        except Exception as exc:
+            print(f"{_LOG_PREFIX} pool de renderização falhou, renderizando em sequência: {exc}")
+
+    rendered = {}
+    for occurrence in occurrences:
+        png_bytes = _render_image_png(doc[occurrence.page_number - 1], occurrence.rect, dpi)
+        if png_bytes is not None:
+            rendered[occurrence.xref] = png_bytes
+    return rendered
+
+
 def _parse_numbered_descriptions(text: str, expected_count: int) -> list[str]:
     results: dict[int, str] = {}
     for line in (text or "").splitlines():
@@ -538,7 +638,12 @@ def _parse_numbered_descriptions(text: str, expected_count: int) -> list[str]:
 
 
 def _record_vision_usage(
-    completion, *, model_name: str, law_firm_id: Optional[int], latency_ms: int
+    completion,
+    *,
+    model_name: str,
+    law_firm_id: Optional[int],
+    latency_ms: int,
+    metadata_payload: Optional[dict] = None,
 ) -> None:
     try:
         usage = getattr(completion, "usage", None)
@@ -574,16 +679,16 @@ def _record_vision_usage(
             law_firm_id=law_firm_id,
             latency_ms=latency_ms,
             status="success",
+            metadata_payload=metadata_payload,
         )
     except Exception as exc:
         print(f"{_LOG_PREFIX} falha ao registrar token usage: {exc}")
 
 
-def _describe_image_batch(images_b64: list[str], *, law_firm_id: Optional[int]) -> list[str]:
-    """Descreve um lote de imagens numa única chamada multimodal. Devolve uma
-    lista de descrições na mesma ordem/quantidade de `images_b64` (string
-    vazia quando o parsing não achar a linha correspondente). Lança em caso
-    de falha de chamada — quem chama decide como degradar."""
+def _request_vision_batch(images_b64: list[str]) -> tuple[object, str, int]:
+    """Só a chamada multimodal de um lote: devolve `(completion, modelo,
+    latência em ms)`. Não toca no banco — por isso pode rodar numa thread do
+    pool de `_request_vision_batches`. Lança em caso de falha de chamada."""
     from openai import OpenAI
 
     client = OpenAI()
@@ -607,23 +712,148 @@ def _describe_image_batch(images_b64: list[str], *, law_firm_id: Optional[int])
     started_at = time.perf_counter()
     completion = client.chat.completions.create(**create_kwargs)
     latency_ms = int((time.perf_counter() - started_at) * 1000)
+    return completion, model_name, latency_ms
 
+
+def _request_vision_batches(
+    batches_b64: list[list[str]], concurrency: int
+) -> Iterator[tuple[object, str, int] | Exception]:
+    """Dispara os lotes com até `concurrency` chamadas em voo e entrega os
+    resultados NA ORDEM dos lotes (a exceção de um lote é entregue no lugar
+    do resultado, sem derrubar os demais)."""
+    if concurrency <= 1 or len(batches_b64) <= 1:
+        for images_b64 in batches_b64:
+            try:
+                yield _request_vision_batch(images_b64)
+            except Exception as exc:
+                yield exc
+        return
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(batches_b64))) as pool:
+        futures = [pool.submit(_request_vision_batch, images_b64) for images_b64 in batches_b64]
+        for future in futures:
+            try:
+                yield future.result()
+            except Exception as exc:
+                yield exc
+
+
+def _finish_vision_batch(
+    completion,
+    *,
+    images_count: int,
+    model_name: str,
+    latency_ms: int,
+    law_firm_id: Optional[int],
+    usage_metadata: Optional[dict] = None,
+) -> list[str]:
+    """Interpreta a resposta de um lote e registra o uso de tokens. Devolve
+    uma lista de descrições na mesma ordem/quantidade das imagens do lote
+    (string vazia quando o parsing não achar a linha correspondente). Roda
+    na thread do chamador — é quem tem a sessão do banco.
+
+    `usage_metadata` vai junto do registro de tokens (hoje: versão do prompt
+    e, só no primeiro lote do documento, acertos/faltas do cache de
+    descrições, ver `_describe_images`)."""
     text = completion.choices[0].message.content if completion.choices else ""
-    descriptions = _parse_numbered_descriptions(text or "", len(images_b64))
+    descriptions = _parse_numbered_descriptions(text or "", images_count)
 
     non_empty = sum(1 for d in descriptions if d)
-    if non_empty == 0 and len(images_b64) > 0:
+    if non_empty == 0 and images_count > 0:
         excerpt = (text or "").strip()[:200]
         print(
             f"{_LOG_PREFIX} AVISO: resposta de visão não parseável "
-            f"(0 de {len(images_b64)} descrições) — trecho: {excerpt!r}"
+            f"(0 de {images_count} descrições) — trecho: {excerpt!r}"
         )
 
-    _record_vision_usage(completion, model_name=model_name, law_firm_id=law_firm_id, latency_ms=latency_ms)
+    _record_vision_usage(
+        completion,
+        model_name=model_name,
+        law_firm_id=law_firm_id,
+        latency_ms=latency_ms,
+        metadata_payload=usage_metadata,
+    )
 
     return descriptions
 
 
+# ── Cache de descrições (hash do PNG + modelo + versão do prompt) ─────────
+
+
+def _image_sha256(png_bytes: bytes) -> str:
+    return hashlib.sha256(png_bytes).hexdigest()
+
+
+def _load_cached_descriptions(
+    image_hashes: list[str], *, law_firm_id: Optional[int], model_name: str
+) -> dict[str, str]:
+    """{sha256: descrição} das imagens já descritas com o mesmo modelo e
+    versão de prompt. Uma consulta `IN (...)` por documento, em conexão
+    própria: não dispara autoflush na sessão da ingestão. Qualquer falha
+    (sem app context, tabela ausente) vira cache vazio — nunca levanta."""
+    if not image_hashes:
+        return {}
+    try:
+        from sqlalchemy import select
+
+        from app.models import db, PdfImageVisionDescription
+
+        table = PdfImageVisionDescription.__table__
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.image_sha256, table.c.description).where(
+                    table.c.law_firm_id == law_firm_id,
+                    table.c.vision_model == model_name,
+                    table.c.prompt_version == _VISION_PROMPT_VERSION,
+                    table.c.image_sha256.in_(sorted(set(image_hashes))),
+                )
+            ).all()
+        return {row.image_sha256: row.description for row in rows if row.description}
+    except Exception as exc:
+        print(f"{_LOG_PREFIX} cache de descrições indisponível (leitura): {exc}")
+        return {}
+
+
+def _store_cached_descriptions(
+    descriptions_by_hash: dict[str, str], *, law_firm_id: Optional[int], model_name: str
+) -> None:
+    """Grava as descrições novas numa transação própria (`engine.begin()`):
+    a sessão da ingestão, com objetos pendentes, não recebe commit nem
+    rollback daqui. Falha é só logada."""
+    if not descriptions_by_hash:
+        return
+    try:
+        from sqlalchemy import select
+
+        from app.models import db, PdfImageVisionDescription
+
+        table = PdfImageVisionDescription.__table__
+        with db.engine.begin() as connection:
+            existing = set(connection.execute(
+                select(table.c.image_sha256).where(
+                    table.c.law_firm_id == law_firm_id,
+                    table.c.vision_model == model_name,
+                    table.c.prompt_version == _VISION_PROMPT_VERSION,
+                    table.c.image_sha256.in_(sorted(descriptions_by_hash)),
+                )
+            ).scalars())
+            rows = [
+                {
+                    'law_firm_id': law_firm_id,
+                    'image_sha256': image_hash,
+                    'vision_model': model_name,
+                    'prompt_version': _VISION_PROMPT_VERSION,
+                    'description': description,
+                }
+                for image_hash, description in descriptions_by_hash.items()
+                if image_hash not in existing
+            ]
+            if rows:
+                connection.execute(table.insert(), rows)
+    except Exception as exc:
+        print(f"{_LOG_PREFIX} cache de descrições indisponível (gravação): {exc}")
+
+
 def _describe_images(
     doc: "fitz.Document",
     occurrences_by_page: dict[int, list[_ImageOccurrence]],
@@ -631,42 +861,102 @@ def _describe_images(
     batch_size: int,
     dpi: int,
     law_firm_id: Optional[int],
+    pdf_path: Optional[str] = None,
 ) -> dict[int, str]:
+    """Renderiza todas as imagens a descrever (em paralelo, ver
+    `_render_images`), resolve o que já está no cache (hash do PNG
+    renderizado + modelo + versão do prompt) e manda ao modelo de visão só as
+    faltas, em lotes de `batch_size` com até `_vision_concurrency()` lotes
+    simultâneos. Imagens com bytes idênticos (xrefs distintos, mesmo print
+    colado duas vezes) são descritas uma vez."""
     xref_to_first_occurrence: dict[int, _ImageOccurrence] = {}
     for occurrences in occurrences_by_page.values():
         for occurrence in occurrences:
             xref_to_first_occurrence.setdefault(occurrence.xref, occurrence)
 
     ordered = [xref for xref in xrefs_to_describe if xref in xref_to_first_occurrence]
-    descriptions: dict[int, str] = {}
-
-    for batch_start in range(0, len(ordered), batch_size):
-        batch_xrefs = ordered[batch_start : batch_start + batch_size]
-        images_b64: list[str] = []
-        valid_xrefs: list[int] = []
-        for xref in batch_xrefs:
-            occurrence = xref_to_first_occurrence[xref]
-            page = doc[occurrence.page_number - 1]
-            b64 = _render_image_png_b64(page, occurrence.rect, dpi)
-            if b64 is None:
-                continue
-            images_b64.append(b64)
-            valid_xrefs.append(xref)
+    png_by_xref = _render_images(doc, pdf_path, [xref_to_first_occurrence[x] for x in ordered], dpi)
 
-        if not images_b64:
+    hash_by_xref: dict[int, str] = {}
+    png_by_hash: dict[str, bytes] = {}
+    for xref in ordered:
+        png_bytes = png_by_xref.get(xref)
+        if png_bytes is None:
             continue
+        image_hash = _image_sha256(png_bytes)
+        hash_by_xref[xref] = image_hash
+        png_by_hash.setdefault(image_hash, png_bytes)
 
+    model_name = _vision_model()
+    use_cache = _vision_cache_enabled()
+    description_by_hash: dict[str, str] = (
+        _load_cached_descriptions(list(png_by_hash), law_firm_id=law_firm_id, model_name=model_name)
+        if use_cache else {}
+    )
+    cache_hits = len(description_by_hash)
+    missing_hashes = [image_hash for image_hash in png_by_hash if image_hash not in description_by_hash]
+    # Acertos/faltas são do documento: vão num registro só (o do primeiro lote
+    # que registrar tokens), para que somar os registros não os multiplique.
+    cache_metadata = {
+        "vision_cache_hits": cache_hits,
+        "vision_cache_misses": len(missing_hashes),
+        "vision_prompt_version": _VISION_PROMPT_VERSION,
+    }
+    cache_counts_recorded = False
+    print(
+        f"{_LOG_PREFIX} cache de visão: {cache_hits} acerto(s), "
+        f"{len(missing_hashes)} falta(s) de {len(png_by_hash)} imagem(ns) única(s)"
+    )
+
+    batches = [missing_hashes[i : i + batch_size] for i in range(0, len(missing_hashes), batch_size)]
+    batches_b64 = [
+        [base64.b64encode(png_by_hash[h]).decode("ascii") for h in batch_hashes]
+        for batch_hashes in batches
+    ]
+    outcomes = _request_vision_batches(batches_b64, _vision_concurrency())
+    for batch_hashes, outcome in zip(batches, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"{_LOG_PREFIX} falha na descrição de lote de imagens: {outcome}")
+            continue
+        completion, batch_model_name, latency_ms = outcome
         try:
-            batch_descriptions = _describe_image_batch(images_b64, law_firm_id=law_firm_id)
+            batch_descriptions = _finish_vision_batch(
+                completion,
+                images_count=len(batch_hashes),
+                model_name=batch_model_name,
+                latency_ms=latency_ms,
+                law_firm_id=law_firm_id,
+                usage_metadata=(
+                    {"vision_prompt_version": _VISION_PROMPT_VERSION}
+                    if cache_counts_recorded else cache_metadata
+                ),
+            )
         except Exception as exc:
             print(f"{_LOG_PREFIX} falha na descrição de lote de imagens: {exc}")
             continue
+        cache_counts_recorded = True
+
+        fresh = {h: d for h, d in zip(batch_hashes, batch_descriptions) if d}
+        description_by_hash.update(fresh)
+        if use_cache:
+            _store_cached_descriptions(fresh, law_firm_id=law_firm_id, model_name=model_name)
+
+    if use_cache and png_by_hash and not cache_counts_recorded:
+        # Tudo no cache (reingestão) ou nenhum lote registrado: um registro
+        # sem tokens leva os acertos/faltas do documento.
+        _record_vision_usage(
+            None,
+            model_name=model_name,
+            law_firm_id=law_firm_id,
+            latency_ms=0,
+            metadata_payload=cache_metadata,
+        )
 
-        for xref, description in zip(valid_xrefs, batch_descriptions):
-            if description:
-                descriptions[xref] = description
-
-    return descriptions
+    return {
+        xref: description_by_hash[image_hash]
+        for xref, image_hash in hash_by_xref.items()
+        if description_by_hash.get(image_hash)
+    }
 
 
 # ── API pública ───────────────────────────────────────────────────────────
@@ -728,7 +1018,8 @@ def _annotate_pages_with_images(
             xrefs_to_describe = first_seen_order[:max_described]
             try:
                 descriptions_by_xref = _describe_images(
-                    doc, occurrences_by_page, xrefs_to_describe, batch_size, dpi, law_firm_id
+                    doc, occurrences_by_page, xrefs_to_describe, batch_size, dpi, law_firm_id,
+                    pdf_path=pdf_path,
                 )
             except Exception as exc:
                 print(f"{_LOG_PREFIX} falha geral na descrição por visão: {exc}")
@@ -8,7 +8,9 @@ publicação = 1º dia útil após a disponibilização; vencimento = publicaç
 """
 from datetime import date, datetime, timedelta
 
-from app.models import db, ProcessDeadline
+from sqlalchemy.orm import joinedload
+
+from app.models import db, JudicialProcess, ProcessDeadline, User
 
 SOON_WINDOW_DAYS = 7
 
@@ -109,13 +111,19 @@ def list_pending_for_firm(law_firm_id, limit=8):
     """Prazos pendentes de todos os processos do escritório, por data-limite.
 
     Retorna (prazos, total_pendentes) — usado pela mesa de trabalho da listagem.
+    Uma consulta só: o total vem de ``COUNT(*) OVER ()`` (calculado antes do
+    LIMIT) e o número do processo e o responsável, que a mesa exibe, vêm no
+    mesmo SELECT em vez de um lazy load por prazo.
     """
-    base = ProcessDeadline.query.filter_by(
-        law_firm_id=law_firm_id, status=ProcessDeadline.STATUS_PENDING)
-    total = base.count()
-    rows = base.order_by(ProcessDeadline.due_date.asc(),
-                         ProcessDeadline.id.asc()).limit(limit).all()
-    return rows, total
+    rows = (db.session.query(ProcessDeadline, db.func.count().over())
+            .options(joinedload(ProcessDeadline.process).load_only(JudicialProcess.process_number),
+                     joinedload(ProcessDeadline.responsible_user).load_only(User.name))
+            .filter(ProcessDeadline.law_firm_id == law_firm_id,
+                    ProcessDeadline.status == ProcessDeadline.STATUS_PENDING)
+            .order_by(ProcessDeadline.due_date.asc(), ProcessDeadline.id.asc())
+            .limit(limit).all())
+    total = rows[0][1] if rows else 0
+    return [deadline for deadline, _ in rows], total
 
 
 def firm_counts(law_firm_id):
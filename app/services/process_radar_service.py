@@ -11,7 +11,10 @@ O Radar agrega, por escritório, o que exige atenção nos processos vinculados:
 - **movimentação recente do DataJud** (`kind='decisao'`/`'movimentacao'`) lida do
   snapshot (nunca consulta a API), ainda não marcada como "ciente".
 
-Nada aqui consulta serviços externos — lê apenas o que já está persistido.
+Nada aqui consulta serviços externos — lê apenas o que já está persistido. As
+consultas andam pelo índice (law_firm_id, data_disponibilizacao) dentro de uma
+janela de datas e trazem só as colunas que os itens usam: o inteiro teor
+(MEDIUMTEXT) e os JSONs brutos da publicação ficam fora do SELECT.
 
 `build_radar` devolve os itens da tela; `build_radar_digest` embrulha o mesmo
 estado para o e-mail de resumo, marcando `is_new` (novidade desde o último envio)
@@ -20,13 +23,32 @@ e contando decisões.
 from datetime import datetime, date, timedelta, time as dt_time
 
 from flask import url_for
+from sqlalchemy.orm import joinedload, load_only
 
 from app.models import (
-    ProcessCommunication, ProcessDeadline, ProcessDatajudSnapshot,
+    db, JudicialProcess, ProcessCommunication, ProcessDeadline, ProcessDatajudSnapshot,
 )
 from app.services import datajud_snapshot_service
 
 RADAR_DIGEST_LIMIT = 15
+RADAR_COMMS_WINDOW_DAYS = 30
+# Providência da IA não expira com a idade da publicação, mas a varredura precisa
+# de um limite de datas para ficar no índice: meio ano cobre qualquer prazo vivo.
+RADAR_AI_WINDOW_DAYS = 180
+
+# Colunas da publicação que viram item do Radar
+_COMM_COLUMNS = (
+    ProcessCommunication.id,
+    ProcessCommunication.judicial_process_id,
+    ProcessCommunication.tipo_comunicacao,
+    ProcessCommunication.tipo_documento,
+    ProcessCommunication.nome_orgao,
+    ProcessCommunication.numero_processo,
+    ProcessCommunication.numero_processo_mascara,
+    ProcessCommunication.data_disponibilizacao,
+    ProcessCommunication.read_at,
+    ProcessCommunication.analysis_json,
+)
 
 
 def _is_decision_text(*parts):
@@ -55,35 +77,49 @@ def build_radar(law_firm_id, limit=8):
     ``when`` (datetime p/ ordenação), ``url``, ``is_decision``.
     """
     radar_items = []
-    cutoff_comms = date.today() - timedelta(days=30)
+    today = date.today()
+
+    # Não lidas: o filtro de leitura vai no SQL — antes vinham as 60 mais
+    # recentes da janela e as lidas eram descartadas em Python, escondendo
+    # não lidas mais antigas quando a janela tinha muita publicação lida.
     recent_comms = (ProcessCommunication.query
+                    .options(load_only(*_COMM_COLUMNS))
                     .filter(ProcessCommunication.law_firm_id == law_firm_id,
+                            ProcessCommunication.data_disponibilizacao
+                            >= today - timedelta(days=RADAR_COMMS_WINDOW_DAYS),
                             ProcessCommunication.judicial_process_id.isnot(None),
-                            ProcessCommunication.data_disponibilizacao >= cutoff_comms)
+                            ProcessCommunication.read_at.is_(None))
                     .order_by(ProcessCommunication.data_disponibilizacao.desc())
                     .limit(60).all())
 
-    linked_deadline_comm_ids = {
-        row.communication_id
-        for row in ProcessDeadline.query.filter(
-            ProcessDeadline.law_firm_id == law_firm_id,
-            ProcessDeadline.communication_id.isnot(None)).all()
-    }
-
-    # Providências da IA: varre TODAS as publicações analisadas (sem janela de data —
-    # providência pendente não expira com a idade da publicação). Volume limitado:
-    # só publicações com análise gerada.
+    # Providências da IA: publicações analisadas da janela longa. Volume
+    # limitado: só publicações com análise gerada.
     analyzed_comms = (ProcessCommunication.query
+                      .options(load_only(*_COMM_COLUMNS))
                       .filter(ProcessCommunication.law_firm_id == law_firm_id,
+                              ProcessCommunication.data_disponibilizacao
+                              >= today - timedelta(days=RADAR_AI_WINDOW_DAYS),
                               ProcessCommunication.judicial_process_id.isnot(None),
                               ProcessCommunication.analysis_json.isnot(None))
                       .order_by(ProcessCommunication.data_disponibilizacao.desc())
                       .limit(200).all())
 
+    # Providência que já virou prazo gerenciado sai do Radar — só importa saber
+    # isso das publicações que pedem ação, não de todos os prazos do escritório.
+    action_comm_ids = [comm.id for comm in analyzed_comms
+                       if _comm_analysis(comm).get('acao_requerida') == 'exige_acao']
+    linked_deadline_comm_ids = set()
+    if action_comm_ids:
+        linked_deadline_comm_ids = {
+            comm_id for (comm_id,) in db.session.query(ProcessDeadline.communication_id).filter(
+                ProcessDeadline.law_firm_id == law_firm_id,
+                ProcessDeadline.communication_id.in_(action_comm_ids))
+        }
+
     ai_comm_ids = set()
     for comm in analyzed_comms:
-        analysis = (comm.analysis_json or {}).get('data') if comm.analysis_json else None
-        if not analysis or analysis.get('acao_requerida') != 'exige_acao':
+        analysis = _comm_analysis(comm)
+        if analysis.get('acao_requerida') != 'exige_acao':
             continue
         if comm.id in linked_deadline_comm_ids:
             continue
@@ -92,7 +128,7 @@ def build_radar(law_firm_id, limit=8):
             due_date = datetime.strptime(due_raw, '%Y-%m-%d').date() if due_raw else None
         except ValueError:
             due_date = None
-        if due_date and due_date < date.today():
+        if due_date and due_date < today:
             continue
         ai_comm_ids.add(comm.id)
         label = (analysis.get('acao_descricao') or analysis.get('resumo')
@@ -119,7 +155,7 @@ def build_radar(law_firm_id, limit=8):
         })
 
     for comm in recent_comms:
-        if comm.is_read or comm.id in ai_comm_ids:
+        if comm.id in ai_comm_ids:
             continue
         analysis = _comm_analysis(comm)
         label = comm.tipo_documento or comm.nome_orgao or 'Publicação'
@@ -145,6 +181,8 @@ def build_radar(law_firm_id, limit=8):
 
     week_ago = datetime.now() - timedelta(days=7)
     recent_snapshots = (ProcessDatajudSnapshot.query
+                        .options(joinedload(ProcessDatajudSnapshot.process)
+                                 .load_only(JudicialProcess.process_number))
                         .filter(ProcessDatajudSnapshot.law_firm_id == law_firm_id,
                                 ProcessDatajudSnapshot.last_movement_at >= week_ago)
                         .all())
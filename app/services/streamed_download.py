@@ -0,0 +1,116 @@
+"""
+Download em streaming para disco: pedaços gravados num arquivo temporário ao
+lado do destino, SHA-256 calculado no caminho, rename atômico no fim.
+
+Usado pela captura do DOU (ZIPs e PDFs do INLABS) e pelo download dos PDFs de
+contestação do FAP: em vez de manter o arquivo inteiro em `bytes` — e, com o
+pool de downloads, vários ao mesmo tempo —, o pico de memória fica no tamanho
+do pedaço.
+
+    with StagingWriter(diretorio, 'arquivo.zip') as escrita:
+        for pedaco in resposta.iter_content(CHUNK_SIZE):
+            escrita.write(pedaco)
+    arquivo = escrita.staged          # StagedFile: path temporário, sha256, size
+    ...                               # compara assinatura, valida, parseia
+    arquivo.publish(destino_final)    # os.replace — nunca deixa arquivo pela metade
+
+Falha no meio do download apaga o temporário; o destino final só é tocado
+pelo `publish`, então um download truncado nunca sobrescreve um arquivo
+íntegro.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+CHUNK_SIZE = 256 * 1024
+
+
+@dataclass
+class StagedFile:
+    """Arquivo já baixado por inteiro, ainda com nome temporário."""
+    path: Path
+    sha256: str
+    size: int
+
+    def publish(self, destino: str | Path) -> Path:
+        """Move para o nome final (mesmo sistema de arquivos: rename atômico)."""
+        destino = Path(destino)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.path, destino)
+        self.path = destino
+        return destino
+
+    def discard(self) -> None:
+        """Apaga o temporário. Sem efeito depois do publish."""
+        if self.path.name.endswith('.part'):
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def head(self, n: int = 80) -> bytes:
+        with open(self.path, 'rb') as fh:
+            return fh.read(n)
+
+
+class StagingWriter:
+    """Escreve pedaços num temporário do diretório, com hash incremental.
+
+    Como context manager: saída com exceção apaga o temporário e a exceção
+    segue; saída normal fecha o arquivo e deixa o resultado em `staged`.
+    """
+
+    def __init__(self, directory: str | Path, name: str):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._path = directory / f'.{name}.{uuid.uuid4().hex}.part'
+        self._fh = open(self._path, 'wb')
+        self._hash = hashlib.sha256()
+        self._size = 0
+        self.staged: StagedFile | None = None
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self._fh.write(chunk)
+        self._hash.update(chunk)
+        self._size += len(chunk)
+
+    def finish(self) -> StagedFile:
+        self._fh.close()
+        self.staged = StagedFile(self._path, self._hash.hexdigest(), self._size)
+        return self.staged
+
+    def abort(self) -> None:
+        self._fh.close()
+        try:
+            self._path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> 'StagingWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.finish()
+
+
+def stage_chunks(chunks, directory: str | Path, name: str) -> StagedFile:
+    """Grava um iterável de pedaços num temporário e devolve o StagedFile."""
+    with StagingWriter(directory, name) as escrita:
+        for chunk in chunks:
+            escrita.write(chunk)
+    return escrita.staged
+
+
+def stage_bytes(content: bytes, directory: str | Path, name: str) -> StagedFile:
+    """Conteúdo já em memória (dublês de teste, respostas pequenas)."""
+    return stage_chunks((content,), directory, name)
@@ -0,0 +1,58 @@
+"""
+Adiciona a coluna benefits.employer_cnpj_digits (CNPJ do empregador só com
+dígitos) e o índice ix_benefits_law_firm_employer_cnpj_digits, usados pelo
+filtro por CNPJ/raiz das tools FAP do MCP no lugar de REPLACE sobre a coluna
+formatada.
+
+A coluna é mantida pelos eventos do model Benefit; os benefícios que já
+existem são preenchidos aqui mesmo, logo depois do ALTER, pelo backfill de
+database/backfill_benefits_employer_cnpj_digits.py (que continua servindo
+para rodar de novo à parte). Sem isso, o filtro por CNPJ não acharia nenhum
+benefício antigo entre a migração e o backfill.
+
+Uso:
+    uv run python database/add_benefits_employer_cnpj_digits_column.py
+"""
+
+import sys
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sqlalchemy import inspect, text
+
+from app.models import db
+from main import app
+from backfill_benefits_employer_cnpj_digits import backfill
+
+TABLE = 'benefits'
+COLUMN = 'employer_cnpj_digits'
+INDEX = 'ix_benefits_law_firm_employer_cnpj_digits'
+
+
+def add_missing_column():
+    with app.app_context():
+        inspector = inspect(db.engine)
+        with db.engine.connect() as conn:
+            if COLUMN in {col['name'] for col in inspector.get_columns(TABLE)}:
+                print(f'- coluna ja existe: {COLUMN}')
+            else:
+                print(f'+ adicionando coluna: {COLUMN}')
+                conn.execute(text(f'ALTER TABLE {TABLE} ADD COLUMN {COLUMN} VARCHAR(20)'))
+
+            if INDEX in {ix['name'] for ix in inspector.get_indexes(TABLE)}:
+                print(f'- indice ja existe: {INDEX}')
+            else:
+                print(f'+ criando indice: {INDEX}')
+                conn.execute(text(f'CREATE INDEX {INDEX} ON {TABLE} (law_firm_id, {COLUMN})'))
+            conn.commit()
+
+        print('+ preenchendo a coluna nos beneficios existentes')
+        backfill(True, None)
+        print('Migracao concluida com sucesso.')
+
+
+if __name__ == '__main__':
+    add_missing_column()
@@ -0,0 +1,38 @@
+"""
+Cria a tabela cnpj_company_cache (cache das consultas à OpenCNPJ, com
+validade e cache de "não encontrado").
+
+Uso:
+    uv run python database/add_cnpj_company_cache_table.py
+"""
+
+import sys
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import inspect
+
+from app.models import db, CnpjCompanyCache
+from main import app
+
+
+def create_table():
+    with app.app_context():
+        inspector = inspect(db.engine)
+        if 'cnpj_company_cache' in inspector.get_table_names():
+            print('- tabela ja existe: cnpj_company_cache')
+            return
+
+        print('+ criando tabela: cnpj_company_cache')
+        try:
+            CnpjCompanyCache.__table__.create(db.engine)
+            print('Migracao concluida com sucesso.')
+        except Exception as exc:
+            print(f'Erro durante a migracao: {exc}')
+            raise
+
+
+if __name__ == '__main__':
+    create_table()
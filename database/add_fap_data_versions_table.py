@@ -0,0 +1,40 @@
+"""
+Cria a tabela fap_data_versions (versão dos dados do FAP por escritório),
+incrementada pelas sincronizações e importações e lida pelo cache de
+resultado das tools FAP do MCP. Sem backfill: escritório sem linha está na
+versão 0 e ganha a linha na primeira gravação.
+
+Uso:
+    uv run python database/add_fap_data_versions_table.py
+"""
+
+import sys
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import inspect
+
+from app.models import db, FapDataVersion
+from main import app
+
+TABLE = 'fap_data_versions'
+
+
+def create_table():
+    with app.app_context():
+        if TABLE in inspect(db.engine).get_table_names():
+            print(f'- tabela ja existe: {TABLE}')
+            return
+        print(f'+ criando tabela: {TABLE}')
+        try:
+            FapDataVersion.__table__.create(db.engine)
+        except Exception as exc:
+            print(f'Erro durante a migracao: {exc}')
+            raise
+        print('Migracao concluida com sucesso.')
+
+
+if __name__ == '__main__':
+    create_table()
@@ -0,0 +1,48 @@
+"""
+Cria as tabelas de estatísticas pré-computadas do Revisor FAP:
+
+- fap_review_execution_stats: contagens e fingerprints dos achados de cada revisão
+- fap_review_lawyer_stats: agregado por advogado lido pela tela de score
+
+Depois de criar, popule com:
+    uv run python database/backfill_fap_review_stats.py --apply
+
+Uso:
+    uv run python database/add_fap_review_stats_tables.py
+"""
+
+import sys
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import inspect
+
+from app.models import db, FapReviewExecutionStats, FapReviewLawyerStats
+from main import app
+
+
+def create_tables():
+    with app.app_context():
+        inspector = inspect(db.engine)
+        existing = set(inspector.get_table_names())
+
+        for model in (FapReviewExecutionStats, FapReviewLawyerStats):
+            table_name = model.__tablename__
+            if table_name in existing:
+                print(f'- tabela ja existe: {table_name}')
+                continue
+
+            print(f'+ criando tabela: {table_name}')
+            try:
+                model.__table__.create(db.engine)
+            except Exception as exc:
+                print(f'Erro durante a migracao: {exc}')
+                raise
+
+        print('Migracao concluida com sucesso.')
+
+
+if __name__ == '__main__':
+    create_tables()
@@ -0,0 +1,55 @@
+"""
+Cria a tabela fap_web_contestacao_group_summaries (resumo por grupo vigência ×
+CNPJ da tela de contestações do Painel FAP) e o índice
+ix_fap_web_contestacoes_firm_ano_cnpj, usado para carregar as linhas de uma
+página por IN de tupla (vigência, CNPJ).
+
+Depois de criar a tabela, preencha-a com
+database/backfill_fap_web_contestacao_group_summaries.py --apply.
+
+Uso:
+    uv run python database/add_fap_web_contestacao_group_summaries_table.py
+"""
+
+import sys
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import inspect, text
+
+from app.models import db, FapWebContestacaoGroupSummary
+from main import app
+
+TABLE = 'fap_web_contestacao_group_summaries'
+INDEX = ('fap_web_contestacoes', 'ix_fap_web_contestacoes_firm_ano_cnpj',
+         ('law_firm_id', 'ano_vigencia', 'cnpj'))
+
+
+def create_table():
+    with app.app_context():
+        inspector = inspect(db.engine)
+        if TABLE in inspector.get_table_names():
+            print(f'- tabela ja existe: {TABLE}')
+        else:
+            print(f'+ criando tabela: {TABLE}')
+            try:
+                FapWebContestacaoGroupSummary.__table__.create(db.engine)
+            except Exception as exc:
+                print(f'Erro durante a migracao: {exc}')
+                raise
+
+        tabela, nome, colunas = INDEX
+        if nome in {ix['name'] for ix in inspector.get_indexes(tabela)}:
+            print(f'- indice ja existe: {nome}')
+        else:
+            print(f'+ criando indice: {nome}')
+            with db.engine.connect() as conn:
+                conn.execute(text(f"CREATE INDEX {nome} ON {tabela} ({', '.join(colunas)})"))
+                conn.commit()
+        print('Migracao concluida com sucesso.')
+
+
+if __name__ == '__main__':
+    create_table()
@@ -0,0 +1,41 @@
+"""
+Cria a tabela fap_web_contestacao_listing_fingerprints (impressão digital da
+listagem de contestações por empresa e ano de vigência, usada pelo cron do FAP
+para pular listagens que não mudaram no portal).
+
+Uso:
+    uv run python database/add_fap_web_contestacao_listing_fingerprints_table.py
+"""
+
+import sys
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import inspect
+
+from app.models import db, FapWebContestacaoListingFingerprint
+from main import app
+
+TABLE = 'fap_web_contestacao_listing_fingerprints'
+
+
+def create_table():
+    with app.app_context():
+        inspector = inspect(db.engine)
+        if TABLE in inspector.get_table_names():
+            print(f'- tabela ja existe: {TABLE}')
+            return
+
+        print(f'+ criando tabela: {TABLE}')
+        try:
+            FapWebContestacaoListingFingerprint.__table__.create(db.engine)
+            print('Migracao concluida com sucesso.')
+        except Exception as exc:
+            print(f'Erro durante a migracao: {exc}')
+            raise
+
+
+if __name__ == '__main__':
+    create_table()
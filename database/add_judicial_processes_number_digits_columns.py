@@ -0,0 +1,62 @@
+"""
+Adiciona as colunas judicial_processes.process_number_digits (número do
+processo só com dígitos) e process_number_digits_reversed (os mesmos dígitos
+invertidos), com um índice por escritório em cada uma.
+
+A busca da listagem do Painel de Processos e o vínculo das comunicações do
+Monitoramento de Processos comparavam dígitos com REPLACE sobre a coluna
+formatada (ou com cada formato possível do número). Com as colunas, o número
+CNJ completo vira igualdade, "começa com" vira prefixo dos dígitos e
+"termina com" vira prefixo dos dígitos invertidos — todos pelo índice.
+
+As colunas são mantidas pelos eventos do model JudicialProcess; para os
+processos que já existem, rode
+database/backfill_judicial_processes_number_digits.py --apply.
+
+Uso:
+    uv run python database/add_judicial_processes_number_digits_columns.py
+"""
+
+import sys
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import inspect, text
+
+from app.models import db
+from main import app
+
+TABLE = 'judicial_processes'
+# (coluna, índice)
+COLUMNS = [
+    ('process_number_digits', 'ix_judicial_processes_firm_number_digits'),
+    ('process_number_digits_reversed', 'ix_judicial_processes_firm_number_digits_reversed'),
+]
+
+
+def add_missing_columns():
+    with app.app_context():
+        inspector = inspect(db.engine)
+        existing_columns = {col['name'] for col in inspector.get_columns(TABLE)}
+        existing_indexes = {ix['name'] for ix in inspector.get_indexes(TABLE)}
+        with db.engine.connect() as conn:
+            for column, index in COLUMNS:
+                if column in existing_columns:
+                    print(f'- coluna ja existe: {column}')
+                else:
+                    print(f'+ adicionando coluna: {column}')
+                    conn.execute(text(f'ALTER TABLE {TABLE} ADD COLUMN {column} VARCHAR(25)'))
+
+                if index in existing_indexes:
+                    print(f'- indice ja existe: {index}')
+                else:
+                    print(f'+ criando indice: {index}')
+                    conn.execute(text(f'CREATE INDEX {index} ON {TABLE} (law_firm_id, {column})'))
+            conn.commit()
+        print('Migracao concluida com sucesso.')
+
+
+if __name__ == '__main__':
+    add_missing_columns()
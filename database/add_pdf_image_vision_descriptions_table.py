@@ -0,0 +1,38 @@
+"""
+Cria a tabela pdf_image_vision_descriptions (cache das descrições por visão de
+imagens de PDF, por hash do PNG renderizado).
+
+Uso:
+    uv run python database/add_pdf_image_vision_descriptions_table.py
+"""
+
+import sys
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import inspect
+
+from app.models import db, PdfImageVisionDescription
+from main import app
+
+
+def create_table():
+    with app.app_context():
+        inspector = inspect(db.engine)
+        if 'pdf_image_vision_descriptions' in inspector.get_table_names():
+            print('- tabela ja existe: pdf_image_vision_descriptions')
+            return
+
+        print('+ criando tabela: pdf_image_vision_descriptions')
+        try:
+            PdfImageVisionDescription.__table__.create(db.engine)
+            print('Migracao concluida com sucesso.')
+        except Exception as exc:
+            print(f'Erro durante a migracao: {exc}')
+            raise
+
+
+if __name__ == '__main__':
+    create_table()
@@ -0,0 +1,64 @@
+"""
+Migration: índices compostos da listagem do Painel de Processos.
+
+- ``judicial_processes (law_firm_id, discovery_status, status)``: os cards da
+  listagem (total, ativos, suspensos, encerrados, descobertos) saem de um único
+  GROUP BY status, discovery_status — com o índice, index-only scan.
+- ``process_datajud_snapshots (law_firm_id, last_movement_at)``: o Radar lê as
+  movimentações da última semana do escritório; o índice de coluna única em
+  last_movement_at misturava todos os escritórios.
+
+O Radar também lê process_communications pela janela de datas, que já tem
+``ix_process_communications_firm_data (law_firm_id, data_disponibilizacao)``.
+
+Executar:
+    uv run python database/add_process_panel_listing_indexes.py
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from app.models import db
+
+
+# (tabela, nome do índice, colunas)
+INDEXES = [
+    ('judicial_processes', 'ix_judicial_processes_firm_discovery_status',
+     ('law_firm_id', 'discovery_status', 'status')),
+    ('process_datajud_snapshots', 'ix_process_datajud_snapshots_firm_last_movement',
+     ('law_firm_id', 'last_movement_at')),
+]
+
+
+def run():
+    with app.app_context():
+        from sqlalchemy import text, inspect
+
+        inspector = inspect(db.engine)
+        criados = 0
+        pulados = 0
+
+        with db.engine.connect() as conn:
+            for tabela, nome, colunas in INDEXES:
+                existentes = {ix['name'] for ix in inspector.get_indexes(tabela)}
+                if nome in existentes:
+                    print(f'Índice {nome} já existe em {tabela}. Pulando.')
+                    pulados += 1
+                    continue
+
+                ddl = f"CREATE INDEX {nome} ON {tabela} ({', '.join(colunas)})"
+                try:
+                    conn.execute(text(ddl))
+                    conn.commit()
+                    print(f'Índice {nome} criado em {tabela} ({", ".join(colunas)}).')
+                    criados += 1
+                except Exception as e:
+                    print(f'Aviso: não foi possível criar {nome} em {tabela} ({e}).')
+
+        print(f'\nConcluído: {criados} índice(s) criado(s), {pulados} já existia(m).')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,76 @@
+"""
+Backfill de benefits.employer_cnpj_digits (CNPJ do empregador só com dígitos).
+
+A coluna é mantida pelos eventos do model Benefit a partir da sua criação
+(database/add_benefits_employer_cnpj_digits_column.py), que já chama este
+backfill para os benefícios existentes; rodar à parte serve para conferir ou
+corrigir linhas gravadas fora do ORM. Percorre por id crescente e só grava as linhas
+cujo valor difere. Idempotente.
+
+Uso:
+    uv run python database/backfill_benefits_employer_cnpj_digits.py                  # dry-run (só conta)
+    uv run python database/backfill_benefits_employer_cnpj_digits.py --apply          # grava
+    uv run python database/backfill_benefits_employer_cnpj_digits.py --apply --law-firm-id 3
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import update
+
+from main import app
+from app.models import Benefit, db
+
+BATCH_SIZE = 2000
+
+
+def _digits(value) -> str | None:
+    return ''.join(ch for ch in (value or '') if ch.isdigit()) or None
+
+
+def backfill(apply_changes: bool, law_firm_id: int | None) -> None:
+    with app.app_context():
+        query = db.session.query(
+            Benefit.id, Benefit.employer_cnpj, Benefit.employer_cnpj_digits, Benefit.updated_at,
+        )
+        if law_firm_id:
+            query = query.filter(Benefit.law_firm_id == law_firm_id)
+
+        total = pending = 0
+        last_id = 0
+        while True:
+            rows = query.filter(Benefit.id > last_id).order_by(Benefit.id).limit(BATCH_SIZE).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            total += len(rows)
+            # updated_at explícito: preencher a coluna derivada não é edição do benefício
+            changes = [
+                {'id': row.id, 'employer_cnpj_digits': _digits(row.employer_cnpj),
+                 'updated_at': row.updated_at}
+                for row in rows
+                if _digits(row.employer_cnpj) != row.employer_cnpj_digits
+            ]
+            pending += len(changes)
+            if apply_changes and changes:
+                db.session.execute(update(Benefit), changes)
+                db.session.commit()
+
+        print(f"  {total} benefício(s) lido(s), {pending} a atualizar")
+        if not apply_changes:
+            print("\nDRY-RUN: rode novamente com --apply para gravar")
+            return
+        print("\n✓ employer_cnpj_digits preenchido")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill de benefits.employer_cnpj_digits')
+    parser.add_argument('--apply', action='store_true', help='grava (sem isto, só conta)')
+    parser.add_argument('--law-firm-id', type=int, help='limita a um escritório')
+    args = parser.parse_args()
+    print("Backfill de benefits.employer_cnpj_digits")
+    print("=" * 60)
+    backfill(args.apply, args.law_firm_id)
@@ -0,0 +1,70 @@
+"""
+Backfill das estatísticas pré-computadas do Revisor FAP.
+
+Revisões concluídas antes de `fap_review_execution_stats` existir não têm linha
+de estatística; a tela de score as calcularia na primeira visita (lendo o
+`result_json` de todas de uma vez). Este script faz esse trabalho fora do
+horário de uso, escritório por escritório, e já deixa o agregado por advogado
+(`fap_review_lawyer_stats`) gravado.
+
+Idempotente: só lê o resultado das revisões sem linha ou com linha
+desatualizada; rodar de novo não refaz nada.
+
+Uso:
+    uv run python database/backfill_fap_review_stats.py                    # dry-run (só conta)
+    uv run python database/backfill_fap_review_stats.py --apply            # grava
+    uv run python database/backfill_fap_review_stats.py --apply --law-firm-id 3
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from main import app
+from app.models import FapReviewExecution, FapReviewExecutionStats, db
+from app.services.fap_review_service import build_lawyer_statistics
+
+
+def backfill(apply_changes: bool, law_firm_id: int | None) -> None:
+    with app.app_context():
+        query = db.session.query(FapReviewExecution.law_firm_id, db.func.count(FapReviewExecution.id)).filter(
+            FapReviewExecution.execution_type == 'revision',
+        )
+        if law_firm_id:
+            query = query.filter(FapReviewExecution.law_firm_id == law_firm_id)
+        revisions_by_firm = dict(query.group_by(FapReviewExecution.law_firm_id).all())
+
+        if not revisions_by_firm:
+            print("✓ Nenhuma revisão encontrada — nada a fazer")
+            return
+
+        for firm_id, total in sorted(revisions_by_firm.items()):
+            with_stats = FapReviewExecutionStats.query.filter_by(law_firm_id=firm_id).count()
+            pending = max(0, total - with_stats)
+            if not apply_changes:
+                print(f"  escritório {firm_id}: {total} revisões, ~{pending} sem estatística")
+                continue
+
+            started = time.perf_counter()
+            result = build_lawyer_statistics(firm_id)
+            elapsed = time.perf_counter() - started
+            print(f"  escritório {firm_id}: {total} revisões, {len(result['lawyers'])} advogado(s) "
+                  f"— {elapsed:.2f} s")
+
+        if not apply_changes:
+            print("\nDRY-RUN: rode novamente com --apply para gravar")
+            return
+        print("\n✓ Estatísticas gravadas")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill das estatísticas do Revisor FAP')
+    parser.add_argument('--apply', action='store_true', help='grava (sem isto, só conta)')
+    parser.add_argument('--law-firm-id', type=int, help='limita a um escritório')
+    args = parser.parse_args()
+    print("Backfill das estatísticas do Revisor FAP")
+    print("=" * 60)
+    backfill(args.apply, args.law_firm_id)
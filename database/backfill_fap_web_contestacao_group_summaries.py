@@ -0,0 +1,65 @@
+"""
+Backfill do resumo por grupo (vigência × CNPJ) das contestações do Painel FAP.
+
+A tabela fap_web_contestacao_group_summaries é mantida pelas sincronizações
+(cron e painel) a partir da sua criação; este script reconstrói o resumo dos
+escritórios a partir de fap_web_contestacoes e do histórico de mudanças.
+Idempotente: rodar de novo recalcula tudo e chega ao mesmo resultado.
+
+Uso:
+    uv run python database/backfill_fap_web_contestacao_group_summaries.py                  # dry-run (só conta)
+    uv run python database/backfill_fap_web_contestacao_group_summaries.py --apply          # grava
+    uv run python database/backfill_fap_web_contestacao_group_summaries.py --apply --law-firm-id 3
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from main import app
+from app.models import FapWebContestacao, FapWebContestacaoGroupSummary, db
+from app.services.fap_contestacao_summary_service import refresh_firm
+
+
+def backfill(apply_changes: bool, law_firm_id: int | None) -> None:
+    with app.app_context():
+        query = db.session.query(
+            FapWebContestacao.law_firm_id, db.func.count(FapWebContestacao.id),
+        )
+        if law_firm_id:
+            query = query.filter(FapWebContestacao.law_firm_id == law_firm_id)
+        rows_by_firm = dict(query.group_by(FapWebContestacao.law_firm_id).all())
+
+        if not rows_by_firm:
+            print("✓ Nenhuma contestação encontrada — nada a fazer")
+            return
+
+        for firm_id, total in sorted(rows_by_firm.items()):
+            existing = FapWebContestacaoGroupSummary.query.filter_by(law_firm_id=firm_id).count()
+            if not apply_changes:
+                print(f"  escritório {firm_id}: {total} contestações, {existing} grupo(s) no resumo")
+                continue
+
+            started = time.perf_counter()
+            groups = refresh_firm(firm_id)
+            db.session.commit()
+            elapsed = time.perf_counter() - started
+            print(f"  escritório {firm_id}: {total} contestações, {groups} grupo(s) — {elapsed:.2f} s")
+
+        if not apply_changes:
+            print("\nDRY-RUN: rode novamente com --apply para gravar")
+            return
+        print("\n✓ Resumo por grupo gravado")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill do resumo por grupo das contestações FAP')
+    parser.add_argument('--apply', action='store_true', help='grava (sem isto, só conta)')
+    parser.add_argument('--law-firm-id', type=int, help='limita a um escritório')
+    args = parser.parse_args()
+    print("Backfill do resumo por grupo das contestações FAP")
+    print("=" * 60)
+    backfill(args.apply, args.law_firm_id)
@@ -0,0 +1,82 @@
+"""
+Backfill de judicial_processes.process_number_digits e
+process_number_digits_reversed (número do processo só com dígitos, direto e
+invertido).
+
+As colunas são mantidas pelos eventos do model JudicialProcess a partir da sua
+criação (database/add_judicial_processes_number_digits_columns.py); este
+script preenche os processos que já existiam. Percorre por id crescente e só
+grava as linhas cujo valor difere. Idempotente.
+
+Uso:
+    uv run python database/backfill_judicial_processes_number_digits.py                  # dry-run (só conta)
+    uv run python database/backfill_judicial_processes_number_digits.py --apply          # grava
+    uv run python database/backfill_judicial_processes_number_digits.py --apply --law-firm-id 3
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import update
+
+from main import app
+from app.models import JudicialProcess, db
+
+BATCH_SIZE = 2000
+
+
+def _digits(value) -> str | None:
+    return ''.join(ch for ch in (value or '') if ch.isdigit()) or None
+
+
+def backfill(apply_changes: bool, law_firm_id: int | None) -> None:
+    with app.app_context():
+        query = db.session.query(
+            JudicialProcess.id, JudicialProcess.process_number,
+            JudicialProcess.process_number_digits, JudicialProcess.process_number_digits_reversed,
+            JudicialProcess.updated_at,
+        )
+        if law_firm_id:
+            query = query.filter(JudicialProcess.law_firm_id == law_firm_id)
+
+        total = pending = 0
+        last_id = 0
+        while True:
+            rows = query.filter(JudicialProcess.id > last_id).order_by(JudicialProcess.id).limit(BATCH_SIZE).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            total += len(rows)
+            changes = []
+            for row in rows:
+                digits = _digits(row.process_number)
+                reversed_digits = digits[::-1] if digits else None
+                if (digits, reversed_digits) == (row.process_number_digits, row.process_number_digits_reversed):
+                    continue
+                # updated_at explícito: preencher a coluna derivada não é edição do processo
+                changes.append({'id': row.id, 'process_number_digits': digits,
+                                'process_number_digits_reversed': reversed_digits,
+                                'updated_at': row.updated_at})
+            pending += len(changes)
+            if apply_changes and changes:
+                db.session.execute(update(JudicialProcess), changes)
+                db.session.commit()
+
+        print(f"  {total} processo(s) lido(s), {pending} a atualizar")
+        if not apply_changes:
+            print("\nDRY-RUN: rode novamente com --apply para gravar")
+            return
+        print("\n✓ process_number_digits preenchido")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill de judicial_processes.process_number_digits')
+    parser.add_argument('--apply', action='store_true', help='grava (sem isto, só conta)')
+    parser.add_argument('--law-firm-id', type=int, help='limita a um escritório')
+    args = parser.parse_args()
+    print("Backfill de judicial_processes.process_number_digits")
+    print("=" * 60)
+    backfill(args.apply, args.law_firm_id)
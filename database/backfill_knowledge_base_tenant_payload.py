@@ -0,0 +1,95 @@
+"""
+Backfill do law_firm_id no payload dos pontos da base de conhecimento (Qdrant).
+
+Pontos ingeridos antes do campo existir não têm `law_firm_id`; a busca do
+escritório só os encontra pelo ramo "sem law_firm_id" do filtro de tenant
+(ver `tenant_filter` em knowledge_ingestion_agent). Este script cria os
+índices de payload da coleção e grava `law_firm_id`/`category` nos pontos de
+cada arquivo (`set_payload` filtrado por `file_id`), a partir da tabela
+knowledge_base. Depois dele, ligar KB_TENANT_FILTER_STRICT=true.
+
+Idempotente: pula arquivos cujos pontos já estão todos com law_firm_id.
+
+Uso:
+    uv run python database/backfill_knowledge_base_tenant_payload.py                    # dry-run (só conta)
+    uv run python database/backfill_knowledge_base_tenant_payload.py --apply            # grava
+    uv run python database/backfill_knowledge_base_tenant_payload.py --apply --law-firm-id 3
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from qdrant_client.http import models as rest
+from sqlalchemy.orm import load_only
+
+from main import app
+from app.agents.knowledge_base.knowledge_ingestion_agent import KnowledgeIngestionAgent
+from app.models import KnowledgeBase
+
+
+def _missing_tenant_filter(file_id: int) -> rest.Filter:
+    return rest.Filter(must=[
+        rest.FieldCondition(key="file_id", match=rest.MatchValue(value=file_id)),
+        rest.IsEmptyCondition(is_empty=rest.PayloadField(key="law_firm_id")),
+    ])
+
+
+def backfill(apply_changes: bool, law_firm_id: int | None) -> None:
+    with app.app_context():
+        agent = KnowledgeIngestionAgent(require_embeddings=False, create_missing_indexes=False)
+        if not agent.qdrant.collection_exists(agent.collection):
+            print(f"✓ Coleção '{agent.collection}' não existe — nada a fazer")
+            return
+        if apply_changes:
+            agent._ensure_payload_indexes()
+            print(f"✓ Índices de payload garantidos em '{agent.collection}'")
+
+        query = KnowledgeBase.query.options(
+            load_only(KnowledgeBase.id, KnowledgeBase.law_firm_id, KnowledgeBase.category)
+        ).order_by(KnowledgeBase.id)
+        if law_firm_id:
+            query = query.filter(KnowledgeBase.law_firm_id == law_firm_id)
+
+        files_pending = points_pending = 0
+        for item in query.yield_per(500):
+            missing = agent.qdrant.count(
+                collection_name=agent.collection,
+                count_filter=_missing_tenant_filter(item.id),
+                exact=True,
+            ).count
+            if not missing:
+                continue
+            files_pending += 1
+            points_pending += missing
+            if apply_changes:
+                agent.set_tenant_payload_by_file_id(item.id, item.law_firm_id, item.category)
+                print(f"  arquivo {item.id} (escritório {item.law_firm_id}): {missing} ponto(s) atualizados")
+            else:
+                print(f"  arquivo {item.id} (escritório {item.law_firm_id}): {missing} ponto(s) sem law_firm_id")
+
+        print(f"\n{files_pending} arquivo(s), {points_pending} ponto(s) {'atualizados' if apply_changes else 'pendentes'}")
+        if not apply_changes:
+            print("\nDRY-RUN: rode novamente com --apply para gravar")
+            return
+
+        orphans = agent.qdrant.count(
+            collection_name=agent.collection,
+            count_filter=rest.Filter(must=[rest.IsEmptyCondition(is_empty=rest.PayloadField(key="law_firm_id"))]),
+            exact=True,
+        ).count
+        if orphans:
+            print(f"⚠ {orphans} ponto(s) seguem sem law_firm_id (file_id ausente ou sem linha em knowledge_base)")
+        print("\n✓ Payload de tenant gravado")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill do law_firm_id nos pontos da base de conhecimento')
+    parser.add_argument('--apply', action='store_true', help='grava (sem isto, só conta)')
+    parser.add_argument('--law-firm-id', type=int, help='limita a um escritório')
+    args = parser.parse_args()
+    print("Backfill do payload de tenant (Qdrant / base de conhecimento)")
+    print("=" * 60)
+    backfill(args.apply, args.law_firm_id)
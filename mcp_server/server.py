@@ -63,6 +63,7 @@ from mcp_server.tools.fap import (
     list_fap_procuracoes_handler,
     fap_filter_values_handler,
 )
+from mcp_server.tools import result_cache
 from mcp_server.tools.disputes import (
     list_cats_handler,
     list_employment_links_handler,
@@ -255,8 +256,9 @@ def pesquisar_base_conhecimento(
 
     Args:
         pergunta: O que pesquisar, em linguagem natural ou termo exato.
-        modo_busca: Força "semantic" ou "full_text" (opcional — sem informar,
-            o roteador LLM decide).
+        modo_busca: Força "semantic", "full_text" ou "hybrid" (semântica +
+            textual fundidas; bom para CNPJ/NB junto de contexto). Opcional —
+            sem informar, decide a configuração do servidor ou o roteador LLM.
         limite: Número máximo de trechos retornados (padrão 20).
 
     Returns:
@@ -303,8 +305,10 @@ def listar_empresas_fap(
     """
     claims = require_module("fap_panel")
     with app.app_context():
-        return list_fap_companies_handler(claims["law_firm_id"], nome, cnpj, tipo_procuracao,
-                                          limite, deslocamento)
+        return result_cache.cached_call(
+            "listar_empresas_fap", list_fap_companies_handler,
+            claims["law_firm_id"], nome, cnpj, tipo_procuracao, limite, deslocamento,
+        )
 
 
 @mcp.tool()
@@ -335,7 +339,8 @@ def listar_contestacoes_fap(
     """
     claims = require_module("fap_panel")
     with app.app_context():
-        return list_fap_contestacoes_handler(
+        return result_cache.cached_call(
+            "listar_contestacoes_fap", list_fap_contestacoes_handler,
             claims["law_firm_id"], cnpj, cnpj_raiz, ano_vigencia,
             situacao_codigo, instancia_codigo, limite, deslocamento,
             app_public_url=APP_PUBLIC_URL,
@@ -386,7 +391,8 @@ def listar_beneficios_fap(
     """
     claims = require_module("fap_panel")
     with app.app_context():
-        return list_fap_benefits_handler(
+        return result_cache.cached_call(
+            "listar_beneficios_fap", list_fap_benefits_handler,
             claims["law_firm_id"], cnpj, status, tipo_pedido, tipo_beneficio,
             topico_contestacao, segurado, nit, cpf, numero_beneficio, ano_vigencia,
             empresa, limite, deslocamento,
@@ -405,7 +411,8 @@ def detalhar_beneficio(beneficio_id: int) -> dict:
     """
     claims = require_module("fap_panel")
     with app.app_context():
-        return get_benefit_detail_handler(beneficio_id, claims["law_firm_id"])
+        return result_cache.cached_call("detalhar_beneficio", get_benefit_detail_handler,
+                                        beneficio_id, claims["law_firm_id"])
 
 
 @mcp.tool()
@@ -493,7 +500,8 @@ def resumo_fap(
     """
     claims = require_module("fap_panel")
     with app.app_context():
-        return fap_summary_handler(claims["law_firm_id"], ano_vigencia, cnpj, empresa)
+        return result_cache.cached_call("resumo_fap", fap_summary_handler, claims["law_firm_id"],
+                                        ano_vigencia, cnpj, empresa)
 
 
 try:
@@ -533,8 +541,8 @@ else:
         """
         claims = require_module("fap_panel")
         with app.app_context():
-            dados = fap_summary_handler(
-                claims["law_firm_id"], ano_vigencia, cnpj, empresa
+            dados = result_cache.cached_call(
+                "resumo_fap", fap_summary_handler, claims["law_firm_id"], ano_vigencia, cnpj, empresa
             )
         # fap_summary_handler não devolve `empresa` em `filtros` (só
         # ano_vigencia/cnpj) — sem isto, um painel filtrado por empresa
@@ -569,8 +577,10 @@ def alteracoes_recentes_fap(
     """
     claims = require_module("fap_panel")
     with app.app_context():
-        return fap_changes_handler(claims["law_firm_id"], cnpj, ano_vigencia, dias, limite,
-                                  deslocamento)
+        return result_cache.cached_call(
+            "alteracoes_recentes_fap", fap_changes_handler,
+            claims["law_firm_id"], cnpj, ano_vigencia, dias, limite, deslocamento,
+        )
 
 
 @mcp.tool()
@@ -595,8 +605,10 @@ def listar_procuracoes_fap(
     """
     claims = require_module("fap_panel")
     with app.app_context():
-        return list_fap_procuracoes_handler(claims["law_firm_id"], cnpj_raiz, situacao_codigo,
-                                            limite, deslocamento)
+        return result_cache.cached_call(
+            "listar_procuracoes_fap", list_fap_procuracoes_handler,
+            claims["law_firm_id"], cnpj_raiz, situacao_codigo, limite, deslocamento,
+        )
 
 
 @mcp.tool()
@@ -612,8 +624,10 @@ def detalhar_contestacao(contestacao_id: int) -> dict:
     """
     claims = require_module("fap_panel")
     with app.app_context():
-        return get_contestacao_detail_handler(contestacao_id, claims["law_firm_id"],
-                                              app_public_url=APP_PUBLIC_URL)
+        return result_cache.cached_call(
+            "detalhar_contestacao", get_contestacao_detail_handler,
+            contestacao_id, claims["law_firm_id"], app_public_url=APP_PUBLIC_URL,
+        )
 
 
 @mcp.tool()
@@ -627,7 +641,8 @@ def valores_de_filtro_fap() -> dict:
     """
     claims = require_module("fap_panel")
     with app.app_context():
-        return fap_filter_values_handler(claims["law_firm_id"])
+        return result_cache.cached_call("valores_de_filtro_fap", fap_filter_values_handler,
+                                        claims["law_firm_id"])
 
 
 @mcp.tool()
@@ -1244,6 +1259,23 @@ def estatisticas_revisor() -> dict:
         return lawyer_statistics_handler(claims["law_firm_id"])
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# RECURSOS
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+@mcp.resource(
+    "intellexia://cache/fap",
+    name="cache_tools_fap",
+    description="Acertos e faltas do cache de resultado das tools FAP (por tool e no total)",
+    mime_type="application/json",
+)
+def cache_tools_fap() -> dict:
+    """Estatísticas do cache das tools FAP neste processo do servidor MCP."""
+    require_module("fap_panel")
+    return result_cache.stats()
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # PROMPTS (comandos prontos que aparecem no cliente MCP)
 # ──────────────────────────────────────────────────────────────────────────────
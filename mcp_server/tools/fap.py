@@ -45,22 +45,18 @@ def _empresa_por_cnpj(cnpj: str | None, names: dict[str, str]) -> str | None:
     return names.get(digits) or names.get(digits[:8])
 
 
-def _cnpj_digits_col(col):
-    """Expressão SQL: coluna de CNPJ sem pontuação (benefícios guardam formatado)."""
-    from app.models import db
-
-    return db.func.replace(db.func.replace(db.func.replace(col, ".", ""), "/", ""), "-", "")
-
-
 def _filter_benefit_cnpj(query, cnpj: str):
-    """Filtra Benefit.employer_cnpj aceitando CNPJ formatado, só dígitos ou raiz (8)."""
+    """Filtra benefícios pelo CNPJ do empregador: formatado, só dígitos ou raiz (8).
+
+    Compara com Benefit.employer_cnpj_digits (índice com law_firm_id): raiz
+    por prefixo, CNPJ completo por igualdade.
+    """
     from app.models import Benefit
 
     digits = "".join(ch for ch in cnpj if ch.isdigit())
-    expr = _cnpj_digits_col(Benefit.employer_cnpj)
     if len(digits) <= 8:
-        return query.filter(expr.like(f"{digits}%"))
-    return query.filter(expr == digits)
+        return query.filter(Benefit.employer_cnpj_digits.like(f"{digits}%"))
+    return query.filter(Benefit.employer_cnpj_digits == digits)
 
 
 def _filter_benefit_empresa(query, empresa: str, law_firm_id: int):
@@ -78,8 +74,7 @@ def _filter_benefit_empresa(query, empresa: str, law_firm_id: int):
 
     conds = [c for c in [name_cond] if c is not None]
     if raizes:
-        expr = _cnpj_digits_col(Benefit.employer_cnpj)
-        conds.append(db.or_(*[expr.like(f"{r}%") for r in raizes]))
+        conds.append(db.or_(*[Benefit.employer_cnpj_digits.like(f"{r}%") for r in raizes]))
     if not conds:
         return query
     return query.filter(db.or_(*conds))
@@ -213,7 +208,7 @@ def list_fap_contestacoes_handler(
 def get_contestacao_detail_handler(contestacao_id: int, law_firm_id: int,
                                    app_public_url: str | None = None) -> dict:
     """Detalhe completo de uma contestação: dados, mudanças e benefícios da vigência."""
-    from app.models import Benefit, FapVigenciaCnpj, FapWebContestacao, FapWebContestacaoChangeHistory, db
+    from app.models import Benefit, FapVigenciaCnpj, FapWebContestacao, FapWebContestacaoChangeHistory
 
     c = FapWebContestacao.query.filter_by(id=contestacao_id, law_firm_id=law_firm_id).first()
     if not c:
@@ -232,8 +227,7 @@ def get_contestacao_detail_handler(contestacao_id: int, law_firm_id: int,
         ben_q = ben_q.filter(Benefit.fap_vigencia_cnpj_id.in_(vigencia_ids))
     else:
         ben_q = ben_q.filter(
-            db.func.replace(db.func.replace(db.func.replace(
-                Benefit.employer_cnpj, ".", ""), "/", ""), "-", "") == c.cnpj,
+            Benefit.employer_cnpj_digits == c.cnpj,
             Benefit.fap_vigencia_years.like(f"%{c.ano_vigencia}%"),
         )
     beneficios = ben_q.order_by(Benefit.created_at.desc()).limit(50).all()
@@ -11,20 +11,13 @@ def _attach_file_links(items: list[dict], law_firm_id: int, app_public_url: str,
     Só gera link para arquivos ativos do escritório do usuário — a própria rota
     também revalida login e tenant ao abrir.
     """
-    from app.models import KnowledgeBase
+    from app.services.knowledge_base.result_hydration import collect_file_ids, load_result_files
 
-    file_ids = {item.get(file_id_key) for item in items if item.get(file_id_key)}
+    file_ids = collect_file_ids(items, file_id_key)
     if not file_ids:
         return items
 
-    allowed = {
-        kb.id
-        for kb in KnowledgeBase.query.filter(
-            KnowledgeBase.id.in_(file_ids),
-            KnowledgeBase.law_firm_id == law_firm_id,
-            KnowledgeBase.is_active.is_(True),
-        ).with_entities(KnowledgeBase.id).all()
-    }
+    allowed = load_result_files(file_ids, law_firm_id, active_only=True)
     base = app_public_url.rstrip("/")
     for item in items:
         file_id = item.get(file_id_key)
@@ -71,25 +64,32 @@ def kb_search_handler(
 ) -> dict:
     """Pesquisa Inteligente da base de conhecimento (mesmo pipeline da tela).
 
-    Sem modo explícito, o roteador LLM decide entre busca semântica e textual;
+    Sem modo explícito, vale KB_CHAT_SEARCH_MODE (ex.: "hybrid", sem chamada
+    LLM de roteamento) ou, em "auto", o roteador LLM decide entre busca
+    semântica e textual;
     o enriquecimento da pergunta (semântica) e a extração de termos-chave
     (textual) acontecem dentro de ask_knowledge_base. A pontuação/corte usa as
     mesmas funções compartilhadas da tela (search_helpers). Retorna apenas
     trechos de arquivos do escritório do usuário.
     """
-    from app.agents.knowledge_base.knowledge_query_agent import KnowledgeQueryAgent
-    from app.models import KnowledgeBase
+    from app.agents.knowledge_base.knowledge_query_agent import (
+        KnowledgeQueryAgent,
+        configured_chat_search_mode,
+        normalize_search_mode,
+    )
+    from app.services.knowledge_base.result_hydration import collect_file_ids, load_result_files
     from app.services.knowledge_base.search_helpers import adjust_search_score, passes_score_cutoff
 
     agent = KnowledgeQueryAgent()
 
-    mode = (search_mode or "").strip().lower() or None
-    if mode in {"full-text", "literal", "textual"}:
-        mode = "full_text"
-    if mode in {"semantic", "full_text"}:
+    mode = normalize_search_mode(search_mode, default=None)
+    if mode:
         decidido_por = "usuario"
+    elif configured_chat_search_mode():
+        mode = configured_chat_search_mode()
+        decidido_por = "configuracao"
     else:
-        decision = agent.context_retrieval_routing.decide_retrieval_and_mode(question)
+        decision = agent.context_retrieval_routing.decide_retrieval_and_mode(question, law_firm_id=law_firm_id)
         mode = decision.search_mode if decision.search_mode in ("semantic", "full_text") else "semantic"
         decidido_por = "roteador_llm"
 
@@ -113,27 +113,19 @@ def kb_search_handler(
         data = {"improved_question": question}
     else:
         try:
-            data = agent.ask_knowledge_base(question, limit=50, search_mode=mode)
+            data = agent.ask_knowledge_base(question, limit=50, search_mode=mode, law_firm_id=law_firm_id)
         except Exception:
             if mode != "full_text":
                 mode = "full_text"
                 aviso = "Busca semântica indisponível no momento; foi usada a busca textual."
-                data = agent.ask_knowledge_base(question, limit=50, search_mode=mode)
+                data = agent.ask_knowledge_base(question, limit=50, search_mode=mode, law_firm_id=law_firm_id)
             else:
                 raise
         points = data["results"].points if data.get("results") else []
 
     def _process(points_list, current_mode):
         # Isolamento de tenant: só trechos de arquivos do escritório do usuário
-        file_ids = {p.payload.get("file_id") for p in points_list if (p.payload or {}).get("file_id")}
-        allowed: dict = {}
-        if file_ids:
-            rows = KnowledgeBase.query.filter(
-                KnowledgeBase.id.in_(file_ids),
-                KnowledgeBase.law_firm_id == law_firm_id,
-                KnowledgeBase.is_active.is_(True),
-            ).all()
-            allowed = {kb.id: kb for kb in rows}
+        allowed = load_result_files(collect_file_ids(points_list), law_firm_id, active_only=True)
 
         collected = []
         for idx, point in enumerate(points_list):
@@ -145,7 +137,7 @@ def kb_search_handler(
             base_score = getattr(point, "score", None)
             if base_score is None:
                 base_score = payload.get("_rankingScore")
-            if base_score is None and current_mode == "full_text":
+            if base_score is None and current_mode in ("full_text", "hybrid"):
                 base_score = max(0.35, 1.0 - (idx * 0.02))
 
             text = payload.get("text", "") or ""
@@ -163,6 +155,7 @@ def kb_search_handler(
                 "tags": [t for t in (payload.get("tags") or "").split(",") if t],
                 "numero_processo": payload.get("lawsuit_number") or None,
                 "relevancia_percentual": round(adjusted_score * 100, 2),
+                "_rrf": getattr(point, "rrf_score", None),
                 "match_literal": literal,
                 "arquivo": {
                     "id": kb.id,
@@ -174,7 +167,13 @@ def kb_search_handler(
                    if app_public_url else {}),
             })
 
-        collected.sort(key=lambda r: r["relevancia_percentual"], reverse=True)
+        if current_mode == "hybrid":
+            # Ordem da fusão (RRF); a relevância ajustada só faz o corte
+            collected.sort(key=lambda r: r["_rrf"] or 0, reverse=True)
+        else:
+            collected.sort(key=lambda r: r["relevancia_percentual"], reverse=True)
+        for item in collected:
+            item.pop("_rrf", None)
         return collected[:limit]
 
     resultados = _process(points, mode)
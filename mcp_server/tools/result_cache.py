@@ -0,0 +1,122 @@
+"""
+Cache de resultado das tools FAP do MCP.
+
+Clientes LLM repetem a mesma chamada várias vezes numa conversa (resumo_fap
+antes de cada pergunta, valores_de_filtro_fap antes de cada filtro, a mesma
+página de listagem) e cada chamada refazia as agregações do zero. Aqui o
+resultado fica num LRU com TTL por processo.
+
+Chave: (escritório, versão dos dados do FAP, tool, argumentos normalizados).
+A versão vem de app/services/fap_data_version.py, que as sincronizações,
+importações e telas de edição do FAP incrementam depois de gravar: um acerto
+custa só o SELECT da versão, e as entradas da versão anterior deixam de ser
+lidas e saem pelo LRU/TTL. Só vale para quem incrementa: gravação por outro
+caminho (SQL manual, script avulso) aparece no máximo depois do TTL, e um
+incremento que falhe (bump não derruba a gravação) também. Argumentos normalizados:
+padrões da assinatura aplicados, textos sem espaços nas pontas e texto vazio
+como ausente — "bistek", " bistek " e empresa="bistek" são a mesma chamada.
+
+O resultado é copiado na entrada e na saída: quem chama pode alterar o dict
+devolvido (painel_fap acrescenta o filtro de empresa) sem sujar o cache.
+Exceções não são guardadas.
+
+Config: MCP_FAP_CACHE_TTL_SECONDS (default 300; 0 desliga) e
+MCP_FAP_CACHE_MAX_ENTRIES (default 1024). Acertos e faltas por tool em
+`stats()`, expostos no recurso MCP ``intellexia://cache/fap``.
+"""
+from __future__ import annotations
+
+import copy
+import inspect
+import os
+import threading
+
+from app.services import fap_data_version
+from app.services.layout_context_cache import TTLCache
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except (TypeError, ValueError):
+        return default
+
+
+class ToolResultCache(TTLCache):
+    """TTLCache com TTL/tamanho próprios (MCP_FAP_CACHE_*)."""
+
+    @staticmethod
+    def ttl_seconds() -> int:
+        return _env_int("MCP_FAP_CACHE_TTL_SECONDS", 300)
+
+    @staticmethod
+    def max_entries() -> int:
+        return max(1, _env_int("MCP_FAP_CACHE_MAX_ENTRIES", 1024))
+
+
+fap_tool_cache = ToolResultCache("mcp_fap_tools")
+
+_stats_lock = threading.Lock()
+_por_tool: dict[str, dict[str, int]] = {}
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    return value
+
+
+def _bound_arguments(handler, args, kwargs) -> dict:
+    bound = inspect.signature(handler).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return {name: _normalize(value) for name, value in bound.arguments.items()}
+
+
+def _registrar(tool: str, acerto: bool) -> None:
+    with _stats_lock:
+        contadores = _por_tool.setdefault(tool, {"hits": 0, "misses": 0})
+        contadores["hits" if acerto else "misses"] += 1
+
+
+def cached_call(tool: str, handler, *args, **kwargs):
+    """Resultado de ``handler(*args, **kwargs)``, do cache quando possível.
+
+    O handler precisa de um parâmetro ``law_firm_id`` (todas as tools FAP
+    têm). ``tool`` é o nome da chave: tools que expõem o mesmo handler, como
+    resumo_fap e painel_fap, compartilham a entrada. Chamar dentro do
+    app_context — a versão dos dados é lida do banco.
+    """
+    argumentos = _bound_arguments(handler, args, kwargs)
+    law_firm_id = argumentos["law_firm_id"]
+    versao = fap_data_version.current(law_firm_id)
+    chave = (law_firm_id, versao, tool, tuple(sorted(argumentos.items())))
+
+    carregou = []
+
+    def carregar():
+        carregou.append(True)
+        return copy.deepcopy(handler(**argumentos))
+
+    resultado = fap_tool_cache.get_or_load(chave, carregar)
+    _registrar(tool, acerto=not carregou)
+    return copy.deepcopy(resultado)
+
+
+def stats() -> dict:
+    with _stats_lock:
+        por_tool = {}
+        for tool, contadores in sorted(_por_tool.items()):
+            consultas = contadores["hits"] + contadores["misses"]
+            por_tool[tool] = {
+                **contadores,
+                "hit_rate": round(contadores["hits"] / consultas, 4) if consultas else None,
+            }
+    return {
+        "ttl_seconds": ToolResultCache.ttl_seconds(),
+        "max_entries": ToolResultCache.max_entries(),
+        fap_tool_cache.name: fap_tool_cache.stats(),
+        "por_tool": por_tool,
+    }
@@ -0,0 +1,311 @@
+"""
+Benchmark da gravação das contestações do cron do FAP: item a item
+(implementação anterior) x em lote (persist_contestacoes_for_company).
+
+Gera N contestações sintéticas de uma empresa, espalhadas pelas vigências, e
+roda as duas implementações em escritórios separados do mesmo SQLite
+temporário:
+
+1. primeira sincronização (tudo novo);
+2. segunda sincronização com ~10% das contestações mudando de situação
+   (atualização + histórico) e o resto igual.
+
+Ao final compara contestações e histórico das duas (ignorando ids e
+timestamps) — a saída tem que ser idêntica.
+
+No SQLite a diferença vem sobretudo do número de comandos; no MySQL de
+produção, com ida e volta de rede por comando, o ganho é maior.
+
+Executar:
+    uv run python scripts/benchmark_fap_sync_persist.py
+    uv run python scripts/benchmark_fap_sync_persist.py --n 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from main import app
+
+DB_FILE = os.path.join(tempfile.gettempdir(), 'benchmark_fap_sync_persist.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+import fap_sync_cron  # noqa: E402
+
+fap_sync_cron._log = lambda msg: None
+CNPJ = '12345678000195'
+SITUACOES = ('EM_ANDAMENTO', 'LIBERADA_PARA_ANALISE', 'PUBLICADA')
+
+
+def _quiet(msg):
+    pass
+
+
+def persist_row_by_row(
+    db,
+    FapWebContestacao, FapWebContestacaoChangeHistory, FapAutoImportedContestacao,
+    law_firm_id: int,
+    company: object,
+    fetched_years: dict,
+) -> dict:
+    """Implementação anterior (um SELECT + flush por contestação), mantida
+    aqui só como referência de desempenho e de saída."""
+    cnpj_raw = str(company.cnpj or '').strip()
+    cnpj_digits = ''.join(ch for ch in cnpj_raw if ch.isdigit())
+
+    total_created = 0
+    total_updated = 0
+
+    tracked_fields = (
+        'cnpj', 'cnpj_raiz', 'ano_vigencia', 'fap_company_id',
+        'instancia_codigo', 'instancia_descricao',
+        'situacao_codigo', 'situacao_descricao',
+        'protocolo', 'data_transmissao', 'data_dou_date',
+    )
+
+    for year_int, items in fetched_years.items():
+        now = datetime.now()
+        created = 0
+        updated = 0
+
+        for item in items:
+            cid = item.get('id')
+            if not cid:
+                continue
+
+            cnpj_full = str(item.get('cnpj') or '').strip() or cnpj_digits[:8]
+            cnpj_item_digits = ''.join(ch for ch in cnpj_full if ch.isdigit())
+            cnpj_full_14 = cnpj_item_digits.zfill(14) if len(cnpj_item_digits) <= 14 else cnpj_item_digits
+            # Raiz = primeiros 8 dígitos do CNPJ ORIGINAL (antes do zfill à esquerda).
+            # Se derivada de cnpj_full_14, o padding desloca a raiz (ex.: "79894168" → "00000079").
+            cnpj_raiz_item = cnpj_item_digits[:8]
+
+            instancia = item.get('instancia') or {}
+            situacao = item.get('situacao') or {}
+
+            raw_dt = item.get('dataTransmissao')
+            data_transmissao = None
+            if raw_dt:
+                try:
+                    data_transmissao = datetime.fromisoformat(
+                        raw_dt.replace('Z', '+00:00').split('+')[0]
+                    )
+                except Exception:
+                    pass
+
+            raw_dou = item.get('dataDOU')
+            data_dou_date = None
+            if raw_dou:
+                try:
+                    data_dou_date = datetime.fromisoformat(str(raw_dou)[:10]).date()
+                except Exception:
+                    pass
+
+            # Dedup pela mesma chave única do banco
+            # (uq_fap_web_contestacoes_law_firm_contestacao = law_firm_id + contestacao_id).
+            # NÃO incluir cnpj_raiz aqui: o valor gravado na coluna pode divergir
+            # do calculado agora (ex.: CNPJ zero-padded para 14 → raiz "00000079"),
+            # fazendo a busca falhar e o INSERT violar a constraint (Duplicate entry).
+            existing = FapWebContestacao.query.filter_by(
+                law_firm_id=law_firm_id,
+                contestacao_id=int(cid),
+            ).first()
+
+            next_values = {
+                'cnpj': cnpj_full_14,
+                'cnpj_raiz': cnpj_raiz_item,
+                'ano_vigencia': year_int,
+                'fap_company_id': company.id,
+                'instancia_codigo': instancia.get('codigo'),
+                'instancia_descricao': instancia.get('descricao'),
+                'situacao_codigo': situacao.get('codigo'),
+                'situacao_descricao': situacao.get('descricao'),
+                'protocolo': item.get('protocolo'),
+                'data_transmissao': data_transmissao,
+                'data_dou_date': data_dou_date,
+            }
+
+            # Deferimento em coluna própria (o dashboard agrega por ela em SQL).
+            # Fora de next_values de propósito: essa estrutura alimenta também o
+            # change history, e a coluna é só um espelho do raw_data.
+            deferimento_descricao = FapWebContestacao.extract_deferimento_descricao(item)
+
+            if existing:
+                changed_old = {}
+                changed_new = {}
+                for field_name in tracked_fields:
+                    curr = getattr(existing, field_name)
+                    nxt = next_values[field_name]
+                    if curr != nxt:
+                        changed_old[field_name] = curr
+                        changed_new[field_name] = nxt
+
+                if changed_new:
+                    db.session.add(FapWebContestacaoChangeHistory(
+                        law_firm_id=law_firm_id,
+                        contestacao_db_id=existing.id,
+                        contestacao_id=existing.contestacao_id,
+                        cnpj=cnpj_full_14,
+                        cnpj_raiz=cnpj_raiz_item,
+                        ano_vigencia=year_int,
+                        change_type='updated',
+                        changed_fields=json.dumps(sorted(changed_new.keys()), ensure_ascii=False),
+                        old_values=json.dumps(changed_old, ensure_ascii=False, default=str),
+                        new_values=json.dumps(changed_new, ensure_ascii=False, default=str),
+                        synced_at=now,
+                    ))
+
+                    imported_link = FapAutoImportedContestacao.query.filter_by(
+                        law_firm_id=law_firm_id,
+                        contestacao_id=existing.contestacao_id,
+                        cnpj=cnpj_full_14,
+                    ).first()
+                    if imported_link:
+                        existing.needs_reprocess = True
+
+                for k, v in next_values.items():
+                    setattr(existing, k, v)
+                existing.deferimento_descricao = deferimento_descricao
+                existing.raw_data = json.dumps(item, ensure_ascii=False)
+                existing.last_synced_at = now
+                updated += 1
+            else:
+                rec = FapWebContestacao(
+                    law_firm_id=law_firm_id,
+                    contestacao_id=int(cid),
+                    deferimento_descricao=deferimento_descricao,
+                    raw_data=json.dumps(item, ensure_ascii=False),
+                    last_synced_at=now,
+                    **next_values,
+                )
+                db.session.add(rec)
+                db.session.flush()
+
+                db.session.add(FapWebContestacaoChangeHistory(
+                    law_firm_id=law_firm_id,
+                    contestacao_db_id=rec.id,
+                    contestacao_id=rec.contestacao_id,
+                    cnpj=cnpj_full_14,
+                    cnpj_raiz=cnpj_raiz_item,
+                    ano_vigencia=year_int,
+                    change_type='created',
+                    changed_fields=json.dumps(sorted(next_values.keys()), ensure_ascii=False),
+                    old_values='{}',
+                    new_values=json.dumps(next_values, ensure_ascii=False, default=str),
+                    synced_at=now,
+                ))
+                created += 1
+
+        db.session.commit()
+        _quiet(f"    Ano {year_int}: {len(items)} contestação(ões) — {created} criada(s), {updated} atualizada(s)")
+        total_created += created
+        total_updated += updated
+
+    return {'created': total_created, 'updated': total_updated}
+
+
+def synthetic_items(n: int, years: list[int], changed: set | None = None) -> dict:
+    fetched = {year: [] for year in years}
+    for cid in range(1, n + 1):
+        year = years[cid % len(years)]
+        situacao = SITUACOES[(cid + (1 if changed and cid in changed else 0)) % len(SITUACOES)]
+        fetched[year].append({
+            'id': cid,
+            'cnpj': CNPJ[:12] + f'{cid % 97:02d}',
+            'instancia': {'codigo': 'ADMINISTRATIVO_PRIMEIRA_INSTANCIA', 'descricao': '1ª instância'},
+            'situacao': {'codigo': situacao, 'descricao': situacao.title()},
+            'deferimento': {'descricao': 'Deferido' if cid % 3 else 'Indeferido'},
+            'protocolo': f'{year}{cid:08d}',
+            'dataTransmissao': f'{year}-03-{1 + cid % 28:02d}T10:20:30Z',
+            'dataDOU': f'{year}-06-{1 + cid % 28:02d}',
+            'motivos': ['x' * 40] * 5,  # raw_data com tamanho realista
+        })
+    return fetched
+
+
+def snapshot(law_firm_id, FapWebContestacao, History):
+    rows = sorted(
+        tuple(getattr(r, name) for name in ('contestacao_id', 'raw_data', 'deferimento_descricao',
+                                             'needs_reprocess', *fap_sync_cron.CONTESTACAO_TRACKED_FIELDS))
+        for r in FapWebContestacao.query.filter_by(law_firm_id=law_firm_id)
+    )
+    history = [
+        (h.contestacao_id, h.change_type, h.changed_fields, h.old_values, h.new_values, h.ano_vigencia)
+        for h in History.query.filter_by(law_firm_id=law_firm_id).order_by(History.id)
+    ]
+    return rows, history
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--n', type=int, default=50000, help='contestações sintéticas (padrão 50000)')
+    parser.add_argument('--changed', type=float, default=0.1, help='fração alterada na 2ª sincronização')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    years = list(range(2010, 2027))
+    first = synthetic_items(args.n, years)
+    changed = set(rng.sample(range(1, args.n + 1), int(args.n * args.changed)))
+    second = synthetic_items(args.n, years, changed)
+    company = SimpleNamespace(id=1, cnpj=CNPJ)
+
+    with app.app_context():
+        from app.models import (
+            LawFirm, FapWebContestacao, FapWebContestacaoChangeHistory, FapAutoImportedContestacao,
+        )
+        db.create_all()
+        db.session.add_all([LawFirm(id=1, name='Item a item', cnpj='00000000000191'),
+                            LawFirm(id=2, name='Em lote', cnpj='00000000000272')])
+        db.session.commit()
+        models = (FapWebContestacao, FapWebContestacaoChangeHistory, FapAutoImportedContestacao)
+
+        results = {}
+        for label, law_firm_id, fn in (('item a item', 1, persist_row_by_row),
+                                       ('em lote', 2, fap_sync_cron.persist_contestacoes_for_company)):
+            timings = []
+            for fetched in (first, second):
+                started = time.perf_counter()
+                stats = fn(db, *models, law_firm_id, company, fetched)
+                timings.append((time.perf_counter() - started, stats))
+                db.session.expunge_all()
+            results[label] = timings
+            for phase, (elapsed, stats) in zip(('1ª sincronização', '2ª sincronização'), timings):
+                print(f'{label:12s} {phase}: {elapsed:7.2f}s  {stats}')
+
+        counts = {label: [(s['created'], s['updated']) for _, s in timings] for label, timings in results.items()}
+        same_stats = counts['item a item'] == counts['em lote']
+        same_output = (snapshot(1, FapWebContestacao, FapWebContestacaoChangeHistory)
+                       == snapshot(2, FapWebContestacao, FapWebContestacaoChangeHistory))
+        for phase in (0, 1):
+            before, after = results['item a item'][phase][0], results['em lote'][phase][0]
+            print(f'ganho na {phase + 1}ª sincronização: {before / after:.1f}x')
+        print('contagens idênticas:', 'sim' if same_stats else 'NÃO')
+        print('contestações e histórico idênticos:', 'sim' if same_output else 'NÃO')
+
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 0 if same_stats and same_output else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Benchmark da busca semântica da base de conhecimento: com x sem filtro de tenant.
+
+Monta uma coleção sintética multi-tenant (vetores aleatórios normalizados,
+payload igual ao da ingestão: law_firm_id, file_id, category) e compara, para
+o mesmo vetor de consulta:
+
+- sem filtro: `query_points` na coleção inteira e pós-filtro por escritório
+  (o que as telas faziam), pedindo `limit × tenants` pontos para ainda sobrar
+  algo do escritório depois do corte;
+- com filtro: `query_points` com `tenant_filter(law_firm_id)` e índice de
+  payload, pedindo só `limit`.
+
+Mostra p50/p95 de latência e quantos trechos do escritório cada modo devolve
+(o pós-filtro pode devolver menos que `limit` quando o escritório é pequeno).
+
+A latência só é representativa com `--host`: cria a coleção temporária num
+servidor real (HNSW + índice de payload) e a remove ao final. Sem `--host`,
+usa o Qdrant embutido em memória, que avalia filtros em Python e ignora
+índices de payload — serve para conferir isolamento e contagem de trechos,
+não para medir o ganho.
+
+Executar:
+    uv run python scripts/benchmark_kb_tenant_filter.py
+    uv run python scripts/benchmark_kb_tenant_filter.py --host localhost --tenants 50 --points-per-tenant 2000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+import warnings
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from app.agents.knowledge_base.knowledge_ingestion_agent import PAYLOAD_INDEXES, tenant_filter
+
+
+def _build_collection(client, name, tenants, points_per_tenant, dim, rng):
+    client.create_collection(
+        collection_name=name,
+        vectors_config=rest.VectorParams(size=dim, distance=rest.Distance.COSINE),
+    )
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        client.create_payload_index(collection_name=name, field_name=field_name, field_schema=field_schema, wait=True)
+
+    file_id = 0
+    for law_firm_id in range(1, tenants + 1):
+        vectors = rng.standard_normal((points_per_tenant, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        batch = []
+        for idx, vector in enumerate(vectors):
+            if idx % 20 == 0:
+                file_id += 1
+            batch.append(rest.PointStruct(
+                id=str(uuid.uuid4()),
+                vector=vector.tolist(),
+                payload={"law_firm_id": law_firm_id, "file_id": file_id, "category": f"cat-{idx % 5}",
+                         "text": f"trecho {idx} do escritório {law_firm_id}"},
+            ))
+            if len(batch) == 256:
+                client.upsert(collection_name=name, points=batch, wait=True)
+                batch = []
+        if batch:
+            client.upsert(collection_name=name, points=batch, wait=True)
+
+
+def _timed(fn, runs):
+    latencies, result = [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+    return statistics.median(latencies), p95, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark da busca com x sem filtro de tenant')
+    ap.add_argument('--host', help='servidor Qdrant (default: embutido em memória)')
+    ap.add_argument('--port', type=int, default=int(os.getenv('QDRANT_PORT', '6333')))
+    ap.add_argument('--tenants', type=int, default=20, help='escritórios (default: 20)')
+    ap.add_argument('--points-per-tenant', type=int, default=500, help='pontos por escritório (default: 500)')
+    ap.add_argument('--dim', type=int, default=256, help='dimensão dos vetores (default: 256)')
+    ap.add_argument('--limit', type=int, default=50, help='trechos pedidos pela tela (default: 50)')
+    ap.add_argument('--queries', type=int, default=30, help='consultas por modo (default: 30)')
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(42)
+    if args.host:
+        client = QdrantClient(host=args.host, port=args.port, timeout=120)
+    else:
+        warnings.filterwarnings('ignore', message='Payload indexes have no effect')
+        client = QdrantClient(':memory:')
+    name = f"bench_kb_tenant_{uuid.uuid4().hex[:8]}"
+    total = args.tenants * args.points_per_tenant
+    print(f"Coleção sintética: {args.tenants} escritórios × {args.points_per_tenant} pontos = {total} "
+          f"(dim {args.dim}, {'servidor ' + args.host if args.host else 'Qdrant em memória'})")
+
+    started = time.perf_counter()
+    _build_collection(client, name, args.tenants, args.points_per_tenant, args.dim, rng)
+    print(f"carga: {time.perf_counter() - started:.1f} s\n")
+
+    try:
+        law_firm_id = 1 + args.tenants // 2
+        query = rng.standard_normal(args.dim).astype(np.float32)
+        query = (query / np.linalg.norm(query)).tolist()
+
+        def unfiltered():
+            points = client.query_points(
+                collection_name=name, query=query, limit=args.limit * args.tenants, with_payload=True,
+            ).points
+            return [p for p in points if (p.payload or {}).get("law_firm_id") == law_firm_id][:args.limit]
+
+        def filtered():
+            return client.query_points(
+                collection_name=name, query=query, query_filter=tenant_filter(law_firm_id),
+                limit=args.limit, with_payload=True,
+            ).points
+
+        unf_p50, unf_p95, unf_points = _timed(unfiltered, args.queries)
+        fil_p50, fil_p95, fil_points = _timed(filtered, args.queries)
+
+        print(f"{'modo':<28}{'p50 (ms)':>10}{'p95 (ms)':>10}{'trechos':>9}")
+        print(f"{'sem filtro + pós-filtro':<28}{unf_p50:>10.1f}{unf_p95:>10.1f}{len(unf_points):>9}")
+        print(f"{'filtro de tenant no Qdrant':<28}{fil_p50:>10.1f}{fil_p95:>10.1f}{len(fil_points):>9}")
+        if fil_p50:
+            print(f"\nrazão p50 (sem filtro / com filtro): {unf_p50 / fil_p50:.1f}x")
+        if not args.host:
+            print("aviso: Qdrant embutido filtra em Python, sem índice — latência não representa o servidor")
+        leaked = [p for p in fil_points if (p.payload or {}).get("law_firm_id") != law_firm_id]
+        print(f"trechos de outro escritório no modo filtrado: {len(leaked)}")
+        return 1 if leaked else 0
+    finally:
+        client.delete_collection(name)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Benchmark do anotador de imagens de PDF: sequencial x concorrente.
+
+Gera um PDF sintético com várias imagens distintas (uma peça-modelo "cheia de
+prints") e mede `annotate_pages_with_images` em dois modos:
+
+- sequencial: render no próprio processo e um lote de visão por vez
+  (IMPUGNACAO_IMAGE_RENDER_WORKERS=1, IMPUGNACAO_IMAGE_VISION_CONCURRENCY=1);
+- concorrente: render em pool de processos e vários lotes em voo.
+
+O cliente de visão é substituído por um stub que dorme `--latency` segundos
+por lote (sem rede, sem custo) e o cache de descrições fica desligado, para
+que toda imagem passe pela visão nos dois modos. Confere também que o texto
+anotado sai idêntico nos dois modos.
+
+Executar:
+    uv run python scripts/benchmark_pdf_image_annotator.py
+    uv run python scripts/benchmark_pdf_image_annotator.py --pages 20 --per-page 3 --latency 1.5
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+import app.services.pdf_image_annotator as annotator
+
+
+class _StubCompletion:
+    def __init__(self, text):
+        message = type('Message', (), {'content': text})()
+        self.choices = [type('Choice', (), {'message': message, 'finish_reason': 'stop'})()]
+        self.usage = None
+        self.id = 'benchmark'
+
+
+def _build_pdf(path, pages, per_page, image_px):
+    doc = fitz.open()
+    for page_index in range(pages):
+        page = doc.new_page(width=595, height=842)
+        slot_height = 760 / per_page
+        for slot in range(per_page):
+            y0 = 40 + slot * slot_height
+            page.insert_text((50, y0 + 12), f'Print {slot + 1} da página {page_index + 1}, conforme abaixo:')
+            img = Image.effect_noise((image_px, image_px), 40 + page_index + slot).convert('RGB')
+            buf = io.BytesIO()
+            img.save(buf, format='PNG')
+            page.insert_image(fitz.Rect(50, y0 + 20, 545, y0 + slot_height - 10), stream=buf.getvalue())
+    doc.save(path)
+    page_texts = [(i + 1, doc[i].get_text()) for i in range(doc.page_count)]
+    doc.close()
+    return page_texts
+
+
+def _run(pdf_path, page_texts, render_workers, concurrency):
+    os.environ['IMPUGNACAO_IMAGE_RENDER_WORKERS'] = str(render_workers)
+    os.environ['IMPUGNACAO_IMAGE_VISION_CONCURRENCY'] = str(concurrency)
+    started = time.perf_counter()
+    result = annotator.annotate_pages_with_images(pdf_path, page_texts, describe=True)
+    return time.perf_counter() - started, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark sequencial x concorrente do anotador de imagens')
+    ap.add_argument('--pages', type=int, default=12, help='páginas do PDF sintético (default: 12)')
+    ap.add_argument('--per-page', type=int, default=3, help='imagens por página (default: 3)')
+    ap.add_argument('--image-px', type=int, default=900, help='lado de cada imagem em pixels (default: 900)')
+    ap.add_argument('--latency', type=float, default=0.8, help='segundos por lote no stub de visão (default: 0.8)')
+    ap.add_argument('--workers', type=int, default=4, help='processos de render no modo concorrente (default: 4)')
+    ap.add_argument('--concurrency', type=int, default=4, help='lotes de visão em voo no modo concorrente (default: 4)')
+    args = ap.parse_args()
+
+    total_images = args.pages * args.per_page
+    os.environ['IMPUGNACAO_IMAGE_VISION_CACHE_ENABLED'] = 'false'
+    os.environ['IMPUGNACAO_IMAGE_MAX_DESCRIBED_PER_DOC'] = str(total_images)
+
+    def stub_request(images_b64):
+        time.sleep(args.latency)
+        text = '\n'.join(f'{i + 1}. print sintético ({len(b64)} bytes)' for i, b64 in enumerate(images_b64))
+        return _StubCompletion(text), annotator._vision_model(), int(args.latency * 1000)
+
+    annotator._request_vision_batch = stub_request
+    annotator._record_vision_usage = lambda *a, **kw: None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, 'benchmark.pdf')
+        page_texts = _build_pdf(pdf_path, args.pages, args.per_page, args.image_px)
+        batch_size = annotator._vision_batch_size()
+        print(f'PDF sintético: {args.pages} páginas, {total_images} imagens, '
+              f'lotes de {batch_size}, stub de visão {args.latency:.2f} s/lote, '
+              f'{os.cpu_count()} CPU(s)\n')
+
+        seq_time, seq_result = _run(pdf_path, page_texts, render_workers=1, concurrency=1)
+        conc_time, conc_result = _run(pdf_path, page_texts, args.workers, args.concurrency)
+
+    print()
+    print(f'sequencial  : {seq_time:6.2f} s')
+    print(f'concorrente : {conc_time:6.2f} s  ({args.workers} processo(s) de render, '
+          f'{args.concurrency} lote(s) em voo)')
+    print(f'ganho       : {seq_time / conc_time:6.2f}x' if conc_time else '')
+    identical = seq_result == conc_result
+    print(f'texto anotado idêntico nos dois modos: {"sim" if identical else "NÃO"}')
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
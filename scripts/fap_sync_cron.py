@@ -6,10 +6,14 @@ Sequência de execução:
   1. Verifica sessão FAP (aborta se expirada)
   2. Sincroniza empresas (upsert FapCompany)
   3. Sincroniza procurações (delega a fap_procuracoes_service) + alerta por e-mail
-  4. Contestações — Fase 1: busca em paralelo (várias empresas ao mesmo tempo)
-                   Fase 2: grava no banco sequencialmente (upsert FapWebContestacao)
+  4. Contestações — Fase 1: busca em paralelo (várias empresas ao mesmo tempo),
+                           só das listagens (empresa × ano) que estão na vez
+                   Fase 2: grava no banco sequencialmente, em lote por empresa
+                           (upsert FapWebContestacao + histórico); listagem com a
+                           mesma impressão digital da última execução é pulada
   5. Download — fila única global: baixa em paralelo todos os PDFs sem arquivo local
-                (pula os que já existem em disco)
+                (pula os que já existem em disco; índice do disco numa varredura só,
+                com checkpoint para retomar uma execução interrompida)
 
 Variáveis de ambiente (.env):
   FAP_AUTH_JSON        — JSON de autenticação (obrigatório)
@@ -20,8 +24,12 @@ Variáveis de ambiente (.env):
                          Exemplo: 2026,2025,2024
   FAP_SYNC_START_YEAR  — Ano inicial do intervalo padrão (padrão: 2010 → busca de 2010 ao ano atual)
   FAP_SYNC_FETCH_WORKERS    — Nº de buscas de contestações em paralelo (padrão: 8, máx: 20)
+  FAP_SYNC_COLD_DAYS   — Intervalo, em dias, para reconsultar listagens "frias" (padrão: 7)
+  FAP_SYNC_FULL        — '1' busca todas as listagens e refaz o diff de todas (ignora
+                         impressões digitais e intervalo das frias); padrão '0'
   FAP_SYNC_DOWNLOAD    — '1' (padrão) baixa os PDFs após a sincronização; '0' desativa
   FAP_SYNC_DOWNLOAD_WORKERS — Nº de downloads em paralelo (fila global) (padrão: 8, máx: 30)
+  FAP_HTTP_POOL_SIZE   — Conexões keep-alive ao portal, compartilhadas pelos workers (padrão: 30)
 
 Execução manual:
   uv run python scripts/fap_sync_cron.py
@@ -102,6 +110,21 @@ def _fetch_workers() -> int:
     return 8
 
 
+def _cold_days() -> float:
+    raw = os.environ.get('FAP_SYNC_COLD_DAYS', '').strip()
+    if raw:
+        try:
+            return max(0.0, float(raw))
+        except ValueError:
+            _log(f"AVISO: FAP_SYNC_COLD_DAYS inválido ('{raw}'). Usando padrão ({LISTING_COLD_DAYS}).")
+    return LISTING_COLD_DAYS
+
+
+def _full_sync() -> bool:
+    raw = os.environ.get('FAP_SYNC_FULL', '0').strip().lower()
+    return raw in ('1', 'true', 'yes', 'sim', 'on')
+
+
 def _get_law_firm_id(db, LawFirm) -> int:
     raw = os.environ.get('FAP_SYNC_LAW_FIRM_ID', '').strip()
     if raw:
@@ -251,193 +274,535 @@ def fetch_contestacoes_for_company(auth, company_id: int, cnpj: str, years: list
     return out
 
 
+# Campos comparados para o histórico de mudanças (change history).
+CONTESTACAO_TRACKED_FIELDS = (
+    'cnpj', 'cnpj_raiz', 'ano_vigencia', 'fap_company_id',
+    'instancia_codigo', 'instancia_descricao',
+    'situacao_codigo', 'situacao_descricao',
+    'protocolo', 'data_transmissao', 'data_dou_date',
+)
+
+# Tamanho dos lotes de IN (...) e de INSERT/UPDATE em massa.
+PERSIST_BATCH_SIZE = 1000
+
+# ── Impressão digital das listagens (empresa × ano de vigência) ──────────
+# Entra no hash: mudar a normalização (ou o que a gravação deriva do item)
+# exige subir a versão, senão listagens antigas seriam puladas sem o diff.
+LISTING_FINGERPRINT_VERSION = 1
+
+# Situação final da contestação; qualquer outra é instância em aberto.
+SITUACAO_PUBLICADA = 'PUBLICADA'
+
+# Listagem "fria" (tudo publicado, vigência antiga) volta a ser consultada
+# depois deste intervalo; as "quentes" são consultadas em toda execução.
+LISTING_COLD_DAYS = 7
+
+
+def listing_fingerprint(items: list) -> tuple[str, int, bool]:
+    """(hash, nº de itens, tem instância em aberto) de uma listagem do portal.
+
+    Normalizada antes do hash — itens ordenados pelo id (ordenação estável:
+    repetidos mantêm a ordem relativa) e chaves ordenadas —, para que a mesma
+    listagem devolvida em outra ordem não pareça mudança.
+    """
+    import hashlib
+
+    ordered = sorted(items, key=lambda item: str(item.get('id') or ''))
+    payload = json.dumps(
+        [LISTING_FINGERPRINT_VERSION, ordered],
+        sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str,
+    )
+    has_open = any(
+        str(((item.get('situacao') or {}).get('codigo')) or '').upper() != SITUACAO_PUBLICADA
+        for item in items
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest(), len(items), has_open
+
+
+def load_listing_fingerprints(db, FapWebContestacaoListingFingerprint, law_firm_id: int) -> dict:
+    """{(cnpj, ano): {'has_open', 'last_synced_at'}} do escritório, numa consulta."""
+    Model = FapWebContestacaoListingFingerprint
+    return {
+        (cnpj, ano): {'has_open': has_open, 'last_synced_at': last_synced_at}
+        for cnpj, ano, has_open, last_synced_at in (
+            db.session.query(Model.cnpj, Model.ano_vigencia, Model.has_open, Model.last_synced_at)
+            .filter(Model.law_firm_id == law_firm_id)
+        )
+    }
+
+
+def plan_listing_years(
+    fingerprints: dict,
+    cnpj: str,
+    years: list[int],
+    now: datetime,
+    cold_days: float = LISTING_COLD_DAYS,
+    full: bool = False,
+) -> list[int]:
+    """Anos da empresa que entram na busca desta execução ("hot set").
+
+    Quente — consultada sempre: listagem nunca vista, com instância em aberto
+    (contestação ainda não publicada) ou de vigência recente (ano atual e o
+    anterior, que ainda recebem contestações e recursos novos). Fria — tudo
+    publicado, vigência antiga: só depois de ``cold_days`` desde a última
+    consulta.
+    """
+    if full:
+        return list(years)
+    from datetime import timedelta
+
+    cnpj_digits = ''.join(ch for ch in str(cnpj or '') if ch.isdigit())
+    recent = now.year - 1
+    cold_before = now - timedelta(days=cold_days)
+    due = []
+    for year in years:
+        fp = fingerprints.get((cnpj_digits, int(year)))
+        if (
+            fp is None
+            or fp['has_open']
+            or int(year) >= recent
+            or fp['last_synced_at'] is None
+            or fp['last_synced_at'] <= cold_before
+        ):
+            due.append(year)
+    return due
+
+
+def _parse_contestacao_item(item: dict, year_int: int, company_id: int, cnpj_digits: str) -> dict:
+    """Valores das colunas rastreadas a partir de um item da API FAP."""
+    cnpj_full = str(item.get('cnpj') or '').strip() or cnpj_digits[:8]
+    cnpj_item_digits = ''.join(ch for ch in cnpj_full if ch.isdigit())
+    cnpj_full_14 = cnpj_item_digits.zfill(14) if len(cnpj_item_digits) <= 14 else cnpj_item_digits
+    # Raiz = primeiros 8 dígitos do CNPJ ORIGINAL (antes do zfill à esquerda).
+    # Se derivada de cnpj_full_14, o padding desloca a raiz (ex.: "79894168" → "00000079").
+    cnpj_raiz_item = cnpj_item_digits[:8]
+
+    instancia = item.get('instancia') or {}
+    situacao = item.get('situacao') or {}
+
+    raw_dt = item.get('dataTransmissao')
+    data_transmissao = None
+    if raw_dt:
+        try:
+            data_transmissao = datetime.fromisoformat(
+                raw_dt.replace('Z', '+00:00').split('+')[0]
+            )
+        except Exception:
+            pass
+
+    raw_dou = item.get('dataDOU')
+    data_dou_date = None
+    if raw_dou:
+        try:
+            data_dou_date = datetime.fromisoformat(str(raw_dou)[:10]).date()
+        except Exception:
+            pass
+
+    return {
+        'cnpj': cnpj_full_14,
+        'cnpj_raiz': cnpj_raiz_item,
+        'ano_vigencia': year_int,
+        'fap_company_id': company_id,
+        'instancia_codigo': instancia.get('codigo'),
+        'instancia_descricao': instancia.get('descricao'),
+        'situacao_codigo': situacao.get('codigo'),
+        'situacao_descricao': situacao.get('descricao'),
+        'protocolo': item.get('protocolo'),
+        'data_transmissao': data_transmissao,
+        'data_dou_date': data_dou_date,
+    }
+
+
+def _chunks(values: list, size: int = PERSIST_BATCH_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
 def persist_contestacoes_for_company(
     db,
     FapWebContestacao, FapWebContestacaoChangeHistory, FapAutoImportedContestacao,
     law_firm_id: int,
     company: object,
     fetched_years: dict,
+    FapWebContestacaoListingFingerprint=None,
+    full: bool = False,
 ) -> dict:
     """Persiste no banco (upsert + histórico) as contestações já buscadas.
 
-    Roda no thread principal — escrita sequencial no banco.
+    Roda no thread principal — escrita sequencial no banco. Em lote: as linhas
+    existentes da empresa são carregadas de uma vez (IN pela chave única
+    law_firm_id + contestacao_id, sem raw_data), o diff e o histórico são
+    calculados em memória e a gravação sai em INSERT/UPDATE em massa —
+    em vez de um SELECT + flush por contestação. Commit por ano, como antes.
+
+    Com o modelo de impressões digitais, cada listagem (ano) cuja impressão
+    é igual à gravada na execução anterior pula o diff: só o last_synced_at
+    das linhas é renovado. Se alguma linha da listagem não existir mais no
+    banco, o diff é feito mesmo assim. ``full=True`` refaz o diff de todas.
+
+    Retorna {'created', 'updated', 'listings_new', 'listings_changed',
+    'listings_skipped'} — "changed" conta as listagens já conhecidas que
+    passaram pelo diff.
+
+    Os grupos (vigência × CNPJ) com contestação nova ou alterada têm o
+    resumo da tela de contestações recalculado no commit do ano.
     """
+    from sqlalchemy import insert, update
+
+    from app.services import fap_contestacao_summary_service
+
     cnpj_raw = str(company.cnpj or '').strip()
     cnpj_digits = ''.join(ch for ch in cnpj_raw if ch.isdigit())
 
+    listing_stats = {'listings_new': 0, 'listings_changed': 0, 'listings_skipped': 0}
+
+    # ── Impressões digitais: listagens iguais às da última execução ────────
+    Fingerprint = FapWebContestacaoListingFingerprint
+    previous: dict[int, dict] = {}   # ano → impressão gravada
+    current: dict[int, tuple] = {}   # ano → (hash, nº de itens, tem aberta)
+    if Fingerprint is not None and fetched_years:
+        previous = {
+            values['ano_vigencia']: values
+            for values in (
+                dict(row._mapping) for row in
+                db.session.query(
+                    Fingerprint.id, Fingerprint.ano_vigencia,
+                    Fingerprint.payload_hash, Fingerprint.item_count,
+                )
+                .filter(Fingerprint.law_firm_id == law_firm_id)
+                .filter(Fingerprint.cnpj == cnpj_digits)
+                .filter(Fingerprint.ano_vigencia.in_([int(y) for y in fetched_years]))
+            )
+        }
+        current = {int(year): listing_fingerprint(items) for year, items in fetched_years.items()}
+
+        now = datetime.now()
+        skipped: dict[int, list] = {}
+        for year_int, items in fetched_years.items():
+            prev = previous.get(int(year_int))
+            digest, count, _ = current[int(year_int)]
+            if full or prev is None or (prev['payload_hash'], prev['item_count']) != (digest, count):
+                continue
+            cids = sorted({int(item['id']) for item in items if item.get('id')})
+            touched = 0
+            for batch in _chunks(cids):
+                touched += db.session.execute(
+                    update(FapWebContestacao)
+                    .where(FapWebContestacao.law_firm_id == law_firm_id)
+                    .where(FapWebContestacao.contestacao_id.in_(batch))
+                    .values(last_synced_at=now)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+            if touched < len(cids):
+                continue  # linha apagada do banco: o diff recria
+            skipped[year_int] = items
+        if skipped:
+            db.session.execute(update(Fingerprint), [
+                {'id': previous[int(year)]['id'], 'last_synced_at': now,
+                 'has_open': current[int(year)][2]}
+                for year in skipped
+            ])
+            db.session.commit()
+            for year_int, items in skipped.items():
+                _log(f"    Ano {year_int}: {len(items)} contestação(ões) — listagem inalterada, diff pulado")
+            listing_stats['listings_skipped'] = len(skipped)
+            fetched_years = {y: items for y, items in fetched_years.items() if y not in skipped}
+
+    all_cids = sorted({
+        int(item['id'])
+        for items in fetched_years.values() for item in items if item.get('id')
+    })
+
+    # ── Pré-carga: linhas existentes + vínculos de importação ─────────────
+    # Dedup pela mesma chave única do banco
+    # (uq_fap_web_contestacoes_law_firm_contestacao = law_firm_id + contestacao_id).
+    # NÃO incluir cnpj_raiz aqui: o valor gravado na coluna pode divergir
+    # do calculado agora (ex.: CNPJ zero-padded para 14 → raiz "00000079"),
+    # fazendo a busca falhar e o INSERT violar a constraint (Duplicate entry).
+    columns = [FapWebContestacao.id, FapWebContestacao.contestacao_id] + [
+        getattr(FapWebContestacao, name) for name in CONTESTACAO_TRACKED_FIELDS
+    ]
+    known: dict[int, dict] = {}   # contestacao_id → {'id', campos rastreados}
+    imported_links: set[tuple[int, str]] = set()
+    for batch in _chunks(all_cids):
+        for row in (
+            db.session.query(*columns)
+            .filter(FapWebContestacao.law_firm_id == law_firm_id)
+            .filter(FapWebContestacao.contestacao_id.in_(batch))
+        ):
+            values = dict(row._mapping)
+            known[values.pop('contestacao_id')] = values
+        imported_links.update(
+            db.session.query(FapAutoImportedContestacao.contestacao_id, FapAutoImportedContestacao.cnpj)
+            .filter(FapAutoImportedContestacao.law_firm_id == law_firm_id)
+            .filter(FapAutoImportedContestacao.contestacao_id.in_(batch))
+            .all()
+        )
+
     total_created = 0
     total_updated = 0
 
-    tracked_fields = (
-        'cnpj', 'cnpj_raiz', 'ano_vigencia', 'fap_company_id',
-        'instancia_codigo', 'instancia_descricao',
-        'situacao_codigo', 'situacao_descricao',
-        'protocolo', 'data_transmissao', 'data_dou_date',
-    )
-
     for year_int, items in fetched_years.items():
         now = datetime.now()
         created = 0
         updated = 0
 
+        inserts: dict[int, dict] = {}   # contestacao_id → linha nova
+        updates: dict[int, dict] = {}   # contestacao_id → UPDATE por id
+        history: list[dict] = []        # na ordem dos itens; id resolvido depois
+        groups: set[tuple] = set()      # (ano_vigencia, cnpj) com resumo a recalcular
+
         for item in items:
             cid = item.get('id')
             if not cid:
                 continue
+            cid = int(cid)
 
-            cnpj_full = str(item.get('cnpj') or '').strip() or cnpj_digits[:8]
-            cnpj_item_digits = ''.join(ch for ch in cnpj_full if ch.isdigit())
-            cnpj_full_14 = cnpj_item_digits.zfill(14) if len(cnpj_item_digits) <= 14 else cnpj_item_digits
-            # Raiz = primeiros 8 dígitos do CNPJ ORIGINAL (antes do zfill à esquerda).
-            # Se derivada de cnpj_full_14, o padding desloca a raiz (ex.: "79894168" → "00000079").
-            cnpj_raiz_item = cnpj_item_digits[:8]
-
-            instancia = item.get('instancia') or {}
-            situacao = item.get('situacao') or {}
-
-            raw_dt = item.get('dataTransmissao')
-            data_transmissao = None
-            if raw_dt:
-                try:
-                    data_transmissao = datetime.fromisoformat(
-                        raw_dt.replace('Z', '+00:00').split('+')[0]
-                    )
-                except Exception:
-                    pass
-
-            raw_dou = item.get('dataDOU')
-            data_dou_date = None
-            if raw_dou:
-                try:
-                    data_dou_date = datetime.fromisoformat(str(raw_dou)[:10]).date()
-                except Exception:
-                    pass
-
-            # Dedup pela mesma chave única do banco
-            # (uq_fap_web_contestacoes_law_firm_contestacao = law_firm_id + contestacao_id).
-            # NÃO incluir cnpj_raiz aqui: o valor gravado na coluna pode divergir
-            # do calculado agora (ex.: CNPJ zero-padded para 14 → raiz "00000079"),
-            # fazendo a busca falhar e o INSERT violar a constraint (Duplicate entry).
-            existing = FapWebContestacao.query.filter_by(
-                law_firm_id=law_firm_id,
-                contestacao_id=int(cid),
-            ).first()
-
-            next_values = {
-                'cnpj': cnpj_full_14,
-                'cnpj_raiz': cnpj_raiz_item,
-                'ano_vigencia': year_int,
-                'fap_company_id': company.id,
-                'instancia_codigo': instancia.get('codigo'),
-                'instancia_descricao': instancia.get('descricao'),
-                'situacao_codigo': situacao.get('codigo'),
-                'situacao_descricao': situacao.get('descricao'),
-                'protocolo': item.get('protocolo'),
-                'data_transmissao': data_transmissao,
-                'data_dou_date': data_dou_date,
-            }
-
+            next_values = _parse_contestacao_item(item, year_int, company.id, cnpj_digits)
             # Deferimento em coluna própria (o dashboard agrega por ela em SQL).
             # Fora de next_values de propósito: essa estrutura alimenta também o
             # change history, e a coluna é só um espelho do raw_data.
-            deferimento_descricao = FapWebContestacao.extract_deferimento_descricao(item)
+            row_values = dict(
+                next_values,
+                deferimento_descricao=FapWebContestacao.extract_deferimento_descricao(item),
+                raw_data=json.dumps(item, ensure_ascii=False),
+                last_synced_at=now,
+            )
 
-            if existing:
+            existing = known.get(cid)
+            if existing is not None:
                 changed_old = {}
                 changed_new = {}
-                for field_name in tracked_fields:
-                    curr = getattr(existing, field_name)
+                for field_name in CONTESTACAO_TRACKED_FIELDS:
+                    curr = existing[field_name]
                     nxt = next_values[field_name]
                     if curr != nxt:
                         changed_old[field_name] = curr
                         changed_new[field_name] = nxt
 
+                # Mesma contestação repetida no lote: a linha ainda não existe
+                # no banco, a atualização entra no próprio INSERT.
+                target = inserts.get(cid)
+                if target is None:
+                    target = updates.setdefault(cid, {'id': existing['id']})
+                    target['updated_at'] = now
+
                 if changed_new:
-                    db.session.add(FapWebContestacaoChangeHistory(
-                        law_firm_id=law_firm_id,
-                        contestacao_db_id=existing.id,
-                        contestacao_id=existing.contestacao_id,
-                        cnpj=cnpj_full_14,
-                        cnpj_raiz=cnpj_raiz_item,
-                        ano_vigencia=year_int,
-                        change_type='updated',
-                        changed_fields=json.dumps(sorted(changed_new.keys()), ensure_ascii=False),
-                        old_values=json.dumps(changed_old, ensure_ascii=False, default=str),
-                        new_values=json.dumps(changed_new, ensure_ascii=False, default=str),
-                        synced_at=now,
-                    ))
-
-                    imported_link = FapAutoImportedContestacao.query.filter_by(
-                        law_firm_id=law_firm_id,
-                        contestacao_id=existing.contestacao_id,
-                        cnpj=cnpj_full_14,
-                    ).first()
-                    if imported_link:
-                        existing.needs_reprocess = True
-
-                for k, v in next_values.items():
-                    setattr(existing, k, v)
-                existing.deferimento_descricao = deferimento_descricao
-                existing.raw_data = json.dumps(item, ensure_ascii=False)
-                existing.last_synced_at = now
+                    # O grupo de antes também muda (vigência/CNPJ podem mudar)
+                    groups.add((existing['ano_vigencia'], existing['cnpj']))
+                    groups.add((year_int, next_values['cnpj']))
+                    history.append({
+                        'contestacao_id': cid,
+                        'cnpj': next_values['cnpj'],
+                        'cnpj_raiz': next_values['cnpj_raiz'],
+                        'ano_vigencia': year_int,
+                        'change_type': 'updated',
+                        'changed_fields': json.dumps(sorted(changed_new.keys()), ensure_ascii=False),
+                        'old_values': json.dumps(changed_old, ensure_ascii=False, default=str),
+                        'new_values': json.dumps(changed_new, ensure_ascii=False, default=str),
+                    })
+                    if (cid, next_values['cnpj']) in imported_links:
+                        target['needs_reprocess'] = True
+
+                target.update(row_values)
+                existing.update(next_values)
                 updated += 1
             else:
-                rec = FapWebContestacao(
-                    law_firm_id=law_firm_id,
-                    contestacao_id=int(cid),
-                    deferimento_descricao=deferimento_descricao,
-                    raw_data=json.dumps(item, ensure_ascii=False),
-                    last_synced_at=now,
-                    **next_values,
-                )
-                db.session.add(rec)
-                db.session.flush()
+                inserts[cid] = dict(row_values, law_firm_id=law_firm_id, contestacao_id=cid)
+                known[cid] = dict(next_values, id=None)
+                groups.add((year_int, next_values['cnpj']))
+                history.append({
+                    'contestacao_id': cid,
+                    'cnpj': next_values['cnpj'],
+                    'cnpj_raiz': next_values['cnpj_raiz'],
+                    'ano_vigencia': year_int,
+                    'change_type': 'created',
+                    'changed_fields': json.dumps(sorted(next_values.keys()), ensure_ascii=False),
+                    'old_values': '{}',
+                    'new_values': json.dumps(next_values, ensure_ascii=False, default=str),
+                })
+                created += 1
 
-                db.session.add(FapWebContestacaoChangeHistory(
+        # ── Gravação em massa ─────────────────────────────────────────────
+        if inserts:
+            for batch in _chunks(list(inserts.values())):
+                db.session.execute(insert(FapWebContestacao), batch)
+            # INSERT em lote não devolve os ids no MySQL: uma consulta pela
+            # chave única resolve todos de uma vez para o histórico.
+            for batch in _chunks(list(inserts)):
+                for row_id, cid in (
+                    db.session.query(FapWebContestacao.id, FapWebContestacao.contestacao_id)
+                    .filter(FapWebContestacao.law_firm_id == law_firm_id)
+                    .filter(FapWebContestacao.contestacao_id.in_(batch))
+                ):
+                    known[cid]['id'] = row_id
+        if updates:
+            for batch in _chunks(list(updates.values())):
+                db.session.execute(update(FapWebContestacao), batch)
+        if history:
+            for entry in history:
+                entry.update(
                     law_firm_id=law_firm_id,
-                    contestacao_db_id=rec.id,
-                    contestacao_id=rec.contestacao_id,
-                    cnpj=cnpj_full_14,
-                    cnpj_raiz=cnpj_raiz_item,
-                    ano_vigencia=year_int,
-                    change_type='created',
-                    changed_fields=json.dumps(sorted(next_values.keys()), ensure_ascii=False),
-                    old_values='{}',
-                    new_values=json.dumps(next_values, ensure_ascii=False, default=str),
+                    contestacao_db_id=known[entry['contestacao_id']]['id'],
                     synced_at=now,
-                ))
-                created += 1
+                )
+            for batch in _chunks(history):
+                db.session.execute(insert(FapWebContestacaoChangeHistory), batch)
+
+        # Impressão digital no mesmo commit do ano: se a gravação falhar, a
+        # próxima execução não pula esta listagem.
+        if Fingerprint is not None:
+            digest, count, has_open = current[int(year_int)]
+            prev = previous.get(int(year_int))
+            if prev is None:
+                db.session.execute(insert(Fingerprint), [{
+                    'law_firm_id': law_firm_id, 'fap_company_id': company.id,
+                    'cnpj': cnpj_digits, 'ano_vigencia': int(year_int),
+                    'payload_hash': digest, 'item_count': count, 'has_open': has_open,
+                    'last_changed_at': now, 'last_synced_at': now, 'created_at': now,
+                }])
+                listing_stats['listings_new'] += 1
+            else:
+                values = {'id': prev['id'], 'last_synced_at': now, 'has_open': has_open,
+                          'fap_company_id': company.id}
+                if (prev['payload_hash'], prev['item_count']) != (digest, count):
+                    values.update(payload_hash=digest, item_count=count, last_changed_at=now)
+                db.session.execute(update(Fingerprint), [values])
+                listing_stats['listings_changed'] += 1
+
+        if groups:
+            fap_contestacao_summary_service.refresh_groups(law_firm_id, groups)
 
         db.session.commit()
         _log(f"    Ano {year_int}: {len(items)} contestação(ões) — {created} criada(s), {updated} atualizada(s)")
         total_created += created
         total_updated += updated
 
-    return {'created': total_created, 'updated': total_updated}
+    return {'created': total_created, 'updated': total_updated, **listing_stats}
 
 
 # ---------------------------------------------------------------------------
 # Download dos PDFs das contestações (fila única global)
 # ---------------------------------------------------------------------------
 
+# file_path gravados por commit durante o download.
+DOWNLOAD_COMMIT_EVERY = 200
+
+# Checkpoint do download (índice do disco + hashes), na raiz dos uploads do
+# escritório. Execução interrompida retoma dele sem varrer o disco de novo;
+# execução que termina apaga o arquivo.
+DOWNLOAD_CHECKPOINT_NAME = '.download_checkpoint.json'
+DOWNLOAD_CHECKPOINT_MAX_AGE_HOURS = 24
+
+
+def _download_rel_path(law_firm_id: int, ano: int, cnpj: str, filename: str) -> str:
+    return '/'.join(['uploads', 'fap_web_contestacoes', str(law_firm_id), str(ano), cnpj, filename])
+
+
+def scan_download_index(upload_root: str, law_firm_id: int) -> dict[int, list[str]]:
+    """Uma passada pelo diretório do escritório: {contestacao_id: [caminhos relativos]}.
+
+    Layout ``{ano}/{cnpj14}/{contestacao_id}_{nome}``. Temporários de
+    download em andamento (``.*.part``) ficam de fora.
+    """
+    index: dict[int, list[str]] = {}
+    if not os.path.isdir(upload_root):
+        return index
+    with os.scandir(upload_root) as years:
+        for year_dir in years:
+            if not (year_dir.is_dir() and year_dir.name.isdigit()):
+                continue
+            with os.scandir(year_dir.path) as cnpjs:
+                for cnpj_dir in cnpjs:
+                    if not cnpj_dir.is_dir():
+                        continue
+                    with os.scandir(cnpj_dir.path) as files:
+                        for entry in files:
+                            prefix = entry.name.split('_', 1)[0]
+                            if entry.name.startswith('.') or not prefix.isdigit() or not entry.is_file():
+                                continue
+                            index.setdefault(int(prefix), []).append(_download_rel_path(
+                                law_firm_id, int(year_dir.name), cnpj_dir.name, entry.name,
+                            ))
+    for paths in index.values():
+        paths.sort()
+    return index
+
+
+def _load_download_checkpoint(path: str, law_firm_id: int, max_age_hours: float) -> dict | None:
+    try:
+        with open(path, encoding='utf-8') as fh:
+            state = json.load(fh)
+        if state.get('law_firm_id') != law_firm_id:
+            return None
+        age = datetime.now() - datetime.fromisoformat(state['saved_at'])
+        if age.total_seconds() > max_age_hours * 3600:
+            return None
+        return {
+            'index': {int(cid): list(paths) for cid, paths in state['index'].items()},
+            'hashes': dict(state.get('hashes') or {}),
+        }
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        _log(f"  ! Checkpoint de download ilegível ({e}) — varrendo o disco")
+        return None
+
+
+def _save_download_checkpoint(path: str, law_firm_id: int, index: dict, hashes: dict) -> None:
+    """Grava o checkpoint por rename atômico (nunca fica pela metade)."""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump({
+            'law_firm_id': law_firm_id,
+            'saved_at': datetime.now().isoformat(),
+            'index': {str(cid): paths for cid, paths in index.items()},
+            'hashes': hashes,
+        }, fh)
+    os.replace(tmp, path)
+
+
+def _remove_download_checkpoint(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
 def download_pending_files(
     auth, db, FapWebContestacao,
     law_firm_id: int,
     years: list[int],
     max_workers: int = 5,
+    commit_every: int = DOWNLOAD_COMMIT_EVERY,
+    svc=None,
 ) -> dict:
     """Baixa, numa fila única, todos os PDFs sem arquivo local do escritório.
 
     Mais eficiente que baixar empresa-a-empresa: um só pool de workers cobre
     todas as empresas/anos de uma vez (sem ociosidade quando uma empresa tem
-    poucos arquivos). Antes de ir à rede, resolve em disco os arquivos que já
-    existem (não rebaixa) e salva em
+    poucos arquivos). Salva em
     ``uploads/fap_web_contestacoes/{law_firm_id}/{ano}/{cnpj14}/``.
+
+    Planejado numa passada só:
+      - o diretório do escritório é varrido uma vez para um índice em memória
+        (ou lido do checkpoint de uma execução interrompida); contestação que
+        já tem arquivo — no diretório dela ou em outro ano/CNPJ — só é
+        vinculada, sem ir à rede;
+      - os workers compartilham um FapWebService (mesma sessão e pool de
+        conexões); PDF com o mesmo SHA-256 de outro já baixado na execução
+        não ocupa disco de novo — vira hardlink com o nome da própria
+        contestação (``{contestacao_id}_…``), e cada linha aponta para um
+        arquivo seu; sem suporte a hardlink, grava o arquivo normalmente;
+      - caminho vindo do checkpoint (até 24h de idade) só é usado se o
+        arquivo ainda existe;
+      - os file_path voltam ao banco pelo thread principal, em UPDATEs em
+        lote com commit a cada ``commit_every`` linhas.
     """
-    import os
-    import glob
+    import threading
     from flask import current_app
     from concurrent.futures import ThreadPoolExecutor, as_completed
+    from sqlalchemy import update
     from app.services.fap_web_service import FapWebService
 
     year_ints = [int(y) for y in years]
@@ -455,88 +820,101 @@ def download_pending_files(
             FapWebContestacao.cnpj,
             FapWebContestacao.ano_vigencia,
         )
+        .order_by(FapWebContestacao.id)
         .all()
     )
 
     if not pending:
-        return {'pending': 0, 'downloaded': 0, 'failed': 0, 'linked': 0, 'expired': False}
+        return {'pending': 0, 'downloaded': 0, 'failed': 0, 'linked': 0, 'deduped': 0, 'expired': False}
+
+    app_root = current_app.root_path
+    upload_root = os.path.join(app_root, 'uploads', 'fap_web_contestacoes', str(law_firm_id))
+    checkpoint_path = os.path.join(upload_root, DOWNLOAD_CHECKPOINT_NAME)
 
-    upload_root = os.path.join(current_app.root_path, 'uploads', 'fap_web_contestacoes', str(law_firm_id))
-    flask_app = current_app._get_current_object()
+    # ── 1) Índice do disco: checkpoint ou uma varredura ───────────────────
+    state = _load_download_checkpoint(checkpoint_path, law_firm_id, DOWNLOAD_CHECKPOINT_MAX_AGE_HOURS)
+    if state is not None:
+        index, hashes = state['index'], state['hashes']
+        _log(f"  Retomando do checkpoint ({len(index)} arquivo(s) indexado(s), sem varrer o disco)")
+    else:
+        index, hashes = scan_download_index(upload_root, law_firm_id), {}
 
-    # ── 1) Resolve arquivos que já existem em disco (não baixa de novo) ──
+    # ── 2) Plano: vincular o que já está em disco, baixar o resto ─────────
     # Cobre o caso de o PDF ter sido baixado antes mas o file_path ter ficado
     # nulo (ex.: run interrompido). Só vincula o caminho — sem ir à rede.
+    updates: list[dict] = []
     to_download = []
-    linked_from_disk = 0
+    seen_cids: set[int] = set()
     for rec in pending:
-        save_dir = os.path.join(upload_root, str(rec.ano_vigencia), rec.cnpj)
-        existing = next(
-            (m for m in glob.glob(os.path.join(save_dir, f'{rec.contestacao_id}_*')) if os.path.isfile(m)),
-            None,
-        )
-        if existing:
-            rel_path = '/'.join([
-                'uploads', 'fap_web_contestacoes',
-                str(law_firm_id), str(rec.ano_vigencia), rec.cnpj, os.path.basename(existing),
-            ])
-            db_rec = db.session.get(FapWebContestacao, rec.id)
-            if db_rec:
-                db_rec.file_path = rel_path
-            linked_from_disk += 1
+        if rec.contestacao_id in seen_cids:
+            continue
+        seen_cids.add(rec.contestacao_id)
+        # O checkpoint pode ter horas: só vincula arquivo que ainda existe
+        paths = [p for p in index.get(rec.contestacao_id, []) if os.path.exists(os.path.join(app_root, p))]
+        if paths:
+            own_dir = f'/{rec.ano_vigencia}/{rec.cnpj}/'
+            updates.append({'id': rec.id, 'file_path': next((p for p in paths if own_dir in p), paths[0])})
         else:
             to_download.append(rec)
+    linked_from_disk = len(updates)
 
-    if linked_from_disk:
+    def _flush(force: bool = False) -> None:
+        if not updates or (len(updates) < commit_every and not force):
+            return
+        db.session.execute(update(FapWebContestacao), updates)
         db.session.commit()
+        updates.clear()
+        _save_download_checkpoint(checkpoint_path, law_firm_id, index, hashes)
+
+    os.makedirs(upload_root, exist_ok=True)
+    _flush(force=True)
 
     _log(f"  {len(pending)} pendente(s): {linked_from_disk} já em disco, {len(to_download)} para baixar")
 
     if not to_download:
+        _remove_download_checkpoint(checkpoint_path)
         return {'pending': len(pending), 'downloaded': 0, 'failed': 0,
-                'linked': linked_from_disk, 'expired': False}
+                'linked': linked_from_disk, 'deduped': 0, 'expired': False}
+
+    svc = svc or FapWebService(auth)
+    hashes_lock = threading.Lock()
 
     def _download_one(rec):
-        svc = FapWebService(auth)
         try:
-            dl = svc.download_contestacao(
+            save_dir = os.path.join(upload_root, str(rec.ano_vigencia), rec.cnpj)
+            # Streaming para disco: o PDF não passa inteiro pela memória
+            dl = svc.download_contestacao_to(
                 year=rec.ano_vigencia,
                 cnpj=rec.cnpj,
                 contestacao_id=rec.contestacao_id,
+                directory=save_dir,
             )
             if not dl.ok:
-                return {'rec_id': rec.id, 'ok': False,
+                return {'rec': rec, 'ok': False,
                         'expired': bool(getattr(dl, 'expired', False)), 'error': dl.message}
 
-            pdf_bytes = dl.data['pdf_bytes']
-            filename  = f"{rec.contestacao_id}_{dl.data['filename']}"
-            save_dir  = os.path.join(upload_root, str(rec.ano_vigencia), rec.cnpj)
-            os.makedirs(save_dir, exist_ok=True)
-
-            with open(os.path.join(save_dir, filename), 'wb') as f:
-                f.write(pdf_bytes)
-
-            rel_path = '/'.join([
-                'uploads', 'fap_web_contestacoes',
-                str(law_firm_id), str(rec.ano_vigencia), rec.cnpj, filename,
-            ])
-
-            with flask_app.app_context():
-                db_rec = db.session.get(FapWebContestacao, rec.id)
-                if db_rec:
-                    db_rec.file_path = rel_path
-                    db.session.commit()
-
-            return {'rec_id': rec.id, 'ok': True, 'filename': filename}
+            staged = dl.data['file']
+            filename = f"{rec.contestacao_id}_{dl.data['filename']}"
+            target = os.path.join(save_dir, filename)
+            rel_path = _download_rel_path(law_firm_id, rec.ano_vigencia, rec.cnpj, filename)
+            with hashes_lock:
+                same = hashes.get(staged.sha256)
+                if same is not None:
+                    # Mesmo conteúdo já em disco: hardlink com o nome desta contestação
+                    try:
+                        os.link(os.path.join(app_root, same), target)
+                        staged.discard()
+                        return {'rec': rec, 'ok': True, 'rel_path': rel_path, 'deduped': True}
+                    except OSError:
+                        pass  # origem sumiu, destino existe ou sem hardlink: grava o baixado
+                staged.publish(target)
+                hashes[staged.sha256] = rel_path
+            return {'rec': rec, 'ok': True, 'rel_path': rel_path, 'deduped': False}
         except Exception as e:
-            try:
-                with flask_app.app_context():
-                    db.session.rollback()
-            except Exception:
-                pass
-            return {'rec_id': rec.id, 'ok': False, 'expired': False, 'error': str(e)}
+            return {'rec': rec, 'ok': False, 'expired': False, 'error': str(e)}
 
     downloaded = 0
+    deduped = 0
     failed = 0
     expired = False
     done = 0
@@ -544,21 +922,31 @@ def download_pending_files(
     workers = max(1, min(max_workers, total_dl))
 
     with ThreadPoolExecutor(max_workers=workers) as pool:
-        futures = {pool.submit(_download_one, r): r for r in to_download}
+        futures = [pool.submit(_download_one, r) for r in to_download]
         for fut in as_completed(futures):
             res = fut.result()
             done += 1
             if res.get('ok'):
-                downloaded += 1
+                rec = res['rec']
+                index.setdefault(rec.contestacao_id, []).append(res['rel_path'])
+                updates.append({'id': rec.id, 'file_path': res['rel_path']})
+                if res['deduped']:
+                    deduped += 1
+                else:
+                    downloaded += 1
+                _flush()
             else:
                 failed += 1
                 if res.get('expired'):
                     expired = True
             if done % 50 == 0 or done == total_dl:
-                _log(f"  ... download {done}/{total_dl} (ok={downloaded}, falhas={failed})")
+                _log(f"  ... download {done}/{total_dl} (ok={downloaded + deduped}, falhas={failed})")
+
+    _flush(force=True)
+    _remove_download_checkpoint(checkpoint_path)
 
     return {'pending': len(pending), 'downloaded': downloaded, 'failed': failed,
-            'linked': linked_from_disk, 'expired': expired}
+            'linked': linked_from_disk, 'deduped': deduped, 'expired': expired}
 
 
 # ---------------------------------------------------------------------------
@@ -601,7 +989,9 @@ def main() -> None:
     from app.models import (
         db, LawFirm, FapCompany, FapWebContestacao,
         FapWebContestacaoChangeHistory, FapAutoImportedContestacao,
+        FapWebContestacaoListingFingerprint,
     )
+    from app.services import fap_data_version, fap_panel_filter_cache
 
     years = _get_sync_years()
     _log(f"Anos a sincronizar: {years}")
@@ -621,6 +1011,8 @@ def main() -> None:
         _log("\n[1/3] Sincronizando empresas...")
         try:
             sync_companies(svc, db, FapCompany, law_firm_id)
+            fap_panel_filter_cache.invalidate(law_firm_id)
+            fap_data_version.bump(law_firm_id)
         except Exception as e:
             _log(f"  ✗ Erro ao sincronizar empresas: {e}")
             db.session.rollback()
@@ -649,17 +1041,35 @@ def main() -> None:
 
             total = len(companies)
             fetch_workers = _fetch_workers()
-            _log(f"  {total} empresa(s) — buscando contestações em paralelo ({fetch_workers} simultâneas)...")
+            full = _full_sync()
+
+            # Hot set: listagens com instância em aberto, vigências recentes e
+            # as nunca vistas vão para a busca; as frias, só no intervalo.
+            fingerprints = load_listing_fingerprints(db, FapWebContestacaoListingFingerprint, law_firm_id)
+            now = datetime.now()
+            cold_days = _cold_days()
+            company_years = {
+                c.id: plan_listing_years(fingerprints, c.cnpj, years, now, cold_days, full)
+                for c in companies
+            }
+            planned = sum(len(ys) for ys in company_years.values())
+            not_due = total * len(years) - planned
+            _log(
+                f"  {total} empresa(s) — {planned} listagem(ns) na vez"
+                + (" (sincronização completa)" if full else f", {not_due} fria(s) fora da vez")
+                + f" — buscando contestações em paralelo ({fetch_workers} simultâneas)..."
+            )
 
             # ── Fase 1: BUSCA paralela (somente rede, sem tocar no banco) ──
             # Extrai só os dados necessários para as threads (sem acessar ORM lá).
-            company_meta = [(c.id, c.cnpj) for c in companies]
+            company_meta = [(c.id, c.cnpj) for c in companies if company_years[c.id]]
             fetched_by_company = {}
             expired_count = 0
             done = 0
+            total_fetch = len(company_meta)
             with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
                 futures = {
-                    pool.submit(fetch_contestacoes_for_company, auth, cid, cnpj, years): cid
+                    pool.submit(fetch_contestacoes_for_company, auth, cid, cnpj, company_years[cid]): cid
                     for (cid, cnpj) in company_meta
                 }
                 for fut in as_completed(futures):
@@ -668,15 +1078,15 @@ def main() -> None:
                     try:
                         res = fut.result()
                     except Exception as e:
-                        _log(f"  [{done}/{total}] ✗ Erro ao buscar empresa id={cid}: {e}")
+                        _log(f"  [{done}/{total_fetch}] ✗ Erro ao buscar empresa id={cid}: {e}")
                         continue
                     fetched_by_company[cid] = res
                     if res['expired']:
                         expired_count += 1
-                    if done % 25 == 0 or done == total:
-                        _log(f"  ... {done}/{total} empresas buscadas")
+                    if done % 25 == 0 or done == total_fetch:
+                        _log(f"  ... {done}/{total_fetch} empresas buscadas")
 
-            _log(f"  ✓ Busca concluída ({len(fetched_by_company)}/{total} empresas)")
+            _log(f"  ✓ Busca concluída ({len(fetched_by_company)}/{total_fetch} empresas)")
 
             # Se houve 401/403, confirma se a sessão caiu de fato
             if expired_count:
@@ -690,9 +1100,12 @@ def main() -> None:
                          "Sessão segue ativa — ignorando essas.")
 
             # ── Fase 2: GRAVAÇÃO sequencial no banco ──────────────────────
-            total_created = 0
-            total_updated = 0
+            totals = dict.fromkeys(
+                ('created', 'updated', 'listings_new', 'listings_changed', 'listings_skipped'), 0,
+            )
             for i, company in enumerate(companies, 1):
+                if not company_years[company.id]:
+                    continue  # só listagens frias: nada buscado nesta execução
                 res = fetched_by_company.get(company.id)
                 nome = (company.nome or company.cnpj or '').strip()
                 _log(f"\n  [{i}/{total}] {nome} (CNPJ: {company.cnpj})")
@@ -711,14 +1124,25 @@ def main() -> None:
                     stats = persist_contestacoes_for_company(
                         db, FapWebContestacao, FapWebContestacaoChangeHistory,
                         FapAutoImportedContestacao, law_firm_id, company, res['years'],
+                        FapWebContestacaoListingFingerprint, full=full,
                     )
-                    total_created += stats['created']
-                    total_updated += stats['updated']
+                    for key in totals:
+                        totals[key] += stats[key]
                 except Exception as e:
                     _log(f"  ✗ Erro ao gravar {nome}: {e}")
                     db.session.rollback()
 
-            _log(f"\n  ✓ Contestações: {total_created} criadas, {total_updated} atualizadas no total")
+            # Filtros da tela de contestações (CNPJs, instâncias, situações)
+            # ficam em cache nos workers web até aqui.
+            if totals['created'] or totals['updated']:
+                fap_panel_filter_cache.invalidate(law_firm_id)
+                fap_data_version.bump(law_firm_id)
+
+            _log(f"\n  ✓ Contestações: {totals['created']} criadas, {totals['updated']} atualizadas no total")
+            _log(
+                f"  ✓ Listagens: {totals['listings_new']} nova(s), {totals['listings_changed']} alterada(s), "
+                f"{totals['listings_skipped']} inalterada(s) (diff pulado), {not_due} fria(s) fora da vez"
+            )
 
             # ── Fase 3: DOWNLOAD global dos PDFs (fila única) ─────────────
             if download_enabled:
@@ -726,11 +1150,13 @@ def main() -> None:
                 try:
                     dl = download_pending_files(
                         auth, db, FapWebContestacao,
-                        law_firm_id, years, max_workers=download_workers,
+                        law_firm_id, years, max_workers=download_workers, svc=svc,
                     )
+                    if dl['downloaded'] or dl['linked'] or dl['deduped']:
+                        fap_data_version.bump(law_firm_id)
                     _log(
                         f"  ✓ Download: {dl['downloaded']} baixado(s), "
-                        f"{dl['linked']} já em disco, "
+                        f"{dl['linked']} já em disco, {dl['deduped']} com conteúdo repetido, "
                         f"{dl['failed']} sem PDF/falha (de {dl['pending']} pendente(s))"
                     )
                     if dl['expired']:
@@ -319,6 +319,19 @@ def _run_year(args, ano_vigencia: int, app, db, FapWebContestacao, FapAutoImport
             db.session.rollback()
             _log(f'  AVISO: pre-seed falhou ({exc}) — prosseguindo sem garantia.')
 
+        # ── Fase 1c: Dados cadastrais dos estabelecimentos (OpenCNPJ) ───
+        # Uma consulta por CNPJ que ainda não é cliente, antes das threads;
+        # na Fase 2 os relatórios acham os dados no cache (cnpj_company_cache).
+        _log('Fase 1c — Consultando OpenCNPJ dos estabelecimentos novos...')
+        try:
+            resolved = service.prefetch_establishment_companies(
+                law_firm_id, [meta['cnpj'] for meta in report_meta.values()]
+            )
+            _log(f'  {resolved} CNPJ(s) resolvido(s) no cache/API.')
+        except Exception as exc:
+            db.session.rollback()
+            _log(f'  AVISO: pré-consulta OpenCNPJ falhou ({exc}) — prosseguindo sem ela.')
+
         # ── Fase 2: Processamento (multi-thread) ─────────────────────────
         workers = max(1, args.workers)
         _log(f'Fase 2/2 — Processando PDFs com {workers} worker(s)...')
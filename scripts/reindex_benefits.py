@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Reindexa os benefícios da Central de Disputas no Meilisearch (índice `benefits`).
+
+O índice é descartável: o MySQL é a fonte da verdade. Use este script na carga
+inicial — até ele rodar, o índice não existe e a busca da tela segue no LIKE —,
+depois de importações feitas por fora do sistema, ou se o índice for perdido.
+
+    uv run python scripts/reindex_benefits.py
+    uv run python scripts/reindex_benefits.py --law-firm-id 3
+    uv run python scripts/reindex_benefits.py --recriar     # apaga o índice antes
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv  # type: ignore[import]
+load_dotenv(project_root / '.env')
+
+
+def _log(msg: str) -> None:
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Reindexa os benefícios da Central de Disputas')
+    parser.add_argument('--law-firm-id', type=int, help='só este escritório')
+    parser.add_argument('--recriar', action='store_true',
+                        help='apaga o índice antes de reconstruir')
+    args = parser.parse_args()
+
+    from main import app
+    from app.services import benefit_search_service as busca
+
+    if not busca.is_available():
+        _log('⚠️  Meilisearch não responde — nada a fazer')
+        return 1
+
+    if args.recriar:
+        _log(f'🗑️  removendo o índice {busca.MEILI_INDEX}...')
+        busca.drop_index()
+
+    with app.app_context():
+        _log('⏳ reindexando...')
+        total = busca.reindex_all(law_firm_id=args.law_firm_id)
+
+    _log('⏳ aguardando o Meilisearch processar a fila...')
+    busca.aguardar_indexacao()
+    _log(f'✅ {total} benefício(s) indexado(s)')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
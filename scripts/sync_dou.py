@@ -11,6 +11,9 @@ Regras (ver app/services/dou_ingestion_service.py):
     dos últimos DOU_RECHECK_DAYS dias (padrão 7) comparando o SHA-256 do ZIP;
   - falha de uma (data, seção) marca a edição como 'error' e a próxima execução
     tenta de novo — falha nunca é registrada como sucesso.
+  - downloads em paralelo sobre uma única sessão: DOU_DOWNLOAD_CONCURRENCY
+    (padrão 4; 1 = sequencial) e DOU_DOWNLOAD_PREFETCH_DAYS (padrão 2, quantas
+    datas à frente já vão sendo baixadas). Parse e commit seguem sequenciais.
 
 Modos de execução:
   - Diário (padrão): hoje + janela de reverificação. É o modo do cron.
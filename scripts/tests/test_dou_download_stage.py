@@ -0,0 +1,161 @@
+"""Teste do estágio de download paralelo da captura do DOU
+(DownloadStage em app/services/dou_ingestion_service.py). Sem rede e sem
+banco: o client do INLABS é um stub com latência, e a ingestão roda em
+dry-run.
+
+Rodar: uv run python scripts/tests/test_dou_download_stage.py
+"""
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import dou_ingestion_service as ingestion  # noqa: E402
+from app.services import inlabs_client  # noqa: E402
+from app.services.streamed_download import stage_bytes  # noqa: E402
+
+FAILS = []
+LATENCIA = 0.05
+SECOES = ('DO1', 'DO2', 'DO3', 'DO1E', 'DO2E', 'DO3E')
+
+
+def check(label, cond, detail=""):
+    if not cond:
+        FAILS.append(label)
+        print(f"  ✗ {label} {detail}")
+    else:
+        print(f"  ✓ {label}")
+
+
+class _ClientLento:
+    """Responde como o InlabsClient: bytes, None (404) ou InlabsError."""
+
+    def __init__(self, falhas=(), ausentes=()):
+        self.falhas = set(falhas)
+        self.ausentes = set(ausentes)
+        self.chamadas = []
+        self._lock = threading.Lock()
+        self._ativos = 0
+        self.pico = 0
+
+    def _responder(self, tipo, data, secao):
+        with self._lock:
+            self.chamadas.append((tipo, data, secao))
+            self._ativos += 1
+            self.pico = max(self.pico, self._ativos)
+        try:
+            time.sleep(LATENCIA)
+            if (data, secao) in self.falhas:
+                raise inlabs_client.InlabsError(f'HTTP 500 em {data} {secao}')
+            if (data, secao) in self.ausentes:
+                return None
+            return f'{tipo}:{data}:{secao}'.encode()
+        finally:
+            with self._lock:
+                self._ativos -= 1
+
+    def login(self):
+        pass
+
+    def download_xml_zip(self, data, secao):
+        return self._responder('xml', data, secao)
+
+    def download_pdf(self, data, secao):
+        return self._responder('pdf', data, secao)
+
+    def download_xml_zip_to(self, data, secao, diretorio):
+        conteudo = self.download_xml_zip(data, secao)
+        return None if conteudo is None else stage_bytes(conteudo, diretorio, f'{secao}.zip')
+
+    def download_pdf_to(self, data, secao, diretorio):
+        conteudo = self.download_pdf(data, secao)
+        return None if conteudo is None else stage_bytes(conteudo, diretorio, f'{secao}.pdf')
+
+
+DIA = date(2026, 8, 10)
+
+# ── estágio isolado ──────────────────────────────────────────────────
+print("\n1. estágio de download")
+client = _ClientLento(falhas={(DIA, 'DO2')}, ausentes={(DIA, 'DO3E')})
+TMP = Path(tempfile.mkdtemp(prefix='dou_stage_'))
+stage = ingestion.DownloadStage(client, concurrency=4, staging_dir=TMP)
+started = time.perf_counter()
+stage.prefetch_xml(DIA, SECOES)
+stage.prefetch_xml(DIA, SECOES)  # repetir não duplica
+resultados = []
+for secao in SECOES:
+    try:
+        arquivo = stage.xml(DIA, secao)
+        resultados.append(arquivo and arquivo.path.read_bytes())
+        if arquivo:
+            arquivo.discard()
+    except inlabs_client.InlabsError as exc:
+        resultados.append(exc)
+elapsed = time.perf_counter() - started
+stage.close()
+check("uma chamada por seção", len(client.chamadas) == len(SECOES), client.chamadas)
+check("resultados na ordem das seções", resultados[0] == b'xml:2026-08-10:DO1'
+      and resultados[2] == b'xml:2026-08-10:DO3', resultados)
+check("erro do download sobe no consumo", isinstance(resultados[1], inlabs_client.InlabsError))
+check("404 continua None", resultados[5] is None)
+check("temporários descartados", list(TMP.iterdir()) == [], list(TMP.iterdir()))
+check("em paralelo, no máximo 4", 1 < client.pico <= 4 and elapsed < LATENCIA * len(SECOES) * 0.7,
+      f"pico {client.pico}, {elapsed:.2f}s")
+
+client = _ClientLento()
+stage = ingestion.DownloadStage(client, concurrency=1, staging_dir=TMP)
+stage.prefetch_xml(DIA, SECOES)
+check("concorrência 1: prefetch não baixa nada", client.chamadas == [])
+arquivo = stage.xml(DIA, 'DO1')
+check("concorrência 1: baixa no consumo", arquivo.path.read_bytes() == b'xml:2026-08-10:DO1'
+      and client.pico == 1)
+arquivo.discard()
+stage.prefetch_pdf(DIA, 'do1')
+stage.close()
+
+client = _ClientLento()
+stage = ingestion.DownloadStage(client, concurrency=2, staging_dir=TMP)
+stage.prefetch_pdf(DIA, 'do1')
+time.sleep(LATENCIA / 5)  # já em andamento: não dá para cancelar
+stage.descartar_pdf(DIA, 'do1')
+stage.close()
+check("PDF descartado em andamento não deixa temporário", list(TMP.iterdir()) == [], list(TMP.iterdir()))
+shutil.rmtree(TMP, ignore_errors=True)
+
+# ── execução de várias datas (dry-run) ───────────────────────────────
+print("\n2. backfill em dry-run")
+ingestion.secoes_configuradas = lambda: SECOES
+datas = [DIA + timedelta(days=i) for i in range(5)]
+tempos = {}
+runs = {}
+for concorrencia in (1, 4):
+    ingestion.download_concurrency = lambda c=concorrencia: c
+    client = _ClientLento(falhas={(datas[1], 'DO1')}, ausentes={(d, 'DO3E') for d in datas})
+    started = time.perf_counter()
+    runs[concorrencia] = ingestion.backfill(datas[0], datas[-1], with_pdf=False, dry_run=True, client=client)
+    tempos[concorrencia] = time.perf_counter() - started
+    check(f"concorrência {concorrencia}: cada (data, seção) baixada uma vez",
+          sorted(client.chamadas) == sorted({('xml', d, s) for d in datas for s in SECOES}),
+          len(client.chamadas))
+
+sequencial, paralelo = runs[1], runs[4]
+check("mesmos contadores com e sem paralelismo",
+      (sequencial.edicoes_baixadas, sequencial.nao_publicados, sequencial.erros)
+      == (paralelo.edicoes_baixadas, paralelo.nao_publicados, paralelo.erros) == (24, 5, 1),
+      (paralelo.edicoes_baixadas, paralelo.nao_publicados, paralelo.erros))
+check("detalhes na ordem das datas e seções",
+      [[d['secao'] for d in dia['detalhes']] for dia in paralelo.detalhe_json['dias']]
+      == [list(SECOES)] * len(datas))
+check("erro de uma seção não derruba as outras",
+      paralelo.detalhe_json['dias'][1]['detalhes'][0]['resultado'] == 'erro'
+      and paralelo.detalhe_json['dias'][1]['detalhes'][1]['resultado'] == 'baixaria')
+check("paralelo mais rápido", tempos[4] < tempos[1] * 0.5, tempos)
+print(f"    sequencial {tempos[1]:.2f}s · paralelo {tempos[4]:.2f}s")
+
+print("\n" + ("TUDO OK" if not FAILS else f"{len(FAILS)} FALHA(S): {FAILS}"))
+sys.exit(1 if FAILS else 0)
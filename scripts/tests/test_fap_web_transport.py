@@ -0,0 +1,181 @@
+"""Teste do transporte HTTP do FapWebService (FapHttpTransport em
+app/services/fap_web_service.py) contra um http.server local com keep-alive,
+que conta as conexões TCP abertas — cada uma seria um handshake TLS no portal.
+
+Confere reaproveitamento de conexão entre instâncias do serviço, limite por
+host com várias threads, retry em 5xx e em conexão resetada, gzip e o
+fallback de autenticação em 401.
+
+Rodar: uv run python scripts/tests/test_fap_web_transport.py
+"""
+import gzip
+import http.server
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import fap_web_service as fws  # noqa: E402
+
+FAILS = []
+EMPRESAS = [{'cnpj': f'{i:08d}', 'nome': f'Empresa {i}'} for i in range(50)]
+
+
+def check(label, cond, detail=""):
+    if not cond:
+        FAILS.append(label)
+        print(f"  ✗ {label} {detail}")
+    else:
+        print(f"  ✓ {label}")
+
+
+class _Estado:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conexoes = 0
+        self.pedidos = 0
+        self.ativos = 0
+        self.pico = 0
+        self.falhas = {}  # caminho → quantas respostas ruins ainda faltam
+        self.cookies = []
+
+    def reset(self):
+        with self.lock:
+            self.conexoes = self.pedidos = self.pico = 0
+            self.falhas.clear()
+            self.cookies.clear()
+
+
+estado = _Estado()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def setup(self):
+        super().setup()
+        with estado.lock:
+            estado.conexoes += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo: bytes, extra=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for nome, valor in (extra or {}).items():
+            self.send_header(nome, valor)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def do_GET(self):
+        with estado.lock:
+            estado.pedidos += 1
+            estado.ativos += 1
+            estado.pico = max(estado.pico, estado.ativos)
+            estado.cookies.append(self.headers.get('Cookie'))
+            falha = estado.falhas.get(self.path, 0)
+            if falha:
+                estado.falhas[self.path] = falha - 1
+        try:
+            if falha and self.path.endswith('/reset'):
+                self.close_connection = True
+                self.connection.shutdown(2)  # derruba sem resposta
+                return
+            if falha:
+                self._responder(503, b'{"erro": "indisponivel"}')
+                return
+            if self.path.endswith('/procuracoes/empresas') or self.path.endswith('/reset'):
+                if 'SESSION=velha' in (self.headers.get('Cookie') or ''):
+                    self._responder(401, b'{"erro": "sessao"}')
+                    return
+                corpo = json.dumps(EMPRESAS).encode()
+                if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+                    self._responder(200, gzip.compress(corpo), {'Content-Encoding': 'gzip'})
+                else:
+                    self._responder(200, corpo)
+                return
+            self._responder(404, b'{"erro": "nao encontrado"}')
+        finally:
+            with estado.lock:
+                estado.ativos -= 1
+
+
+servidor = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+servidor.daemon_threads = True
+threading.Thread(target=servidor.serve_forever, daemon=True).start()
+fws._BASE_URL = f'http://127.0.0.1:{servidor.server_address[1]}'
+AUTH = fws.FapWebAuthPayload(cookies={'SESSION': 'boa', 'XSRF-TOKEN': 't'})
+
+try:
+    # ── reaproveitamento ─────────────────────────────────────────────
+    print("\n1. conexões reaproveitadas entre instâncias")
+    transporte = fws.FapHttpTransport(maxsize=4, retries=2, backoff=0)
+    for _ in range(20):
+        resultado = fws.FapWebService(AUTH, use_env_fallback=False, transport=transporte).fetch_companies()
+    check("resposta correta (gzip descomprimido)", resultado.ok and resultado.data == EMPRESAS)
+    check("20 chamadas sequenciais, 1 conexão", estado.conexoes == 1, estado.conexoes)
+
+    estado.reset()
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        resultados = list(pool.map(
+            lambda _: fws.FapWebService(AUTH, use_env_fallback=False, transport=transporte).fetch_companies(),
+            range(120),
+        ))
+    check("120 chamadas em 12 threads, todas ok", all(r.ok for r in resultados))
+    check("limite por host respeitado (≤ 4 conexões)", estado.conexoes <= 4 and estado.pico <= 4,
+          f"{estado.conexoes} conexões, pico {estado.pico}")
+
+    compartilhado = fws.FapWebService(AUTH, use_env_fallback=False)._transport
+    check("instâncias sem transporte explícito compartilham o do processo",
+          compartilhado is fws.FapWebService(AUTH, use_env_fallback=False)._transport)
+
+    # ── retry ────────────────────────────────────────────────────────
+    print("\n2. retry e erros")
+    estado.reset()
+    estado.falhas['/gateway/fap/v1/procuracoes/empresas'] = 2
+    resultado = fws.FapWebService(AUTH, use_env_fallback=False, transport=transporte).fetch_companies()
+    check("503 duas vezes, depois 200 → ok", resultado.ok and estado.pedidos == 3, estado.pedidos)
+
+    estado.reset()
+    estado.falhas['/gateway/fap/v1/procuracoes/empresas'] = 5
+    resultado = fws.FapWebService(AUTH, use_env_fallback=False, transport=transporte).fetch_companies()
+    check("5xx persistente → erro HTTP com corpo",
+          not resultado.ok and resultado.status_code == 503 and 'indisponivel' in resultado.data['detail'],
+          resultado)
+    check("tentativas limitadas (1 + 2 retries)", estado.pedidos == 3, estado.pedidos)
+
+    estado.reset()
+    estado.falhas['/reset'] = 1
+    body, status = fws.FapWebService(AUTH, use_env_fallback=False, transport=transporte)._get(
+        f'{fws._BASE_URL}/reset')
+    check("conexão resetada → nova tentativa", status == 200 and estado.pedidos == 2, estado.pedidos)
+
+    resultado = fws.FapWebService(AUTH, use_env_fallback=False, transport=transporte).fetch_procuracoes()
+    check("404 continua erro HTTP", not resultado.ok and resultado.status_code == 404, resultado)
+
+    sem_servidor = fws.FapHttpTransport(maxsize=1, retries=0)
+    try:
+        sem_servidor.request('GET', 'http://127.0.0.1:9/', {}, timeout=2)
+        check("sem servidor → URLError", False, "não levantou")
+    except fws.urllib.error.URLError as exc:
+        check("sem servidor → URLError", not isinstance(exc, fws.urllib.error.HTTPError))
+
+    # ── autenticação ─────────────────────────────────────────────────
+    print("\n3. fallback de autenticação")
+    estado.reset()
+    velha = fws.FapWebAuthPayload(cookies={'SESSION': 'velha'})
+    service = fws.FapWebService(velha, fallback_auth=AUTH, transport=transporte)
+    resultado = service.fetch_companies()
+    check("401 troca para o fallback e reenvia", resultado.ok and len(estado.cookies) == 2
+          and estado.cookies[0] == 'SESSION=velha' and 'SESSION=boa' in estado.cookies[1], estado.cookies)
+    check("conexão reaproveitada também no reenvio", estado.conexoes <= 1, estado.conexoes)
+finally:
+    servidor.shutdown()
+
+print("\n" + ("TUDO OK" if not FAILS else f"{len(FAILS)} FALHA(S): {FAILS}"))
+sys.exit(1 if FAILS else 0)
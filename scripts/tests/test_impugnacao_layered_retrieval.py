@@ -231,6 +231,60 @@ refs_min5 = sorted(r["reference_id"] for r in result_min5)
 check("min_distinct_references=5 com acervo menor -> sem travar, devolve o que há",
       refs_min5 == [201, 202, 203, 204], f"(veio {refs_min5})")
 
+# ── fetch_style_references_batch ────────────────────────────────────
+# Mesmo acervo de StubQdrant, agora com `query_batch_points`: várias
+# buscas (teses + seções) saem em 1 embedding e 1 rodada de Qdrant, com a
+# mesma seleção das chamadas individuais.
+
+
+class StubQdrantBatch(StubQdrant):
+    def __init__(self):
+        self.batch_calls = 0
+        self.single_calls = 0
+
+    def query_points(self, collection_name, query, query_filter, limit, with_payload):
+        self.single_calls += 1
+        return super().query_points(collection_name, query, query_filter, limit, with_payload)
+
+    def query_batch_points(self, collection_name, requests):
+        self.batch_calls += 1
+        return [
+            StubQdrant.query_points(self, collection_name, req.query, req.filter, req.limit, True)
+            for req in requests
+        ]
+
+
+embed_calls = []
+retriever_batch = ImpugnacaoReferenceRetriever.__new__(ImpugnacaoReferenceRetriever)
+retriever_batch.collection = "stub-batch"
+retriever_batch.qdrant = StubQdrantBatch()
+retriever_batch._embed_many = lambda texts: embed_calls.append(list(texts)) or [[0.0] for _ in texts]
+
+BATCH_REQUESTS = [
+    dict(law_firm_id=1, query_text="tese A", context=CTX,
+         kind_plan=[("merit_by_thesis", 3)], max_chunks=3, max_chars=50_000),
+    dict(law_firm_id=1, query_text="tese B", context=CTX,
+         kind_plan=[("jurisprudence", 1)], max_chunks=1, max_chars=50_000),
+    dict(law_firm_id=1, query_text="seção", trf_region="TRF4",
+         kind_plan=[("merit_by_thesis", 2)], max_chunks=2, max_chars=50_000,
+         allowed_reference_ids=[2]),
+    dict(law_firm_id=1, query_text="sem referências permitidas",
+         kind_plan=[("merit_by_thesis", 2)], allowed_reference_ids=[]),
+    dict(law_firm_id=1, query_text="só fallback amplo",
+         kind_plan=[("requests", 2)], max_chunks=2, max_chars=50_000),
+]
+batch_results = retriever_batch.fetch_style_references_batch(BATCH_REQUESTS)
+individual_results = [retriever.fetch_style_references(**req) for req in BATCH_REQUESTS]
+check("lote devolve a mesma seleção das chamadas individuais",
+      [[r["point_id"] for r in res] for res in batch_results]
+      == [[r["point_id"] for r in res] for res in individual_results],
+      f"(lote {[[r['point_id'] for r in res] for res in batch_results]})")
+check("um único embedding em lote para as buscas ativas",
+      len(embed_calls) == 1 and len(embed_calls[0]) == 4, f"(chamadas {embed_calls})")
+check("plano + fallback amplo em 2 rodadas de Qdrant, sem consultas avulsas",
+      retriever_batch.qdrant.batch_calls == 2 and retriever_batch.qdrant.single_calls == 0,
+      f"(lotes={retriever_batch.qdrant.batch_calls}, avulsas={retriever_batch.qdrant.single_calls})")
+
 print()
 if FAILS:
     print(f"FALHOU: {len(FAILS)} verificação(ões)")
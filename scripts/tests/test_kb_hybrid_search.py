@@ -0,0 +1,146 @@
+"""Teste da busca híbrida da base de conhecimento (semântica + full-text com
+reciprocal rank fusion), sem serviços externos: os dois ramos são stubs.
+
+Rodar: uv run python scripts/tests/test_kb_hybrid_search.py
+"""
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.agents.knowledge_base import knowledge_query_agent as kqa
+from app.services.knowledge_base.search_helpers import passes_score_cutoff
+
+FAILS = []
+
+
+def check(label, cond, detail=""):
+    if not cond:
+        FAILS.append(label)
+        print(f"  ✗ {label} {detail}")
+    else:
+        print(f"  ✓ {label}")
+
+
+def point(point_id, score, text=""):
+    return SimpleNamespace(id=point_id, payload={"id": point_id, "text": text or point_id}, score=score)
+
+
+DELAY = 0.3
+
+
+def semantic_stub(question, history, limit, law_firm_id):
+    time.sleep(DELAY)
+    return "pergunta melhorada", SimpleNamespace(points=[point("a", 0.82), point("b", 0.55), point("d", 0.31)])
+
+
+def full_text_stub(question, limit, law_firm_id=None):
+    time.sleep(DELAY)
+    # NB exato: o Meilisearch acha "cnpj" que a semântica não trouxe
+    return question, SimpleNamespace(points=[point("cnpj", 0.97), point("b", 0.9)])
+
+
+def failing_stub(*args, **kwargs):
+    raise RuntimeError("backend fora")
+
+
+agent = kqa.KnowledgeQueryAgent.__new__(kqa.KnowledgeQueryAgent)
+agent.collection = "knowledge_base"
+agent._semantic_search = semantic_stub
+agent._full_text_search = full_text_stub
+
+# ── RRF puro ─────────────────────────────────────────────────────────
+print("\n1. reciprocal_rank_fusion")
+fused = kqa.reciprocal_rank_fusion(
+    [("semantic", semantic_stub("", None, 0, None)[1].points),
+     ("full_text", full_text_stub("", 0)[1].points)],
+    k=60,
+)
+ids = [p.id for p in fused]
+check("chunk presente nos dois backends sobe para o topo", ids[0] == "b", ids)
+check("sem duplicatas (chave = id do chunk)", len(ids) == len(set(ids)) == 4, ids)
+check("origens registradas", fused[0].origins == ["semantic", "full_text"], fused[0].origins)
+check("score = maior score bruto entre backends", fused[0].score == 0.9, fused[0].score)
+check("rrf_score = 1/(k+2) + 1/(k+2)", abs(fused[0].rrf_score - 2 / 62) < 1e-12, fused[0].rrf_score)
+
+# ── modo híbrido no agente ───────────────────────────────────────────
+print("\n2. ask_knowledge_base(search_mode='hybrid')")
+started = time.perf_counter()
+data = kqa.KnowledgeQueryAgent.ask_knowledge_base(agent, "CNPJ 12.345.678/0001-90", limit=3, search_mode="hibrida")
+elapsed = time.perf_counter() - started
+check("alias 'hibrida' normalizado", data["search_mode"] == "hybrid", data["search_mode"])
+check("ramos em paralelo (≈ um ramo, não a soma)", elapsed < DELAY * 1.8, f"{elapsed:.2f}s")
+check("limit aplicado depois da fusão", len(data["results"].points) == 3, len(data["results"].points))
+check("hit só do full-text (NB/CNPJ) entra no resultado",
+      "cnpj" in [p.id for p in data["results"].points], [p.id for p in data["results"].points])
+check("pergunta melhorada vem do ramo semântico", data["improved_question"] == "pergunta melhorada")
+
+def low_score_semantic(question, history, limit, law_firm_id):
+    return "q", SimpleNamespace(points=[point("a", 0.82), point("fraco", 0.2)])
+
+
+def low_score_full_text(question, limit, law_firm_id=None):
+    # 0.35 passaria no corte semântico, mas não no full-text (0.40)
+    return question, SimpleNamespace(points=[point("fraco", 0.9), point("raso", 0.35)])
+
+
+agent._semantic_search, agent._full_text_search = low_score_semantic, low_score_full_text
+data = kqa.KnowledgeQueryAgent.ask_knowledge_base(agent, "x", search_mode="hybrid")
+fused_ids = [p.id for p in data["results"].points]
+fraco = next(p for p in data["results"].points if p.id == "fraco")
+check("corte por ramo antes da fusão", sorted(fused_ids) == ["a", "fraco"], fused_ids)
+check("ponto fraco em um ramo só conta pelo ramo que o aceitou", fraco.origins == ["full_text"], fraco.origins)
+agent._full_text_search = full_text_stub
+
+agent._semantic_search = failing_stub
+data = kqa.KnowledgeQueryAgent.ask_knowledge_base(agent, "x", search_mode="hybrid")
+check("ramo semântico fora → segue com o full-text", [p.id for p in data["results"].points] == ["cnpj", "b"])
+agent._full_text_search = failing_stub
+try:
+    kqa.KnowledgeQueryAgent.ask_knowledge_base(agent, "x", search_mode="hybrid")
+    check("os dois ramos fora → erro", False)
+except RuntimeError:
+    check("os dois ramos fora → erro", True)
+
+# ── tenant no ramo full-text ─────────────────────────────────────────
+print("\n3. full-text só com o escritório")
+
+
+class FakeIndex:
+    def search(self, query, limit, show_ranking_score):
+        hits = [
+            {"id": "meu", "law_firm_id": 1, "text": "x", "_rankingScore": 0.9},
+            {"id": "outro", "law_firm_id": 2, "text": "x", "_rankingScore": 0.95},
+            {"id": "legado", "text": "x", "_rankingScore": 0.8},
+        ]
+        return SimpleNamespace(hits=hits)
+
+
+tenant_agent = kqa.KnowledgeQueryAgent.__new__(kqa.KnowledgeQueryAgent)
+tenant_agent.collection = "knowledge_base"
+tenant_agent.meilisearch = SimpleNamespace(index=lambda name: FakeIndex())
+tenant_agent.keyword_extraction = SimpleNamespace(extract_keywords=lambda question, law_firm_id=None: [])
+_, hits = tenant_agent._full_text_search("x", 10, 1)
+check("hit de outro escritório descartado", [p.id for p in hits.points] == ["meu", "legado"],
+      [p.id for p in hits.points])
+_, hits = tenant_agent._full_text_search("x", 10, None)
+check("sem escritório → sem filtro", len(hits.points) == 3)
+
+# ── modos e cortes ───────────────────────────────────────────────────
+print("\n4. modos e cortes")
+check("modo inválido rejeitado", kqa.normalize_search_mode("vetorial") is None)
+check("modo vazio → semantic", kqa.normalize_search_mode("") == "semantic")
+check("corte híbrido aceita 0.35", passes_score_cutoff(0.35, "hybrid"))
+check("corte híbrido rejeita 0.30", not passes_score_cutoff(0.30, "hybrid"))
+
+original = kqa.KB_CHAT_SEARCH_MODE
+kqa.KB_CHAT_SEARCH_MODE = "auto"
+check("KB_CHAT_SEARCH_MODE=auto → roteador decide", kqa.configured_chat_search_mode() is None)
+kqa.KB_CHAT_SEARCH_MODE = "hybrid"
+check("KB_CHAT_SEARCH_MODE=hybrid → pula o roteador", kqa.configured_chat_search_mode() == "hybrid")
+kqa.KB_CHAT_SEARCH_MODE = original
+
+print("\n" + ("TUDO OK" if not FAILS else f"{len(FAILS)} FALHA(S): {FAILS}"))
+sys.exit(1 if FAILS else 0)
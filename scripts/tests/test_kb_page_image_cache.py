@@ -0,0 +1,125 @@
+"""Teste do cache de páginas renderizadas do visualizador de trechos
+(app/services/knowledge_base/page_image_cache.py), com um PDF gerado na hora.
+
+Rodar: uv run python scripts/tests/test_kb_page_image_cache.py
+"""
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import fitz  # noqa: E402
+import PIL.Image  # noqa: E402
+
+from app.services.knowledge_base import page_image_cache as pic  # noqa: E402
+
+FAILS = []
+
+
+def check(label, cond, detail=""):
+    if not cond:
+        FAILS.append(label)
+        print(f"  ✗ {label} {detail}")
+    else:
+        print(f"  ✓ {label}")
+
+
+tmp_dir = Path(tempfile.mkdtemp(prefix="kb_page_cache_"))
+try:
+    pdf_path = tmp_dir / "doc.pdf"
+    doc = fitz.open()
+    for idx in range(30):
+        page = doc.new_page()
+        page.insert_text((72, 100), f"Pagina {idx + 1}: Acidente de Trabalho no NB 1234567890")
+        page.insert_text((72, 130), "CNPJ 12.345.678/0001-90 outra linha")
+    doc.save(str(pdf_path))
+    doc.close()
+
+    cache = pic.PageImageCache(str(tmp_dir / "cache"), max_bytes=64 * 1024 * 1024)
+    key = pic.file_cache_key(None, str(pdf_path))
+
+    # ── miss → hit ───────────────────────────────────────────────────
+    print("\n1. miss e hit")
+    started = time.perf_counter()
+    first = cache.get_page(key, str(pdf_path), 5)
+    miss_ms = (time.perf_counter() - started) * 1000
+    check("primeiro acesso renderiza", cache.misses == 1 and Path(first.png_path).is_file())
+    check("página 1-based → índice 4", first.page_index == 4, first.page_index)
+
+    original_open = fitz.open
+    fitz.open = lambda *a, **k: (_ for _ in ()).throw(AssertionError("PDF aberto no hit"))
+    try:
+        started = time.perf_counter()
+        second = cache.get_page(key, str(pdf_path), 5)
+        hit_ms = (time.perf_counter() - started) * 1000
+        check("segundo acesso não abre o PDF", cache.hits == 1 and second.png_path == first.png_path)
+        check("índice de palavras igual ao renderizado", second.words == first.words)
+    finally:
+        fitz.open = original_open
+    print(f"    miss {miss_ms:.1f} ms · hit {hit_ms:.2f} ms")
+    last = cache.get_page(key, str(pdf_path), 999)
+    check("página fora do intervalo → última", last.page_index == 29, last.page_index)
+
+    # ── destaque ─────────────────────────────────────────────────────
+    print("\n2. destaque a partir do índice de palavras")
+    rects = pic.find_match_rects(first.words, ["acidente de trabalho"])
+    check("frase sem diferenciar maiúsculas, atravessando palavras", len(rects) == 3, rects)
+    rects = pic.find_match_rects(first.words, ["4567"])
+    check("fallback: substring dentro da palavra", len(rects) == 1, rects)
+    rects = pic.find_match_rects(first.words, ["12.345.678/0001-90outra"])
+    check("fallback 2: linha concatenada", len(rects) == 4, rects)
+    check("termo ausente → nada", pic.find_match_rects(first.words, ["inexistente"]) == [])
+
+    buf, total = pic.render_highlighted_png(first, ["trabalho"])
+    img = PIL.Image.open(buf)
+    with PIL.Image.open(first.png_path) as clean:
+        check("PNG final no tamanho da página a 2x", img.size == clean.size, img.size)
+        check("destaque altera a imagem limpa", img.convert("RGB").tobytes() != clean.convert("RGB").tobytes())
+    check("um retângulo para 'trabalho'", total == 1, total)
+
+    # ── ETag ─────────────────────────────────────────────────────────
+    print("\n3. ETag")
+    etag = pic.page_etag(key, 5, 2.0, ["a"])
+    check("estável", etag == pic.page_etag(key, 5, 2.0, ["a"]))
+    check("muda com termos e página",
+          len({etag, pic.page_etag(key, 5, 2.0, ["b"]), pic.page_etag(key, 6, 2.0, ["a"])}) == 3)
+    check("chave por file_hash quando existe", pic.file_cache_key("ABC", str(pdf_path)) == "abc")
+
+    # ── despejo LRU ──────────────────────────────────────────────────
+    print("\n4. despejo LRU")
+    page_size = Path(first.png_path).stat().st_size
+    small = pic.PageImageCache(str(tmp_dir / "small"), max_bytes=page_size * 4)
+    for page_no in range(1, 4):
+        small.get_page(key, str(pdf_path), page_no)
+        time.sleep(0.01)
+    small.get_page(key, str(pdf_path), 1)  # página 1 vira a mais recente
+    for page_no in range(4, 8):
+        small.get_page(key, str(pdf_path), page_no)
+        time.sleep(0.01)
+    small.evict()
+    total_bytes = sum(p.stat().st_size for p in (tmp_dir / "small").rglob("*") if p.is_file())
+    check("cache abaixo do limite", total_bytes <= small.max_bytes, f"{total_bytes} > {small.max_bytes}")
+    check("houve despejo", small.evictions > 0)
+    file_dir = small._file_dir(key)
+    check("mais antiga não usada (p2) saiu", not (file_dir / "p2@2.png").exists())
+    check("mais recente (p7) ficou", (file_dir / "p7@2.png").exists())
+
+    # ── PNG despejado por outro worker ───────────────────────────────
+    print("\n5. PNG despejado depois da consulta")
+    page = cache.get_page(key, str(pdf_path), 8)
+    Path(page.png_path).unlink()
+    buf, total = pic.render_highlighted_png(page, ["trabalho"])
+    check("destaque usa os bytes já lidos", total == 1 and PIL.Image.open(buf).size == img.size)
+    misses = cache.misses
+    again = cache.get_page(key, str(pdf_path), 8)
+    check("PNG ausente com índice presente → renderiza de novo",
+          cache.misses == misses + 1 and again.png_bytes == page.png_bytes
+          and Path(again.png_path).is_file())
+finally:
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+print("\n" + ("TUDO OK" if not FAILS else f"{len(FAILS)} FALHA(S): {FAILS}"))
+sys.exit(1 if FAILS else 0)
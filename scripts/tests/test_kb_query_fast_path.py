@@ -0,0 +1,129 @@
+"""Teste do atalho sem LLM do pré-processamento das perguntas da base de
+conhecimento (app/services/knowledge_base/query_fast_path.py): regras
+determinísticas, cache TTL e contadores. As chamadas ao LLM são stubs.
+
+Rodar: uv run python scripts/tests/test_kb_query_fast_path.py
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.agents.knowledge_base.context_retrieval_routing_agent import (  # noqa: E402
+    ContextRetrievalDecisionSchema,
+    ContextRetrievalRoutingAgent,
+)
+from app.agents.knowledge_base.keyword_extraction_agent import KeywordExtractionAgent  # noqa: E402
+from app.agents.knowledge_base.query_enhancer_agent import QueryEnhancerAgent  # noqa: E402
+from app.services.knowledge_base import query_fast_path as qfp  # noqa: E402
+
+FAILS = []
+LLM_DELAY = 0.05
+
+
+def check(label, cond, detail=""):
+    if not cond:
+        FAILS.append(label)
+        print(f"  ✗ {label} {detail}")
+    else:
+        print(f"  ✓ {label}")
+
+
+llm_calls = []
+
+
+def _fake_llm(name, value):
+    def _call(*args):
+        llm_calls.append(name)
+        time.sleep(LLM_DELAY)
+        if isinstance(value, Exception):
+            raise value
+        return value
+    return _call
+
+
+enhancer = QueryEnhancerAgent.__new__(QueryEnhancerAgent)
+enhancer._enhance_with_llm = _fake_llm("enhance", "pergunta reformulada")
+router = ContextRetrievalRoutingAgent.__new__(ContextRetrievalRoutingAgent)
+router._decide_with_llm = _fake_llm(
+    "route", ContextRetrievalDecisionSchema(should_retrieve_context=True, search_mode="semantic")
+)
+extractor = KeywordExtractionAgent.__new__(KeywordExtractionAgent)
+extractor._extract_with_llm = _fake_llm("keywords", ["nexo causal", "trajeto"])
+
+# ── pré-classificador ────────────────────────────────────────────────
+print("\n1. pré-classificador")
+pre = qfp.preclassify("andamento do processo 0001234-56.2023.5.04.0001")
+check("CNJ reconhecido (e não vira CPF/número solto)", pre.identifiers == [("cnj", "0001234-56.2023.5.04.0001")],
+      pre.identifiers)
+check("termos: original + só dígitos", pre.keywords == ["0001234-56.2023.5.04.0001", "00012345620235040001"])
+pre = qfp.preclassify("empresa CNPJ 88.611.835/0008-03 e NB 123.456.789-0, espécie B91")
+check("CNPJ, NB e espécie", [kind for kind, _ in pre.identifiers] == ["cnpj", "nb", "benefit_species"],
+      pre.identifiers)
+check("espécie sem variante só dígitos", "91" not in pre.keywords, pre.keywords)
+check("cumprimento", qfp.preclassify("Obrigado!").small_talk)
+check("pergunta conceitual não é atalho",
+      not qfp.preclassify("qual o entendimento sobre nexo causal no acidente de trajeto?").identifier_lookup)
+long_question = "preciso de uma análise completa sobre a tese de defesa usada no processo " \
+                "0001234-56.2023.5.04.0001 comparando com outros casos parecidos do escritório"
+check("identificador em pergunta longa não é atalho", not qfp.preclassify(long_question).identifier_lookup)
+
+# ── regras: sem LLM ──────────────────────────────────────────────────
+print("\n2. regras (sem LLM)")
+decision = router.decide_retrieval_and_mode("CNPJ 88.611.835/0008-03", law_firm_id=1)
+check("identificador → full_text", decision.should_retrieve_context and decision.search_mode == "full_text")
+decision = router.decide_retrieval_and_mode("bom dia", law_firm_id=1)
+check("cumprimento → não busca", not decision.should_retrieve_context)
+check("identificador → pergunta sem reformular",
+      enhancer.enhance_question("NB 1234567890", law_firm_id=1) == "NB 1234567890")
+check("curta sem histórico → sem reformular", enhancer.enhance_question("acidente trajeto") == "acidente trajeto")
+check("termos do identificador por regex",
+      extractor.extract_keywords("processo 0001234-56.2023.5.04.0001") == [
+          "0001234-56.2023.5.04.0001", "00012345620235040001"])
+check("nenhuma chamada ao LLM", llm_calls == [], llm_calls)
+
+# ── cache ────────────────────────────────────────────────────────────
+print("\n3. cache por (escritório, pergunta, histórico)")
+question = "Qual o entendimento sobre nexo causal no acidente de trajeto?"
+history = [{"role": "user", "content": "falávamos de acidente de trajeto"}]
+first = enhancer.enhance_question(question, history=history, law_firm_id=1)
+again = enhancer.enhance_question("  qual o entendimento sobre NEXO causal no acidente de trajeto?", history=history,
+                                  law_firm_id=1)
+check("reformulação cacheada (pergunta normalizada)", first == again == "pergunta reformulada"
+      and llm_calls.count("enhance") == 1, llm_calls)
+enhancer.enhance_question(question, history=history, law_firm_id=2)
+enhancer.enhance_question(question, history=None, law_firm_id=1)
+check("outro escritório ou outro histórico → nova chamada", llm_calls.count("enhance") == 3, llm_calls)
+
+router.decide_retrieval_and_mode(question, law_firm_id=1)
+router.decide_retrieval_and_mode(question, law_firm_id=1)
+check("decisão do roteador cacheada", llm_calls.count("route") == 1, llm_calls)
+keywords = extractor.extract_keywords(question, law_firm_id=1)
+keywords.append("mutado")
+check("termos cacheados e devolvidos como cópia",
+      extractor.extract_keywords(question, law_firm_id=1) == ["nexo causal", "trajeto"]
+      and llm_calls.count("keywords") == 1, llm_calls)
+
+router._decide_with_llm = _fake_llm("route_fail", RuntimeError("LLM fora"))
+failing_question = "quais documentos tratam de estabilidade acidentária no retorno?"
+decision = router.decide_retrieval_and_mode(failing_question, law_firm_id=1)
+check("falha do LLM → fallback (busca semântica)", decision.should_retrieve_context and decision.search_mode == "semantic")
+router.decide_retrieval_and_mode(failing_question, law_firm_id=1)
+check("falha não entra no cache", llm_calls.count("route_fail") == 2, llm_calls)
+
+# ── contadores ───────────────────────────────────────────────────────
+print("\n4. contadores")
+stages = qfp.stats()["stages"]
+enhance = stages["enhance_question"]
+check("enhance: 2 regra, 1 cache, 3 llm", (enhance["rule"], enhance["cache"], enhance["llm"]) == (2, 1, 3), enhance)
+check("latência média do LLM medida", enhance["avg_llm_ms"] and enhance["avg_llm_ms"] >= LLM_DELAY * 1000 * 0.9,
+      enhance["avg_llm_ms"])
+check("economia estimada = (regra + cache) × média", abs(enhance["estimated_saved_ms"] - 3 * enhance["avg_llm_ms"]) <= 1,
+      enhance)
+check("roteador: 2 por regra", stages["decide_retrieval_and_mode"]["rule"] == 2, stages["decide_retrieval_and_mode"])
+check("termos: 1 regra, 1 cache", (stages["extract_keywords"]["rule"], stages["extract_keywords"]["cache"]) == (1, 1),
+      stages["extract_keywords"])
+
+print("\n" + ("TUDO OK" if not FAILS else f"{len(FAILS)} FALHA(S): {FAILS}"))
+sys.exit(1 if FAILS else 0)
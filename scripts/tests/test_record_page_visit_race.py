@@ -5,8 +5,10 @@ Com REPEATABLE READ (MySQL), o SELECT da segunda request não enxerga a linha
 que a primeira acabou de comitar; o INSERT então estoura 1062 (Duplicate entry)
 no commit do middleware — fora do try/except do serviço — e derruba a tela.
 
-O teste simula o "snapshot cego" forçando a busca de linha existente a
-retornar None, com uma linha conflitante já comitada no banco.
+Desde o write-behind a request não escreve: a visita fica no acumulador e o
+flush grava com upsert (`hits = hits + n`), que não depende de enxergar a
+linha antes. O teste deixa uma linha conflitante já comitada no banco e
+confere que o flush soma em vez de estourar a chave única.
 
 Uso:
     uv run python scripts/tests/test_record_page_visit_race.py
@@ -56,13 +58,13 @@ def main():
         try:
             with mock.patch.object(access_audit_service, '_is_page_navigation',
                                    return_value=True), \
-                 mock.patch.object(access_audit_service, 'request', fake_request), \
-                 mock.patch.object(access_audit_service, '_find_visit',
-                                   return_value=None):
+                 mock.patch.object(access_audit_service, 'request', fake_request):
                 access_audit_service.record_page_visit(user)
 
-            # É aqui que o bug explodia: IntegrityError no commit do middleware
+            # Flush em transação própria; o commit do chamador não tem nada pendente
+            access_audit_service.flush_activity()
             db.session.commit()
+            db.session.expire_all()
 
             row = UserPageVisit.query.filter_by(
                 user_id=user.id, endpoint=ENDPOINT, visit_date=today).first()
@@ -71,7 +73,7 @@ def main():
                 return 1
             if row.hits != 6:
                 print(f'FALHOU: hits={row.hits}, esperado 6 '
-                      '(fallback deveria incrementar a linha existente).')
+                      '(o upsert deveria incrementar a linha existente).')
                 return 1
             print('OK: corrida tratada — commit não estourou e hits foi de 5 para 6.')
             return 0
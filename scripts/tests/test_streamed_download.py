@@ -0,0 +1,150 @@
+"""Teste dos downloads em streaming para disco (app/services/streamed_download.py)
+no client do INLABS e no download de contestações do FAP, contra um servidor
+HTTP local — sem rede externa.
+
+Confere SHA-256 incremental, rename atômico, limpeza do temporário em falha
+e que o pico de memória fica longe do tamanho do arquivo.
+
+Rodar: uv run python scripts/tests/test_streamed_download.py
+"""
+import base64
+import hashlib
+import http.server
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import tracemalloc
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import fap_web_service as fws  # noqa: E402
+from app.services import inlabs_client as ic  # noqa: E402
+from app.services.streamed_download import StagingWriter, stage_bytes  # noqa: E402
+
+FAILS = []
+TAMANHO = 12 * 1024 * 1024
+PDF = os.urandom(TAMANHO)
+FAP_JSON = json.dumps({'nome': 'julgamento.pdf', 'base64': base64.b64encode(PDF).decode()}).encode()
+
+
+def check(label, cond, detail=""):
+    if not cond:
+        FAILS.append(label)
+        print(f"  ✗ {label} {detail}")
+    else:
+        print(f"  ✓ {label}")
+
+
+def sobras(diretorio: Path) -> list:
+    return [p.name for p in diretorio.iterdir() if p.name.endswith('.part')]
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _enviar(self, corpo: bytes, tipo: str, truncar: bool = False):
+        self.send_response(200)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        corpo = corpo[:len(corpo) // 2] if truncar else corpo
+        for inicio in range(0, len(corpo), 64 * 1024):
+            self.wfile.write(corpo[inicio:inicio + 64 * 1024])
+
+    def do_GET(self):
+        if 'dl=2026-08-10-DO3.zip' in self.path:
+            self._enviar(PDF, 'application/octet-stream')
+        elif 'dl=2026-08-10-DO1.zip' in self.path:
+            self._enviar(PDF, 'application/octet-stream', truncar=True)
+        elif 'dl=2026-08-09-DO1.zip' in self.path:
+            self._enviar(b'<html>portal</html>', 'text/html; charset=utf-8')
+        elif '/contestacoes/42/imprimir' in self.path:
+            self._enviar(FAP_JSON, 'application/json')
+        elif '/contestacoes/43/imprimir' in self.path:
+            self._enviar(b'{"nome": "x.pdf", "base64": "@@@@invalido', 'application/json')
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+
+servidor = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+threading.Thread(target=servidor.serve_forever, daemon=True).start()
+BASE = f'http://127.0.0.1:{servidor.server_address[1]}'
+TMP = Path(tempfile.mkdtemp(prefix='streamed_download_'))
+
+try:
+    # ── utilitário ───────────────────────────────────────────────────
+    print("\n1. StagingWriter")
+    arquivo = stage_bytes(b'abc', TMP, 'x.zip')
+    check("hash e tamanho", arquivo.sha256 == hashlib.sha256(b'abc').hexdigest() and arquivo.size == 3)
+    check("temporário oculto no mesmo diretório", arquivo.path.parent == TMP and arquivo.path.name.startswith('.'))
+    (TMP / 'x.zip').write_bytes(b'versao antiga')
+    destino = arquivo.publish(TMP / 'x.zip')
+    check("publish substitui o destino", destino.read_bytes() == b'abc' and sobras(TMP) == [])
+    arquivo.discard()
+    check("discard depois do publish não apaga", destino.exists())
+    try:
+        with StagingWriter(TMP, 'y.zip') as escrita:
+            escrita.write(b'meio')
+            raise RuntimeError('rede caiu')
+    except RuntimeError:
+        pass
+    check("exceção apaga o temporário", sobras(TMP) == [], sobras(TMP))
+
+    # ── INLABS ───────────────────────────────────────────────────────
+    print("\n2. INLABS em streaming")
+    ic.URL_DOWNLOAD = f'{BASE}/index.php?p='
+    client = ic.InlabsClient(email='a@b.com', password='x')
+    client._cookie = 'COOKIE'
+    tracemalloc.start()
+    arquivo = client.download_xml_zip_to(date(2026, 8, 10), 'DO3', TMP)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    check("conteúdo e SHA-256 corretos", arquivo.path.read_bytes() == PDF
+          and arquivo.sha256 == hashlib.sha256(PDF).hexdigest())
+    check("pico de memória bem abaixo do arquivo", pico < TAMANHO / 4, f"{pico / 1e6:.1f} MB")
+    print(f"    pico {pico / 1e6:.2f} MB para {TAMANHO / 1e6:.0f} MB")
+    arquivo.discard()
+    check("404 → None", client.download_xml_zip_to(date(2026, 8, 10), 'DO2', TMP) is None)
+    check("portal em HTML → None", client.download_xml_zip_to(date(2026, 8, 9), 'DO1', TMP) is None)
+    try:
+        client.download_xml_zip_to(date(2026, 8, 10), 'DO1', TMP)
+        check("download truncado levanta InlabsError", False, "não levantou")
+    except ic.InlabsError:
+        check("download truncado levanta InlabsError", True)
+    check("nenhum temporário sobrando", sobras(TMP) == [], sobras(TMP))
+    check("API em bytes preservada", client.download_xml_zip(date(2026, 8, 10), 'DO3') == PDF)
+
+    # ── FAP ──────────────────────────────────────────────────────────
+    print("\n3. contestação do FAP em streaming")
+    fws._BASE_URL = BASE
+    service = fws.FapWebService(fws.FapWebAuthPayload(cookies={'SESSION': 's'}), use_env_fallback=False)
+    tracemalloc.start()
+    dl = service.download_contestacao_to(2023, '12345678000195', 42, directory=str(TMP))
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    check("ok e nome do arquivo", dl.ok and dl.data['filename'] == 'julgamento.pdf', dl.message)
+    destino = dl.data['file'].publish(TMP / f"42_{dl.data['filename']}")
+    check("PDF decodificado igual ao original", destino.read_bytes() == PDF)
+    check("SHA-256 do PDF", dl.data['file'].sha256 == hashlib.sha256(PDF).hexdigest())
+    check("pico de memória bem abaixo da resposta", pico < len(FAP_JSON) / 4, f"{pico / 1e6:.1f} MB")
+    print(f"    pico {pico / 1e6:.2f} MB para resposta de {len(FAP_JSON) / 1e6:.0f} MB")
+    bytes_api = service.download_contestacao(2023, '12345678000195', 42)
+    check("API em bytes preservada", bytes_api.ok and bytes_api.data['pdf_bytes'] == PDF)
+    dl = service.download_contestacao_to(2023, '12345678000195', 43, directory=str(TMP))
+    check("base64 inválido → erro de processamento", not dl.ok and 'processar resposta' in dl.message, dl.message)
+    dl = service.download_contestacao_to(2023, '12345678000195', 44, directory=str(TMP))
+    check("HTTP 404 → erro HTTP", not dl.ok and dl.status_code == 404, dl.message)
+    check("nenhum temporário sobrando", sobras(TMP) == [], sobras(TMP))
+finally:
+    servidor.shutdown()
+    shutil.rmtree(TMP, ignore_errors=True)
+
+print("\n" + ("TUDO OK" if not FAILS else f"{len(FAILS)} FALHA(S): {FAILS}"))
+sys.exit(1 if FAILS else 0)
@@ -79,6 +79,11 @@ def run_tests():
                 client.get('/dashboard', headers={'Accept': 'text/html'})
                 client.get('/dashboard', headers={'Accept': 'text/html'})
 
+            # Write-behind: a request não grava nada; o flush grava em lote
+            check('request não escreve visita antes do flush',
+                  UserPageVisit.query.filter_by(user_id=normal.id).count() == 0)
+            access_audit_service.flush_activity()
+
             visits = UserPageVisit.query.filter_by(user_id=normal.id, endpoint='dashboard.dashboard').all()
             check('middleware registra visita de tela', len(visits) == 1,
                   f'esperava 1 linha agregada, obteve {len(visits)}')
@@ -91,6 +96,8 @@ def run_tests():
                 login_session(client, normal)
                 client.get('/dashboard', headers={'Accept': 'application/json',
                                                   'X-Requested-With': 'XMLHttpRequest'})
+            access_audit_service.flush_activity()
+            db.session.expire_all()
             visits_after_ajax = UserPageVisit.query.filter_by(user_id=normal.id, endpoint='dashboard.dashboard').first()
             check('AJAX/JSON não conta como tela', visits_after_ajax.hits == 2 if visits_after_ajax else False,
                   f'hits={visits_after_ajax.hits if visits_after_ajax else None}')
@@ -0,0 +1,303 @@
+"""
+Busca textual dos benefícios da Central de Disputas pelo índice `benefits`
+do Meilisearch (app/services/benefit_search_service.py) e o filtro da
+listagem (_apply_benefits_filters em app/blueprints/disputes_center.py).
+
+Sem Meilisearch de verdade: um cliente falso guarda os documentos e casa
+cada palavra da consulta como prefixo de um token, sem tolerância a erro
+de digitação — como o índice é configurado.
+
+Confere, num SQLite temporário:
+- sem índice (antes da reindexação), a busca usa o LIKE;
+- reindexação: um documento por benefício, com o nome do cliente;
+- para nomes, CPF, NB, CNPJ e cliente, os ids pelo índice são os mesmos
+  do LIKE, e só do escritório; com várias palavras o índice acha também a
+  ordem/intervalo diferente, e CPF só em dígitos acha o CPF pontuado;
+- texto casa começo de palavra só pelo índice; termo com dígito soma o
+  índice e o LIKE (trecho do meio de um NB/CPF);
+- pedaço do meio de um número, termo amplo demais e Meilisearch fora do ar
+  caem no LIKE (e fora do ar pausa as tentativas);
+- cadastro, edição e exclusão manuais atualizam o índice, e a troca do nome
+  de um cliente reindexa os benefícios dele.
+
+Executar:
+    uv run python tests/test_benefit_search_index.py
+"""
+
+import os
+import re
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_benefit_search_index.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+app.config['WTF_CSRF_ENABLED'] = False
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from app.blueprints import disputes_center as dc  # noqa: E402
+from app.services import benefit_search_service as busca  # noqa: E402
+
+FALHAS = []
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+# ── Meilisearch falso ────────────────────────────────────────────────────
+
+class _IndexNotFound(Exception):
+    code = 'index_not_found'
+
+
+def _tokens(texto):
+    return [t for t in re.split(r'[^0-9a-zà-ú]+', str(texto).lower()) if t]
+
+
+class _FakeIndex:
+    def __init__(self, uid):
+        self.uid = uid
+        self.docs = {}
+        self.settings = {'searchable': [], 'filterable': [], 'typo': True, 'max_total_hits': 1000}
+        self.buscas = 0
+
+    def _task(self):
+        return SimpleNamespace(task_uid=1)
+
+    def get_searchable_attributes(self):
+        return self.settings['searchable']
+
+    def update_searchable_attributes(self, valor):
+        self.settings['searchable'] = list(valor)
+        return self._task()
+
+    def get_filterable_attributes(self):
+        return self.settings['filterable']
+
+    def update_filterable_attributes(self, valor):
+        self.settings['filterable'] = list(valor)
+        return self._task()
+
+    def get_typo_tolerance(self):
+        return SimpleNamespace(enabled=self.settings['typo'])
+
+    def update_typo_tolerance(self, valor):
+        self.settings['typo'] = valor.enabled
+        return self._task()
+
+    def get_pagination(self):
+        return SimpleNamespace(max_total_hits=self.settings['max_total_hits'])
+
+    def update_pagination(self, valor):
+        self.settings['max_total_hits'] = valor.max_total_hits
+        return self._task()
+
+    def add_documents(self, documentos):
+        for doc in documentos:
+            self.docs[doc['id']] = doc
+        return self._task()
+
+    def delete_documents(self, ids):
+        for i in ids:
+            self.docs.pop(int(i), None)
+        return self._task()
+
+    def search(self, termo, limit, filter, attributes_to_retrieve, matching_strategy):
+        self.buscas += 1
+        assert matching_strategy == 'all' and not self.settings['typo']
+        firma = int(filter.split('=')[1])
+        palavras = _tokens(termo)
+        hits = []
+        for doc in sorted(self.docs.values(), key=lambda d: d['id']):
+            if doc['law_firm_id'] != firma:
+                continue
+            tokens = [t for campo in self.settings['searchable'] for t in _tokens(doc.get(campo, ''))]
+            if all(any(t.startswith(p) for t in tokens) for p in palavras):
+                hits.append({'id': doc['id']})
+        return SimpleNamespace(hits=hits[:min(limit, self.settings['max_total_hits'])])
+
+
+class _FakeClient:
+    def __init__(self):
+        self.indices = {}
+        self.fora_do_ar = False
+        self.chamadas = 0
+
+    def _check(self):
+        self.chamadas += 1
+        if self.fora_do_ar:
+            raise ConnectionError('meilisearch fora do ar')
+
+    def health(self):
+        self._check()
+
+    def get_index(self, uid):
+        self._check()
+        if uid not in self.indices:
+            raise _IndexNotFound(uid)
+        return self.indices[uid]
+
+    def get_or_create_index(self, uid, primary_key):
+        self._check()
+        return self.indices.setdefault(uid, _FakeIndex(uid))
+
+    def delete_index_if_exists(self, uid):
+        self.indices.pop(uid, None)
+
+    def wait_for_task(self, task_uid, timeout_in_ms=None):
+        pass
+
+    def get_tasks(self, index_ids=None):
+        return SimpleNamespace(results=[])
+
+
+FAKE = _FakeClient()
+busca._client = lambda: FAKE
+
+
+def popular():
+    from app.models import Benefit, Client, LawFirm, User
+    db.session.add_all([
+        LawFirm(id=1, name='Escritório', cnpj='00000000000191'),
+        LawFirm(id=2, name='Outro', cnpj='00000000000272'),
+        User(id=1, law_firm_id=1, name='Admin', email='a@b.c', password_hash='x', role='admin'),
+        Client(id=1, law_firm_id=1, name='Metalúrgica Exemplo Ltda', cnpj='12.345.678/0001-95'),
+    ])
+    nomes = ['Maria da Silva', 'João Silva Santos', 'Mariana Souza', 'Pedro Alves', 'Ana Maria Costa']
+    for i in range(1, 41):
+        db.session.add(Benefit(
+            id=i, law_firm_id=1 if i <= 35 else 2, client_id=1 if i % 2 else None,
+            benefit_number=f'{6000000000 + i * 137}', benefit_type='B91' if i % 3 else 'B94',
+            insured_name=nomes[i % len(nomes)], insured_cpf=f'{i:03d}.456.789-{i % 100:02d}',
+            insured_nit=f'1{i:02d}.2345.678-9', employer_cnpj='12.345.678/0001-95' if i % 4 else '98.765.432/0001-10',
+            employer_name='Metalúrgica Exemplo' if i % 4 else 'Transportes Beta', status='pending',
+            fap_vigencia_years='2024,2025' if i % 5 else '2023',
+        ))
+    db.session.commit()
+
+
+def ids_filtrados(termo):
+    query = dc._apply_benefits_filters(dc._base_benefits_query(1), search_value=termo, law_firm_id=1)
+    return sorted(benefit.id for benefit, _ in query)
+
+
+def ids_like(termo):
+    original = busca.search_ids
+    busca.search_ids = lambda *args: None
+    try:
+        return ids_filtrados(termo)
+    finally:
+        busca.search_ids = original
+
+
+def main():
+    with app.app_context():
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        popular()
+
+        print('\n1. antes da reindexação')
+        check('sem índice → LIKE', busca.search_ids(1, 'silva') is None)
+        check('hook não cria índice parcial', busca.index_benefits([1]) == 0 and not FAKE.indices)
+
+        print('\n2. reindexação')
+        total = busca.reindex_all()
+        indice = FAKE.indices[busca.MEILI_INDEX]
+        check('um documento por benefício', total == 40 and len(indice.docs) == 40, total)
+        check('nome do cliente no documento', indice.docs[1]['client_name'] == 'Metalúrgica Exemplo Ltda'
+              and indice.docs[2]['client_name'] == '')
+        check('CPF também só em dígitos', indice.docs[7]['insured_cpf_digits'] == '00745678907')
+        check('sem tolerância a erro de digitação', indice.settings['typo'] is False)
+
+        print('\n3. mesmos ids do LIKE')
+        termos = ['silva', 'silva santos', 'Mariana', '007.456.789-07',
+                  str(6000000000 + 9 * 137), '12.345.678/0001-95', 'metalúrgica exemplo', 'b94', '2023']
+        for termo in termos:
+            pelo_indice = busca.search_ids(1, termo)
+            check(f'"{termo}"', pelo_indice is not None and ids_filtrados(termo) == ids_like(termo)
+                  and sorted(pelo_indice) == ids_like(termo), (len(pelo_indice or []), len(ids_like(termo))))
+        check('várias palavras: o que o LIKE acha e mais', set(ids_like('maria silva'))
+              <= set(busca.search_ids(1, 'maria silva'))
+              and ids_like('maria silva') != ids_filtrados('maria silva')
+              and all(i % 5 == 0 for i in ids_filtrados('maria silva')))
+        check('CPF só em dígitos acha o pontuado', busca.search_ids(1, '00745678907') == [7]
+              and ids_filtrados('00745678907') == [7] and ids_like('00745678907') == [])
+        check('só o escritório', all(i <= 35 for i in busca.search_ids(1, 'silva'))
+              and busca.search_ids(2, 'silva') and all(i > 35 for i in busca.search_ids(2, 'silva')))
+        check('nada casou → lista vazia', busca.search_ids(1, 'inexistente') == []
+              and ids_filtrados('inexistente') == [])
+
+        check('texto: começo de palavra pelo índice, sem LIKE', ids_filtrados('silv') == ids_like('silv')
+              and ids_filtrados('ilva') == [] and ids_like('ilva'))
+
+        print('\n4. volta ao LIKE')
+        check('meio de um número', busca.search_ids(1, '56.78') is None
+              and ids_filtrados('56.78') == ids_like('56.78') and ids_like('56.78'))
+        for termo in ['00745678907', '0001', '2023', '789-07']:
+            pelo_indice = busca.search_ids(1, termo)
+            check(f'identificador "{termo}": índice + LIKE', pelo_indice is not None
+                  and ids_filtrados(termo) == sorted(set(ids_like(termo)) | set(pelo_indice)),
+                  (pelo_indice, ids_like(termo)))
+        limite = busca.MAX_IDS
+        busca.MAX_IDS = 5
+        try:
+            check('termo amplo demais', busca.search_ids(1, 'metalúrgica') is None)
+        finally:
+            busca.MAX_IDS = limite
+        FAKE.fora_do_ar = True
+        check('Meilisearch fora do ar', busca.search_ids(1, 'silva') is None
+              and ids_filtrados('silva') == ids_like('silva'))
+        chamadas = FAKE.chamadas
+        FAKE.fora_do_ar = False
+        check('pausa depois da falha', busca.search_ids(1, 'silva') is None and FAKE.chamadas == chamadas)
+        busca._unavailable_until = 0.0
+        check('volta depois da pausa', busca.search_ids(1, 'silva') is not None)
+
+    print('\n5. cadastro, edição e exclusão manuais')
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['user_id'] = 1
+        sessao['law_firm_id'] = 1
+        sessao['user_role'] = 'admin'
+    formulario = {'benefit_number': '7771234567', 'benefit_type': 'B91', 'status': 'pending',
+                  'insured_name': 'Zuleica Prado', 'client_id': ''}
+    cliente.post('/disputes-center/new', data=formulario)
+    with app.app_context():
+        from app.models import Benefit
+        novo = Benefit.query.filter_by(benefit_number='7771234567').one().id
+    check('cadastro indexado', busca.search_ids(1, 'zuleica') == [novo])
+    cliente.post(f'/disputes-center/{novo}/edit', data=dict(formulario, insured_name='Zuleide Prado'))
+    check('edição reindexada', busca.search_ids(1, 'zuleide') == [novo] and busca.search_ids(1, 'zuleica') == [])
+    cliente.post(f'/disputes-center/{novo}/delete')
+    check('exclusão remove do índice', novo not in indice.docs)
+
+    print('\n6. nome do cliente alterado')
+    cliente.post('/clients/1/edit', data={'name': 'Siderúrgica Renomeada', 'cnpj': '12.345.678/0001-95'})
+    check('benefícios do cliente reindexados', busca.search_ids(1, 'siderúrgica') == list(range(1, 36, 2))
+          and indice.docs[1]['client_name'] == 'Siderúrgica Renomeada', busca.search_ids(1, 'siderúrgica'))
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
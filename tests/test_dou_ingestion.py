@@ -21,6 +21,7 @@ from main import app
 from app.models import db, DouEdition, DouArticle
 from app.services import dou_ingestion_service as ingestion
 from app.services import dou_search_service as busca
+from app.services.streamed_download import stage_bytes
 
 FIXTURES = Path(__file__).resolve().parent / 'fixtures'
 
@@ -68,6 +69,15 @@ class FakeClient:
     def download_pdf(self, data, secao):
         return self.pdfs.get((data, secao.lower()))
 
+    # A ingestão usa as variantes em streaming: mesmo conteúdo, em arquivo
+    def download_xml_zip_to(self, data, secao, diretorio):
+        conteudo = self.download_xml_zip(data, secao)
+        return None if conteudo is None else stage_bytes(conteudo, diretorio, f'{secao}.zip')
+
+    def download_pdf_to(self, data, secao, diretorio):
+        conteudo = self.download_pdf(data, secao)
+        return None if conteudo is None else stage_bytes(conteudo, diretorio, f'{secao}.pdf')
+
 
 def limpar_dados_de_teste():
     """Remove o resíduo da data-sentinela — banco, índice e arquivos.
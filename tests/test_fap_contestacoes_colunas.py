@@ -33,6 +33,7 @@ except Exception:
 db.init_app(app)
 
 from app.blueprints import fap_panel as fp  # noqa: E402
+from app.services import fap_contestacao_summary_service  # noqa: E402
 
 FALHAS = []
 
@@ -116,6 +117,8 @@ def main():
                 situacao_codigo=sit, instancia_codigo=inst, protocolo=f'P{i}',
                 last_synced_at=datetime(2026, 1, 1), created_at=datetime(2026, 1, 1),
             ))
+        # A paginação lê os grupos do resumo, que a sincronização mantém
+        fap_contestacao_summary_service.refresh_firm(1)
         db.session.commit()
 
     cliente = app.test_client()
@@ -143,6 +146,7 @@ def main():
             protocolo='P999', last_synced_at=datetime(2026, 1, 1),
             created_at=datetime(2026, 1, 1),
         ))
+        fap_contestacao_summary_service.refresh_firm(1)
         db.session.commit()
 
     html = cliente.get('/fap-panel/contestacoes?ano_vigencia=2026').get_data(as_text=True)
@@ -0,0 +1,279 @@
+"""
+Paginação por cursor da tela de contestações do Painel FAP
+(contestacoes_page em app/blueprints/fap_panel.py) sobre o resumo por grupo
+(app/services/fap_contestacao_summary_service.py).
+
+Confere, num SQLite temporário com grupos de datas repetidas e nulas:
+- em todas as ordenações, a sequência de páginas — seguindo o cursor para
+  frente, para trás, saltando por número e indo direto à última — é igual
+  à do GROUP BY + OFFSET anterior, grupo a grupo;
+- o mesmo com filtro de linha (situação), que agrega as linhas;
+- as linhas da página são exatamente as dos grupos da página;
+- página por cursor sem OFFSET nem GROUP BY;
+- o cron mantém o resumo (grupo novo, alterado e esvaziado) igual a um
+  recálculo completo.
+
+Executar:
+    uv run python tests/test_fap_contestacoes_keyset.py
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_fap_contestacoes_keyset.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from sqlalchemy import and_, event, func, insert  # noqa: E402
+
+import fap_sync_cron  # noqa: E402
+from app.blueprints import fap_panel as fp  # noqa: E402
+from app.services import fap_contestacao_summary_service as summaries  # noqa: E402
+
+fap_sync_cron._log = lambda msg: None
+
+FALHAS = []
+TMP = tempfile.mkdtemp(prefix='fap_contestacoes_keyset_')
+PAGE_SIZE = 25
+ORDENACOES = ('padrao', 'dou', 'transmissao', 'cadastro', 'atualizacao')
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+def popular(FapWebContestacao, FapWebContestacaoChangeHistory):
+    """3 raízes × 15 estabelecimentos × 7 vigências; datas de poucos valores
+    (empates entre grupos) e nulas em parte dos grupos."""
+    rnd = random.Random(46)
+    dous = [None, None, date(2024, 5, 1), date(2024, 6, 3), date(2025, 1, 10)]
+    transmissoes = [None, datetime(2024, 3, 5, 10, 20), datetime(2024, 3, 6, 8, 0)]
+    criacoes = [datetime(2026, 1, 1), datetime(2026, 2, 1, 12, 30)]
+    linhas, historico, cid = [], [], 0
+    for r in range(3):
+        raiz = f'{10000000 + r}'
+        for e in range(15):
+            cnpj = f'{raiz}{e:04d}{r:02d}'
+            for ano in range(2019, 2026):
+                for _ in range(rnd.randint(1, 4)):
+                    cid += 1
+                    linhas.append({
+                        'id': cid, 'law_firm_id': 1, 'contestacao_id': 500000 + cid,
+                        'cnpj': cnpj, 'cnpj_raiz': raiz, 'ano_vigencia': ano,
+                        'situacao_codigo': rnd.choice(['PUBLICADA', 'EM_ANDAMENTO']),
+                        'instancia_codigo': 'ADMINISTRATIVO_PRIMEIRA_INSTANCIA',
+                        'protocolo': f'P{cid}', 'data_dou_date': rnd.choice(dous),
+                        'data_transmissao': rnd.choice(transmissoes),
+                        'needs_reprocess': False, 'last_synced_at': datetime(2026, 3, 1),
+                        'created_at': rnd.choice(criacoes),
+                    })
+                    tipo = rnd.choice([None, None, 'updated', 'created'])
+                    if tipo:
+                        historico.append({
+                            'law_firm_id': 1, 'contestacao_db_id': cid, 'contestacao_id': 500000 + cid,
+                            'cnpj': cnpj, 'cnpj_raiz': raiz, 'ano_vigencia': ano, 'change_type': tipo,
+                            'synced_at': datetime(2026, 4, 1) + timedelta(days=rnd.randint(0, 3)),
+                        })
+    db.session.execute(insert(FapWebContestacao), linhas)
+    db.session.execute(insert(FapWebContestacaoChangeHistory), historico)
+    return linhas
+
+
+def ordem_antiga(sort, situacao=None, ano=None):
+    """GROUP BY + ORDER BY da versão anterior da tela (referência)."""
+    from app.models import FapWebContestacao as W, FapWebContestacaoChangeHistory as H
+    tiebreak = [W.ano_vigencia.desc(), W.cnpj.asc()]
+    q = db.session.query(W.ano_vigencia, W.cnpj).filter(W.law_firm_id == 1)
+    if situacao:
+        q = q.filter(W.situacao_codigo == situacao)
+    if ano:
+        q = q.filter(W.ano_vigencia == ano)
+    ordem = {
+        'dou': [func.max(W.data_dou_date).desc()],
+        'transmissao': [func.max(W.data_transmissao).desc()],
+        'cadastro': [func.max(W.created_at).desc()],
+        'atualizacao': [func.max(H.synced_at).desc()],
+    }.get(sort, [])
+    if sort == 'atualizacao':
+        q = q.outerjoin(H, and_(H.contestacao_db_id == W.id, H.change_type == 'updated'))
+    return [tuple(r) for r in q.group_by(W.ano_vigencia, W.cnpj).order_by(*ordem, *tiebreak)]
+
+
+def snapshot_resumo():
+    from app.models import FapWebContestacaoGroupSummary as S
+    return sorted(
+        (s.ano_vigencia, s.cnpj, s.cnpj_raiz, s.contestacao_count, s.max_data_dou,
+         s.max_data_transmissao, s.max_created_at, s.last_updated_at)
+        for s in S.query.filter_by(law_firm_id=1)
+    )
+
+
+def main():
+    original_root = app.root_path
+    with app.app_context():
+        from app.models import LawFirm, User, FapWebContestacao, FapWebContestacaoChangeHistory
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        db.session.add(LawFirm(id=1, name='Escritório', cnpj='00000000000191'))
+        db.session.add(User(id=1, law_firm_id=1, name='Admin', email='a@b.c',
+                            password_hash='x', role='admin'))
+        linhas = popular(FapWebContestacao, FapWebContestacaoChangeHistory)
+        grupos = summaries.refresh_firm(1)
+        db.session.commit()
+        check('resumo com um registro por grupo', grupos == 315, grupos)
+
+    capturado = {}
+    original_render = fp.render_template
+    fp.render_template = lambda nome, **contexto: capturado.update(contexto) or ''
+    app.root_path = TMP  # carimbo de sincronização fora da árvore do projeto
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['user_id'] = 1
+        sessao['law_firm_id'] = 1
+        sessao['user_role'] = 'admin'
+
+    def pagina(**params):
+        capturado.clear()
+        resposta = cliente.get('/fap-panel/contestacoes', query_string=dict(page_size=PAGE_SIZE, **params))
+        assert resposta.status_code == 200, resposta.status_code
+        return [(row['ano_vigencia'], row['cnpj_raw']) for row in capturado['table_rows']]
+
+    def percorrer(filtros):
+        """(para frente por cursor, para trás por cursor, por número)"""
+        frente, cursor, n = [], None, 1
+        while True:
+            frente += pagina(page=n, after=cursor, **filtros)
+            if n >= capturado['total_pages']:
+                break
+            cursor, n = capturado['next_cursor'], n + 1
+        total = capturado['total_pages']
+        tras, cursor = [], None
+        for n in range(total, 0, -1):
+            tras = pagina(page=n, before=cursor, **filtros) + tras
+            cursor = capturado['prev_cursor']
+        numero = []
+        for n in range(1, total + 1):
+            numero += pagina(page=n, **filtros)
+        return frente, tras, numero
+
+    try:
+        with app.app_context():
+            referencias = {sort: ordem_antiga(sort) for sort in ORDENACOES}
+            com_situacao = {sort: ordem_antiga(sort, situacao='PUBLICADA') for sort in ORDENACOES}
+            do_ano = ordem_antiga('dou', ano=2024)
+
+        print('\n1. ordem igual à do GROUP BY, em todas as ordenações')
+        for sort in ORDENACOES:
+            frente, tras, numero = percorrer({'ordenar': sort})
+            check(f'{sort}: cursor para frente', frente == referencias[sort], len(frente))
+            check(f'{sort}: cursor para trás', tras == referencias[sort], len(tras))
+            check(f'{sort}: salto por número', numero == referencias[sort], len(numero))
+        check('ordenações realmente diferentes', len({tuple(v) for v in referencias.values()}) == len(ORDENACOES))
+
+        print('\n2. filtro de vigência (resumo) e de situação (linhas)')
+        frente, tras, numero = percorrer({'ordenar': 'dou', 'ano_vigencia': '2024'})
+        check('vigência 2024', frente == tras == numero == do_ano, len(frente))
+        for sort in ('padrao', 'dou', 'atualizacao'):
+            frente, tras, numero = percorrer({'ordenar': sort, 'situacao': 'PUBLICADA'})
+            check(f'situação + {sort}', frente == tras == numero == com_situacao[sort], len(frente))
+
+        print('\n3. linhas da página')
+        chaves = pagina(page=2, ordenar='cadastro')
+        registros = [c for row in capturado['table_rows'] for b in fp._baldes_vazios() for c in row[b]]
+        esperados = sorted(r['id'] for r in linhas if (r['ano_vigencia'], r['cnpj']) in set(chaves))
+        check('todas as linhas dos grupos, nenhuma de fora', sorted(c.id for c in registros) == esperados,
+              len(registros))
+        check('cursor inválido cai no número da página', pagina(page=2, ordenar='cadastro', after='xx') == chaves)
+        pagina(page=1, ordenar='dou')
+        check('cursor de outra ordenação é ignorado',
+              pagina(page=2, ordenar='cadastro', after=capturado['next_cursor']) == chaves)
+
+        print('\n4. SQL da página por cursor')
+        pagina(page=3, ordenar='atualizacao')
+        cursor = capturado['next_cursor']
+        statements = []
+
+        def contar(conn, cur, statement, parameters, *args):
+            if 'fap_' in statement:
+                statements.append((statement, parameters))
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', contar)
+        try:
+            pagina(page=4, ordenar='atualizacao', after=cursor)
+        finally:
+            event.remove(engine, 'before_cursor_execute', contar)
+        grupos_sql = [(s, p) for s, p in statements if 'fap_web_contestacao_group_summaries' in s and 'LIMIT' in s]
+        check('grupos lidos do resumo', len(grupos_sql) == 1, len(grupos_sql))
+        # O SQLite sempre escreve OFFSET depois de LIMIT: o valor é que tem de ser 0
+        check('sem OFFSET nem GROUP BY', grupos_sql and 'GROUP BY' not in grupos_sql[0][0]
+              and ('OFFSET' not in grupos_sql[0][0] or grupos_sql[0][1][-1] == 0), grupos_sql)
+        check('linhas por IN de tupla', any('(fap_web_contestacoes.ano_vigencia, fap_web_contestacoes.cnpj) IN' in s
+                                            for s, _ in statements))
+    finally:
+        fp.render_template = original_render
+        app.root_path = original_root
+
+    print('\n5. manutenção pelo cron')
+    with app.app_context():
+        from app.models import FapAutoImportedContestacao
+        company = SimpleNamespace(id=None, cnpj='20000000000100')
+
+        def item(cid, dou='2025-02-01'):
+            return {'id': cid, 'cnpj': '20000000000100', 'dataDOU': dou,
+                    'situacao': {'codigo': 'PUBLICADA'}, 'dataTransmissao': '2025-01-05T10:00:00Z'}
+
+        def persist(fetched):
+            fap_sync_cron.persist_contestacoes_for_company(
+                db, FapWebContestacao, FapWebContestacaoChangeHistory, FapAutoImportedContestacao,
+                1, company, fetched,
+            )
+
+        def conferir(rotulo):
+            mantido = snapshot_resumo()
+            summaries.refresh_firm(1)
+            db.session.commit()
+            check(rotulo, mantido == snapshot_resumo())
+
+        persist({2024: [item(900001), item(900002)], 2025: [item(900003)]})
+        conferir('grupos novos')
+        persist({2024: [item(900001, '2025-03-09'), item(900002)]})
+        conferir('DOU alterado (e histórico updated)')
+        persist({2023: [item(900003)]})
+        conferir('contestação muda de vigência: grupo antigo sai do resumo')
+        check('grupo esvaziado removido',
+              not any(a == 2025 and c == '20000000000100' for a, c, *_ in snapshot_resumo()))
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    shutil.rmtree(TMP, ignore_errors=True)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Estatísticas da tela de contestações do Painel FAP numa agregação só
+(contestacoes_page em app/blueprints/fap_panel.py) e cache por escritório
+das opções de filtro (app/services/fap_panel_filter_cache.py).
+
+Confere, num SQLite temporário com 100 mil contestações:
+- os SUM(CASE …) batem com _chave_celula linha a linha, inclusive caixa,
+  espaços, situação nula/desconhecida e instância nula;
+- total, importadas, com arquivo e nº de grupos iguais às contagens diretas;
+- a página e o mapa de importadas (contestacao_id → report_id);
+- carga da tela com o cache quente: no máximo 4 comandos SQL nas tabelas do FAP;
+- o carimbo gravado pela sincronização (outro processo) invalida o cache.
+
+Executar:
+    uv run python tests/test_fap_contestacoes_stats.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_fap_contestacoes_stats.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from sqlalchemy import event, insert  # noqa: E402
+
+from app.blueprints import fap_panel as fp  # noqa: E402
+from app.services import fap_contestacao_summary_service, fap_panel_filter_cache  # noqa: E402
+
+FALHAS = []
+TOTAL = 100_000
+TMP = tempfile.mkdtemp(prefix='fap_contestacoes_stats_')
+
+SITUACOES = ['EM_ANDAMENTO', 'LIBERADA_PARA_ANALISE', 'PUBLICADA', 'publicada', ' PUBLICADA ',
+             'CODIGO_NOVO', None, '']
+INSTANCIAS = ['ADMINISTRATIVO_PRIMEIRA_INSTANCIA', 'ADMINISTRATIVO_SEGUNDA_INSTANCIA',
+              'recurso_segunda', None]
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+def linha(i):
+    raiz = f'{10000000 + i % 40}'
+    return {
+        'id': i, 'law_firm_id': 1, 'contestacao_id': 100000 + i,
+        'cnpj': f'{raiz}{i % 3:04d}00', 'cnpj_raiz': raiz, 'ano_vigencia': 2020 + i % 7,
+        'situacao_codigo': SITUACOES[i % len(SITUACOES)],
+        'situacao_descricao': 'desc',
+        'instancia_codigo': INSTANCIAS[(i // 3) % len(INSTANCIAS)],
+        'protocolo': f'P{i}', 'file_path': f'uploads/x/{i}.pdf' if i % 5 == 0 else None,
+        'needs_reprocess': False,
+        'last_synced_at': datetime(2026, 1, 1), 'created_at': datetime(2026, 1, 1),
+    }
+
+
+def main():
+    original_root = app.root_path
+    with app.app_context():
+        from app.models import (
+            LawFirm, User, FapCompany, FapWebContestacao, FapAutoImportedContestacao,
+        )
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        db.session.add(LawFirm(id=1, name='Escritório', cnpj='00000000000191'))
+        db.session.add(User(id=1, law_firm_id=1, name='Admin', email='a@b.c',
+                            password_hash='x', role='admin'))
+        db.session.add(FapCompany(law_firm_id=1, cnpj='10000000', nome='Empresa',
+                              synced_at=datetime(2026, 1, 1)))
+        linhas = [linha(i) for i in range(1, TOTAL + 1)]
+        for inicio in range(0, TOTAL, 10_000):
+            db.session.execute(insert(FapWebContestacao), linhas[inicio:inicio + 10_000])
+        importadas = [{'law_firm_id': 1, 'report_id': 1 + i % 3, 'contestacao_id': 100000 + i,
+                       'cnpj': 'x', 'year': 2024} for i in range(6, TOTAL + 1, 7)]
+        db.session.execute(insert(FapAutoImportedContestacao), importadas)
+        fap_contestacao_summary_service.refresh_firm(1)
+        db.session.commit()
+
+    print('\n1. agregação contra a classificação em Python')
+    esperado = Counter(fp._chave_celula(r['situacao_codigo'], r['instancia_codigo']).replace('c_', 'count_')
+                       for r in linhas)
+    capturado = {}
+    original_render = fp.render_template
+    fp.render_template = lambda nome, **contexto: capturado.update(contexto) or ''
+    app.root_path = TMP  # carimbo de sincronização fora da árvore do projeto
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['user_id'] = 1
+        sessao['law_firm_id'] = 1
+        sessao['user_role'] = 'admin'
+    try:
+        resposta = cliente.get('/fap-panel/contestacoes')
+        check('tela responde', resposta.status_code == 200, resposta.status_code)
+        for chave in sorted(set(esperado) | {k for k in capturado if k.startswith('count_')}):
+            check(f'{chave} = {esperado.get(chave, 0)}', capturado.get(chave) == esperado.get(chave, 0),
+                  capturado.get(chave))
+        grupos = len({(r['ano_vigencia'], r['cnpj']) for r in linhas})
+        check('total', capturado['total'] == TOTAL, capturado['total'])
+        check('importadas e pendentes', capturado['imported_count'] == len(importadas)
+              and capturado['pending_count'] == TOTAL - len(importadas), capturado['imported_count'])
+        check('com e sem arquivo', capturado['with_file_count'] == TOTAL // 5
+              and capturado['without_file_count'] == TOTAL - TOTAL // 5)
+        check('nº de grupos', capturado['total_groups'] == grupos, capturado['total_groups'])
+
+        print('\n2. página e mapa de importadas')
+        pagina = capturado['table_rows']
+        check('50 grupos na página', len(pagina) == 50, len(pagina))
+        check('ordem padrão: vigência desc', pagina[0]['ano_vigencia'] == 2026)
+        registros = [c for row in pagina for chave in fp._baldes_vazios() for c in row[chave]]
+        mapa = capturado['imported_map']
+        check('report_id das importadas da página',
+              mapa and all(mapa[c.contestacao_id] == 1 + (c.id % 3) for c in registros if c.id % 7 == 6),
+              len(mapa))
+        check('só importadas no mapa', all(c.id % 7 == 6 for c in registros if c.contestacao_id in mapa))
+
+        print('\n3. comandos SQL com o cache quente')
+        statements = []
+
+        def contar(conn, cursor, statement, *args):
+            if 'fap_' in statement:
+                statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', contar)
+        try:
+            cliente.get('/fap-panel/contestacoes?page=3')
+        finally:
+            event.remove(engine, 'before_cursor_execute', contar)
+        check('no máximo 4 comandos nas tabelas do FAP', len(statements) <= 4,
+              [s.split('FROM')[0][:60] for s in statements])
+        check('sem DISTINCT das opções de filtro', not any('DISTINCT' in s for s in statements))
+
+        print('\n4. invalidação pela sincronização')
+        situacoes = {cod for cod, _ in capturado['situacoes']}
+        check('opções de situação do cache', 'CODIGO_NOVO' in situacoes and 'SITUACAO_DO_CRON' not in situacoes)
+        with app.app_context():
+            db.session.execute(insert(FapWebContestacao), [dict(linha(TOTAL + 1), situacao_codigo='SITUACAO_DO_CRON')])
+            db.session.commit()
+        cliente.get('/fap-panel/contestacoes')
+        check('sem invalidação segue em cache',
+              'SITUACAO_DO_CRON' not in {cod for cod, _ in capturado['situacoes']})
+        # O cron é outro processo: só o carimbo em disco chega aos workers web.
+        carimbo = os.path.join(TMP, 'uploads', 'fap_web_contestacoes', '1', fap_panel_filter_cache.STAMP_NAME)
+        os.makedirs(os.path.dirname(carimbo), exist_ok=True)
+        with open(carimbo, 'w') as fh:
+            fh.write('gravado-pelo-cron')
+        cliente.get('/fap-panel/contestacoes')
+        check('carimbo novo recarrega as opções',
+              'SITUACAO_DO_CRON' in {cod for cod, _ in capturado['situacoes']})
+        with app.test_request_context():
+            fap_panel_filter_cache.invalidate(1)
+        check('invalidate grava o carimbo', open(carimbo).read() != 'gravado-pelo-cron')
+        check('empresas e mapa de CNPJs', capturado['companies'] == [{'cnpj': '10000000', 'nome': 'Empresa'}]
+              and capturado['cnpjs_by_raiz']['10000000'] == ['10000000000000', '10000000000100', '10000000000200'])
+    finally:
+        fp.render_template = original_render
+        app.root_path = original_root
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    shutil.rmtree(TMP, ignore_errors=True)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
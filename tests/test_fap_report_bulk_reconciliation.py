@@ -0,0 +1,269 @@
+"""
+Reconciliação em massa da importação de relatório FAP (benefícios, CATs e massa
+salarial) contra linhas já gravadas.
+
+A importação pré-carrega candidatos, histórico de fonte e análises em lotes e
+grava o histórico em INSERTs multi-linha (_bulk_upsert_source_history). Este
+teste importa o mesmo relatório duas vezes e confere, linha a linha, o estado
+que o caminho antigo — uma consulta e um upsert por bloco — deixava:
+
+- benefício com fonte mais nova em outro relatório: dados não são sobrescritos,
+  mas o relatório entra no histórico e as análises são atualizadas;
+- benefício sem vigência gravada é adotado; vigência diferente cria outra linha;
+- NB repetido no PDF: o 2º bloco não sobrescreve o 1º e vira nova análise;
+- reimportação do mesmo relatório: nada aplicado, nada duplicado, ação
+  "updated" no histórico, sequências das análises preservadas;
+- CAT e massa salarial seguem a mesma regra de fonte mais nova.
+
+Executar:
+    uv run python tests/test_fap_report_bulk_reconciliation.py
+"""
+
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_bulk_reconciliation.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from app.services.fap_contestation_judgment_report_service import (  # noqa: E402
+    FapContestationJudgmentReportService,
+)
+
+FALHAS = []
+
+# Relatório importado: publicado em 10/03/2025, vigência 2025
+PUBLICACAO = datetime(2025, 3, 10)
+MAIS_NOVA = datetime(2025, 6, 1)     # fonte de outro relatório, posterior
+MAIS_VELHA = datetime(2024, 1, 1)    # fonte de outro relatório, anterior
+METADADOS = SimpleNamespace(validity_year='2025', publication_date='10/03/2025',
+                            transmission_datetime=None, establishment_cnpj=None)
+CNPJ_MASSA = '11222333000181'
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+def bloco(numero, tipo, status, just1, op1, just2=None, op2=None):
+    return {
+        'benefit_number': numero, 'benefit_type': tipo, 'raw_status': status,
+        'first_instance_status': status, 'first_instance_status_raw': status,
+        'first_instance_justification': just1, 'first_instance_opinion': op1,
+        'second_instance_status': status if just2 else None,
+        'second_instance_status_raw': status if just2 else None,
+        'second_instance_justification': just2, 'second_instance_opinion': op2,
+        'justification': just1, 'opinion': op1, 'decisions_summary': None,
+    }
+
+
+BENEFICIOS = [
+    bloco('1111111111', 'B94', 'Deferido', 'Just A', 'Op A', 'Just A2', 'Op A2'),
+    bloco('2222222222', 'B91', 'Indeferido', 'Just B', 'Op B'),
+    bloco('3333333333', 'B92', 'Deferido', 'Just C', 'Op C'),
+    bloco('3333333333', 'B93', 'Indeferido', 'Just C outra', 'Op C outra'),
+    bloco('4444444444', 'B91', 'Deferido', 'Just D', 'Op D'),
+    bloco('', 'B91', 'Deferido', 'sem número', 'sem número'),
+]
+CATS = [
+    {'benefit_number': 'CAT-1', 'raw_status': 'Deferido', 'first_instance_status': 'Deferido'},
+    {'benefit_number': 'CAT-2', 'raw_status': 'Deferido', 'first_instance_status': 'Deferido'},
+]
+MASSAS = [
+    {'employer_cnpj': '11.222.333/0001-81', 'competence': '2022', 'raw_status': 'Deferido'},
+    {'employer_cnpj': '11.222.333/0001-81', 'competence': '2023', 'raw_status': 'Deferido'},
+]
+
+
+def popular():
+    from app.models import (
+        Benefit, BenefitContestationDecision, BenefitFapSourceHistory, FapContestationCat,
+        FapContestationCatSourceHistory, FapContestationJudgmentReport, FapContestationPayrollMass,
+        FapContestationPayrollMassSourceHistory, LawFirm, User,
+    )
+    db.session.add_all([
+        LawFirm(id=1, name='Escritório', cnpj='00000000000191'),
+        LawFirm(id=2, name='Outro', cnpj='00000000000272'),
+        User(id=1, law_firm_id=1, name='Admin', email='a@b.c', password_hash='x', role='admin'),
+    ])
+    for rid in (1, 2, 9):
+        db.session.add(FapContestationJudgmentReport(
+            id=rid, user_id=1, law_firm_id=1, original_filename=f'rel{rid}.pdf', file_path=f'rel{rid}.pdf'))
+    criado = datetime(2025, 1, 1)
+    db.session.add_all([
+        Benefit(id=1, law_firm_id=1, benefit_number='1111111111', benefit_type='B91',
+                fap_vigencia_years='2025', status='pending', notes='antigo', created_at=criado),
+        Benefit(id=2, law_firm_id=1, benefit_number='2222222222', status='pending', created_at=criado),
+        Benefit(id=3, law_firm_id=1, benefit_number='4444444444', fap_vigencia_years='2023',
+                benefit_type='B31', created_at=criado),
+        Benefit(id=4, law_firm_id=2, benefit_number='3333333333', benefit_type='B31', created_at=criado),
+        FapContestationCat(id=1, law_firm_id=1, report_id=9, cat_number='CAT-1', status='pending',
+                           created_at=criado),
+        FapContestationPayrollMass(id=1, law_firm_id=1, report_id=9, employer_cnpj=CNPJ_MASSA,
+                                   competence='2022', status='pending', created_at=criado),
+    ])
+    db.session.flush()
+    db.session.add_all([
+        BenefitFapSourceHistory(law_firm_id=1, benefit_id=1, report_id=2, action='added',
+                                publication_datetime=MAIS_NOVA, created_at=criado),
+        BenefitFapSourceHistory(law_firm_id=1, benefit_id=2, report_id=1, action='added',
+                                publication_datetime=MAIS_VELHA, created_at=criado),
+        FapContestationCatSourceHistory(law_firm_id=1, cat_id=1, report_id=2, action='added',
+                                        publication_datetime=MAIS_NOVA, created_at=criado),
+        FapContestationPayrollMassSourceHistory(law_firm_id=1, payroll_mass_id=1, report_id=1, action='added',
+                                                publication_datetime=MAIS_VELHA, created_at=criado),
+        BenefitContestationDecision(
+            law_firm_id=1, benefit_id=1, report_id=2, instancia=1, sequence=0, status='Em análise',
+            justification='Just A', opinion='Op A', created_at=criado,
+            fingerprint=FapContestationJudgmentReportService._decision_fingerprint(1, 'Just A', 'Op A')),
+    ])
+    db.session.commit()
+
+
+def importar(servico):
+    from app.models import FapContestationJudgmentReport
+    relatorio = db.session.get(FapContestationJudgmentReport, 9)
+    contagens = (
+        servico._upsert_benefits_from_report(relatorio, BENEFICIOS, METADADOS),
+        servico._upsert_cats_from_report(relatorio, CATS, METADADOS),
+        servico._upsert_payroll_masses_from_report(relatorio, MASSAS, METADADOS),
+    )
+    db.session.commit()
+    db.session.expire_all()
+    return contagens
+
+
+def estado():
+    """Tudo o que a importação grava, em tuplas comparáveis."""
+    from app.models import (
+        Benefit, BenefitContestationDecision, BenefitFapSourceHistory, FapContestationCat,
+        FapContestationCatSourceHistory, FapContestationPayrollMass, FapContestationPayrollMassSourceHistory,
+    )
+    return {
+        'beneficios': [(b.id, b.law_firm_id, b.benefit_number, b.benefit_type, b.status,
+                        b.fap_vigencia_years, b.first_instance_justification)
+                       for b in Benefit.query.order_by(Benefit.id)],
+        'historico': [(h.benefit_id, h.report_id, h.action, h.publication_datetime)
+                      for h in BenefitFapSourceHistory.query.order_by(
+                          BenefitFapSourceHistory.benefit_id, BenefitFapSourceHistory.report_id)],
+        'analises': [(d.benefit_id, d.instancia, d.sequence, d.report_id, d.status, d.justification)
+                     for d in BenefitContestationDecision.query.order_by(
+                         BenefitContestationDecision.benefit_id, BenefitContestationDecision.instancia,
+                         BenefitContestationDecision.sequence)],
+        'cats': [(c.id, c.cat_number, c.status, c.vigencia_year)
+                 for c in FapContestationCat.query.order_by(FapContestationCat.id)],
+        'historico_cats': [(h.cat_id, h.report_id, h.action)
+                           for h in FapContestationCatSourceHistory.query.order_by(
+                               FapContestationCatSourceHistory.cat_id, FapContestationCatSourceHistory.report_id)],
+        'massas': [(m.id, m.competence, m.status, m.vigencia_year)
+                   for m in FapContestationPayrollMass.query.order_by(FapContestationPayrollMass.id)],
+        'historico_massas': [(h.payroll_mass_id, h.report_id, h.action)
+                             for h in FapContestationPayrollMassSourceHistory.query.order_by(
+                                 FapContestationPayrollMassSourceHistory.payroll_mass_id,
+                                 FapContestationPayrollMassSourceHistory.report_id)],
+    }
+
+
+def main():
+    with app.app_context():
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        popular()
+        servico = FapContestationJudgmentReportService(app)
+
+        # Estado que o caminho por bloco deixava. Benefícios: 5 = NB 3333333333
+        # (novo; o do outro escritório não é adotado), 6 = NB 4444444444 na
+        # vigência 2025 (a linha 3 é de 2023).
+        beneficios = [
+            (1, 1, '1111111111', 'B91', 'pending', '2025', None),       # fonte mais nova: intacto
+            (2, 1, '2222222222', 'B91', 'rejected', '2025', 'Just B'),  # sem vigência: adotado
+            (3, 1, '4444444444', 'B31', 'pending', '2023', None),
+            (4, 2, '3333333333', 'B31', 'pending', None, None),
+            (5, 1, '3333333333', 'B92', 'approved', '2025', 'Just C'),  # 2º bloco não sobrescreve
+            (6, 1, '4444444444', 'B91', 'approved', '2025', 'Just D'),
+        ]
+        analises = [
+            (1, 1, 0, 9, 'Deferido', 'Just A'),        # mesma análise: atualizada, não duplicada
+            (1, 2, 0, 9, 'Deferido', 'Just A2'),
+            (2, 1, 0, 9, 'Indeferido', 'Just B'),
+            (5, 1, 0, 9, 'Deferido', 'Just C'),
+            (5, 1, 1, 9, 'Indeferido', 'Just C outra'),
+            (6, 1, 0, 9, 'Deferido', 'Just D'),
+        ]
+        cats = [(1, 'CAT-1', 'pending', None), (2, 'CAT-2', 'approved', '2025')]
+        massas = [(1, '2022', 'approved', '2025'), (2, '2023', 'approved', '2025')]
+
+        def historico(acao_novos):
+            return [
+                (1, 2, 'added', MAIS_NOVA), (1, 9, 'updated', PUBLICACAO),
+                (2, 1, 'added', MAIS_VELHA), (2, 9, 'updated', PUBLICACAO),
+                # NB repetido: a 2ª aparição já encontra a linha, vale "updated"
+                (5, 9, 'updated', PUBLICACAO), (6, 9, acao_novos, PUBLICACAO),
+            ]
+
+        print('\n1. primeira importação')
+        contagens = importar(servico)
+        primeira = estado()
+        check('aplicados: 3 benefícios, 1 CAT, 2 massas', contagens == (3, 1, 2), contagens)
+        check('benefícios', primeira['beneficios'] == beneficios, primeira['beneficios'])
+        check('fonte mais nova em outro relatório não é sobrescrita',
+              primeira['beneficios'][0] == beneficios[0])
+        check('histórico de fonte', primeira['historico'] == historico('added'), primeira['historico'])
+        check('análises', primeira['analises'] == analises, primeira['analises'])
+        check('CATs: a de fonte mais nova fica como estava', primeira['cats'] == cats, primeira['cats'])
+        check('histórico das CATs', primeira['historico_cats'] == [(1, 2, 'added'), (1, 9, 'updated'),
+                                                                   (2, 9, 'added')], primeira['historico_cats'])
+        check('massas salariais', primeira['massas'] == massas, primeira['massas'])
+        check('histórico das massas', primeira['historico_massas'] == [(1, 1, 'added'), (1, 9, 'updated'),
+                                                                       (2, 9, 'added')],
+              primeira['historico_massas'])
+
+        print('\n2. o mesmo relatório de novo')
+        tamanho_lote = FapContestationJudgmentReportService._BULK_CHUNK_SIZE
+        FapContestationJudgmentReportService._BULK_CHUNK_SIZE = 2  # força vários lotes e INSERTs
+        try:
+            contagens = importar(servico)
+        finally:
+            FapContestationJudgmentReportService._BULK_CHUNK_SIZE = tamanho_lote
+        segunda = estado()
+        check('nada aplicado: o relatório não é mais novo que ele mesmo', contagens == (0, 0, 0), contagens)
+        check('benefícios iguais, nenhum duplicado', segunda['beneficios'] == beneficios, segunda['beneficios'])
+        check('histórico sem linha nova, ação "updated"', segunda['historico'] == historico('updated'),
+              segunda['historico'])
+        check('análises iguais, mesmas sequências', segunda['analises'] == analises, segunda['analises'])
+        check('CATs iguais', segunda['cats'] == cats)
+        check('histórico das CATs: "updated"', segunda['historico_cats'] == [(1, 2, 'added'), (1, 9, 'updated'),
+                                                                             (2, 9, 'updated')],
+              segunda['historico_cats'])
+        check('massas iguais', segunda['massas'] == massas)
+        check('histórico das massas: "updated"',
+              segunda['historico_massas'] == [(1, 1, 'added'), (1, 9, 'updated'), (2, 9, 'updated')],
+              segunda['historico_massas'])
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -142,6 +142,28 @@ def main():
         check('o próprio escritório encontra o seu',
               achado is not None and achado.id == 30)
 
+        # ── reconciliação em massa ───────────────────────────────────────
+        print('\n5. pré-carga em lote escolhe a mesma linha que a busca por NB')
+        numeros = ['6316257396', '1879727398', '6371831651', '6380574283',
+                   '6386065550', '9999999999', '8888888888', '7777777777', 'NAO_EXISTE']
+        anos = [None, '2019', '2020', '2022', '2024', '2025']
+        tamanho_lote = FapContestationJudgmentReportService._BULK_CHUNK_SIZE
+        FapContestationJudgmentReportService._BULK_CHUNK_SIZE = 2  # força vários lotes IN (...)
+        try:
+            candidatos = servico._prefetch_benefit_candidates(1, numeros)
+        finally:
+            FapContestationJudgmentReportService._BULK_CHUNK_SIZE = tamanho_lote
+        check('não carrega benefício de outro escritório',
+              '7777777777' not in candidatos)
+        divergencias = []
+        for numero in numeros:
+            for ano in anos:
+                esperado = procura(numero, ano)
+                obtido = servico._select_benefit_candidate(candidatos.get(numero, []), ano)
+                if (esperado.id if esperado else None) != (obtido.id if obtido else None):
+                    divergencias.append((numero, ano))
+        check('mesma escolha para todo NB × vigência', not divergencias, divergencias)
+
     print('\n' + '=' * 62)
     print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
     if os.path.exists(DB_FILE):
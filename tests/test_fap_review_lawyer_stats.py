@@ -0,0 +1,461 @@
+"""
+Estatísticas por advogado do Revisor FAP pré-computadas (tela de score e MCP).
+
+A tela decodificava o ``result_json`` de TODA revisão do escritório a cada
+visita (duas vezes, na verdade: a segunda para a reincidência). Agora cada
+revisão grava uma linha em ``fap_review_execution_stats`` ao concluir e o
+agregado por advogado (``fap_review_lawyer_stats``) só é refeito para quem
+teve revisão nova ou alterada.
+
+Verifica, contra o algoritmo anterior (mantido aqui como oráculo):
+1. primeira leitura (backfill preguiçoso) = mesmos números;
+2. segunda leitura não lê result_json nem refaz agregado;
+3. revisão nova registrada na conclusão refaz só o agregado do seu advogado,
+   e a leitura seguinte não refaz nada nem mexe na transação do request;
+4. resultado alterado depois do cálculo (reprocesso) é recalculado;
+5. tempo: algoritmo anterior x leitura fria x leitura quente.
+
+Executar:
+    uv run python tests/test_fap_review_lawyer_stats.py
+    uv run python tests/test_fap_review_lawyer_stats.py --revisions 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_lawyer_stats.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from sqlalchemy import event  # noqa: E402
+
+from app.models import (  # noqa: E402
+    FapReviewExecution, FapReviewExecutionStats, FapReviewLawyerStats,
+    FapReviewPetition, LawFirm, User,
+)
+from app.services.fap_review_service import (  # noqa: E402
+    build_finding_fingerprint, build_lawyer_statistics, calculate_lawyer_score,
+    load_execution_result_payload, normalize_finding_severity,
+    record_execution_statistics, translate_finding_category, translate_user_role,
+)
+
+FALHAS = []
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+# ── oráculo: o algoritmo anterior, sem alteração ─────────────────────────
+
+
+def legacy_build_lawyer_statistics(law_firm_id: int) -> dict:
+    """Algoritmo anterior (decodifica o result_json de toda revisão a cada leitura) — oráculo."""
+    revisions = FapReviewExecution.query.filter_by(
+        law_firm_id=law_firm_id,
+        execution_type='revision',
+    ).order_by(
+        FapReviewExecution.created_at.asc(),
+        FapReviewExecution.id.asc(),
+    ).all()
+
+    lawyer_stats: dict[int, dict] = {}
+    petition_user_groups: dict[tuple[int, int], list[FapReviewExecution]] = defaultdict(list)
+
+    for execution in revisions:
+        if not execution.user_id or not execution.user:
+            continue
+
+        stats = lawyer_stats.setdefault(execution.user_id, {
+            'user': execution.user,
+            'total_revisions': 0,
+            'completed_revisions': 0,
+            'petitions': set(),
+            'petition_history': {},
+            'total_findings': 0,
+            'critical_findings': 0,
+            'moderate_findings': 0,
+            'formal_findings': 0,
+            'repeated_findings': 0,
+            'categories': Counter(),
+            'monthly': defaultdict(lambda: {'revisions': 0, 'findings': 0, 'repeated_findings': 0}),
+        })
+
+        stats['total_revisions'] += 1
+        if execution.petition_id:
+            stats['petitions'].add(execution.petition_id)
+            petition_user_groups[(execution.user_id, execution.petition_id)].append(execution)
+
+        month_key = (execution.created_at or execution.updated_at or datetime.now()).strftime('%Y-%m')
+        stats['monthly'][month_key]['revisions'] += 1
+
+        payload = load_execution_result_payload(execution)
+        findings = payload.get('findings') or []
+        if execution.status == 'completed':
+            stats['completed_revisions'] += 1
+
+        petition_key = execution.petition_id or execution.id
+        petition_title = execution.petition.title if execution.petition else (execution.main_document_filename or 'Petição')
+        petition_identifier = (
+            execution.petition.office_document_identifier
+            if execution.petition and execution.petition.office_document_identifier
+            else (execution.law_firm_document_identifier or '-')
+        )
+        petition_history = stats['petition_history'].setdefault(petition_key, {
+            'petition_id': execution.petition_id,
+            'title': petition_title,
+            'identifier': petition_identifier,
+            'revision_count': 0,
+            'latest_revision_number': 0,
+            'latest_status': execution.status,
+            'latest_at': execution.created_at or execution.updated_at,
+            'total_findings': 0,
+            'repeated_findings': 0,
+            'categories': Counter(),
+        })
+        petition_history['revision_count'] += 1
+        petition_history['latest_revision_number'] = max(
+            petition_history['latest_revision_number'],
+            execution.revision_number or petition_history['revision_count'],
+        )
+        petition_history['latest_status'] = execution.status
+        petition_history['latest_at'] = execution.created_at or execution.updated_at
+
+        for finding in findings:
+            severity = normalize_finding_severity(finding.get('severity'))
+            category = translate_finding_category(finding.get('category') or 'SEM_CATEGORIA')
+
+            stats['total_findings'] += 1
+            petition_history['total_findings'] += 1
+            stats['categories'][category] += 1
+            petition_history['categories'][category] += 1
+            stats['monthly'][month_key]['findings'] += 1
+
+            if severity == 'CRÍTICO':
+                stats['critical_findings'] += 1
+            elif severity == 'MODERADO':
+                stats['moderate_findings'] += 1
+            else:
+                stats['formal_findings'] += 1
+
+    for (user_id, petition_id), grouped_revisions in petition_user_groups.items():
+        if petition_id is None:
+            continue
+
+        seen_fingerprints: set[str] = set()
+        for execution in sorted(grouped_revisions, key=lambda item: ((item.revision_number or 0), item.created_at or datetime.now(), item.id)):
+            payload = load_execution_result_payload(execution)
+            findings = payload.get('findings') or []
+            month_key = (execution.created_at or execution.updated_at or datetime.now()).strftime('%Y-%m')
+            petition_key = execution.petition_id or execution.id
+            petition_history = lawyer_stats[user_id]['petition_history'].get(petition_key)
+
+            for finding in findings:
+                fingerprint = build_finding_fingerprint(finding)
+                if not fingerprint:
+                    continue
+                if fingerprint in seen_fingerprints:
+                    lawyer_stats[user_id]['repeated_findings'] += 1
+                    lawyer_stats[user_id]['monthly'][month_key]['repeated_findings'] += 1
+                    if petition_history:
+                        petition_history['repeated_findings'] += 1
+                seen_fingerprints.add(fingerprint)
+
+    lawyers: list[dict] = []
+    total_findings_overall = 0
+    total_repeated_overall = 0
+
+    for stats in lawyer_stats.values():
+        petitions_count = len(stats['petitions'])
+        rework_petitions = sum(
+            1 for petition_data in stats['petition_history'].values()
+            if petition_data['revision_count'] > 1
+        )
+        completed_revisions = stats['completed_revisions'] or 0
+        total_findings = stats['total_findings'] or 0
+        repeated_findings = stats['repeated_findings'] or 0
+        recurrence_rate = (repeated_findings / total_findings) if total_findings else 0.0
+        rework_ratio = (rework_petitions / petitions_count) if petitions_count else 0.0
+        avg_findings_per_revision = (total_findings / completed_revisions) if completed_revisions else 0.0
+
+        monthly_trend = []
+        for month_key in sorted(stats['monthly'].keys())[-6:]:
+            month_metrics = stats['monthly'][month_key]
+            monthly_trend.append({
+                'month_key': month_key,
+                'label': f"{month_key[5:7]}/{month_key[0:4]}",
+                'revisions': month_metrics['revisions'],
+                'findings': month_metrics['findings'],
+                'repeated_findings': month_metrics['repeated_findings'],
+            })
+
+        petition_history_rows = []
+        for petition_data in stats['petition_history'].values():
+            top_category = petition_data['categories'].most_common(1)
+            petition_history_rows.append({
+                **petition_data,
+                'top_category': top_category[0][0] if top_category else '-',
+            })
+
+        petition_history_rows.sort(
+            key=lambda item: (item['revision_count'], item['latest_at'] or datetime.now()),
+            reverse=True,
+        )
+
+        total_findings_overall += total_findings
+        total_repeated_overall += repeated_findings
+
+        lawyers.append({
+            'user_id': stats['user'].id,
+            'name': stats['user'].name,
+            'role': translate_user_role(stats['user'].role),
+            'score': calculate_lawyer_score(total_findings, completed_revisions, rework_ratio, recurrence_rate),
+            'total_revisions': stats['total_revisions'],
+            'completed_revisions': completed_revisions,
+            'petitions_count': petitions_count,
+            'rework_petitions': rework_petitions,
+            'rework_ratio': rework_ratio,
+            'total_findings': total_findings,
+            'critical_findings': stats['critical_findings'],
+            'moderate_findings': stats['moderate_findings'],
+            'formal_findings': stats['formal_findings'],
+            'repeated_findings': repeated_findings,
+            'recurrence_rate': recurrence_rate,
+            'avg_findings_per_revision': avg_findings_per_revision,
+            'top_categories': stats['categories'].most_common(5),
+            'petition_history': petition_history_rows,
+            'monthly_trend': monthly_trend,
+        })
+
+    lawyers.sort(
+        key=lambda item: (-item['score'], item['recurrence_rate'], item['avg_findings_per_revision'], item['name'].lower()),
+    )
+
+    for index, lawyer in enumerate(lawyers, start=1):
+        lawyer['rank'] = index
+
+    overview = {
+        'total_lawyers': len(lawyers),
+        'total_revisions': len(revisions),
+        'total_findings': total_findings_overall,
+        'repeated_findings': total_repeated_overall,
+        'recurrence_rate': (total_repeated_overall / total_findings_overall) if total_findings_overall else 0.0,
+    }
+
+    return {
+        'overview': overview,
+        'lawyers': lawyers,
+    }
+
+
+# ── massa sintética ──────────────────────────────────────────────────────
+
+CATEGORIAS = ['CAT-1', 'CAT-2', 'CAT_3', 'FORMAL', 'Fundamentação', None]
+SEVERIDADES = ['CRITICAL', 'moderado', 'FORMAL', 'formal', None, 'CRÍTICO']
+
+
+def _achado(rng):
+    return {
+        'category': rng.choice(CATEGORIAS),
+        'severity': rng.choice(SEVERIDADES),
+        'description': f'Achado {rng.randint(1, 25)}',
+        'location': f'Seção {rng.randint(1, 4)}',
+        'correction': 'Ajustar',
+    }
+
+
+def _resultado(rng):
+    return json.dumps({
+        'summary': 'x' * 2000,  # o result_json real é grande; o custo era decodificá-lo
+        'findings': [_achado(rng) for _ in range(rng.randint(0, 12))],
+    }, ensure_ascii=False)
+
+
+def semear(total_revisoes, rng):
+    db.session.add(LawFirm(id=1, name='Escritório', cnpj='00000000000191'))
+    db.session.add(LawFirm(id=2, name='Outro', cnpj='00000000000272'))
+    usuarios = []
+    for i in range(1, 9):
+        usuarios.append(User(id=i, law_firm_id=1, name=f'Advogado {i:02d}', email=f'adv{i}@x.com',
+                             password_hash='x', role=rng.choice(['lawyer', 'admin', 'assistant'])))
+    usuarios.append(User(id=50, law_firm_id=2, name='Outro escritório', email='o@x.com', password_hash='x'))
+    db.session.add_all(usuarios)
+    peticoes = [
+        FapReviewPetition(id=i, law_firm_id=1, created_by_id=1, office_document_identifier=f'DOC-{i}',
+                          title=f'Petição {i}')
+        for i in range(1, max(2, total_revisoes // 6))
+    ]
+    db.session.add_all(peticoes)
+    db.session.flush()
+
+    inicio = datetime(2025, 1, 1)
+    revisoes_por_peticao = defaultdict(int)
+    mappings = []
+    for i in range(total_revisoes):
+        peticao_id = rng.choice(peticoes).id if rng.random() < 0.9 else None
+        revisao = None
+        if peticao_id:
+            revisoes_por_peticao[peticao_id] += 1
+            revisao = revisoes_por_peticao[peticao_id]
+        status = rng.choices(['completed', 'failed', 'processing'], [0.85, 0.1, 0.05])[0]
+        quando = inicio + timedelta(hours=i * 3)
+        mappings.append({
+            'law_firm_id': 1,
+            'user_id': rng.randint(1, 8),
+            'petition_id': peticao_id,
+            'execution_type': 'revision',
+            'status': status,
+            'revision_number': revisao,
+            'main_document_filename': f'arquivo_{i}.docx',
+            'law_firm_document_identifier': rng.choice([None, f'LF-{i}']),
+            'result_json': _resultado(rng) if status == 'completed' else None,
+            'created_at': quando,
+            'updated_at': quando,
+        })
+    mappings.append({
+        'law_firm_id': 2, 'user_id': 50, 'execution_type': 'revision', 'status': 'completed',
+        'result_json': _resultado(rng), 'created_at': inicio, 'updated_at': inicio,
+    })
+    db.session.bulk_insert_mappings(FapReviewExecution, mappings)
+    db.session.commit()
+
+
+class ContadorSQL:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def le_resultado(self):
+        return any('result_json' in s and s.lstrip().upper().startswith('SELECT') for s in self.statements)
+
+
+def medir(funcao):
+    db.session.expire_all()
+    inicio = time.perf_counter()
+    resultado = funcao(1)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--revisions', type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(20261019)
+
+    with app.app_context():
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        semear(args.revisions, rng)
+
+        print(f'\n1. primeira leitura ({args.revisions} revisões, sem estatística gravada)')
+        esperado, t_legado = medir(legacy_build_lawyer_statistics)
+        obtido, t_frio = medir(build_lawyer_statistics)
+        check('mesmos números do algoritmo anterior', obtido == esperado)
+        check('grava uma linha de estatística por revisão do escritório',
+              FapReviewExecutionStats.query.filter_by(law_firm_id=1).count() == args.revisions)
+        check('não mistura o outro escritório',
+              FapReviewExecutionStats.query.filter_by(law_firm_id=2).count() == 0
+              and all(l['user_id'] != 50 for l in obtido['lawyers']))
+        check('um agregado por advogado', FapReviewLawyerStats.query.filter_by(law_firm_id=1).count() == 8)
+
+        print('\n2. segunda leitura (tudo pré-computado)')
+        contador = ContadorSQL()
+        event.listen(db.engine, 'before_cursor_execute', contador)
+        refeitos_antes = {r.user_id: r.refreshed_at for r in FapReviewLawyerStats.query.all()}
+        obtido, t_quente = medir(build_lawyer_statistics)
+        event.remove(db.engine, 'before_cursor_execute', contador)
+        db.session.expire_all()
+        check('mesmos números', obtido == esperado)
+        check('não lê result_json', not contador.le_resultado())
+        check('não refaz nenhum agregado',
+              refeitos_antes == {r.user_id: r.refreshed_at for r in FapReviewLawyerStats.query.all()})
+        check(f'poucas consultas ({len(contador.statements)})', len(contador.statements) <= 8)
+
+        print('\n3. revisão nova registrada na conclusão')
+        autor = 3
+        refeitos_antes = {r.user_id: r.refreshed_at for r in FapReviewLawyerStats.query.all()}
+        anterior = FapReviewExecution.query.filter_by(user_id=autor, status='completed').filter(
+            FapReviewExecution.petition_id.isnot(None)).first()
+        repetida = json.loads(anterior.result_json)['findings']
+        nova = FapReviewExecution(
+            law_firm_id=1, user_id=autor, petition_id=anterior.petition_id, execution_type='revision',
+            status='completed', revision_number=999, main_document_filename='nova.docx',
+            result_json=json.dumps({'findings': repetida + [_achado(rng)]}, ensure_ascii=False),
+            created_at=datetime(2030, 1, 1),
+        )
+        db.session.add(nova)
+        db.session.flush()
+        record_execution_statistics(nova)
+        db.session.commit()
+        refeitos = {r.user_id for r in FapReviewLawyerStats.query.all() if refeitos_antes.get(r.user_id) != r.refreshed_at}
+        check('conclusão refaz só o agregado do autor', refeitos == {autor}, refeitos)
+        refeitos_antes = {r.user_id: r.refreshed_at for r in FapReviewLawyerStats.query.all()}
+        esperado = legacy_build_lawyer_statistics(1)
+        contador = ContadorSQL()
+        event.listen(db.engine, 'before_cursor_execute', contador)
+        transacao = []
+        commit_original, rollback_original = db.session.commit, db.session.rollback
+        db.session.commit = lambda: transacao.append('commit')
+        db.session.rollback = lambda: transacao.append('rollback')
+        try:
+            obtido = build_lawyer_statistics(1)
+        finally:
+            db.session.commit, db.session.rollback = commit_original, rollback_original
+        event.remove(db.engine, 'before_cursor_execute', contador)
+        db.session.expire_all()
+        check('mesmos números (inclui a reincidência da revisão nova)', obtido == esperado)
+        check('não lê result_json (estatística gravada na conclusão)', not contador.le_resultado())
+        check('leitura não refaz o agregado gravado na conclusão',
+              refeitos_antes == {r.user_id: r.refreshed_at for r in FapReviewLawyerStats.query.all()})
+        check('leitura não faz commit nem rollback na sessão do request', transacao == [], transacao)
+
+        print('\n4. resultado alterado depois do cálculo (reprocesso)')
+        alvo = FapReviewExecution.query.filter_by(user_id=5, status='completed').first()
+        alvo.result_json = json.dumps({'findings': [_achado(rng) for _ in range(30)]})
+        alvo.updated_at = datetime.now() + timedelta(seconds=1)
+        db.session.commit()
+        esperado = legacy_build_lawyer_statistics(1)
+        obtido = build_lawyer_statistics(1)
+        check('mesmos números após o reprocesso', obtido == esperado)
+        linha = FapReviewExecutionStats.query.filter_by(execution_id=alvo.id).first()
+        check('linha da execução recalculada', linha.total_findings == 30, linha.total_findings)
+
+        print('\n5. tempo')
+        print(f'  algoritmo anterior : {t_legado * 1000:8.1f} ms')
+        print(f'  leitura fria       : {t_frio * 1000:8.1f} ms  (backfill preguiçoso)')
+        print(f'  leitura quente     : {t_quente * 1000:8.1f} ms')
+        check('leitura quente mais rápida que o algoritmo anterior', t_quente < t_legado)
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Gravação em lote das contestações do cron do FAP
+(persist_contestacoes_for_company em scripts/fap_sync_cron.py).
+
+Confere, num SQLite temporário:
+- contagem de criadas/atualizadas por ano e histórico igual ao da gravação
+  item a item (created / updated com campos, valores antigos e novos);
+- contestação repetida no mesmo lote e entre anos;
+- needs_reprocess só para contestação já importada que mudou;
+- número de comandos SQL constante, não proporcional aos itens.
+
+Executar:
+    uv run python tests/test_fap_sync_bulk_persist.py
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_fap_sync_bulk.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from sqlalchemy import event  # noqa: E402
+
+import fap_sync_cron  # noqa: E402
+
+fap_sync_cron._log = lambda msg: None
+
+FALHAS = []
+CNPJ = '12345678000195'
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+def item(cid, situacao='EM_ANDAMENTO', protocolo=None, deferimento=None):
+    data = {
+        'id': cid,
+        'cnpj': CNPJ,
+        'instancia': {'codigo': 'ADMINISTRATIVO_PRIMEIRA_INSTANCIA', 'descricao': '1ª instância'},
+        'situacao': {'codigo': situacao, 'descricao': situacao.title()},
+        'protocolo': protocolo or f'P{cid}',
+        'dataTransmissao': '2024-03-05T10:20:30Z',
+        'dataDOU': '2024-06-01',
+    }
+    if deferimento:
+        data['deferimento'] = {'descricao': deferimento}
+    return data
+
+
+def persist(models, company, fetched):
+    FapWebContestacao, History, Imported = models
+    return fap_sync_cron.persist_contestacoes_for_company(
+        db, FapWebContestacao, History, Imported, 1, company, fetched,
+    )
+
+
+def main():
+    with app.app_context():
+        from app.models import (
+            LawFirm, FapWebContestacao, FapWebContestacaoChangeHistory, FapAutoImportedContestacao,
+        )
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        db.session.add(LawFirm(id=1, name='Escritório', cnpj='00000000000191'))
+        db.session.commit()
+        models = (FapWebContestacao, FapWebContestacaoChangeHistory, FapAutoImportedContestacao)
+        company = SimpleNamespace(id=7, cnpj=CNPJ)
+
+        print('\n1. primeira sincronização')
+        stats = persist(models, company, {2023: [item(100), item(101)]})
+        check('2 criadas', (stats['created'], stats['updated']) == (2, 0), stats)
+        # report_id sem relatório: o SQLite do teste não confere FK
+        db.session.add(FapAutoImportedContestacao(law_firm_id=1, report_id=1, contestacao_id=100,
+                                                  cnpj=CNPJ, year=2023))
+        db.session.commit()
+
+        print('\n2. mudanças, repetidos e anos')
+        fetched = {
+            2023: [
+                item(100, situacao='PUBLICADA', deferimento='Deferido'),
+                item(101),
+                item(102),
+                item(102, protocolo='P102-B'),
+                {'id': None},
+            ],
+            2024: [item(103), item(100, situacao='PUBLICADA', deferimento='Deferido')],
+        }
+        stats = persist(models, company, fetched)
+        check('contagem: 2 criadas, 4 atualizadas', (stats['created'], stats['updated']) == (2, 4), stats)
+
+        rows = {r.contestacao_id: r for r in FapWebContestacao.query.all()}
+        check('4 contestações, sem duplicar', sorted(rows) == [100, 101, 102, 103], sorted(rows))
+        check('última ocorrência vence', rows[102].protocolo == 'P102-B' and rows[100].ano_vigencia == 2024)
+        check('deferimento e raw_data atualizados', rows[100].deferimento_descricao == 'Deferido'
+              and json.loads(rows[100].raw_data)['situacao']['codigo'] == 'PUBLICADA')
+        check('needs_reprocess só na importada que mudou',
+              rows[100].needs_reprocess and not any(rows[c].needs_reprocess for c in (101, 102, 103)))
+        check('datas convertidas', rows[103].data_transmissao == datetime(2024, 3, 5, 10, 20, 30)
+              and rows[103].data_dou_date.isoformat() == '2024-06-01')
+
+        history = (FapWebContestacaoChangeHistory.query
+                   .order_by(FapWebContestacaoChangeHistory.id).all())
+        resumo = [(h.contestacao_id, h.change_type, json.loads(h.changed_fields)) for h in history]
+        esperado = [
+            (100, 'created', sorted(fap_sync_cron.CONTESTACAO_TRACKED_FIELDS)),
+            (101, 'created', sorted(fap_sync_cron.CONTESTACAO_TRACKED_FIELDS)),
+            (100, 'updated', ['situacao_codigo', 'situacao_descricao']),
+            (102, 'created', sorted(fap_sync_cron.CONTESTACAO_TRACKED_FIELDS)),
+            (102, 'updated', ['protocolo']),
+            (103, 'created', sorted(fap_sync_cron.CONTESTACAO_TRACKED_FIELDS)),
+            (100, 'updated', ['ano_vigencia']),
+        ]
+        check('histórico na ordem dos itens', resumo == esperado, resumo)
+        check('histórico aponta para a linha certa',
+              all(h.contestacao_db_id == rows[h.contestacao_id].id for h in history))
+        mudanca = history[2]
+        check('valores antigos e novos', json.loads(mudanca.old_values)['situacao_codigo'] == 'EM_ANDAMENTO'
+              and json.loads(mudanca.new_values)['situacao_codigo'] == 'PUBLICADA')
+        check('sem histórico para contestação inalterada',
+              sum(1 for h in history if h.contestacao_id == 101) == 1)
+
+        print('\n3. comandos SQL não crescem com o número de itens')
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            persist(models, company, {2025: [item(cid) for cid in range(1000, 1300)]})
+            novos = len(statements)
+            statements.clear()
+            persist(models, company, {2025: [item(cid, situacao='PUBLICADA') for cid in range(1000, 1300)]})
+            atualizados = len(statements)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        check('300 novas em poucos comandos', novos <= 10, novos)
+        check('300 atualizadas em poucos comandos', atualizados <= 10, atualizados)
+        check('300 históricos de atualização',
+              FapWebContestacaoChangeHistory.query.filter_by(change_type='updated', ano_vigencia=2025).count() == 300)
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Sincronização delta do cron do FAP: impressão digital por listagem
+(empresa × ano de vigência) e "hot set" de listagens consultadas a cada
+execução (scripts/fap_sync_cron.py).
+
+Confere, num SQLite temporário:
+- a impressão não muda com a ordem dos itens e muda com o conteúdo;
+- listagem igual à da execução anterior pula o diff (sem histórico, poucos
+  comandos SQL) e só renova o last_synced_at;
+- listagem alterada passa pelo diff e atualiza a impressão;
+- linha apagada do banco força o diff mesmo com a impressão igual;
+- full=True refaz o diff de tudo;
+- quentes (aberta, recente, nunca vista) sempre; frias só após o intervalo.
+
+Executar:
+    uv run python tests/test_fap_sync_delta.py
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_fap_sync_delta.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from sqlalchemy import event  # noqa: E402
+
+import fap_sync_cron  # noqa: E402
+
+fap_sync_cron._log = lambda msg: None
+
+FALHAS = []
+CNPJ = '12345678000195'
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+def item(cid, situacao='PUBLICADA'):
+    return {
+        'id': cid,
+        'cnpj': CNPJ,
+        'instancia': {'codigo': 'ADMINISTRATIVO_PRIMEIRA_INSTANCIA', 'descricao': '1ª instância'},
+        'situacao': {'codigo': situacao, 'descricao': situacao.title()},
+        'protocolo': f'P{cid}',
+        'dataTransmissao': '2024-03-05T10:20:30Z',
+    }
+
+
+def main():
+    print('\n1. impressão digital')
+    itens = [item(1), item(2, 'EM_ANDAMENTO'), item(3)]
+    digest, count, has_open = fap_sync_cron.listing_fingerprint(itens)
+    check('ordem dos itens não importa', fap_sync_cron.listing_fingerprint(itens[::-1])[0] == digest)
+    check('conteúdo importa', fap_sync_cron.listing_fingerprint([item(1), item(2), item(3)])[0] != digest)
+    check('contagem e instância em aberto', count == 3 and has_open)
+    check('tudo publicado → fechada', not fap_sync_cron.listing_fingerprint([item(1)])[2])
+
+    with app.app_context():
+        from app.models import (
+            LawFirm, FapWebContestacao, FapWebContestacaoChangeHistory, FapAutoImportedContestacao,
+            FapWebContestacaoListingFingerprint as Fingerprint,
+        )
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        db.session.add(LawFirm(id=1, name='Escritório', cnpj='00000000000191'))
+        db.session.commit()
+        company = SimpleNamespace(id=7, cnpj=CNPJ)
+
+        def persist(fetched, full=False):
+            return fap_sync_cron.persist_contestacoes_for_company(
+                db, FapWebContestacao, FapWebContestacaoChangeHistory, FapAutoImportedContestacao,
+                1, company, fetched, Fingerprint, full=full,
+            )
+
+        def historico():
+            return FapWebContestacaoChangeHistory.query.count()
+
+        print('\n2. primeira execução')
+        listagem_2020 = [item(cid) for cid in range(100, 400)]
+        stats = persist({2020: listagem_2020, 2021: [item(500, 'EM_ANDAMENTO')], 2022: []})
+        check('3 listagens novas', stats['listings_new'] == 3 and stats['created'] == 301, stats)
+        fps = {fp.ano_vigencia: fp for fp in Fingerprint.query.all()}
+        check('impressão gravada por ano', sorted(fps) == [2020, 2021, 2022]
+              and fps[2020].item_count == 300 and fps[2022].item_count == 0)
+        check('has_open por listagem', fps[2021].has_open and not fps[2020].has_open)
+
+        print('\n3. listagem inalterada')
+        antes = historico()
+        linha = FapWebContestacao.query.filter_by(contestacao_id=150).one()
+        sincronizada = linha.last_synced_at
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            stats = persist({2020: listagem_2020[::-1]})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        check('diff pulado', stats['listings_skipped'] == 1 and stats['updated'] == 0, stats)
+        check('nenhum histórico novo', historico() == antes)
+        check('poucos comandos SQL', len(statements) <= 4, len(statements))
+        db.session.expire_all()
+        linha = FapWebContestacao.query.filter_by(contestacao_id=150).one()
+        check('last_synced_at renovado', linha.last_synced_at > sincronizada)
+
+        print('\n4. listagem alterada')
+        alterada = listagem_2020[:-1] + [item(399, 'EM_ANDAMENTO')]
+        stats = persist({2020: alterada, 2021: [item(500, 'EM_ANDAMENTO')]})
+        check('uma alterada, uma pulada', stats['listings_changed'] == 1 and stats['listings_skipped'] == 1, stats)
+        check('histórico só da mudança', historico() == antes + 1)
+        fp = Fingerprint.query.filter_by(ano_vigencia=2020).one()
+        check('impressão e has_open atualizados',
+              fp.payload_hash == fap_sync_cron.listing_fingerprint(alterada)[0] and fp.has_open)
+
+        print('\n5. linha apagada e sincronização completa')
+        FapWebContestacao.query.filter_by(contestacao_id=500).delete()
+        db.session.commit()
+        stats = persist({2021: [item(500, 'EM_ANDAMENTO')]})
+        check('linha apagada → diff recria', stats['created'] == 1 and stats['listings_skipped'] == 0, stats)
+        stats = persist({2020: alterada}, full=True)
+        check('full=True refaz o diff', stats['listings_changed'] == 1 and stats['updated'] == 300, stats)
+
+        print('\n6. hot set')
+        agora = datetime(2026, 10, 19, 6, 0)
+        ontem = agora - timedelta(days=1)
+        fingerprints = {
+            (CNPJ, 2015): {'has_open': False, 'last_synced_at': ontem},
+            (CNPJ, 2016): {'has_open': True, 'last_synced_at': ontem},
+            (CNPJ, 2017): {'has_open': False, 'last_synced_at': agora - timedelta(days=8)},
+            (CNPJ, 2025): {'has_open': False, 'last_synced_at': ontem},
+        }
+        anos = [2026, 2025, 2018, 2017, 2016, 2015]
+        plano = fap_sync_cron.plan_listing_years(fingerprints, '12.345.678/0001-95', anos, agora, 7)
+        check('fria recente fora; aberta, recente, vencida e nova dentro',
+              plano == [2026, 2025, 2018, 2017, 2016], plano)
+        check('full busca tudo', fap_sync_cron.plan_listing_years(fingerprints, CNPJ, anos, agora, 7, True) == anos)
+        carregadas = fap_sync_cron.load_listing_fingerprints(db, Fingerprint, 1)
+        check('carga das impressões do escritório', set(carregadas) == {(CNPJ, 2020), (CNPJ, 2021), (CNPJ, 2022)}
+              and carregadas[(CNPJ, 2021)]['has_open'])
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
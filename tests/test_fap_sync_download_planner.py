@@ -0,0 +1,206 @@
+"""
+Planejador de downloads dos PDFs de contestação do cron do FAP
+(download_pending_files em scripts/fap_sync_cron.py) — sem rede: o
+FapWebService é um dublê que grava o PDF em streaming como o real.
+
+Confere, num SQLite temporário e num diretório de uploads temporário:
+- uma varredura do disco vincula o que já existe (no diretório da
+  contestação ou em outro ano/CNPJ) e ignora temporários .part;
+- PDF com conteúdo repetido não é gravado duas vezes: hardlink com o nome
+  de cada contestação;
+- caminho do checkpoint cujo arquivo sumiu é baixado de novo;
+- um único serviço compartilhado pelos workers;
+- file_path gravados em lote (UPDATEs proporcionais a commit_every);
+- execução interrompida retoma do checkpoint sem varrer o disco.
+
+Executar:
+    uv run python tests/test_fap_sync_download_planner.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_fap_sync_download.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from sqlalchemy import event  # noqa: E402
+
+import fap_sync_cron  # noqa: E402
+from app.services.fap_web_service import FapWebResult  # noqa: E402
+from app.services.streamed_download import stage_bytes  # noqa: E402
+
+fap_sync_cron._log = lambda msg: None
+
+FALHAS = []
+CNPJ = '12345678000195'
+TMP = tempfile.mkdtemp(prefix='fap_download_planner_')
+app.root_path = TMP  # uploads/ do teste fora da árvore do projeto
+ROOT = os.path.join(TMP, 'uploads', 'fap_web_contestacoes', '1')
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+class _StubService:
+    """Baixa 'PDF <cid>'; 10 e 11 têm o mesmo conteúdo; 13 sempre falha."""
+
+    def __init__(self, interromper_em=None):
+        self.chamadas = []
+        self.lock = threading.Lock()
+        self.interromper_em = interromper_em
+
+    def download_contestacao_to(self, year, cnpj, contestacao_id, directory):
+        with self.lock:
+            self.chamadas.append(contestacao_id)
+            n = len(self.chamadas)
+        if self.interromper_em and n == self.interromper_em:
+            raise KeyboardInterrupt
+        if contestacao_id == 13:
+            return FapWebResult(ok=False, message='sem PDF')
+        conteudo = b'PDF repetido' if contestacao_id in (10, 11) else f'PDF {contestacao_id}'.encode()
+        arquivo = stage_bytes(conteudo, directory, f'{contestacao_id}.pdf')
+        return FapWebResult(ok=True, data={'file': arquivo, 'filename': 'julgamento.pdf'})
+
+
+def gravar(ano, nome, conteudo=b'antigo'):
+    pasta = os.path.join(ROOT, str(ano), CNPJ)
+    os.makedirs(pasta, exist_ok=True)
+    with open(os.path.join(pasta, nome), 'wb') as fh:
+        fh.write(conteudo)
+
+
+def main():
+    with app.app_context():
+        from app.models import LawFirm, FapWebContestacao
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        db.session.add(LawFirm(id=1, name='Escritório', cnpj='00000000000191'))
+        for cid in range(1, 15):
+            db.session.add(FapWebContestacao(
+                law_firm_id=1, contestacao_id=cid, cnpj=CNPJ, cnpj_raiz=CNPJ[:8], ano_vigencia=2024,
+            ))
+        db.session.commit()
+
+        # 1: no diretório dele; 2: em outro ano; 3: só um temporário .part
+        gravar(2024, '1_julgamento.pdf')
+        gravar(2023, '2_julgamento.pdf')
+        gravar(2024, '.3_julgamento.pdf.abc.part')
+
+        print('\n1. índice do disco')
+        indice = fap_sync_cron.scan_download_index(ROOT, 1)
+        check('uma entrada por contestação com arquivo', sorted(indice) == [1, 2], sorted(indice))
+        check('caminho relativo completo',
+              indice[1] == ['uploads/fap_web_contestacoes/1/2024/12345678000195/1_julgamento.pdf'])
+
+        print('\n2. execução completa')
+        service = _StubService()
+        updates = []
+
+        def contar(conn, cursor, statement, *args):
+            if statement.startswith('UPDATE fap_web_contestacoes'):
+                updates.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', contar)
+        try:
+            stats = fap_sync_cron.download_pending_files(
+                None, db, FapWebContestacao, 1, [2024], max_workers=4, commit_every=3, svc=service,
+            )
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', contar)
+        check('contagens', stats == {'pending': 14, 'downloaded': 10, 'failed': 1, 'linked': 2,
+                                     'deduped': 1, 'expired': False}, stats)
+        check('disco não rebaixado', sorted(service.chamadas) == list(range(3, 15)), sorted(service.chamadas))
+        rows = {r.contestacao_id: r.file_path for r in FapWebContestacao.query.all()}
+        check('vinculado de outro ano', rows[2].endswith('/2023/12345678000195/2_julgamento.pdf'))
+        check('conteúdo repetido: cada contestação com o próprio nome',
+              rows[10].endswith('/10_julgamento.pdf') and rows[11].endswith('/11_julgamento.pdf'),
+              (rows[10], rows[11]))
+        repetidos = [os.path.join(ROOT, '2024', CNPJ, f'{cid}_julgamento.pdf') for cid in (10, 11)]
+        check('conteúdo repetido gravado uma vez (hardlink)', os.path.samefile(*repetidos))
+        check('falha fica pendente', rows[13] is None)
+        check('UPDATEs em lote', 1 <= len(updates) <= 5, len(updates))
+        check('sem checkpoint ao terminar',
+              not os.path.exists(os.path.join(ROOT, fap_sync_cron.DOWNLOAD_CHECKPOINT_NAME)))
+
+        print('\n3. interrupção e retomada')
+        FapWebContestacao.query.update({'file_path': None})
+        db.session.commit()
+        shutil.rmtree(os.path.join(ROOT, '2024'))
+        gravar(2024, '1_julgamento.pdf')
+        try:
+            fap_sync_cron.download_pending_files(
+                None, db, FapWebContestacao, 1, [2024], max_workers=1, commit_every=3,
+                svc=_StubService(interromper_em=8),
+            )
+            check('interrompida', False, 'não interrompeu')
+        except KeyboardInterrupt:
+            pass
+        db.session.rollback()
+        checkpoint = os.path.join(ROOT, fap_sync_cron.DOWNLOAD_CHECKPOINT_NAME)
+        check('checkpoint gravado', os.path.exists(checkpoint))
+        gravados = FapWebContestacao.query.filter(FapWebContestacao.file_path.isnot(None)).count()
+        check('lotes já gravados no banco', gravados >= 5, gravados)
+
+        varreu = []
+        original = fap_sync_cron.scan_download_index
+        fap_sync_cron.scan_download_index = lambda *args: varreu.append(args) or original(*args)
+        try:
+            service = _StubService()
+            stats = fap_sync_cron.download_pending_files(
+                None, db, FapWebContestacao, 1, [2024], max_workers=4, commit_every=3, svc=service,
+            )
+        finally:
+            fap_sync_cron.scan_download_index = original
+        check('retomou sem varrer o disco', not varreu)
+        check('só o que faltava foi baixado', 13 in service.chamadas and len(service.chamadas) < 12,
+              sorted(service.chamadas))
+        faltando = [r.contestacao_id for r in FapWebContestacao.query.filter(FapWebContestacao.file_path.is_(None))]
+        check('todas vinculadas, exceto a que falha', faltando == [13], faltando)
+        check('checkpoint removido', not os.path.exists(checkpoint))
+
+        print('\n4. checkpoint com arquivo apagado depois')
+        FapWebContestacao.query.update({'file_path': None})
+        db.session.commit()
+        fap_sync_cron._save_download_checkpoint(
+            checkpoint, 1, fap_sync_cron.scan_download_index(ROOT, 1), {})
+        os.remove(os.path.join(ROOT, '2024', CNPJ, '5_julgamento.pdf'))
+        service = _StubService()
+        fap_sync_cron.download_pending_files(
+            None, db, FapWebContestacao, 1, [2024], max_workers=2, commit_every=3, svc=service,
+        )
+        rows = {r.contestacao_id: r.file_path for r in FapWebContestacao.query.all()}
+        check('arquivo sumido baixado de novo, não vinculado', sorted(service.chamadas) == [5, 13]
+              and os.path.exists(os.path.join(TMP, rows[5])), sorted(service.chamadas))
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    shutil.rmtree(TMP, ignore_errors=True)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
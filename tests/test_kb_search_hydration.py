@@ -0,0 +1,143 @@
+"""
+Pesquisa Inteligente: hidratação em lote dos arquivos dos resultados.
+
+Com 50 trechos vindos da busca (agente de consulta substituído por stub),
+confere que a tela:
+- faz um número constante de consultas em knowledge_base (não uma por trecho);
+- descarta trechos de arquivos de outro escritório;
+- mantém nome/descrição/tipo do arquivo em cada resultado;
+e que as fontes do chat (/api/ask) passam pelo mesmo filtro de escritório.
+
+Executar:
+    uv run python tests/test_kb_search_hydration.py
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_kb_hydration.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+app.config['WTF_CSRF_ENABLED'] = False
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from sqlalchemy import event  # noqa: E402
+
+import app.blueprints.knowledge_base as kb_blueprint  # noqa: E402
+from app.services import access_audit_service  # noqa: E402
+from app.services.knowledge_base.result_hydration import filter_sources_detail  # noqa: E402
+
+FALHAS = []
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+class _StubQueryAgent:
+    points = []
+
+    def ask_knowledge_base(self, question, history=None, limit=None, search_mode='semantic', law_firm_id=None):
+        return {'improved_question': question, 'results': SimpleNamespace(points=self.points)}
+
+
+def main():
+    with app.app_context():
+        from app.models import LawFirm, User, KnowledgeBase
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        db.session.add_all([LawFirm(id=1, name='Escritório A', cnpj='00000000000191'),
+                            LawFirm(id=2, name='Escritório B', cnpj='00000000000272')])
+        user = User(id=1, law_firm_id=1, name='Admin', email='admin@example.com', role='admin', is_active=True)
+        user.set_password('x')
+        db.session.add(user)
+        db.session.flush()
+        for file_id in range(1, 11):
+            db.session.add(KnowledgeBase(
+                id=file_id, user_id=1, law_firm_id=1 if file_id <= 8 else 2,
+                original_filename=f'arquivo_{file_id}.pdf', file_path=f'/tmp/{file_id}.pdf',
+                file_type='pdf', description=f'descrição {file_id}', is_active=file_id != 8,
+            ))
+        db.session.commit()
+
+        _StubQueryAgent.points = [
+            SimpleNamespace(id=f'p{idx}', score=0.9 - idx * 0.005, payload={
+                'text': f'acidente de trabalho trecho {idx}', 'source': f'arquivo_{idx % 10 + 1}.pdf',
+                'file_id': idx % 10 + 1, 'page': idx,
+            })
+            for idx in range(50)
+        ]
+        kb_blueprint.KnowledgeQueryAgent = _StubQueryAgent
+
+        kb_queries = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def _count(conn, cursor, statement, params, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT') and 'FROM knowledge_base' in statement:
+                kb_queries.append(statement)
+
+        captured = {}
+
+        def _capture(sender, template, context, **extra):
+            if 'results' in context:
+                captured['results'] = context['results']
+
+        from flask import template_rendered
+        template_rendered.connect(_capture, app)
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['law_firm_id'] = 1
+
+        print('\n1. Pesquisa Inteligente com 50 trechos')
+        response = client.post('/knowledge-base/intelligent-search',
+                               data={'query': 'acidente trabalho', 'search_mode': 'semantic'})
+        check('tela respondeu', response.status_code == 200, response.status_code)
+        results = captured.get('results') or []
+        check('consultas em knowledge_base constantes (contagem + lote)', len(kb_queries) <= 2,
+              f'{len(kb_queries)} consulta(s)')
+        foreign = [r for r in results if r['file_id'] in (9, 10)]
+        check('trechos de outro escritório descartados', not foreign, [r['file_id'] for r in foreign])
+        check('40 trechos do escritório mantidos', len(results) == 40, len(results))
+        sample = next((r for r in results if r['file_id'] == 3), None)
+        check('metadados do arquivo preenchidos',
+              sample and sample['file_info'] == {'original_filename': 'arquivo_3.pdf',
+                                                 'description': 'descrição 3', 'file_type': 'pdf'},
+              sample and sample['file_info'])
+        check('highlight aplicado', sample and '<mark class="highlight-term">acidente</mark>' in sample['highlighted_text'])
+
+        print('\n2. fontes do chat')
+        detail = [{'file_id': 1}, {'file_id': 8}, {'file_id': 9}, {'source': 'antigo.pdf'}]
+        kept = filter_sources_detail(detail, 1)
+        check('mantém ativo do escritório e entradas sem file_id',
+              kept == [{'file_id': 1}, {'source': 'antigo.pdf'}], kept)
+
+        template_rendered.disconnect(_capture, app)
+        access_audit_service.flush_activity()
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
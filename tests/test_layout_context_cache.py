@@ -0,0 +1,144 @@
+"""
+Cache do contexto de layout (comentários recentes e permissões de módulo).
+
+Confere que:
+- a segunda página do mesmo escritório não consulta case_comments de novo;
+- criar/excluir comentário pelo blueprint case_comments invalida o cache;
+- o cache é por escritório (um tenant não vê comentários do outro);
+- os contadores de acerto/falta aparecem em /admin/access-audit/layout-cache.
+
+Executar:
+    uv run python tests/test_layout_context_cache.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_layout_cache.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+app.config['WTF_CSRF_ENABLED'] = False
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from sqlalchemy import event  # noqa: E402
+
+from app.services import access_audit_service, layout_context_cache  # noqa: E402
+
+FALHAS = []
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+def main():
+    with app.app_context():
+        from app.models import LawFirm, User, Client, Case, CaseComment
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        firms = [LawFirm(id=1, name='Escritório A', cnpj='00000000000191'),
+                 LawFirm(id=2, name='Escritório B', cnpj='00000000000272')]
+        db.session.add_all(firms)
+        users = []
+        for firm in firms:
+            user = User(law_firm_id=firm.id, name=f'Admin {firm.id}', email=f'admin{firm.id}@example.com',
+                        role='admin', is_active=True)
+            user.set_password('x')
+            users.append(user)
+        db.session.add_all(users)
+        db.session.add_all([Client(id=1, law_firm_id=1, name='Cliente A', cnpj='11111111000111'),
+                            Client(id=2, law_firm_id=2, name='Cliente B', cnpj='22222222000122')])
+        db.session.add_all([Case(id=10, law_firm_id=1, client_id=1, title='Caso A', case_type='fap'),
+                            Case(id=20, law_firm_id=2, client_id=2, title='Caso B', case_type='fap')])
+        db.session.flush()
+        db.session.add(CaseComment(case_id=10, user_id=users[0].id, title='Primeiro', content='texto'))
+        db.session.commit()
+
+        comment_queries = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def _count(conn, cursor, statement, params, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT') and 'FROM case_comments' in statement:
+                comment_queries.append(statement)
+
+        layout_context_cache.recent_case_comments_cache.invalidate()
+        layout_context_cache.module_permissions_cache.invalidate()
+
+        def client_for(user):
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = user.id
+                sess['law_firm_id'] = user.law_firm_id
+            return client
+
+        def header_comments(client):
+            captured = {}
+
+            def _capture(sender, template, context, **extra):
+                captured.setdefault('items', context.get('recent_case_comments'))
+
+            from flask import template_rendered
+            template_rendered.connect(_capture, app)
+            try:
+                client.get('/dashboard', headers={'Accept': 'text/html'})
+            finally:
+                template_rendered.disconnect(_capture, app)
+            return [item['title'] for item in captured.get('items') or []]
+
+        client_a = client_for(users[0])
+        client_b = client_for(users[1])
+
+        print('\n1. cache por escritório')
+        titles = header_comments(client_a)
+        check('primeira página carrega os comentários', titles == ['Primeiro'], titles)
+        before = len(comment_queries)
+        titles = header_comments(client_a)
+        check('segunda página não consulta case_comments', len(comment_queries) == before,
+              f'{len(comment_queries) - before} consulta(s)')
+        check('mesmo conteúdo vindo do cache', titles == ['Primeiro'], titles)
+        check('outro escritório não vê o comentário do primeiro', header_comments(client_b) == [])
+
+        print('\n2. invalidação pelo blueprint case_comments')
+        response = client_a.post('/cases/10/comments/', json={'title': 'Segundo', 'content': 'mais texto'})
+        check('comentário criado', response.status_code == 201, response.status_code)
+        titles = header_comments(client_a)
+        check('header mostra o comentário novo', titles[:1] == ['Segundo'], titles)
+        new_id = response.get_json()['id']
+        response = client_a.delete(f'/cases/10/comments/{new_id}')
+        check('comentário excluído', response.status_code == 200, response.status_code)
+        check('header deixa de mostrar o excluído', header_comments(client_a) == ['Primeiro'])
+
+        print('\n3. contadores')
+        stats = client_a.get('/admin/access-audit/layout-cache').get_json() or {}
+        comments_stats = stats.get('recent_case_comments', {})
+        check('contadores de acerto/falta expostos',
+              comments_stats.get('hits', 0) >= 1 and comments_stats.get('misses', 0) >= 1, comments_stats)
+        check('permissões de módulo também em cache',
+              stats.get('module_permissions', {}).get('hits', 0) >= 1, stats.get('module_permissions'))
+
+        access_audit_service.flush_activity()
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Cache de resultado das tools FAP do MCP (mcp_server/tools/result_cache.py),
+versão dos dados do FAP (app/services/fap_data_version.py) e filtro por CNPJ
+sobre benefits.employer_cnpj_digits.
+
+Confere, num SQLite temporário:
+- employer_cnpj_digits mantido pelos eventos do Benefit (insert e update);
+- filtro por raiz, CNPJ completo e formatado igual à comparação em Python;
+- segunda chamada igual vem do cache com um único SELECT (o da versão);
+  argumentos equivalentes (padrões, espaços, posicional × nome) na mesma
+  entrada; escritórios separados; resultado alterado por quem chamou não
+  suja o cache; exceção não fica guardada;
+- bump da versão (e a exclusão de benefício e de relatório de julgamento
+  na Central de Disputas) descarta o resultado velho;
+- estatísticas por tool e o recurso MCP registrado.
+
+Executar:
+    uv run python tests/test_mcp_fap_cache.py
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_mcp_fap_cache.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+app.config['WTF_CSRF_ENABLED'] = False
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from sqlalchemy import event  # noqa: E402
+
+from app.services import benefit_search_service, fap_data_version  # noqa: E402
+from mcp_server.tools import result_cache  # noqa: E402
+from mcp_server.tools.fap import (  # noqa: E402
+    _filter_benefit_cnpj,
+    fap_summary_handler,
+    get_benefit_detail_handler,
+    list_fap_benefits_handler,
+)
+
+FALHAS = []
+
+CNPJS = ['12.345.678/0001-95', '12345678000276', '98.765.432/0001-10', None, '']
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+def popular():
+    from app.models import Benefit, FapCompany, LawFirm, User
+    db.session.add_all([
+        LawFirm(id=1, name='Escritório', cnpj='00000000000191'),
+        LawFirm(id=2, name='Outro', cnpj='00000000000272'),
+        User(id=1, law_firm_id=1, name='Admin', email='a@b.c', password_hash='x', role='admin'),
+        FapCompany(law_firm_id=1, cnpj='12345678', nome='Bistek Supermercados',
+                   synced_at=datetime(2026, 1, 1)),
+    ])
+    for i in range(1, 31):
+        db.session.add(Benefit(
+            id=i, law_firm_id=1 if i <= 25 else 2, benefit_number=f'{6000000000 + i}',
+            benefit_type='B91' if i % 3 else 'B94', employer_cnpj=CNPJS[i % len(CNPJS)],
+            fap_vigencia_years='2024', status='pending',
+        ))
+    db.session.commit()
+
+
+def ids(query):
+    return sorted(b.id for b in query)
+
+
+def contar_selects():
+    selects = []
+
+    def contar(conn, cursor, statement, *args):
+        selects.append(statement)
+
+    return selects, contar
+
+
+def main():
+    with app.app_context():
+        from app.models import Benefit
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        popular()
+        engine = db.engine
+
+        print('\n1. employer_cnpj_digits pelos eventos do Benefit')
+        check('formatado → dígitos', db.session.get(Benefit, 1).employer_cnpj_digits == '12345678000276')
+        check('vazio/nulo → NULL', db.session.get(Benefit, 3).employer_cnpj_digits is None
+              and db.session.get(Benefit, 4).employer_cnpj_digits is None)
+        editado = db.session.get(Benefit, 2)
+        editado.employer_cnpj = '98.765.432/0002-00'
+        db.session.commit()
+        check('edição recalcula', db.session.get(Benefit, 2).employer_cnpj_digits == '98765432000200')
+
+        print('\n2. filtro por CNPJ igual ao de Python')
+        base = Benefit.query.filter_by(law_firm_id=1)
+        todos = base.all()
+
+        def esperado(cnpj):
+            digitos = ''.join(ch for ch in cnpj if ch.isdigit())
+            cnpjs = {b.id: ''.join(ch for ch in (b.employer_cnpj or '') if ch.isdigit()) for b in todos}
+            if len(digitos) <= 8:
+                return sorted(i for i, c in cnpjs.items() if c and c.startswith(digitos))
+            return sorted(i for i, c in cnpjs.items() if c == digitos)
+
+        for termo in ['12345678', '12.345.678', '12.345.678/0001-95', '12345678000276', '98765432', '11111111']:
+            check(f'cnpj "{termo}"', ids(_filter_benefit_cnpj(base, termo)) == esperado(termo),
+                  len(esperado(termo)))
+
+        print('\n3. cache de resultado')
+        result_cache.fap_tool_cache.invalidate()
+        primeiro = result_cache.cached_call('resumo_fap', fap_summary_handler, 1, None, '12345678', None)
+        selects, contar = contar_selects()
+        event.listen(engine, 'before_cursor_execute', contar)
+        try:
+            segundo = result_cache.cached_call('resumo_fap', fap_summary_handler, 1, cnpj=' 12345678 ')
+        finally:
+            event.remove(engine, 'before_cursor_execute', contar)
+        check('acerto: mesmo resultado', segundo == primeiro)
+        check('acerto: só o SELECT da versão', len(selects) == 1 and 'fap_data_versions' in selects[0],
+              [s[:50] for s in selects])
+        check('resumo da raiz', primeiro['beneficios']['total'] == len(esperado('12345678')),
+              primeiro['beneficios']['total'])
+
+        segundo['beneficios']['total'] = -1
+        segundo['filtros']['empresa'] = 'sujou'
+        terceiro = result_cache.cached_call('resumo_fap', fap_summary_handler, 1, None, '12345678', None)
+        check('alterar o devolvido não suja o cache', terceiro == primeiro)
+
+        outro = result_cache.cached_call('resumo_fap', fap_summary_handler, 2, None, '12345678', None)
+        check('outro escritório, outra entrada', outro['beneficios']['total'] != primeiro['beneficios']['total'])
+
+        pagina = result_cache.cached_call('listar_beneficios_fap', list_fap_benefits_handler, 1, limit=5)
+        mesma = result_cache.cached_call('listar_beneficios_fap', list_fap_benefits_handler, 1, None, limit=5, offset=0)
+        check('padrões aplicados na chave', mesma == pagina)
+        estat = result_cache.stats()['por_tool']
+        check('acertos e faltas por tool', estat['resumo_fap'] == {'hits': 2, 'misses': 2, 'hit_rate': 0.5}
+              and estat['listar_beneficios_fap']['hits'] == 1, estat)
+
+        chamadas = []
+
+        def falha(law_firm_id):
+            chamadas.append(law_firm_id)
+            raise RuntimeError('banco fora')
+
+        for _ in range(2):
+            try:
+                result_cache.cached_call('falha', falha, 1)
+            except RuntimeError:
+                pass
+        check('exceção não fica no cache', len(chamadas) == 2)
+
+        print('\n4. versão dos dados')
+        check('escritório sem gravação: versão 0', fap_data_version.current(1) == 0)
+        db.session.get(Benefit, 1).employer_cnpj = '55.555.555/0001-55'
+        db.session.commit()
+        check('sem bump, o cache ainda serve o anterior',
+              result_cache.cached_call('resumo_fap', fap_summary_handler, 1, None, '12345678', None) == primeiro)
+        check('bump cria e incrementa', fap_data_version.bump(1) == 1 and fap_data_version.bump(1) == 2)
+        depois = result_cache.cached_call('resumo_fap', fap_summary_handler, 1, None, '12345678', None)
+        check('versão nova: resultado recalculado',
+              depois['beneficios']['total'] == primeiro['beneficios']['total'] - 1, depois['beneficios']['total'])
+        check('outro escritório mantém a versão', fap_data_version.current(2) == 0)
+        detalhe = result_cache.cached_call('detalhar_beneficio', get_benefit_detail_handler, 6, 1)
+        check('detalhe pelo cache', detalhe['id'] == 6)
+
+    # Exclusão na Central de Disputas incrementa a versão
+    benefit_search_service._unavailable_until = float('inf')
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['user_id'] = 1
+        sessao['law_firm_id'] = 1
+        sessao['user_role'] = 'admin'
+    cliente.post('/disputes-center/6/delete')
+    with app.app_context():
+        check('exclusão de benefício faz bump', fap_data_version.current(1) == 3)
+        detalhe = result_cache.cached_call('detalhar_beneficio', get_benefit_detail_handler, 6, 1)
+        check('detalhe do excluído recalculado', 'erro' in detalhe, detalhe)
+        from app.models import FapContestationJudgmentReport
+        db.session.add(FapContestationJudgmentReport(id=1, user_id=1, law_firm_id=1,
+                                                     original_filename='r.pdf', file_path='/nao/existe.pdf'))
+        db.session.commit()
+    cliente.post('/disputes-center/fap-contestation-reports/1/delete')
+    with app.app_context():
+        check('exclusão de relatório faz bump', fap_data_version.current(1) == 4, fap_data_version.current(1))
+
+    print('\n5. recurso MCP')
+    import fastmcp
+    from mcp_server.server import mcp
+
+    async def listar():
+        async with fastmcp.Client(mcp) as mcp_cliente:
+            return {str(r.uri) for r in await mcp_cliente.list_resources()}
+
+    check('intellexia://cache/fap registrado', 'intellexia://cache/fap' in asyncio.run(listar()))
+    estat = result_cache.stats()
+    check('estatísticas com TTL, tamanho e entradas', estat['ttl_seconds'] == 300
+          and estat['mcp_fap_tools']['entries'] > 0)
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
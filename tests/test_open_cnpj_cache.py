@@ -0,0 +1,190 @@
+"""
+Cache da OpenCNPJ (cnpj_company_cache) — sem rede: SDK e HTTP são stubs.
+
+Confere:
+- segunda consulta do mesmo CNPJ sai do cache (nenhuma chamada à API);
+- 404 é cacheado (cache negativo) e erro 5xx não é;
+- cache expirado volta à API;
+- consultas simultâneas do mesmo CNPJ viram uma só chamada;
+- prefetch resolve um lote com uma chamada por CNPJ distinto;
+- a importação de relatórios não consulta de novo um CNPJ já resolvido.
+
+Executar:
+    uv run python tests/test_open_cnpj_cache.py
+"""
+
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_open_cnpj_cache.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+import app.services.open_cnpj_service as open_cnpj_module  # noqa: E402
+from app.services.open_cnpj_service import OpenCNPJService  # noqa: E402
+
+FALHAS = []
+API_DELAY = 0.2
+
+KNOWN = {'11222333000181': 'Empresa Conhecida Ltda'}
+for idx in range(5):
+    KNOWN[f'4455566600{idx:02d}{idx:02d}'] = f'Empresa Lote {idx}'
+BROKEN = '99888777000166'
+
+api_calls = []
+api_lock = threading.Lock()
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+class _StubSDK:
+    def find_by_cnpj(self, cnpj):
+        digits = ''.join(ch for ch in cnpj if ch.isdigit())
+        with api_lock:
+            api_calls.append(digits)
+        time.sleep(API_DELAY)
+        if digits == BROKEN:
+            raise RuntimeError('status 503: indisponível')
+        if digits in KNOWN:
+            return {'cnpj': digits, 'razao_social': KNOWN[digits], 'municipio': 'Porto Alegre', 'uf': 'RS'}
+        raise RuntimeError('status 404: not_found')
+
+
+class _StubResponse:
+    status_code = 503
+    content = b''
+
+
+def _stub_requests_get(url, timeout=None):
+    with api_lock:
+        api_calls.append(url)
+    return _StubResponse()
+
+
+def calls_for(digits):
+    return sum(1 for call in api_calls if digits in call)
+
+
+def main():
+    open_cnpj_module.OpenCNPJ = _StubSDK
+    open_cnpj_module.requests.get = _stub_requests_get
+
+    with app.app_context():
+        from app.models import LawFirm, Client, CnpjCompanyCache
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        db.session.add(LawFirm(id=1, name='Escritório', cnpj='00000000000191'))
+        db.session.commit()
+
+        service = OpenCNPJService()
+
+        print('\n1. cache positivo')
+        first = service.lookup_company('11.222.333/0001-81')
+        check('primeira consulta vai à API', first['success'] and calls_for('11222333000181') >= 1, api_calls)
+        before = len(api_calls)
+        second = service.lookup_company('11222333000181')
+        check('segunda consulta sai do cache', len(api_calls) == before and second['data'] == first['data'])
+        check('razão social preservada', second['data']['razao_social'] == 'Empresa Conhecida Ltda')
+
+        print('\n2. cache negativo e erros')
+        unknown = '12345678000195'
+        result = service.lookup_company(unknown)
+        calls_404 = calls_for(unknown)
+        check('404 sem fallback HTTP quando o SDK respondeu', result['status_code'] == 404 and calls_404 == 2,
+              f'{calls_404} chamada(s)')
+        service.lookup_company(unknown)
+        check('404 cacheado', calls_for(unknown) == calls_404)
+        result = service.lookup_company(BROKEN)
+        check('erro da API → 502', result['status_code'] == 502, result)
+        broken_calls = calls_for(BROKEN)
+        service.lookup_company(BROKEN)
+        check('erro não é cacheado', calls_for(BROKEN) == 2 * broken_calls)
+        check('tabela só com found/not_found',
+              {row.status for row in CnpjCompanyCache.query.all()} == {'found', 'not_found'})
+
+        print('\n3. expiração e use_cache=False')
+        row = db.session.get(CnpjCompanyCache, '11222333000181')
+        row.expires_at = datetime.now() - timedelta(seconds=1)
+        db.session.commit()
+        before = calls_for('11222333000181')
+        service.lookup_company('11222333000181')
+        check('expirado volta à API', calls_for('11222333000181') == before + 1)
+        service.lookup_company('11222333000181', use_cache=False)
+        check('use_cache=False força a API', calls_for('11222333000181') == before + 2)
+
+        print('\n4. consultas simultâneas do mesmo CNPJ')
+        target = '44555666000000'
+        results = []
+        app_obj = app
+
+        def _worker():
+            with app_obj.app_context():
+                results.append(OpenCNPJService().lookup_company(target))
+
+        threads = [threading.Thread(target=_worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        check('6 pedidos → 1 chamada', calls_for(target) == 1, calls_for(target))
+        check('todos receberam o resultado', len(results) == 6 and all(r['success'] for r in results))
+
+        print('\n5. prefetch em lote')
+        batch = [cnpj for cnpj in KNOWN if cnpj.startswith('4455566600')] * 3 + ['11222333000181', 'inválido']
+        started = time.perf_counter()
+        resolved = service.prefetch_companies(batch)
+        elapsed = time.perf_counter() - started
+        lot = [cnpj for cnpj in KNOWN if cnpj.startswith('4455566600')]
+        check('um resultado por CNPJ válido distinto', len(resolved) == 6, len(resolved))
+        check('cada CNPJ consultado no máximo uma vez', all(calls_for(cnpj) == 1 for cnpj in lot),
+              {cnpj: calls_for(cnpj) for cnpj in lot})
+        check('consultas em paralelo', elapsed < API_DELAY * 4, f'{elapsed:.2f}s')
+
+        print('\n6. importação de relatórios')
+        from app.services.fap_contestation_judgment_report_service import FapContestationJudgmentReportService
+        report_service = FapContestationJudgmentReportService.__new__(FapContestationJudgmentReportService)
+        report_service.open_cnpj_service = OpenCNPJService()
+        new_cnpj = '55666777000144'
+        KNOWN[new_cnpj] = 'Estabelecimento Novo SA'
+        prefetched = report_service.prefetch_establishment_companies(1, [new_cnpj, '44.555.666/0000-00'])
+        check('prefetch do importador consulta só o que falta', prefetched == 2 and calls_for(new_cnpj) == 1)
+        before = len(api_calls)
+        for _ in range(5):
+            client, company_data, _ = report_service._upsert_client_from_cnpj(1, unknown)
+        check('estabelecimento 404 não reconsultado nos 5 blocos do relatório', len(api_calls) == before)
+        client, company_data, formatted = report_service._upsert_client_from_cnpj(1, new_cnpj)
+        db.session.commit()
+        check('cliente criado com dados do cache', client is not None and client.name == 'Estabelecimento Novo SA'
+              and len(api_calls) == before)
+        check('já cliente → fora do prefetch', report_service.prefetch_establishment_companies(1, [new_cnpj]) == 0)
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Busca por número de processo pelas colunas judicial_processes.process_number_digits
+e process_number_digits_reversed (_apply_process_search em
+app/blueprints/process_panel.py) e o vínculo das comunicações do Monitoramento
+pelas mesmas colunas (_existing_process_ids em communication_monitor_service).
+
+Confere, num SQLite temporário:
+- colunas mantidas pelos eventos do JudicialProcess (insert, edição, número apagado);
+- backfill: dry-run não grava, --apply preenche sem mexer em updated_at;
+- número CNJ completo, com ou sem máscara: uma igualdade, sem join de vara;
+- pedaço do número, com ou sem pontuação, em qualquer posição (começo, fim ou
+  meio), igual à comparação em Python, numa consulta só e sem REPLACE no SQL;
+  processo com o pedaço no meio não some quando outro o tem numa ponta;
+- texto continua nos ILIKE de processo e vara, com os dígitos em qualquer
+  posição do número;
+- só o escritório;
+- vínculo do Monitoramento casa máscara e número cru numa consulta só,
+  inclusive em linhas ainda sem a coluna preenchida.
+
+Executar:
+    uv run python tests/test_process_number_search.py
+"""
+
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_process_number_search.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+app.config['WTF_CSRF_ENABLED'] = False
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from sqlalchemy import event, update  # noqa: E402
+
+from app.blueprints import process_panel as pp  # noqa: E402
+from app.services import communication_monitor_service as monitor  # noqa: E402
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'database')))
+import backfill_judicial_processes_number_digits as backfill_script  # noqa: E402
+
+FALHAS = []
+
+NUMEROS = [
+    '5001181-56.2023.4.03.6100',
+    '50011815620234036100',          # mesmo processo sem máscara, outro id
+    '0012345-67.2024.5.04.0001',
+    '1000123-45.2025.8.26.0100',
+    '5009999-11.2024.4.04.7100',
+    'TEMP-20260101-001',
+    None,
+    '1234567-89.2023.4.03.6100',     # ano 2023 no meio do número
+    '2023123-45.2020.4.03.6100',     # 2023 no começo do número
+]
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+def digitos(valor):
+    return ''.join(ch for ch in (valor or '') if ch.isdigit())
+
+
+def popular():
+    from app.models import Court, JudicialProcess, LawFirm, User
+    db.session.add_all([
+        LawFirm(id=1, name='Escritório', cnpj='00000000000191'),
+        LawFirm(id=2, name='Outro', cnpj='00000000000272'),
+        User(id=1, law_firm_id=1, name='Admin', email='a@b.c', password_hash='x', role='admin'),
+        Court(id=1, law_firm_id=1, orgao_julgador='3ª Vara Federal de Porto Alegre'),
+    ])
+    for i, numero in enumerate(NUMEROS, start=1):
+        db.session.add(JudicialProcess(id=i, law_firm_id=1, user_id=1, process_number=numero,
+                                       title=f'Processo {i}', court_id=1 if i == 5 else None))
+    db.session.add(JudicialProcess(id=50, law_firm_id=2, user_id=1, process_number=NUMEROS[0]))
+    db.session.commit()
+
+
+def buscar(termo):
+    filtros = SimpleNamespace(search_query=termo, status='', client_id=None,
+                              legal_thesis_id=None, discovery_view='')
+    return sorted(p.id for p in pp._filtered_processes_query(1, filtros))
+
+
+def esperado_por_digitos(termo, modo):
+    alvo = digitos(termo)
+    ids = []
+    for i, numero in enumerate(NUMEROS, start=1):
+        d = digitos(numero)
+        if d and ((modo == 'igual' and d == alvo) or (modo == 'qualquer' and alvo in d)):
+            ids.append(i)
+    return ids
+
+
+def comandos_de(funcao):
+    comandos = []
+
+    def contar(conn, cursor, statement, *args):
+        comandos.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', contar)
+    try:
+        resultado = funcao()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', contar)
+    return comandos, resultado
+
+
+def main():
+    with app.app_context():
+        from app.models import JudicialProcess
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        popular()
+
+        print('\n1. colunas pelos eventos do JudicialProcess')
+        p1 = db.session.get(JudicialProcess, 1)
+        check('máscara → dígitos', p1.process_number_digits == '50011815620234036100')
+        check('dígitos invertidos', p1.process_number_digits_reversed == '00163043202651811005')
+        check('sem número → NULL', db.session.get(JudicialProcess, 7).process_number_digits is None
+              and db.session.get(JudicialProcess, 7).process_number_digits_reversed is None)
+        editado = db.session.get(JudicialProcess, 4)
+        editado.process_number = '1000123-45.2025.8.26.0199'
+        db.session.commit()
+        check('edição recalcula', db.session.get(JudicialProcess, 4).process_number_digits_reversed
+              == '99106285202543210001')
+        NUMEROS[3] = '1000123-45.2025.8.26.0199'
+
+        print('\n2. backfill')
+        carimbo = datetime(2025, 1, 1, 12, 0)
+        db.session.execute(update(JudicialProcess).values(
+            process_number_digits=None, process_number_digits_reversed=None, updated_at=carimbo))
+        db.session.commit()
+        backfill_script.backfill(False, None)
+        db.session.expire_all()
+        check('dry-run não grava', db.session.get(JudicialProcess, 1).process_number_digits is None)
+        backfill_script.backfill(True, None)
+        db.session.expire_all()
+        check('--apply preenche', all(
+            p.process_number_digits == (digitos(p.process_number) or None)
+            and p.process_number_digits_reversed == (digitos(p.process_number)[::-1] or None)
+            for p in JudicialProcess.query))
+        check('updated_at preservado', all(p.updated_at == carimbo for p in JudicialProcess.query))
+
+        print('\n3. número CNJ completo')
+        for termo in ['5001181-56.2023.4.03.6100', '50011815620234036100', ' 5001181 56 2023 4 03 6100 ']:
+            comandos, ids = comandos_de(lambda: buscar(termo))
+            check(f'"{termo.strip()}"', ids == esperado_por_digitos(termo, 'igual') == [1, 2], ids)
+            check('  igualdade, sem join nem ILIKE', 'process_number_digits = ' in comandos[0]
+                  and 'courts' not in comandos[0] and 'lower(' not in comandos[0].lower())
+
+        print('\n4. pedaço do número, em qualquer posição')
+        for termo in ['5001181', '5001181-56', '0012345', '7100', '.0199', '4.04.7100', '6100',
+                      '2024', '2023.4.03', '9999999']:
+            comandos, ids = comandos_de(lambda: buscar(termo))
+            check(f'"{termo}"', ids == esperado_por_digitos(termo, 'qualquer'), ids)
+            check('  uma consulta, sem REPLACE', len(comandos) == 1
+                  and 'process_number_digits_reversed LIKE' in comandos[0]
+                  and 'replace(' not in comandos[0].lower())
+        check('"2023" no meio não some por outro ter 2023 no começo',
+              {1, 2, 8, 9} <= set(buscar('2023')), buscar('2023'))
+        check('só o escritório', 50 not in buscar('5001181'))
+
+        print('\n5. texto')
+        check('título', buscar('Processo 3') == [3])
+        check('vara', buscar('porto alegre') == [5])
+        check('número provisório', buscar('TEMP-2026') == [6])
+        check('número com texto junto', buscar('proc 5001181') == [1, 2])
+        check('texto com pedaço do meio do número', buscar('proc 2023.4.03')
+              == esperado_por_digitos('2023.4.03', 'qualquer') == [1, 2, 8], buscar('proc 2023.4.03'))
+
+        print('\n6. vínculo do Monitoramento')
+        procurados = {digitos(NUMEROS[2]): {}, '50011815620234036100': {}, '99999999999999999999': {}}
+        comandos, vinculo = comandos_de(lambda: monitor._existing_process_ids(1, procurados))
+        check('máscara e número cru numa consulta', len(comandos) == 1
+              and vinculo[digitos(NUMEROS[2])] == 3 and vinculo['50011815620234036100'] in (1, 2)
+              and '99999999999999999999' not in vinculo, vinculo)
+        check('outro escritório', monitor._existing_process_ids(2, procurados) == {'50011815620234036100': 50})
+        # Antes do backfill: coluna NULL, casa pelo número como está gravado
+        db.session.execute(update(JudicialProcess).where(JudicialProcess.id == 3).values(
+            process_number_digits=None, process_number_digits_reversed=None))
+        db.session.commit()
+        comandos, vinculo = comandos_de(lambda: monitor._existing_process_ids(1, procurados))
+        check('linha sem dígitos casa pela máscara', len(comandos) == 1
+              and vinculo.get(digitos(NUMEROS[2])) == 3, vinculo)
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Consultas da listagem do Painel de Processos (list_processes em
+app/blueprints/process_panel.py), do Radar (process_radar_service.build_radar)
+e da mesa de prazos (process_deadline_service.list_pending_for_firm).
+
+Confere, num SQLite temporário:
+- cards de estatística de um GROUP BY só, iguais às contagens diretas;
+- Radar: providência da IA some quando já virou prazo ou é de fora da janela,
+  publicação lida não entra, e o SELECT das publicações não traz o inteiro teor;
+- mesa de prazos: total pelo COUNT(*) OVER () igual ao count();
+- orçamento de comandos SQL da tabela e do Kanban, fixo com o dobro de
+  processos, prazos, publicações e snapshots (sem N+1);
+- Kanban: colunas com os primeiros cartões, total no badge e "Carregar mais"
+  trazendo o resto da coluna, na ordem e com os filtros.
+
+Executar:
+    uv run python tests/test_process_panel_queries.py
+"""
+
+import os
+import re
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_tmp_process_panel_queries.db')
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+app.config['WTF_CSRF_ENABLED'] = False
+
+from app.models import db  # noqa: E402
+
+app.extensions.pop('sqlalchemy', None)
+try:
+    db._app_engines.pop(app, None)
+except Exception:
+    pass
+db.init_app(app)
+
+from sqlalchemy import event  # noqa: E402
+
+from app.blueprints import process_panel as pp  # noqa: E402
+from app.services import process_deadline_service, process_radar_service  # noqa: E402
+
+FALHAS = []
+
+# Comandos SQL por carga de tela, inclusive os 7 dos contadores do header e
+# do menu. Subir este número exige justificar a consulta nova; o que não pode
+# é variar com o volume.
+ORCAMENTO_TABELA = 25
+ORCAMENTO_KANBAN = 17
+
+STATUS = ['ativo', 'ativo', 'suspenso', 'encerrado', 'aguardando']
+FASES = ['inicio_processo', 'julgamento', 'fase_removida', None]
+
+
+def check(rotulo, condicao, extra=''):
+    print(f"  [{'OK ' if condicao else 'FALHA'}] {rotulo}{(' — ' + str(extra)) if extra else ''}")
+    if not condicao:
+        FALHAS.append(rotulo)
+
+
+def popular_base():
+    from app.models import Client, Court, JudicialDefendant, JudicialPhase, LawFirm, User
+    db.session.add_all([
+        LawFirm(id=1, name='Escritório', cnpj='00000000000191'),
+        LawFirm(id=2, name='Outro', cnpj='00000000000272'),
+        User(id=1, law_firm_id=1, name='Ana Admin', email='a@b.c', password_hash='x', role='admin'),
+        User(id=2, law_firm_id=1, name='Bruno Advogado', email='b@b.c', password_hash='x', role='user'),
+        Client(id=1, law_firm_id=1, name='Metalúrgica Exemplo', cnpj='12345678000195'),
+        JudicialDefendant(id=1, law_firm_id=1, name='INSS'),
+        Court(id=1, law_firm_id=1, orgao_julgador='1ª Vara Federal'),
+        JudicialPhase(law_firm_id=1, key='inicio_processo', name='Início', display_order=1),
+        JudicialPhase(law_firm_id=1, key='julgamento', name='Julgamento', display_order=2),
+    ])
+    db.session.commit()
+
+
+def popular(inicio, quantidade):
+    """Processos [inicio, inicio+quantidade) com eventos, prazos, publicações e snapshots."""
+    from app.models import (
+        JudicialEvent, JudicialProcess, ProcessCommunication, ProcessDatajudSnapshot, ProcessDeadline,
+    )
+    hoje = date.today()
+    for i in range(inicio, inicio + quantidade):
+        db.session.add(JudicialProcess(
+            id=i, law_firm_id=1 if i % 10 else 2, user_id=1, title=f'Processo {i:03d}',
+            process_number=f'{i:07d}-11.2026.4.03.6100', status=STATUS[i % len(STATUS)],
+            discovery_status='pending_review' if i % 7 == 0 else 'confirmed',
+            plaintiff_client_id=1, defendant_id=1, court_id=1 if i % 2 else None,
+            created_at=datetime(2026, 1, 1) + timedelta(hours=i),
+        ))
+        if i % 10 == 0:
+            continue  # do outro escritório: nada do escritório 1 aponta para ele
+        fase = FASES[i % len(FASES)]
+        if fase:
+            db.session.add(JudicialEvent(process_id=i, type='x', phase='citacao',
+                                         event_date=datetime(2025, 1, 1)))
+            db.session.add(JudicialEvent(process_id=i, type='x', phase=fase,
+                                         event_date=datetime(2025, 6, 1)))
+        db.session.add(ProcessDeadline(
+            law_firm_id=1, process_id=i, title=f'Prazo {i}', due_date=hoje + timedelta(days=i % 20),
+            responsible_user_id=1 + i % 2, status='done' if i % 6 == 0 else 'pending',
+        ))
+        analise = {'data': {'acao_requerida': 'exige_acao', 'acao_descricao': f'Manifestar {i}',
+                            'urgencia': 'alta'}}
+        db.session.add(ProcessCommunication(
+            id=i, law_firm_id=1, judicial_process_id=i, hash=f'h{i}', texto='teor ' * 200,
+            tipo_comunicacao='Intimação', numero_processo=f'{i:07d}1120264036100',
+            data_disponibilizacao=hoje - timedelta(days=(i % 4) * 100 if i % 3 == 0 else i % 25),
+            read_at=datetime.now() if i % 4 == 0 else None,
+            analysis_json=analise if i % 3 == 0 else None,
+        ))
+        db.session.add(ProcessDatajudSnapshot(
+            law_firm_id=1, process_id=i, last_movement_at=datetime.now() - timedelta(days=i % 10),
+            payload_json={'instancias': [{'movimentos': [{'nome': 'Sentença', 'data_hora': '2026-01-01'}]}]},
+        ))
+        if i % 9 == 0:
+            # Providência que já virou prazo gerenciado
+            db.session.add(ProcessDeadline(law_firm_id=1, process_id=i, title='Da intimação',
+                                           due_date=hoje, communication_id=i, origin='communication',
+                                           status='done'))
+    db.session.commit()
+
+
+def radar_esperado():
+    """Itens 'ia' e 'publicacao' do Radar pela regra, lendo tudo em Python."""
+    from app.models import ProcessCommunication, ProcessDeadline
+    hoje = date.today()
+    vinculadas = {d.communication_id for d in ProcessDeadline.query.filter(
+        ProcessDeadline.communication_id.isnot(None))}
+    ia, publicacao = set(), set()
+    for comm in ProcessCommunication.query.filter_by(law_firm_id=1):
+        if not comm.judicial_process_id:
+            continue
+        analise = (comm.analysis_json or {}).get('data') or {}
+        if (analise.get('acao_requerida') == 'exige_acao' and comm.id not in vinculadas
+                and comm.data_disponibilizacao >= hoje - timedelta(days=process_radar_service.RADAR_AI_WINDOW_DAYS)):
+            ia.add(comm.id)
+        elif comm.read_at is None and comm.data_disponibilizacao >= hoje - timedelta(days=30):
+            publicacao.add(comm.id)
+    return ia, publicacao
+
+
+def contar_comandos(engine, funcao):
+    comandos = []
+
+    def contar(conn, cursor, statement, *args):
+        comandos.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', contar)
+    try:
+        resultado = funcao()
+    finally:
+        event.remove(engine, 'before_cursor_execute', contar)
+    return comandos, resultado
+
+
+def cartoes(html):
+    return [int(pid) for pid in re.findall(r'data-process-id="(\d+)"', html)]
+
+
+def main():
+    with app.app_context():
+        from app.models import JudicialProcess, ProcessDeadline
+        assert DB_FILE in str(db.engine.url), 'ABORTADO: fora do sandbox'
+        db.create_all()
+        popular_base()
+        popular(1, 60)
+        engine = db.engine
+
+        print('\n1. cards de estatística')
+        base = JudicialProcess.query.filter_by(law_firm_id=1)
+        confirmados = base.filter_by(discovery_status='confirmed')
+        esperado = {
+            'total': confirmados.count(),
+            'ativo': confirmados.filter_by(status='ativo').count(),
+            'suspenso': confirmados.filter_by(status='suspenso').count(),
+            'encerrado': confirmados.filter_by(status='encerrado').count(),
+            'descobertos': base.filter_by(discovery_status='pending_review').count(),
+        }
+        comandos, stats = contar_comandos(engine, lambda: pp._process_stats(1))
+        check('iguais às contagens diretas', stats == esperado, stats)
+        check('um GROUP BY só', len(comandos) == 1 and 'GROUP BY' in comandos[0])
+
+        print('\n2. Radar e mesa de prazos')
+        with app.test_request_context():
+            comandos, (itens, total) = contar_comandos(
+                engine, lambda: process_radar_service.build_radar(1, limit=500))
+        ia, publicacao = radar_esperado()
+        check('providências da IA', {i['communication_id'] for i in itens if i['kind'] == 'ia'} == ia, len(ia))
+        check('publicações não lidas', {i['communication_id'] for i in itens if i['kind'] == 'publicacao'}
+              == publicacao, len(publicacao))
+        snapshots = sum(1 for i in range(1, 61) if i % 10 and i % 10 <= 6)
+        check('total', total == len(itens) == len(ia) + len(publicacao) + snapshots, total)
+        selects_comm = [c for c in comandos if 'FROM process_communications' in c]
+        check('publicações sem o inteiro teor', selects_comm and not any(
+            'process_communications.texto' in c or 'raw_json' in c for c in selects_comm))
+        check('Radar em 4 comandos', len(comandos) == 4, len(comandos))
+
+        comandos, (prazos, total) = contar_comandos(
+            engine, lambda: process_deadline_service.list_pending_for_firm(1, limit=8))
+        pendentes = ProcessDeadline.query.filter_by(law_firm_id=1, status='pending')
+        check('total pelo COUNT OVER', total == pendentes.count() and len(prazos) == 8, total)
+        check('ordem por data-limite', [p.id for p in prazos] == [p.id for p in pendentes.order_by(
+            ProcessDeadline.due_date, ProcessDeadline.id).limit(8)])
+        check('processo e responsável no mesmo SELECT', len(comandos) == 1
+              and [p.process.process_number for p in prazos] and [p.responsible_user.name for p in prazos]
+              and len(comandos) == 1)
+
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['user_id'] = 1
+        sessao['law_firm_id'] = 1
+        sessao['user_role'] = 'admin'
+
+    pp.KANBAN_COLUMN_LIMIT = 4
+
+    def medir(url):
+        cliente.get(url)  # aquece os caches do layout
+        comandos, resposta = contar_comandos(engine, lambda: cliente.get(url))
+        return len(comandos), resposta
+
+    print('\n3. orçamento de comandos SQL')
+    tabela, resposta = medir('/process-panel/')
+    check('tabela responde', resposta.status_code == 200, resposta.status_code)
+    kanban, resposta = medir('/process-panel/?view=kanban')
+    check('kanban responde', resposta.status_code == 200, resposta.status_code)
+    with app.app_context():
+        popular(61, 60)
+    tabela_2x, _ = medir('/process-panel/')
+    kanban_2x, _ = medir('/process-panel/?view=kanban')
+    check(f'tabela: no máximo {ORCAMENTO_TABELA}', tabela <= ORCAMENTO_TABELA, tabela)
+    check(f'kanban: no máximo {ORCAMENTO_KANBAN}', kanban <= ORCAMENTO_KANBAN, kanban)
+    check('tabela não cresce com o volume', tabela_2x == tabela, (tabela, tabela_2x))
+    check('kanban não cresce com o volume', kanban_2x == kanban, (kanban, kanban_2x))
+
+    print('\n4. Kanban com "Carregar mais"')
+    with app.app_context():
+        from app.models import JudicialEvent, JudicialProcess
+        confirmados = (JudicialProcess.query.filter_by(law_firm_id=1, discovery_status='confirmed')
+                       .order_by(JudicialProcess.created_at.desc(), JudicialProcess.id.desc()).all())
+        fase = {}
+        for evento in JudicialEvent.query.order_by(JudicialEvent.event_date.desc(), JudicialEvent.id.desc()):
+            fase.setdefault(evento.process_id, evento.phase)
+        julgamento = [p.id for p in confirmados if fase.get(p.id) == 'julgamento']
+        sem_fase = [p.id for p in confirmados if fase.get(p.id) not in ('inicio_processo', 'julgamento')]
+
+    html = cliente.get('/process-panel/?view=kanban').get_data(as_text=True)
+    colunas = re.split(r'kanban-cards" data-phase-key="', html)[1:]
+    por_coluna = {c.split('"')[0]: cartoes(c.split('kanban-empty-state')[0]) for c in colunas}
+    check('primeiros cartões de cada coluna', por_coluna.get('julgamento') == julgamento[:4]
+          and por_coluna.get('__unassigned__') == sem_fase[:4], por_coluna.get('julgamento'))
+    check('badge com o total da coluna', f'<strong>Julgamento</strong>\n                    '
+          f'<span class="badge bg-secondary">{len(julgamento)}</span>' in html)
+
+    carregados = list(por_coluna['julgamento'])
+    proxima = re.search(r'data-url="([^"]*phase_key=julgamento[^"]*)"', html)
+    paginas = 0
+    while proxima:
+        fragmento = cliente.get(proxima.group(1).replace('&amp;', '&')).get_data(as_text=True)
+        carregados += cartoes(fragmento)
+        proxima = re.search(r'data-url="([^"]*)"', fragmento)
+        paginas += 1
+    check('"Carregar mais" completa a coluna na ordem', carregados == julgamento,
+          (len(carregados), len(julgamento)))
+    check('última página sem botão', paginas == -(-len(julgamento) // 4) - 1, paginas)
+
+    sem_fase_2 = cliente.get('/process-panel/kanban/column?phase_key=__unassigned__&offset=4')
+    check('"Carregar mais" da coluna "Sem fase"',
+          cartoes(sem_fase_2.get_data(as_text=True)) == sem_fase[4:8])
+
+    comandos = []
+
+    def contar(conn, cursor, statement, *args):
+        comandos.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', contar)
+        try:
+            cliente.get('/process-panel/kanban/column?phase_key=julgamento&offset=4')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', contar)
+    check('"Carregar mais" filtra a fase no SQL, com LIMIT', any(
+        'row_number() over' in c.lower() and 'LIMIT' in c for c in comandos))
+
+    filtrado = cliente.get('/process-panel/kanban/column?phase_key=julgamento&offset=0&status=suspenso')
+    check('filtros valem no "Carregar mais"', cartoes(filtrado.get_data(as_text=True)) == [
+        p for p in julgamento if STATUS[p % len(STATUS)] == 'suspenso'][:4])
+
+    print('\n' + '=' * 62)
+    print('RESULTADO:', 'TUDO OK' if not FALHAS else f'{len(FALHAS)} FALHA(S): {FALHAS}')
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    return 1 if FALHAS else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())